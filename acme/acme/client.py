@@ -2,9 +2,15 @@
 import base64
 import collections
 import datetime
+from email.utils import mktime_tz
 from email.utils import parsedate_tz
+import errno
+import hashlib
 import heapq
+import json
 import logging
+import os
+import tempfile
 import time
 
 import six
@@ -53,11 +59,14 @@ class Client(object):  # pylint: disable=too-many-instance-attributes
     :ivar .ClientNetwork net: Client network. Useful for testing. If not
         supplied, it will be initialized using `key`, `alg` and
         `verify_ssl`.
+    :ivar .ChainCache chain_cache: Cache of the certificates fetched by
+        `fetch_chain`, or ``None``.
 
     """
 
     def __init__(self, directory, key, alg=jose.RS256, verify_ssl=True,
-                 net=None):
+                 net=None, chain_cache=None):
+        # pylint: disable=too-many-arguments
         """Initialize.
 
         :param directory: Directory Resource (`.messages.Directory`) or
@@ -66,6 +75,7 @@ class Client(object):  # pylint: disable=too-many-instance-attributes
         """
         self.key = key
         self.net = ClientNetwork(key, alg, verify_ssl) if net is None else net
+        self.chain_cache = chain_cache
 
         if isinstance(directory, six.string_types):
             self.directory = messages.Directory.from_json(
@@ -418,6 +428,39 @@ class Client(object):  # pylint: disable=too-many-instance-attributes
         return response, jose.ComparableX509(OpenSSL.crypto.load_certificate(
             OpenSSL.crypto.FILETYPE_ASN1, response.content))
 
+    def _get_chain_cert(self, uri):
+        """Returns a certificate of a chain from URI, using `chain_cache`.
+
+        :param str uri: URI of certificate
+
+        :returns: tuple of the form (URI of the certificate's issuer or
+            ``None``, :class:`josepy.util.ComparableX509`)
+        :rtype: tuple
+
+        """
+        if self.chain_cache is None:
+            response, cert = self._get_cert(uri)
+            return response.links.get('up', {}).get('url'), cert
+
+        entry = self.chain_cache.get(uri)
+        if entry is not None and entry.fresh():
+            logger.debug("Using cached certificate for %s", uri)
+            return entry.up, entry.cert
+
+        headers = {'Accept': DER_CONTENT_TYPE}
+        if entry is not None:
+            headers.update(entry.validators())
+        response = self.net.get(uri, headers=headers,
+                                content_type=DER_CONTENT_TYPE)
+        if entry is not None and response.status_code == http_client.NOT_MODIFIED:
+            logger.debug("Cached certificate for %s is still current", uri)
+            entry = entry.revalidated(response)
+        else:
+            entry = ChainCacheEntry.from_response(response)
+        if 'no-store' not in response.headers.get('Cache-Control', ''):
+            self.chain_cache.set(uri, entry)
+        return entry.up, entry.cert
+
     def check_cert(self, certr):
         """Check for new cert.
 
@@ -458,8 +501,8 @@ class Client(object):  # pylint: disable=too-many-instance-attributes
         :param .CertificateResource certr: Certificate Resource
         :param int max_length: Maximum allowed length of the chain.
             Note that each element in the certificate requires new
-            ``HTTP GET`` request, and the length of the chain is
-            controlled by the ACME CA.
+            ``HTTP GET`` request, unless it is cached in `chain_cache`,
+            and the length of the chain is controlled by the ACME CA.
 
         :raises errors.Error: if recursion exceeds `max_length`
 
@@ -473,8 +516,7 @@ class Client(object):  # pylint: disable=too-many-instance-attributes
         chain = []
         uri = certr.cert_chain_uri
         while uri is not None and len(chain) < max_length:
-            response, cert = self._get_cert(uri)
-            uri = response.links.get('up', {}).get('url')
+            uri, cert = self._get_chain_cert(uri)
             chain.append(cert)
         if uri is not None:
             raise errors.Error(
@@ -502,6 +544,230 @@ class Client(object):  # pylint: disable=too-many-instance-attributes
                 'Successful revocation must return HTTP OK status')
 
 
+class ChainCacheEntry(object):
+    """Certificate of a chain, as cached by `ChainCache`.
+
+    :ivar bytes der: DER encoded certificate
+    :ivar str up: URI of the certificate's issuer, or ``None``
+    :ivar str etag: ``ETag`` of the certificate, or ``None``
+    :ivar str last_modified: ``Last-Modified`` date of the certificate,
+        or ``None``
+    :ivar float expires: Time until which the certificate can be used
+        without checking with the server
+
+    """
+    def __init__(self, der, up=None, etag=None, last_modified=None,
+                 expires=0):
+        # pylint: disable=too-many-arguments
+        self.der = der
+        self.up = up
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+        self.cert = jose.ComparableX509(OpenSSL.crypto.load_certificate(
+            OpenSSL.crypto.FILETYPE_ASN1, der))
+
+    @classmethod
+    def from_response(cls, response):
+        """Create an entry from the response to a certificate request.
+
+        :raises OpenSSL.crypto.Error: if the response isn't a certificate
+
+        """
+        return cls(response.content, response.links.get('up', {}).get('url'),
+                   response.headers.get('ETag'),
+                   response.headers.get('Last-Modified'),
+                   _cache_expiry(response.headers))
+
+    def revalidated(self, response):
+        """Update the entry from a ``304 Not Modified`` response."""
+        return type(self)(self.der, self.up,
+                          response.headers.get('ETag', self.etag),
+                          response.headers.get('Last-Modified',
+                                               self.last_modified),
+                          _cache_expiry(response.headers))
+
+    def fresh(self):
+        """Can the entry be used without checking with the server?"""
+        return time.time() < self.expires
+
+    def validators(self):
+        """Headers of a request checking whether the entry is current."""
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified is not None:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def to_json(self):
+        """Serialize the entry, with a digest of the certificate."""
+        return {'der': base64.b64encode(self.der).decode('ascii'),
+                'sha256': hashlib.sha256(self.der).hexdigest(),
+                'up': self.up, 'etag': self.etag,
+                'last_modified': self.last_modified, 'expires': self.expires}
+
+    @classmethod
+    def from_json(cls, jobj):
+        """Deserialize an entry, checking the certificate's digest.
+
+        :raises ValueError: if the entry is corrupted
+
+        """
+        try:
+            der = base64.b64decode(jobj['der'].encode('ascii'))
+            if hashlib.sha256(der).hexdigest() != jobj['sha256']:
+                raise ValueError('Certificate digest mismatch')
+            return cls(der, jobj['up'], jobj['etag'], jobj['last_modified'],
+                       float(jobj['expires']))
+        except (KeyError, TypeError, AttributeError,
+                OpenSSL.crypto.Error) as error:
+            raise ValueError(error)
+
+
+def _cache_expiry(headers):
+    """Compute until when a response can be cached.
+
+    Follows the ``max-age``, ``no-cache`` and ``no-store`` directives of
+    ``Cache-Control``, and then ``Expires``. Without either header the
+    response must be checked with the server before every use.
+
+    :returns: Time point, in seconds since the epoch
+    :rtype: float
+
+    """
+    now = time.time()
+    directives = {}
+    for directive in headers.get('Cache-Control', '').split(','):
+        name, _, value = directive.strip().partition('=')
+        directives[name.lower()] = value.strip('"')
+    if 'no-cache' in directives or 'no-store' in directives:
+        return now
+    if 'max-age' in directives:
+        try:
+            age = int(headers.get('Age', 0))
+        except ValueError:
+            age = 0
+        try:
+            return now + int(directives['max-age']) - age
+        except ValueError:
+            return now
+    when = parsedate_tz(headers.get('Expires', ''))
+    if when is not None:
+        try:
+            return float(mktime_tz(when))
+        except (ValueError, OverflowError):
+            pass
+    return now
+
+
+def _decode_json_once(response):
+    """Decode the JSON body of a response, if any.
+
+    The decoded object is memoized on the response, so that callers'
+    ``response.json()`` doesn't parse the body again.
+
+    :returns: The decoded JSON object, or ``None`` if the body isn't
+        JSON or is a successfully fetched certificate.
+
+    """
+    if response.ok and response.headers.get('Content-Type') == DER_CONTENT_TYPE:
+        # Not worth guessing the encoding of a certificate
+        return None
+    try:
+        jobj = response.json()
+    except ValueError:
+        return None
+    response.json = lambda *args, **kwargs: jobj
+    return jobj
+
+
+class ChainCache(object):
+    """Cache of the certificates fetched by `Client.fetch_chain`, by URI.
+
+    Certificates are used without contacting the server for as long as
+    the ``Cache-Control`` or ``Expires`` headers of their response allow,
+    and are then checked with a conditional request, using their
+    ``ETag`` or ``Last-Modified`` header, so they are only downloaded
+    again when they change.
+
+    :ivar str directory: Directory the entries are also stored in, so
+        that they outlive the cache, or ``None``
+
+    """
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._entries = {}
+
+    def get(self, uri):
+        """Get the cached certificate of uri.
+
+        :param str uri: URI of the certificate
+
+        :returns: the entry, or ``None`` if none is cached
+        :rtype: `ChainCacheEntry`
+
+        """
+        entry = self._entries.get(uri)
+        if entry is None and self.directory is not None:
+            entry = self._load(uri)
+            if entry is not None:
+                self._entries[uri] = entry
+        return entry
+
+    def set(self, uri, entry):
+        """Cache the certificate of uri.
+
+        :param str uri: URI of the certificate
+        :param ChainCacheEntry entry: the certificate
+
+        """
+        self._entries[uri] = entry
+        if self.directory is not None:
+            self._store(uri, entry)
+
+    def _path(self, uri):
+        return os.path.join(self.directory, hashlib.sha256(
+            uri.encode('utf-8')).hexdigest() + '.json')
+
+    def _load(self, uri):
+        try:
+            with open(self._path(uri)) as entry_file:
+                jobj = json.load(entry_file)
+            if jobj.get('uri') != uri:
+                return None
+            return ChainCacheEntry.from_json(jobj)
+        except (IOError, OSError, ValueError, AttributeError) as error:
+            if getattr(error, 'errno', None) != errno.ENOENT:
+                logger.debug('Ignoring cached certificate for %s: %s',
+                             uri, error)
+            return None
+
+    def _store(self, uri, entry):
+        """Atomically replace the file of uri's entry."""
+        jobj = entry.to_json()
+        jobj['uri'] = uri
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd, temp_path = tempfile.mkstemp(
+                prefix='.chain-', dir=self.directory)
+        except (IOError, OSError) as error:
+            logger.debug('Unable to cache certificate for %s: %s', uri, error)
+            return
+        try:
+            with os.fdopen(fd, 'w') as entry_file:
+                json.dump(jobj, entry_file)
+            os.rename(temp_path, self._path(uri))
+        except Exception as error:  # pylint: disable=broad-except
+            # A failure to cache must never abort issuance
+            logger.debug('Unable to cache certificate for %s: %s', uri, error)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
 class ClientNetwork(object):  # pylint: disable=too-many-instance-attributes
     """Client network."""
     JSON_CONTENT_TYPE = 'application/json'
@@ -537,11 +803,11 @@ class ClientNetwork(object):  # pylint: disable=too-many-instance-attributes
         :rtype: `.JWS`
 
         """
-        jobj = obj.json_dumps(indent=2).encode()
-        logger.debug('JWS payload:\n%s', jobj)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('JWS payload:\n%s', obj.json_dumps(indent=2))
         return jws.JWS.sign(
-            payload=jobj, key=self.key, alg=self.alg,
-            nonce=nonce).json_dumps(indent=2)
+            payload=obj.json_dumps().encode(), key=self.key, alg=self.alg,
+            nonce=nonce).json_dumps()
 
     @classmethod
     def _check_response(cls, response, content_type=None):
@@ -563,12 +829,7 @@ class ClientNetwork(object):  # pylint: disable=too-many-instance-attributes
 
         """
         response_ct = response.headers.get('Content-Type')
-        try:
-            # TODO: response.json() is called twice, once here, and
-            # once in _get and _post clients
-            jobj = response.json()
-        except ValueError:
-            jobj = None
+        jobj = _decode_json_once(response)
 
         if response.status_code == 409:
             raise errors.ConflictError(response.headers.get('Location'))
@@ -652,17 +913,18 @@ class ClientNetwork(object):  # pylint: disable=too-many-instance-attributes
                 host, path, _err_no, err_msg = m.groups()
                 raise ValueError("Requesting {0}{1}:{2}".format(host, path, err_msg))
 
-        # If content is DER, log the base64 of it instead of raw bytes, to keep
-        # binary data out of the logs.
-        if response.headers.get("Content-Type") == DER_CONTENT_TYPE:
-            debug_content = base64.b64encode(response.content)
-        else:
-            debug_content = response.content
-        logger.debug('Received response:\nHTTP %d\n%s\n\n%s',
-                     response.status_code,
-                     "\n".join(["{0}: {1}".format(k, v)
-                                for k, v in response.headers.items()]),
-                     debug_content)
+        if logger.isEnabledFor(logging.DEBUG):
+            # If content is DER, log the base64 of it instead of raw bytes,
+            # to keep binary data out of the logs.
+            if response.headers.get("Content-Type") == DER_CONTENT_TYPE:
+                debug_content = base64.b64encode(response.content)
+            else:
+                debug_content = response.content
+            logger.debug('Received response:\nHTTP %d\n%s\n\n%s',
+                         response.status_code,
+                         "\n".join(["{0}: {1}".format(k, v)
+                                    for k, v in response.headers.items()]),
+                         debug_content)
         return response
 
     def head(self, *args, **kwargs):
@@ -693,10 +955,13 @@ class ClientNetwork(object):  # pylint: disable=too-many-instance-attributes
             raise errors.MissingNonce(response)
 
     def _get_nonce(self, url):
-        if not self._nonces:
-            logger.debug('Requesting fresh nonce')
-            self._add_nonce(self.head(url))
-        return self._nonces.pop()
+        # Other threads may take the nonces, see acme.parallel
+        while True:
+            try:
+                return self._nonces.pop()
+            except KeyError:
+                logger.debug('Requesting fresh nonce')
+                self._add_nonce(self.head(url))
 
     def post(self, *args, **kwargs):
         """POST object wrapped in `.JWS` and check response.
@@ -1,6 +1,9 @@
 """Tests for acme.client."""
 import datetime
 import json
+import os
+import shutil
+import tempfile
 import unittest
 
 from six.moves import http_client  # pylint: disable=import-error
@@ -414,6 +417,45 @@ class ClientTest(unittest.TestCase):
         self.client._get_cert.return_value = (response, "certificate")
         self.assertRaises(errors.Error, self.client.fetch_chain, self.certr)
 
+    def _chain_response(self, status_code=http_client.OK, headers=None,
+                        up=None):
+        return mock.MagicMock(
+            status_code=status_code, content=CERT_DER,
+            headers=headers if headers is not None else {},
+            links={'up': {'url': up}} if up else {})
+
+    def test_fetch_chain_cached(self):
+        from acme.client import ChainCache
+        self.client.chain_cache = ChainCache()
+        self.net.get.side_effect = [
+            self._chain_response(headers={'Cache-Control': 'max-age=60'},
+                                 up='http://root'),
+            self._chain_response(headers={'ETag': '"root"'})]
+        chain = self.client.fetch_chain(self.certr)
+        self.assertEqual(len(chain), 2)
+
+        self.net.get.side_effect = [
+            self._chain_response(http_client.NOT_MODIFIED)]
+        self.assertEqual(self.client.fetch_chain(self.certr), chain)
+        self.assertEqual(self.net.get.call_count, 3)
+        self.assertEqual(self.net.get.call_args[0][0], 'http://root')
+        self.assertEqual(
+            self.net.get.call_args[1]['headers']['If-None-Match'], '"root"')
+
+    def test_fetch_chain_cached_changed(self):
+        from acme.client import ChainCache
+        self.client.chain_cache = ChainCache()
+        self.net.get.side_effect = [
+            self._chain_response(headers={'Last-Modified': 'yesterday'}),
+            self._chain_response(up='http://root'),
+            self._chain_response(headers={'Cache-Control': 'no-store'})]
+        self.assertEqual(len(self.client.fetch_chain(self.certr)), 1)
+        self.assertEqual(len(self.client.fetch_chain(self.certr)), 2)
+        self.assertEqual(
+            self.net.get.call_args_list[1][1]['headers']['If-Modified-Since'],
+            'yesterday')
+        self.assertEqual(self.client.chain_cache.get('http://root'), None)
+
     def test_revoke(self):
         self.client.revoke(self.certr.body, self.rsn)
         self.net.post.assert_called_once_with(
@@ -433,6 +475,87 @@ class ClientTest(unittest.TestCase):
             self.rsn)
 
 
+class ChainCacheTest(unittest.TestCase):
+    """Tests for acme.client.ChainCache."""
+
+    def setUp(self):
+        from acme.client import ChainCache
+        from acme.client import ChainCacheEntry
+        self.tempdir = tempfile.mkdtemp()
+        self.directory = os.path.join(self.tempdir, 'chains')
+        self.cache = ChainCache(self.directory)
+        self.entry = ChainCacheEntry(CERT_DER, 'http://root', '"etag"',
+                                     expires=1.5)
+        self.uri = 'http://intermediate'
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_persisted(self):
+        from acme.client import ChainCache
+        self.cache.set(self.uri, self.entry)
+        entry = ChainCache(self.directory).get(self.uri)
+        self.assertEqual(entry.cert, self.entry.cert)
+        self.assertEqual(entry.up, 'http://root')
+        self.assertEqual(entry.validators(), {'If-None-Match': '"etag"'})
+        self.assertEqual(entry.expires, 1.5)
+        self.assertFalse(entry.fresh())
+        self.assertEqual(ChainCache(self.directory).get('http://other'), None)
+
+    def test_corrupted(self):
+        from acme.client import ChainCache
+        self.cache.set(self.uri, self.entry)
+        path = os.path.join(self.directory, os.listdir(self.directory)[0])
+        with open(path) as entry_file:
+            jobj = json.load(entry_file)
+        jobj['sha256'] = 'bad'
+        with open(path, 'w') as entry_file:
+            json.dump(jobj, entry_file)
+        self.assertEqual(ChainCache(self.directory).get(self.uri), None)
+        with open(path, 'w') as entry_file:
+            entry_file.write('[')
+        self.assertEqual(ChainCache(self.directory).get(self.uri), None)
+
+    def test_unwritable(self):
+        from acme.client import ChainCache
+        with open(self.directory, 'w'):
+            pass
+        self.cache.set(self.uri, self.entry)
+        self.assertEqual(self.cache.get(self.uri), self.entry)
+        self.assertEqual(ChainCache(self.directory).get(self.uri), None)
+
+    def test_rename_failure(self):
+        with mock.patch('acme.client.os.rename') as mock_rename:
+            mock_rename.side_effect = OSError
+            self.cache.set(self.uri, self.entry)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_write_and_remove_failure(self):
+        with mock.patch('acme.client.os.rename') as mock_rename:
+            mock_rename.side_effect = OSError
+            with mock.patch('acme.client.os.remove') as mock_remove:
+                mock_remove.side_effect = OSError
+                self.cache.set(self.uri, self.entry)
+        self.assertTrue(mock_remove.called)
+        self.assertEqual(self.cache.get(self.uri), self.entry)
+
+    @mock.patch('acme.client.time.time')
+    def test_expiry(self, mock_time):
+        from acme.client import _cache_expiry
+        mock_time.return_value = 1000
+        self.assertEqual(_cache_expiry({}), 1000)
+        self.assertEqual(_cache_expiry(
+            {'Cache-Control': 'public, max-age=60', 'Age': '10'}), 1050)
+        self.assertEqual(_cache_expiry(
+            {'Cache-Control': 'max-age=60', 'Age': 'x'}), 1060)
+        self.assertEqual(_cache_expiry({'Cache-Control': 'max-age=x'}), 1000)
+        self.assertEqual(_cache_expiry(
+            {'Cache-Control': 'no-cache, max-age=60'}), 1000)
+        self.assertEqual(_cache_expiry(
+            {'Expires': 'Thu, 01 Jan 1970 00:20:00 GMT'}), 1200)
+        self.assertEqual(_cache_expiry({'Expires': '0'}), 1000)
+
+
 class ClientNetworkTest(unittest.TestCase):
     """Tests for acme.client.ClientNetwork."""
 
@@ -637,6 +760,46 @@ class ClientNetworkTest(unittest.TestCase):
             self.assertEqual("('Connection aborted.', "
                              "error(111, 'Connection refused'))", str(z))
 
+class ClientNetworkResponseShortcutsTest(unittest.TestCase):
+    """Tests for the work acme.client.ClientNetwork skips on responses."""
+
+    def setUp(self):
+        from acme.client import ClientNetwork
+        self.net = ClientNetwork(key=KEY, alg=jose.RS256)
+
+        self.response = mock.MagicMock(ok=True, status_code=http_client.OK)
+        self.response.headers = {}
+        self.response.links = {}
+
+    def test_check_response_jobj_decoded_once(self):
+        decode = mock.MagicMock(return_value={'foo': 'bar'})
+        self.response.json = decode
+        # pylint: disable=protected-access
+        response = self.net._check_response(
+            self.response, content_type=self.net.JSON_CONTENT_TYPE)
+        self.assertEqual(response.json(), {'foo': 'bar'})
+        decode.assert_called_once_with()
+
+    def test_check_response_der(self):
+        self.response.headers['Content-Type'] = 'application/pkix-cert'
+        # pylint: disable=protected-access
+        self.assertEqual(self.response, self.net._check_response(
+            self.response, content_type='application/pkix-cert'))
+        self.assertFalse(self.response.json.called)
+
+    @mock.patch('acme.client.logger')
+    def test_send_request_no_debug(self, mock_logger):
+        mock_logger.isEnabledFor.return_value = False
+        self.net.session = mock.MagicMock()
+        self.net.session.request.return_value = mock.MagicMock(
+            ok=True, status_code=http_client.OK,
+            headers={"Content-Type": "application/pkix-cert"})
+        # pylint: disable=protected-access
+        self.net._send_request('GET', 'http://example.com/')
+        for call in mock_logger.debug.call_args_list:
+            self.assertFalse(call[0][0].startswith('Received response'))
+
+
 class ClientNetworkWithMockedResponseTest(unittest.TestCase):
     """Tests for acme.client.ClientNetwork which mock out response."""
     # pylint: disable=too-many-instance-attributes
@@ -748,6 +911,19 @@ class ClientNetworkWithMockedResponseTest(unittest.TestCase):
         self.assertEqual(self.checked_response, self.net.post(
             'uri', self.obj, content_type=self.content_type))
 
+    def test_get_nonce_taken_by_other_thread(self):
+        added = []
+        def _add_nonce(unused_response):
+            # The first nonce is taken by another thread before us
+            if added:
+                self.net._nonces.add(b'nonce')  # pylint: disable=protected-access
+            added.append(True)
+        self.net.head = mock.MagicMock()
+        self.net._add_nonce = _add_nonce  # pylint: disable=protected-access
+        # pylint: disable=protected-access
+        self.assertEqual(self.net._get_nonce('http://example.com/'), b'nonce')
+        self.assertEqual(self.net.head.call_count, 2)
+
     def test_head_get_post_error_passthrough(self):
         self.send_request.side_effect = requests.exceptions.RequestException
         for method in self.net.head, self.net.get:
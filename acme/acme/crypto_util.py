@@ -2,10 +2,13 @@
 import binascii
 import contextlib
 import logging
+import math
 import os
 import re
+import select
 import socket
 import sys
+import time
 
 import OpenSSL
 
@@ -115,7 +118,8 @@ def probe_sni(name, host, port=443, timeout=300,
         client hello message.
     :param bytes host: Host to connect to.
     :param int port: Port to connect to.
-    :param int timeout: Timeout in seconds.
+    :param float timeout: Timeout in seconds, for connecting and then
+        for the handshake.
     :param method: See `OpenSSL.SSL.Context` for allowed values.
     :param tuple source_address: Enables multi-path probing (selection
         of source interface). See `socket.creation_connection` for more
@@ -128,7 +132,7 @@ def probe_sni(name, host, port=443, timeout=300,
 
     """
     context = OpenSSL.SSL.Context(method)
-    context.set_timeout(timeout)
+    context.set_timeout(int(math.ceil(timeout)))
 
     socket_kwargs = {} if sys.version_info < (2, 7) else {
         'source_address': source_address}
@@ -140,7 +144,8 @@ def probe_sni(name, host, port=443, timeout=300,
         logger.debug("Attempting to connect to %s:%d%s.", host_protocol_agnostic, port,
             " from {0}:{1}".format(source_address[0], source_address[1]) if \
             socket_kwargs else "")
-        sock = socket.create_connection((host_protocol_agnostic, port), **socket_kwargs)
+        sock = socket.create_connection(
+            (host_protocol_agnostic, port), timeout, **socket_kwargs)
     except socket.error as error:
         raise errors.Error(error)
 
@@ -149,12 +154,33 @@ def probe_sni(name, host, port=443, timeout=300,
         client_ssl.set_connect_state()
         client_ssl.set_tlsext_host_name(name)  # pyOpenSSL>=0.13
         try:
-            client_ssl.do_handshake()
+            _do_handshake(client_ssl, client, timeout)
             client_ssl.shutdown()
         except OpenSSL.SSL.Error as error:
             raise errors.Error(error)
     return client_ssl.get_peer_certificate()
 
+
+def _do_handshake(client_ssl, sock, timeout):
+    """Perform the handshake of client_ssl within timeout seconds.
+
+    sock has a timeout, which makes it non-blocking for OpenSSL, so the
+    handshake is resumed each time sock is ready until timeout passes.
+
+    :raises acme.errors.Error: If the handshake timed out.
+
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return client_ssl.do_handshake()
+        except OpenSSL.SSL.WantReadError:
+            ready = select.select([sock], [], [], max(deadline - time.time(), 0))[0]
+        except OpenSSL.SSL.WantWriteError:
+            ready = select.select([], [sock], [], max(deadline - time.time(), 0))[1]
+        if not ready:
+            raise errors.Error("Timed out during the TLS handshake")
+
 def make_csr(private_key_pem, domains, must_staple=False):
     """Generate a CSR containing a list of domains as subjectAltNames.
 
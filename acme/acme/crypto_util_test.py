@@ -65,6 +65,27 @@ class SSLSocketAndProbeSNITest(unittest.TestCase):
     #    self.assertRaises(errors.Error, self._probe, b'bar')
 
 
+class ProbeSNITimeoutTest(unittest.TestCase):
+    """Tests for the timeout of acme.crypto_util.probe_sni."""
+
+    def setUp(self):
+        # Connections are accepted by the kernel, but never answered
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        self.port = self.listener.getsockname()[1]
+
+    def tearDown(self):
+        self.listener.close()
+
+    def test_handshake_timeout(self):
+        from acme.crypto_util import probe_sni
+        start = time.time()
+        self.assertRaises(errors.Error, probe_sni, b'foo', host='127.0.0.1',
+                          port=self.port, timeout=0.5)
+        self.assertTrue(time.time() - start < 5)
+
+
 class PyOpenSSLCertOrReqSANTest(unittest.TestCase):
     """Test for acme.crypto_util._pyopenssl_cert_or_req_san."""
 
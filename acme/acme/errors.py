@@ -93,3 +93,8 @@ class ConflictError(ClientError):
         self.location = location
         super(ConflictError, self).__init__()
 
+
+
+class OperationTimeout(Error):
+    """An operation run by `acme.parallel.ParallelClient` didn't finish
+    in time."""
@@ -0,0 +1,229 @@
+"""Concurrent ACME client API.
+
+`ParallelClient` runs the operations of an `acme.client.Client` on a
+pool of worker threads, returning a `Future` for each of them, so many
+registrations, authorizations and issuances can be in flight at once.
+All operations share the client's `acme.client.ClientNetwork`, and thus
+its HTTP connections and its pool of nonces.
+
+"""
+import logging
+import sys
+import threading
+import time
+
+from requests import adapters
+import six
+from six.moves import queue  # pylint: disable=import-error
+
+from acme import errors
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 10
+"""Default number of concurrent operations."""
+
+
+class Future(object):
+    """Result of an operation run by `ParallelClient`."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        """Has the operation finished?
+
+        :rtype: bool
+
+        """
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        """Wait for the operation to finish, and return its result.
+
+        :param float timeout: seconds to wait, or ``None`` to wait for
+            as long as it takes
+
+        :raises .OperationTimeout: if the operation didn't finish in time
+        :raises Exception: whatever the operation raised
+
+        """
+        self._wait(timeout)
+        if self._exc_info is not None:
+            six.reraise(*self._exc_info)
+        return self._result
+
+    def exception(self, timeout=None):
+        """Wait for the operation to finish, and return its exception.
+
+        :param float timeout: seconds to wait, or ``None`` to wait for
+            as long as it takes
+
+        :returns: the exception raised by the operation, or ``None`` if
+            it succeeded
+
+        :raises .OperationTimeout: if the operation didn't finish in time
+
+        """
+        self._wait(timeout)
+        return self._exc_info[1] if self._exc_info is not None else None
+
+    def add_done_callback(self, callback):
+        """Call callback with this future once the operation is finished.
+
+        If the operation has already finished, callback is called
+        immediately, otherwise it is called from a worker thread.
+
+        """
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(callback)
+                return
+        self._call(callback)
+
+    def _call(self, callback):
+        try:
+            callback(self)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception("Error in callback of %r", self)
+
+    def _wait(self, timeout):
+        # Event.wait only reports whether it timed out since Python 2.7
+        self._done.wait(timeout)
+        if not self._done.is_set():
+            raise errors.OperationTimeout()
+
+    def _run(self, func, args, kwargs):
+        try:
+            self._result = func(*args, **kwargs)  # pylint: disable=star-args
+        except Exception:  # pylint: disable=broad-except
+            self._exc_info = sys.exc_info()
+        with self._lock:
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            self._call(callback)
+
+
+class ParallelClient(object):
+    """ACME client running its operations concurrently.
+
+    Each operation takes the same arguments as the `acme.client.Client`
+    method of the same name, and returns a `Future` for its result.
+
+    :ivar .Client client: client running the operations
+
+    """
+    def __init__(self, client, max_workers=DEFAULT_MAX_WORKERS):
+        self.client = client
+        self._work = queue.Queue()
+        self._shutdown = False
+        # Keep a connection open for each worker
+        adapter = adapters.HTTPAdapter(pool_maxsize=max_workers)
+        for prefix in ('https://', 'http://'):
+            client.net.session.mount(prefix, adapter)
+        self._threads = []
+        for _ in range(max_workers):
+            thread = threading.Thread(target=self._worker)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def _worker(self):
+        while True:
+            item = self._work.get()
+            if item is None:
+                return
+            future, func, args, kwargs = item
+            future._run(func, args, kwargs)  # pylint: disable=protected-access
+
+    def submit(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on a worker thread.
+
+        :rtype: Future
+
+        """
+        if self._shutdown:
+            raise RuntimeError("Cannot submit operations after shutdown")
+        future = Future()
+        self._work.put((future, func, args, kwargs))
+        return future
+
+    def shutdown(self, block=True):
+        """Stop the worker threads once the submitted operations are done.
+
+        :param bool block: wait for the operations to finish
+
+        """
+        if not self._shutdown:
+            self._shutdown = True
+            for _ in self._threads:
+                self._work.put(None)
+        if block:
+            for thread in self._threads:
+                thread.join()
+
+    def register(self, *args, **kwargs):
+        """Register, see `acme.client.Client.register`."""
+        return self.submit(self.client.register, *args, **kwargs)
+
+    def request_domain_challenges(self, *args, **kwargs):
+        """Request challenges, see
+        `acme.client.Client.request_domain_challenges`."""
+        return self.submit(
+            self.client.request_domain_challenges, *args, **kwargs)
+
+    def answer_challenge(self, *args, **kwargs):
+        """Answer a challenge, see `acme.client.Client.answer_challenge`."""
+        return self.submit(self.client.answer_challenge, *args, **kwargs)
+
+    def poll(self, *args, **kwargs):
+        """Poll an authorization, see `acme.client.Client.poll`."""
+        return self.submit(self.client.poll, *args, **kwargs)
+
+    def request_issuance(self, *args, **kwargs):
+        """Request issuance, see `acme.client.Client.request_issuance`."""
+        return self.submit(self.client.request_issuance, *args, **kwargs)
+
+    def fetch_chain(self, *args, **kwargs):
+        """Fetch a chain, see `acme.client.Client.fetch_chain`."""
+        return self.submit(self.client.fetch_chain, *args, **kwargs)
+
+    def revoke(self, *args, **kwargs):
+        """Revoke a certificate, see `acme.client.Client.revoke`."""
+        return self.submit(self.client.revoke, *args, **kwargs)
+
+
+def wait(futures, timeout=None):
+    """Wait for all operations to finish.
+
+    :param futures: futures of the operations
+    :type futures: `list` of `Future`
+    :param float timeout: seconds to wait in total, or ``None`` to wait
+        for as long as it takes
+
+    :returns: results of the operations, in the same order
+    :rtype: list
+
+    :raises .OperationTimeout: if the operations didn't finish in time
+    :raises Exception: the exception raised by the first operation,
+        in order, that failed
+
+    """
+    deadline = None if timeout is None else time.time() + timeout
+    results = []
+    for future in futures:
+        remaining = None if deadline is None else max(deadline - time.time(), 0)
+        results.append(future.result(remaining))
+    return results
@@ -0,0 +1,80 @@
+"""Tests for acme.parallel."""
+import threading
+import unittest
+
+import mock
+
+from acme import errors
+
+
+class ParallelClientTest(unittest.TestCase):
+    """Tests for acme.parallel.ParallelClient."""
+
+    def setUp(self):
+        from acme.parallel import ParallelClient
+        self.client = mock.MagicMock()
+        self.parallel = ParallelClient(self.client, max_workers=2)
+
+    def tearDown(self):
+        self.parallel.shutdown()
+
+    def test_operations(self):
+        for name in ('register', 'request_domain_challenges',
+                     'answer_challenge', 'poll', 'request_issuance',
+                     'fetch_chain', 'revoke'):
+            future = getattr(self.parallel, name)('foo', bar='baz')
+            self.assertEqual(future.result(5),
+                             getattr(self.client, name).return_value)
+            getattr(self.client, name).assert_called_once_with('foo', bar='baz')
+        self.assertEqual(self.client.net.session.mount.call_count, 2)
+
+    def test_exception(self):
+        self.client.poll.side_effect = errors.ClientError
+        future = self.parallel.poll(mock.sentinel.authzr)
+        self.assertTrue(isinstance(future.exception(5), errors.ClientError))
+        self.assertRaises(errors.ClientError, future.result)
+        self.assertTrue(future.done())
+        self.assertEqual(self.parallel.register().exception(5), None)
+
+    def test_concurrent(self):
+        barrier = threading.Event()
+        self.client.poll.side_effect = lambda authzr: barrier.wait(5)
+        futures = [self.parallel.poll(i) for i in range(2)]
+        self.assertFalse(futures[0].done())
+        self.assertRaises(errors.OperationTimeout, futures[0].result, 0.01)
+        barrier.set()
+        from acme.parallel import wait
+        wait(futures, 5)
+        self.assertEqual(self.client.poll.call_count, 2)
+
+    def test_wait_timeout(self):
+        from acme.parallel import wait
+        barrier = threading.Event()
+        self.client.poll.side_effect = lambda authzr: barrier.wait(5)
+        futures = [self.parallel.poll(i) for i in range(2)]
+        self.assertRaises(errors.OperationTimeout, wait, futures, 0.01)
+        barrier.set()
+        self.assertEqual(len(wait(futures)), 2)
+
+    def test_callbacks(self):
+        barrier = threading.Event()
+        self.client.poll.side_effect = lambda authzr: barrier.wait(5)
+        future = self.parallel.poll(mock.sentinel.authzr)
+        callback = mock.MagicMock(side_effect=ValueError)
+        future.add_done_callback(callback)
+        barrier.set()
+        future.result(5)
+        self.parallel.shutdown()
+        callback.assert_called_once_with(future)
+        future.add_done_callback(callback)
+        self.assertEqual(callback.call_count, 2)
+
+    def test_shutdown(self):
+        with self.parallel as parallel:
+            future = parallel.register()
+        self.assertTrue(future.done())
+        self.assertRaises(RuntimeError, self.parallel.register)
+
+
+if __name__ == '__main__':
+    unittest.main()  # pragma: no cover
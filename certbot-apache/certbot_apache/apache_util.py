@@ -1,7 +1,9 @@
 """ Utility functions for certbot-apache plugin """
 import os
+import re
 
 from certbot import util
+from certbot.plugins import util as plugins_util
 
 def get_mod_deps(mod_name):
     """Get known module dependencies.
@@ -98,3 +100,64 @@ def parse_define_file(filepath, varname):
             var_parts = v[2:].partition("=")
             return_vars[var_parts[0]] = var_parts[2]
     return return_vars
+
+
+def get_files_fingerprint(filepaths):
+    """Get a fingerprint of the on-disk state of files.
+
+    The state of the directories containing the files is included as well,
+    so that files added to or removed from included directories are noticed.
+
+    :param list filepaths: Paths of the files to fingerprint
+
+    :returns: Sorted (path, (inode, size, mtime)) pairs, state is None for
+        paths that cannot be accessed
+    :rtype: tuple
+
+    """
+    paths = set(filepaths)
+    paths.update([os.path.dirname(path) for path in filepaths])
+    fingerprint = []
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+            state = (stat.st_ino, stat.st_size, stat.st_mtime)
+        except OSError:
+            state = None
+        fingerprint.append((path, state))
+    return tuple(fingerprint)
+
+
+def get_ctl_files(ctl, server_root):
+    """Get the files an apachectl script runs httpd with.
+
+    apachectl and its distribution variants are shell scripts that load
+    environment variables from a file, such as ``envvars`` in the server
+    root on Debian or ``/etc/sysconfig/httpd`` on CentOS, and then run the
+    real httpd binary. The output of commands run through them depends on
+    these files as much as on the script itself.
+
+    :param str ctl: Name or path of apachectl, or of httpd itself
+    :param str server_root: Apache server root directory
+
+    :returns: Paths of the existing files, sorted
+    :rtype: list
+
+    """
+    files = set()
+    envvars = os.path.join(server_root, "envvars")
+    if os.path.isfile(envvars):
+        files.add(envvars)
+    ctl_path = plugins_util.find_executable(ctl)
+    try:
+        with open(ctl_path, "rb") as ctl_file:
+            if ctl_file.read(2) != b"#!":
+                # Not a script, so httpd itself
+                return sorted(files)
+            script = ctl_file.read().decode("utf-8", "replace")
+    except (IOError, OSError, TypeError):
+        return sorted(files)
+    # httpd and the files sourced by the script are named by absolute paths
+    files.update(path for path in re.findall(r"/[\w.+/-]+", script)
+                 if path != ctl_path and os.path.isfile(path))
+    return sorted(files)
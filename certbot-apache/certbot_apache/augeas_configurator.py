@@ -50,6 +50,10 @@ class AugeasConfigurator(common.Installer):
         # vhosts
         self.recovery_routine()
 
+    def _reload_augeas(self):
+        """Reload the Augeas tree from the configuration files on disk."""
+        self.aug.load()
+
     def check_parsing_errors(self, lens):
         """Verify Augeas can parse all of the lens files.
 
@@ -154,7 +158,7 @@ class AugeasConfigurator(common.Installer):
         if save_files:
             for sf in save_files:
                 self.aug.remove("/files/"+sf)
-            self.aug.load()
+            self._reload_augeas()
         if title and not temporary:
             self.finalize_checkpoint(title)
 
@@ -183,7 +187,7 @@ class AugeasConfigurator(common.Installer):
         """
         super(AugeasConfigurator, self).recovery_routine()
         # Need to reload configuration after these changes take effect
-        self.aug.load()
+        self._reload_augeas()
 
     def revert_challenge_config(self):
         """Used to cleanup challenge configurations.
@@ -192,7 +196,7 @@ class AugeasConfigurator(common.Installer):
 
         """
         self.revert_temporary_config()
-        self.aug.load()
+        self._reload_augeas()
 
     def rollback_checkpoints(self, rollback=1):
         """Rollback saved checkpoints.
@@ -204,4 +208,4 @@ class AugeasConfigurator(common.Installer):
 
         """
         super(AugeasConfigurator, self).rollback_checkpoints(rollback)
-        self.aug.load()
+        self._reload_augeas()
@@ -6,7 +6,6 @@ import os
 import pkg_resources
 import re
 import socket
-import time
 
 import zope.component
 import zope.interface
@@ -18,6 +17,7 @@ from certbot import interfaces
 from certbot import util
 
 from certbot.plugins import common
+from certbot.plugins import util as plugins_util
 from certbot.plugins.util import path_surgery
 
 from certbot_apache import apache_util
@@ -30,6 +30,12 @@ from certbot_apache import parser
 
 from collections import defaultdict
 
+try:
+    from collections import OrderedDict
+except ImportError:  # pragma: no cover
+    # OrderedDict was added in Python 2.7
+    from ordereddict import OrderedDict  # pylint: disable=import-error
+
 logger = logging.getLogger(__name__)
 
 
@@ -232,13 +238,26 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         self.install_ssl_options_conf(self.mod_ssl_conf,
                                       self.updated_mod_ssl_conf_digest)
 
+        self.lock_config()
+
+    def lock_config(self):
+        """Prevent other Certbot processes from changing the configuration.
+
+        The server root is locked as well as the checkpoints, see
+        :meth:`certbot.plugins.common.Installer.lock_config`.
+
+        :raises .errors.PluginError: when the configuration stays in use
+
+        """
         # Prevent two Apache plugins from modifying a config at once
         try:
-            util.lock_dir_until_exit(self.conf("server-root"))
+            util.lock_dir_until_exit(self.conf("server-root"),
+                                     timeout=self._lock_timeout())
         except (OSError, errors.LockError):
             logger.debug("Encountered error:", exc_info=True)
             raise errors.PluginError(
                 "Unable to lock %s", self.conf("server-root"))
+        super(ApacheConfigurator, self).lock_config()
 
     def _check_aug_version(self):
         """ Checks that we have recent enough version of libaugeas.
@@ -261,6 +280,11 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
             self.aug, self.conf("server-root"), self.conf("vhost-root"),
             self.version, configurator=self)
 
+    def _reload_augeas(self):
+        super(ApacheConfigurator, self)._reload_augeas()
+        if self.parser:
+            self.parser.reset_dir_index()
+
     def deploy_cert(self, domain, cert_path, key_path,
                     chain_path=None, fullchain_path=None):
         """Deploys certificate to specified virtual host.
@@ -501,6 +525,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
 
         """
         all_names = set()
+        ips = set()
 
         vhost_macro = []
 
@@ -512,10 +537,11 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
             for addr in vhost.addrs:
                 if common.hostname_regex.match(addr.get_addr()):
                     all_names.add(addr.get_addr())
-                else:
-                    name = self.get_name_from_ip(addr)
-                    if name:
-                        all_names.add(name)
+                elif self._is_public_ipv4(addr):
+                    ips.add(addr.get_addr())
+
+        if ips and self.config.reverse_dns:
+            all_names.update(common.reverse_dns_lookups(ips).values())
 
         if len(vhost_macro) > 0:
             zope.component.getUtility(interfaces.IDisplay).notification(
@@ -525,7 +551,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
 
         return util.get_filtered_names(all_names)
 
-    def get_name_from_ip(self, addr):  # pylint: disable=no-self-use
+    def get_name_from_ip(self, addr):
         """Returns a reverse dns name if available.
 
         :param addr: IP Address
@@ -536,28 +562,41 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
 
         """
         # If it isn't a private IP, do a reverse DNS lookup
-        if not common.private_ips_regex.match(addr.get_addr()):
-            try:
-                socket.inet_aton(addr.get_addr())
-                return socket.gethostbyaddr(addr.get_addr())[0]
-            except (socket.error, socket.herror, socket.timeout):
-                pass
+        if self._is_public_ipv4(addr):
+            return common.reverse_dns_lookups(
+                [addr.get_addr()]).get(addr.get_addr(), "")
 
         return ""
 
-    def _get_vhost_names(self, path):
+    @staticmethod
+    def _is_public_ipv4(addr):
+        """Is addr a non-private IPv4 address worth a reverse DNS lookup?"""
+        if common.private_ips_regex.match(addr.get_addr()):
+            return False
+        try:
+            socket.inet_aton(addr.get_addr())
+        except socket.error:
+            return False
+        return True
+
+    def _get_vhost_names(self, path, directives=None):
         """Helper method for getting the ServerName and
         ServerAlias values from vhost in path
 
         :param path: Path to read ServerName and ServerAliases from
+        :param dict directives: Directive arguments of the vhost as returned
+            by `_get_vhost_directives`, None if they should be looked up
 
         :returns: Tuple including ServerName and `list` of ServerAlias strings
         """
-
-        servername_match = self.parser.find_dir(
-            "ServerName", None, start=path, exclude=False)
-        serveralias_match = self.parser.find_dir(
-            "ServerAlias", None, start=path, exclude=False)
+        if directives is None:
+            servername_match = self.parser.find_dir(
+                "ServerName", None, start=path, exclude=False)
+            serveralias_match = self.parser.find_dir(
+                "ServerAlias", None, start=path, exclude=False)
+        else:
+            servername_match = directives["servername"]
+            serveralias_match = directives["serveralias"]
 
         serveraliases = []
         for alias in serveralias_match:
@@ -571,15 +610,18 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
 
         return (servername, serveraliases)
 
-    def _add_servernames(self, host):
+    def _add_servernames(self, host, directives=None):
         """Helper function for get_virtual_hosts().
 
         :param host: In progress vhost whose names will be added
         :type host: :class:`~certbot_apache.obj.VirtualHost`
+        :param dict directives: Directive arguments of the vhost as returned
+            by `_get_vhost_directives`, None if they should be looked up
 
         """
 
-        servername, serveraliases = self._get_vhost_names(host.path)
+        servername, serveraliases = self._get_vhost_names(
+            host.path, directives)
 
         for alias in serveraliases:
             if not host.modmacro:
@@ -588,27 +630,32 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         if not host.modmacro:
             host.name = servername
 
-    def _create_vhost(self, path):
+    def _create_vhost(self, path, directives=None):
         """Used by get_virtual_hosts to create vhost objects
 
         :param str path: Augeas path to virtual host
+        :param dict directives: Directive arguments of the vhost as returned
+            by `_get_vhost_directives`, None if they should be looked up
 
         :returns: newly created vhost
         :rtype: :class:`~certbot_apache.obj.VirtualHost`
 
         """
         addrs = set()
-        try:
-            args = self.aug.match(path + "/arg")
-        except RuntimeError:
-            logger.warning("Encountered a problem while parsing file: %s, skipping", path)
-            return None
+        if directives is None:
+            try:
+                args = self.aug.match(path + "/arg")
+            except RuntimeError:
+                logger.warning("Encountered a problem while parsing file: %s, skipping", path)
+                return None
+            is_ssl = bool(self.parser.find_dir(
+                "SSLEngine", "on", start=path, exclude=False))
+        else:
+            args = directives["arg"]
+            is_ssl = any((self.aug.get(arg) or "").lower() == "on"
+                         for arg in directives["sslengine"])
         for arg in args:
             addrs.add(obj.Addr.fromstring(self.parser.get_arg(arg)))
-        is_ssl = False
-
-        if self.parser.find_dir("SSLEngine", "on", start=path, exclude=False):
-            is_ssl = True
 
         # "SSLEngine on" might be set outside of <VirtualHost>
         # Treat vhosts with port 443 as ssl vhosts
@@ -629,9 +676,61 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
 
         vhost = obj.VirtualHost(filename, path, addrs, is_ssl,
                                 vhost_enabled, modmacro=macro)
-        self._add_servernames(vhost)
+        self._add_servernames(vhost, directives)
         return vhost
 
+    def _get_vhost_directives(self, vhost_path):
+        """Gathers the VirtualHosts below a parser path in bulk.
+
+        Rather than querying Augeas for every VirtualHost, this finds all
+        VirtualHost nodes, their address arguments and the arguments of
+        their ServerName, ServerAlias and SSLEngine directives with a
+        fixed number of queries.
+
+        :param str vhost_path: parser path to search for VirtualHosts
+
+        :returns: `collections.OrderedDict` mapping Augeas paths of the
+            VirtualHosts to a `dict` of lowercase directive names (and
+            "arg" for the addresses) to argument paths, or to None if the
+            VirtualHost contains Includes and must be searched with
+            `.ApacheParser.find_dir`
+        :rtype: collections.OrderedDict
+
+        """
+        vhost_match = "/files%s//*[label()=~regexp('%s')]" % (
+            vhost_path, parser.case_i("VirtualHost"))
+        names = ("servername", "serveralias", "sslengine")
+        dir_match = "%s//*[self::directive=~regexp('%s')]" % (
+            vhost_match, "|".join("(%s)" % parser.case_i(name) for name in
+                                  names + ("include", "includeoptional")))
+
+        vhosts = OrderedDict()
+        for path in self.aug.match(vhost_match):
+            if "virtualhost" in os.path.basename(path).lower():
+                vhosts[path] = dict((name, []) for name in names + ("arg",))
+        for arg in self.aug.match(vhost_match + "/arg"):
+            parent = arg.rpartition("/")[0]
+            if parent in vhosts:
+                vhosts[parent]["arg"].append(arg)
+
+        dir_args = defaultdict(list)
+        for arg in self.aug.match(dir_match + "/arg"):
+            dir_args[arg.rpartition("/")[0]].append(arg)
+
+        for match in self.aug.match(dir_match):
+            # Find the VirtualHost the directive belongs to
+            vhost = match.rpartition("/")[0]
+            while vhost and vhost not in vhosts:
+                vhost = vhost.rpartition("/")[0]
+            if not vhosts.get(vhost):
+                continue
+            name = (self.aug.get(match) or "").lower()
+            if name in names:
+                vhosts[vhost][name].extend(dir_args[match])
+            else:
+                vhosts[vhost] = None
+        return vhosts
+
     def get_virtual_hosts(self):
         """Returns list of virtual hosts found in the Apache configuration.
 
@@ -643,47 +742,47 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         # Search base config, and all included paths for VirtualHosts
         file_paths = {}
         internal_paths = defaultdict(set)
-        vhs = []
+        # (realpath, internal path) -> vhost, in order of discovery
+        vhs = OrderedDict()
         # Make a list of parser paths because the parser_paths
         # dictionary may be modified during the loop.
         for vhost_path in list(self.parser.parser_paths):
-            paths = self.aug.match(
-                ("/files%s//*[label()=~regexp('%s')]" %
-                    (vhost_path, parser.case_i("VirtualHost"))))
-            paths = [path for path in paths if
-                     "virtualhost" in os.path.basename(path).lower()]
-            for path in paths:
-                new_vhost = self._create_vhost(path)
+            try:
+                vhost_directives = self._get_vhost_directives(vhost_path)
+            except RuntimeError:
+                # Fall back to looking up each vhost on its own, which
+                # skips just the vhosts Augeas has trouble with
+                paths = self.aug.match(
+                    ("/files%s//*[label()=~regexp('%s')]" %
+                     (vhost_path, parser.case_i("VirtualHost"))))
+                vhost_directives = OrderedDict(
+                    (path, None) for path in paths
+                    if "virtualhost" in os.path.basename(path).lower())
+            for path, directives in vhost_directives.items():
+                new_vhost = self._create_vhost(path, directives)
                 if not new_vhost:
                     continue
                 internal_path = apache_util.get_internal_aug_path(new_vhost.path)
                 realpath = os.path.realpath(new_vhost.filep)
                 if realpath not in file_paths:
                     file_paths[realpath] = new_vhost.filep
-                    internal_paths[realpath].add(internal_path)
-                    vhs.append(new_vhost)
                 elif (realpath == new_vhost.filep and
                       realpath != file_paths[realpath]):
                     # Prefer "real" vhost paths instead of symlinked ones
                     # ex: sites-enabled/vh.conf -> sites-available/vh.conf
 
                     # remove old (most likely) symlinked one
-                    new_vhs = []
-                    for v in vhs:
-                        if v.filep == file_paths[realpath]:
-                            internal_paths[realpath].remove(
-                                apache_util.get_internal_aug_path(v.path))
-                        else:
-                            new_vhs.append(v)
-                    vhs = new_vhs
-
+                    for old_path in list(internal_paths[realpath]):
+                        if (vhs[(realpath, old_path)].filep ==
+                                file_paths[realpath]):
+                            internal_paths[realpath].remove(old_path)
+                            del vhs[(realpath, old_path)]
                     file_paths[realpath] = realpath
-                    internal_paths[realpath].add(internal_path)
-                    vhs.append(new_vhost)
-                elif internal_path not in internal_paths[realpath]:
-                    internal_paths[realpath].add(internal_path)
-                    vhs.append(new_vhost)
-        return vhs
+                elif internal_path in internal_paths[realpath]:
+                    continue
+                internal_paths[realpath].add(internal_path)
+                vhs[(realpath, internal_path)] = new_vhost
+        return list(vhs.values())
 
     def is_name_vhost(self, target_addr):
         """Returns if vhost is a name based vhost
@@ -884,7 +983,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         self._copy_create_ssl_vhost_skeleton(nonssl_vhost, ssl_fp)
 
         # Reload augeas to take into account the new vhost
-        self.aug.load()
+        self._reload_augeas()
         # Get Vhost augeas path for new vhost
         new_matches = self.aug.match("/files%s//* [label()=~regexp('%s')]" %
                                      (self._escape(ssl_fp),
@@ -1187,6 +1286,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
                 directive_path = self.parser.find_dir(directive, None,
                                                       vh_path, False)
                 self.aug.remove(re.sub(r"/\w*$", "", directive_path[0]))
+                self.parser.reset_dir_index()
 
     def _remove_directives(self, vh_path, directives):
         for directive in directives:
@@ -1195,6 +1295,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
                 directive_path = self.parser.find_dir(directive, None,
                                                       vh_path, False)
                 self.aug.remove(re.sub(r"/\w*$", "", directive_path[0]))
+                self.parser.reset_dir_index()
 
     def _add_dummy_ssl_directives(self, vh_path):
         self.parser.add_dir(vh_path, "SSLCertificateFile",
@@ -1362,6 +1463,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         if stapling_cache_aug_path:
             self.aug.remove(
                     re.sub(r"/\w*$", "", stapling_cache_aug_path[0]))
+            self.parser.reset_dir_index()
 
         self.parser.add_dir_to_ifmodssl(ssl_vhost_aug_path,
                 "SSLStaplingCache",
@@ -1570,6 +1672,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
                 # Search for past redirection rule, delete it, set the new one
                 if arg_vals in constants.OLD_REWRITE_HTTPS_ARGS:
                     self.aug.remove(dir_path)
+                    self.parser.reset_dir_index()
                     self._set_https_redirection_rewrite_rule(vhost)
                     self.save()
                     raise errors.PluginEnhancementAlreadyPresent(
@@ -1625,7 +1728,7 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
 
         redirect_filepath = self._write_out_redirect(ssl_vhost, text)
 
-        self.aug.load()
+        self._reload_augeas()
         # Make a new vhost data structure and add it to the lists
         new_vhost = self._create_vhost(parser.get_aug_path(self._escape(redirect_filepath)))
         self.vhosts.append(new_vhost)
@@ -1803,16 +1906,29 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         except errors.SubprocessError as err:
             raise errors.MisconfigurationError(str(err))
 
-    def config_test(self):  # pylint: disable=no-self-use
+    def config_test(self):
         """Check the configuration of Apache for errors.
 
+        The check is skipped if none of the configuration files have changed
+        since the last successful check or runtime config dump.
+
         :raises .errors.MisconfigurationError: If config_test fails
 
         """
+        fingerprint = None
+        if self.parser is not None:
+            fingerprint = self.parser.config_fingerprint()
+            if (fingerprint is not None and
+                    fingerprint == self.parser.tested_fingerprint):
+                logger.debug("Apache configuration is unchanged since the "
+                             "last successful config test, skipping it")
+                return
         try:
             util.run_script(self.constant("conftest_cmd"))
         except errors.SubprocessError as err:
             raise errors.MisconfigurationError(str(err))
+        if self.parser is not None:
+            self.parser.tested_fingerprint = fingerprint
 
     def get_version(self):
         """Return version of Apache Server.
@@ -1825,8 +1941,13 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         :raises .PluginError: if unable to find Apache version
 
         """
+        version_cmd = self.constant("version_cmd")
         try:
-            stdout, _ = util.run_script(self.constant("version_cmd"))
+            stdout = plugins_util.cached_introspection(
+                self.config, version_cmd,
+                lambda: util.run_script(version_cmd)[0],
+                files=[self.conf("server-root")] + apache_util.get_ctl_files(
+                    version_cmd[0], self.conf("server-root")))
         except errors.SubprocessError:
             raise errors.PluginError(
                 "Unable to run %s -v" %
@@ -1881,10 +2002,8 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
             # Handled here because we may be able to load up other challenge
             # types
             self.restart()
-
-            # TODO: Remove this dirty hack. We need to determine a reliable way
-            # of identifying when the new configuration is being used.
-            time.sleep(3)
+            # Apache's graceful restart takes a moment to load the challenges
+            chall_doer.wait_until_served(sni_response, chall_doer.probe_hosts)
 
             # Go through all of the challenges and assign them to the proper
             # place in the responses return value. All responses must be in the
@@ -1901,7 +2020,8 @@ class ApacheConfigurator(augeas_configurator.AugeasConfigurator):
         # If all of the challenges have been finished, clean up everything
         if not self._chall_out:
             self.revert_challenge_config()
-            self.restart()
+            if not common.defer_challenge_reload(self):
+                self.restart()
             self.parser.reset_modules()
 
     def install_ssl_options_conf(self, options_ssl, options_ssl_digest):
@@ -1,15 +1,21 @@
 """ApacheParser is a member object of the ApacheConfigurator class."""
+import collections
 import copy
 import fnmatch
+import json
 import logging
 import os
 import re
 import subprocess
 import sys
+import time
 
 import six
 
 from certbot import errors
+from certbot.plugins import util as plugins_util
+
+from certbot_apache import apache_util
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +32,7 @@ class ApacheParser(object):
         default - user config file, name - NameVirtualHost,
 
     """
+    # pylint: disable=too-many-public-methods
     arg_var_interpreter = re.compile(r"\$\{[^ \}]*}")
     fnmatch_chars = set(["*", "?", "\\", "[", "]"])
 
@@ -41,6 +48,15 @@ class ApacheParser(object):
         self.modules = set()
         self.parser_paths = {}
         self.variables = {}
+        # Directive index for find_dir, keyed by Augeas start path
+        self._dir_index = {}
+        # Sections of the last httpd runtime config dump, the configuration
+        # files it listed and their state at the time of the dump
+        self._runtime_dump = None
+        self._runtime_files = []
+        self._runtime_fingerprint = None
+        # Configuration fingerprint of the last successful syntax check
+        self.tested_fingerprint = None
 
         self.aug = aug
         # Find configuration root and make sure augeas can parse it.
@@ -81,7 +97,7 @@ class ApacheParser(object):
         :param str inc_path: path of file to include
 
         """
-        if len(self.find_dir(case_i("Include"), inc_path)) == 0:
+        if len(self.find_dir("Include", inc_path)) == 0:
             logger.debug("Adding Include %s to %s",
                          inc_path, get_aug_path(main_config))
             self.add_dir(
@@ -150,13 +166,15 @@ class ApacheParser(object):
         """Get Defines from httpd process"""
 
         variables = dict()
-        define_cmd = [self.configurator.constant("apache_cmd"), "-t", "-D",
-                      "DUMP_RUN_CFG"]
-        matches = self.parse_from_subprocess(define_cmd, r"Define: ([^ \n]*)")
+        matches = re.compile(r"Define: ([^ \n]*)").findall(
+            self._get_runtime_dump()["run_cfg"])
         try:
             matches.remove("DUMP_RUN_CFG")
         except ValueError:
             return
+        for dump_define in ("DUMP_INCLUDES", "DUMP_MODULES"):
+            if dump_define in matches:
+                matches.remove(dump_define)
 
         for match in matches:
             if match.count("=") > 1:
@@ -168,6 +186,8 @@ class ApacheParser(object):
             variables[parts[0]] = parts[2]
 
         self.variables = variables
+        # Include paths may be expressed with variables
+        self.reset_dir_index()
 
     def update_includes(self):
         """Get includes from httpd process, and add them to DOM if needed"""
@@ -177,23 +197,140 @@ class ApacheParser(object):
         # configuration files
         _ = self.find_dir("Include")
 
-        inc_cmd = [self.configurator.constant("apache_cmd"), "-t", "-D",
-                   "DUMP_INCLUDES"]
-        matches = self.parse_from_subprocess(inc_cmd, r"\(.*\) (.*)")
-        if matches:
-            for i in matches:
-                if not self.parsed_in_current(i):
-                    self.parse_file(i)
+        self._get_runtime_dump()
+        # Load all missing files at once rather than reloading Augeas for
+        # every one of them
+        new_files = [i for i in self._runtime_files
+                     if not self.parsed_in_current(i)]
+        if new_files:
+            self.parse_files(new_files)
 
     def update_modules(self):
         """Get loaded modules from httpd process, and add them to DOM"""
 
-        mod_cmd = [self.configurator.constant("apache_cmd"), "-t", "-D",
-                       "DUMP_MODULES"]
-        matches = self.parse_from_subprocess(mod_cmd, r"(.*)_module")
+        matches = re.compile(r"(.*)_module").findall(
+            self._get_runtime_dump()["modules"])
         for mod in matches:
             self.add_mod(mod.strip())
 
+    def config_fingerprint(self, since=None, files=None):
+        """Get a fingerprint of the configuration files httpd has read.
+
+        The files are the ones listed by the last runtime config dump, along
+        with the directories Augeas parses includes from.
+
+        :param float since: Files modified after this time (defaults to now)
+            make the fingerprint unreliable
+        :param list files: Files listed by a runtime config dump (defaults
+            to those of the last one)
+
+        :returns: Fingerprint, or None if changes to the configuration
+            might go unnoticed
+        :rtype: tuple
+
+        """
+        if files is None:
+            files = self._runtime_files
+        if not files:
+            return None
+        if since is None:
+            since = time.time()
+        fingerprint = apache_util.get_files_fingerprint(
+            list(files) + sorted(self.parser_paths))
+        # Modification times have a coarse resolution on some filesystems,
+        # so a change made in the same second could go unnoticed later on
+        for _, state in fingerprint:
+            if state is not None and state[2] >= since - 1:
+                return None
+        return fingerprint
+
+    def _get_runtime_dump(self):
+        """Get the httpd runtime config dump, split into sections.
+
+        Defines, includes and modules are all dumped by a single httpd
+        invocation. The result is reused, by later runs as well, for as
+        long as none of the configuration files it lists have changed.
+
+        :returns: Dict with "run_cfg", "includes" and "modules" dump output
+        :rtype: dict
+
+        """
+        if self._runtime_dump is not None:
+            fingerprint = self.config_fingerprint()
+            if (fingerprint is not None and
+                    fingerprint == self._runtime_fingerprint):
+                return self._runtime_dump
+
+        dump_cmd = [self.configurator.constant("apache_cmd"), "-t",
+                    "-D", "DUMP_RUN_CFG", "-D", "DUMP_INCLUDES",
+                    "-D", "DUMP_MODULES"]
+        started = time.time()
+        result = plugins_util.cached_introspection(
+            self.configurator.config, dump_cmd,
+            lambda: self._dump_runtime_cfg(dump_cmd, started),
+            files=[self.loc["root"]] + apache_util.get_ctl_files(
+                dump_cmd[0], self.root),
+            validate=self._is_current_dump)
+
+        self._runtime_dump = result["dump"]
+        self._runtime_files = result["files"]
+        self._runtime_fingerprint = self.config_fingerprint(started)
+        # httpd only dumps its configuration after it passed the syntax check
+        self.tested_fingerprint = self._runtime_fingerprint
+        return self._runtime_dump
+
+    def _dump_runtime_cfg(self, command, started):
+        """Run the httpd runtime config dump.
+
+        :param list command: Dump command
+        :param float started: Time the dump was started at
+
+        :returns: Dict with the dump sections as "dump", the configuration
+            files it lists as "files" and their fingerprint as "fingerprint"
+        :rtype: dict
+
+        """
+        dump = self._split_runtime_dump(self._get_runtime_cfg(command))
+        files = re.compile(r"\(.*\) (.*)").findall(dump["includes"])
+        return {"dump": dump, "files": files,
+                "fingerprint": _json_compatible(
+                    self.config_fingerprint(started, files))}
+
+    def _is_current_dump(self, result):
+        """Are the files listed by a cached runtime config dump unchanged?"""
+        try:
+            files = result["files"]
+            fingerprint = result["fingerprint"]
+        except (KeyError, TypeError):
+            return False
+        return (fingerprint is not None and _json_compatible(
+            self.config_fingerprint(files=files)) == fingerprint)
+
+    def _split_runtime_dump(self, stdout):  # pylint: disable=no-self-use
+        """Split httpd runtime config dump output into its sections.
+
+        Included files and loaded modules are listed indented below their
+        headers, everything else belongs to the DUMP_RUN_CFG output.
+
+        :param str stdout: Output of the httpd config dump
+
+        :returns: Dict with "run_cfg", "includes" and "modules" dump output
+        :rtype: dict
+
+        """
+        headers = {"Included configuration files:": "includes",
+                   "Loaded Modules:": "modules"}
+        sections = {"run_cfg": [], "includes": [], "modules": []}
+        section = "run_cfg"
+        for line in stdout.splitlines():
+            if line.strip() in headers:
+                section = headers[line.strip()]
+            elif not line.startswith((" ", "\t")):
+                section = "run_cfg"
+            sections[section].append(line)
+        return dict((name, "\n".join(lines))
+                    for name, lines in sections.items())
+
     def parse_from_subprocess(self, command, regexp):
         """Get values from stdout of subprocess command
 
@@ -284,6 +421,7 @@ class ApacheParser(object):
         """
         # TODO: Add error checking code... does the path given even exist?
         #       Does it throw exceptions?
+        self.reset_dir_index()
         if_mod_path = self._get_ifmod(aug_conf_path, "mod_ssl.c")
         # IfModule can have only one valid argument, so append after
         self.aug.insert(if_mod_path + "arg", "directive", False)
@@ -324,6 +462,7 @@ class ApacheParser(object):
         :type args: list or str
 
         """
+        self.reset_dir_index()
         self.aug.set(aug_conf_path + "/directive[last() + 1]", directive)
         if isinstance(args, list):
             for i, value in enumerate(args, 1):
@@ -338,6 +477,9 @@ class ApacheParser(object):
         Recursively searches through config files to find directives
         Directives should be in the form of a case insensitive regex currently
 
+        Lookups are answered from a directive index that is built with a
+        single Augeas traversal per start path, see `reset_dir_index`.
+
         .. todo:: arg should probably be a list
         .. todo:: arg search currently only supports direct matching. It does
             not handle the case of variables or quoted arguments. This should
@@ -345,11 +487,8 @@ class ApacheParser(object):
             case-insensitive self.get_arg filter
 
         Note: Augeas is inherently case sensitive while Apache is case
-        insensitive.  Augeas 1.0 allows case insensitive regexes like
-        regexp(/Listen/, "i"), however the version currently supported
-        by Ubuntu 0.10 does not.  Thus I have included my own case insensitive
-        transformation by calling case_i() on everything to maintain
-        compatibility.
+        insensitive.  Directive names are therefore indexed in lowercase
+        and arguments are compared case insensitively.
 
         :param str directive: Directive to look for
         :param arg: Specific value directive must have, None if all should
@@ -365,49 +504,114 @@ class ApacheParser(object):
         if not start:
             start = get_aug_path(self.loc["root"])
 
-        # No regexp code
-        # if arg is None:
-        #     matches = self.aug.match(start +
-        # "//*[self::directive='" + directive + "']/arg")
-        # else:
-        #     matches = self.aug.match(start +
-        # "//*[self::directive='" + directive +
-        #   "']/* [self::arg='" + arg + "']")
+        directive = directive.lower()
+        index = self._get_dir_index(start)
 
-        # includes = self.aug.match(start +
-        # "//* [self::directive='Include']/* [label()='arg']")
-
-        regex = "(%s)|(%s)|(%s)" % (case_i(directive),
-                                    case_i("Include"),
-                                    case_i("IncludeOptional"))
-        matches = self.aug.match(
-            "%s//*[self::directive=~regexp('%s')]" % (start, regex))
+        # Includes sort before a matching directive at the same position so
+        # that searching for Include itself returns the included files first
+        candidates = sorted(
+            [(pos, True, match) for pos, match in index["includes"]] +
+            [(pos, False, match)
+             for pos, match in index["dirs"].get(directive, [])],
+            key=lambda cand: (cand[0], not cand[1]))
 
         if exclude:
-            matches = self._exclude_dirs(matches)
-
-        if arg is None:
-            arg_suffix = "/arg"
-        else:
-            arg_suffix = "/*[self::arg=~regexp('%s')]" % case_i(arg)
+            valid = set(self._exclude_dirs(
+                [match for _, _, match in candidates]))
+            candidates = [cand for cand in candidates if cand[2] in valid]
+
+        # Parse all files included at this level with a single Augeas load
+        unresolved = [match for _, is_include, match in candidates
+                      if is_include and match not in index["targets"]]
+        if unresolved:
+            self.parse_files([
+                self._get_include_file(self.get_arg(match + "/arg"))[1]
+                for match in unresolved])
 
         ordered_matches = []
 
         # TODO: Wildcards should be included in alphabetical order
         # https://httpd.apache.org/docs/2.4/mod/core.html#include
-        for match in matches:
-            dir_ = self.aug.get(match).lower()
-            if dir_ == "include" or dir_ == "includeoptional":
+        for _, is_include, match in candidates:
+            if is_include:
+                if match not in index["targets"]:
+                    index["targets"][match] = self._get_include_path(
+                        self.get_arg(match + "/arg"))
                 ordered_matches.extend(self.find_dir(
-                    directive, arg,
-                    self._get_include_path(self.get_arg(match + "/arg")),
-                    exclude))
-            # This additionally allows Include
-            if dir_ == directive.lower():
-                ordered_matches.extend(self.aug.match(match + arg_suffix))
+                    directive, arg, index["targets"][match], exclude))
+            else:
+                ordered_matches.extend(
+                    self._filter_args(index["args"].get(match, []), arg))
 
         return ordered_matches
 
+    def reset_dir_index(self):
+        """Forget the directive index used by `find_dir`.
+
+        The index holds Augeas paths, which shift whenever nodes are added
+        to or removed from the tree. This must be called after any such
+        change that isn't made through the parser itself, and after the
+        tree is reloaded from disk.
+
+        """
+        self._dir_index = {}
+
+    def _get_dir_index(self, start):
+        """Returns the directive index of the tree below start.
+
+        The index maps lowercase directive names to their positions and
+        Augeas paths in document order, lists the Include and
+        IncludeOptional directives and maps each directive path to the
+        paths of its arguments. Included files are indexed separately
+        when they are first searched.
+
+        :param str start: Augeas path of the tree to index
+
+        :returns: directive index
+        :rtype: dict
+
+        """
+        if start not in self._dir_index:
+            dirs = collections.defaultdict(list)
+            includes = []
+            matches = self.aug.match("%s//*[self::directive]" % start)
+            for pos, match in enumerate(matches):
+                name = (self.aug.get(match) or "").lower()
+                dirs[name].append((pos, match))
+                if name == "include" or name == "includeoptional":
+                    includes.append((pos, match))
+
+            args = collections.defaultdict(list)
+            for match in self.aug.match("%s//*[self::directive]/arg" % start):
+                args[match.rpartition("/")[0]].append(match)
+
+            self._dir_index[start] = {
+                "dirs": dirs, "includes": includes, "args": args,
+                "targets": {}}
+        return self._dir_index[start]
+
+    def _filter_args(self, matches, arg):
+        """Filters argument paths by a case insensitive argument value.
+
+        Values are compared literally rather than as regular expressions,
+        which all callers of `find_dir` pass: flags like "on", addresses
+        and file paths whose dots must not match any character.
+
+        :param list matches: Augeas paths of directive arguments
+        :param arg: Value the argument must have, None if all should be
+            returned
+        :type arg: str or None
+
+        :returns: matching argument paths
+        :rtype: list
+
+        """
+        if arg is None:
+            return list(matches)
+        arg = arg.lower()
+        return [match for match in matches
+                if (self.aug.get(match) or "").lower() == arg]
+
     def get_arg(self, match):
         """Uses augeas.get to get argument value and interprets result.
 
@@ -480,6 +684,30 @@ class ApacheParser(object):
 
         return True
 
+    def _get_include_file(self, arg):
+        """Normalizes the argument of an Apache Include directive.
+
+        :param str arg: Argument of Include directive
+
+        :returns: tuple of the absolute include path and the file path or
+            glob that has to be parsed for it
+        :rtype: tuple
+
+        """
+        # Remove beginning and ending quotes
+        arg = arg.strip("'\"")
+
+        # Standardize the include argument based on server root
+        if not arg.startswith("/"):
+            # Normpath will condense ../
+            arg = os.path.normpath(os.path.join(self.root, arg))
+        else:
+            arg = os.path.normpath(arg)
+
+        if os.path.isdir(arg):
+            return arg, os.path.join(arg, "*")
+        return arg, arg
+
     def _get_include_path(self, arg):
         """Converts an Apache Include directive into Augeas path.
 
@@ -501,21 +729,10 @@ class ApacheParser(object):
         #     logger.error("Error: Invalid regexp characters in %s", arg)
         #     return []
 
-        # Remove beginning and ending quotes
-        arg = arg.strip("'\"")
-
-        # Standardize the include argument based on server root
-        if not arg.startswith("/"):
-            # Normpath will condense ../
-            arg = os.path.normpath(os.path.join(self.root, arg))
-        else:
-            arg = os.path.normpath(arg)
+        arg, include_file = self._get_include_file(arg)
 
         # Attempts to add a transform to the file if one does not already exist
-        if os.path.isdir(arg):
-            self.parse_file(os.path.join(arg, "*"))
-        else:
-            self.parse_file(arg)
+        self.parse_file(include_file)
 
         # Argument represents an fnmatch regular expression, convert it
         # Split up the path and convert each into an Augeas accepted regex
@@ -564,24 +781,42 @@ class ApacheParser(object):
         :param str filepath: Apache config file path
 
         """
-        use_new, remove_old = self._check_path_actions(filepath)
-        # Ensure that we have the latest Augeas DOM state on disk before
-        # calling aug.load() which reloads the state from disk
-        if self.configurator:
-            self.configurator.ensure_augeas_state()
-        # Test if augeas included file for Httpd.lens
-        # Note: This works for augeas globs, ie. *.conf
-        if use_new:
-            inc_test = self.aug.match(
-                "/augeas/load/Httpd['%s' =~ glob(incl)]" % filepath)
-            if not inc_test:
-                # Load up files
-                # This doesn't seem to work on TravisCI
-                # self.aug.add_transform("Httpd.lns", [filepath])
-                if remove_old:
-                    self._remove_httpd_transform(filepath)
-                self._add_httpd_transform(filepath)
-                self.aug.load()
+        self.parse_files([filepath])
+
+    def parse_files(self, filepaths):
+        """Parse files with Augeas
+
+        Adds a transform for every file path that isn't parsed by Augeas
+        yet and then reloads Augeas once for all of them. Augeas only
+        reads files that are new or have changed on disk when reloading.
+
+        :param list filepaths: Apache config file paths
+
+        """
+        new_transforms = False
+        for filepath in filepaths:
+            use_new, remove_old = self._check_path_actions(filepath)
+            # Test if augeas included file for Httpd.lens
+            # Note: This works for augeas globs, ie. *.conf
+            if use_new:
+                inc_test = self.aug.match(
+                    "/augeas/load/Httpd['%s' =~ glob(incl)]" % filepath)
+                if not inc_test:
+                    # Load up files
+                    # This doesn't seem to work on TravisCI
+                    # self.aug.add_transform("Httpd.lns", [filepath])
+                    if remove_old:
+                        self._remove_httpd_transform(filepath)
+                    self._add_httpd_transform(filepath)
+                    new_transforms = True
+
+        if new_transforms:
+            # Ensure that we have the latest Augeas DOM state on disk before
+            # calling aug.load() which reloads the state from disk
+            if self.configurator:
+                self.configurator.ensure_augeas_state()
+            self.aug.load()
+            self.reset_dir_index()
 
     def parsed_in_current(self, filep):
         """Checks if the file path is parsed by current Augeas parser config
@@ -718,6 +953,7 @@ class ApacheParser(object):
             self.aug.set("/augeas/load/Httpd/excl[%d]" % i, excluded)
 
         self.aug.load()
+        self.reset_dir_index()
 
     def _set_locations(self):
         """Set default location for directives.
@@ -770,3 +1006,8 @@ def get_aug_path(file_path):
 
     """
     return "/files%s" % file_path
+
+
+def _json_compatible(value):
+    """Convert value to the form it's read back in from JSON."""
+    return json.loads(json.dumps(value))
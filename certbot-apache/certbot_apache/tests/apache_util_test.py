@@ -0,0 +1,51 @@
+"""Tests for certbot_apache.apache_util."""
+import os
+import unittest
+
+from certbot.tests import util as test_util
+
+
+class GetCtlFilesTest(test_util.TempDirTestCase):
+    """Tests for certbot_apache.apache_util.get_ctl_files."""
+
+    def setUp(self):
+        super(GetCtlFilesTest, self).setUp()
+        self.server_root = os.path.join(self.tempdir, "apache2")
+        os.mkdir(self.server_root)
+        self.envvars = os.path.join(self.server_root, "envvars")
+        open(self.envvars, "w").close()
+
+        self.httpd = os.path.join(self.tempdir, "httpd")
+        with open(self.httpd, "wb") as httpd_file:
+            httpd_file.write(b"\x7fELF")
+        os.chmod(self.httpd, 0o755)
+
+    @classmethod
+    def _call(cls, ctl, server_root):
+        from certbot_apache.apache_util import get_ctl_files
+        return get_ctl_files(ctl, server_root)
+
+    def test_script(self):
+        sysconfig = os.path.join(self.tempdir, "sysconfig")
+        open(sysconfig, "w").close()
+        ctl = os.path.join(self.tempdir, "apachectl")
+        with open(ctl, "w") as ctl_file:
+            ctl_file.write("#!/bin/sh\nHTTPD='{0}'\n. {1}\n. {2}/missing\n"
+                           "$HTTPD \"$@\"\n".format(
+                               self.httpd, sysconfig, self.tempdir))
+        os.chmod(ctl, 0o755)
+
+        self.assertEqual(self._call(ctl, self.server_root), sorted(
+            [p for p in ["/bin/sh", self.envvars, self.httpd, sysconfig]
+             if os.path.isfile(p)]))
+
+    def test_httpd(self):
+        self.assertEqual(self._call(self.httpd, self.server_root),
+                         [self.envvars])
+
+    def test_missing(self):
+        self.assertEqual(self._call("nonexistent-apachectl", self.tempdir), [])
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -63,14 +63,7 @@ class MultipleVhostsTestCentOS(util.ApacheTest):
             ' mock_module (static)\n'
             ' another_module (static)\n'
         )
-        def mock_get_cfg(command):
-            """Mock httpd process stdout"""
-            if command == ['apachectl', '-t', '-D', 'DUMP_RUN_CFG']:
-                return define_val
-            elif command == ['apachectl', '-t', '-D', 'DUMP_MODULES']:
-                return mod_val
-            return ""
-        mock_get.side_effect = mock_get_cfg
+        mock_get.return_value = define_val + mod_val
         self.config.parser.modules = set()
         self.config.parser.variables = {}
 
@@ -79,7 +72,7 @@ class MultipleVhostsTestCentOS(util.ApacheTest):
             mock_osi.return_value = ("centos", "7")
             self.config.parser.update_runtime_variables()
 
-        self.assertEquals(mock_get.call_count, 3)
+        self.assertEquals(mock_get.call_count, 1)
         self.assertEquals(len(self.config.parser.modules), 4)
         self.assertEquals(len(self.config.parser.variables), 2)
         self.assertTrue("TEST2" in self.config.parser.variables.keys())
@@ -16,6 +16,7 @@ from certbot import achallenges
 from certbot import crypto_util
 from certbot import errors
 
+from certbot.plugins import common
 from certbot.tests import acme_util
 from certbot.tests import util as certbot_util
 
@@ -39,6 +40,7 @@ class MultipleVhostsTest(util.ApacheTest):
         self.config = self.mock_deploy_cert(self.config)
         self.vh_truth = util.get_vh_truth(
             self.temp_dir, "debian_apache_2_4/multiple_vhosts")
+        common._reverse_dns_cache.clear()  # pylint: disable=protected-access
 
     def mock_deploy_cert(self, config):
         """A test for a mock deploy cert"""
@@ -92,6 +94,7 @@ class MultipleVhostsTest(util.ApacheTest):
         self.assertRaises(
             errors.NotSupportedError, self.config.prepare)
 
+    @mock.patch("certbot.plugins.common.INSTALLER_LOCK_TIMEOUT", 0)
     def test_prepare_locked(self):
         server_root = self.config.conf("server-root")
         self.config.config_test = mock.Mock()
@@ -151,6 +154,30 @@ class MultipleVhostsTest(util.ApacheTest):
         self.assertTrue("google.com" in names)
         self.assertTrue("certbot.demo" in names)
 
+    @certbot_util.patch_get_utility()
+    @mock.patch("certbot_apache.configurator.common.reverse_dns_lookups")
+    def test_get_all_names_no_reverse_dns(self, mock_lookups, mock_getutility):
+        mock_getutility().notification.return_value = True
+        self.config.config.reverse_dns = False
+        self.config.vhosts.append(obj.VirtualHost(
+            "fp", "ap", set([obj.Addr(("8.8.8.8", "443"))]), True, False))
+
+        names = self.config.get_all_names()
+        self.assertFalse(mock_lookups.called)
+        self.assertTrue("certbot.demo" in names)
+
+    @mock.patch("certbot_apache.configurator.socket.gethostbyaddr")
+    def test_get_name_from_ip(self, mock_gethost):
+        mock_gethost.return_value = ("google.com", "", "")
+        self.assertEqual(
+            self.config.get_name_from_ip(obj.Addr(("8.8.8.8", "443"))),
+            "google.com")
+        self.assertEqual(
+            self.config.get_name_from_ip(obj.Addr(("192.168.1.2", "443"))), "")
+        self.assertEqual(
+            self.config.get_name_from_ip(obj.Addr(("*", "443"))), "")
+        self.assertEqual(mock_gethost.call_count, 1)
+
     def test_get_bad_path(self):
         self.assertEqual(apache_util.get_file_path(None), None)
         self.assertEqual(apache_util.get_file_path("nonexistent"), None)
@@ -676,9 +703,10 @@ class MultipleVhostsTest(util.ApacheTest):
         self.config._add_name_vhost_if_necessary(self.vh_truth[0])
         self.assertEqual(self.config.add_name_vhost.call_count, 2)
 
+    @mock.patch("certbot_apache.configurator.tls_sni_01.ApacheTlsSni01.wait_until_served")
     @mock.patch("certbot_apache.configurator.tls_sni_01.ApacheTlsSni01.perform")
     @mock.patch("certbot_apache.configurator.ApacheConfigurator.restart")
-    def test_perform(self, mock_restart, mock_perform):
+    def test_perform(self, mock_restart, mock_perform, mock_wait):
         # Only tests functionality specific to configurator.perform
         # Note: As more challenges are offered this will have to be expanded
         account_key, achall1, achall2 = self.get_achalls()
@@ -693,6 +721,7 @@ class MultipleVhostsTest(util.ApacheTest):
 
         self.assertEqual(mock_perform.call_count, 1)
         self.assertEqual(responses, expected)
+        mock_wait.assert_called_once_with(expected, [])
 
         self.assertEqual(mock_restart.call_count, 1)
 
@@ -761,6 +790,19 @@ class MultipleVhostsTest(util.ApacheTest):
     def test_config_test(self, _):
         self.config.config_test()
 
+    @mock.patch("certbot.util.run_script")
+    def test_config_test_unchanged(self, mock_run_script):
+        with mock.patch("certbot_apache.parser.ApacheParser."
+                        "config_fingerprint") as mock_fingerprint:
+            mock_fingerprint.return_value = (("/etc/apache2", None),)
+            self.config.config_test()
+            self.config.config_test()
+            self.assertEqual(mock_run_script.call_count, 1)
+
+            mock_fingerprint.return_value = (("/etc/httpd", None),)
+            self.config.config_test()
+            self.assertEqual(mock_run_script.call_count, 2)
+
     @mock.patch("certbot.util.run_script")
     def test_config_test_bad_process(self, mock_run_script):
         mock_run_script.side_effect = errors.SubprocessError
@@ -1238,6 +1280,49 @@ class MultipleVhostsTest(util.ApacheTest):
                           self.config.enable_mod,
                           "whatever")
 
+class LargeVhostTreeTest(util.ApacheTest):
+    """Test vhost discovery on a generated tree with many vhosts."""
+
+    def setUp(self):  # pylint: disable=arguments-differ
+        super(LargeVhostTreeTest, self).setUp()
+        self.names = util.generate_vhosts(self.config_path, 100)
+        # A vhost whose names can only be found by following an Include
+        aliases = os.path.join(self.config_path, "aliases.conf")
+        with open(aliases, "w") as f:
+            f.write("ServerAlias alias.example.org\n")
+        with open(os.path.join(self.config_path, "sites-enabled",
+                               "include.conf"), "w") as f:
+            f.write("<VirtualHost *:80>\n    ServerName include.example.org\n"
+                    "    Include {0}\n</VirtualHost>\n".format(aliases))
+        self.config = util.get_apache_configurator(
+            self.config_path, self.vhost_path, self.config_dir, self.work_dir)
+
+    def test_get_virtual_hosts(self):
+        self.assertEqual(len(self.config.vhosts), 111)
+        found = dict((vh.name, vh) for vh in self.config.vhosts)
+        for i, name in enumerate(self.names):
+            self.assertEqual(found[name].aliases, set(["www." + name]))
+            self.assertEqual(found[name].ssl, bool(i % 2))
+        self.assertEqual(found["include.example.org"].aliases,
+                         set(["alias.example.org"]))
+
+    def test_get_virtual_hosts_bulk_queries(self):
+        with mock.patch.object(self.config.aug, "match",
+                               wraps=self.config.aug.match) as mock_match:
+            vhs = self.config.get_virtual_hosts()
+        self.assertEqual(len(vhs), 111)
+        # The number of Augeas queries doesn't depend on the number of vhosts
+        self.assertTrue(mock_match.call_count < 50)
+
+    def test_get_virtual_hosts_fallback(self):
+        with mock.patch("certbot_apache.configurator.ApacheConfigurator."
+                        "_get_vhost_directives") as mock_directives:
+            mock_directives.side_effect = RuntimeError
+            vhs = self.config.get_virtual_hosts()
+        self.assertEqual(set(vh.name for vh in vhs),
+                         set(vh.name for vh in self.config.vhosts))
+
+
 class AugeasVhostsTest(util.ApacheTest):
     """Test vhosts with illegal names dependent on augeas version."""
     # pylint: disable=protected-access
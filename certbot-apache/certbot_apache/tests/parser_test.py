@@ -1,6 +1,7 @@
 """Tests for certbot_apache.parser."""
 import os
 import shutil
+import time
 import unittest
 
 import augeas
@@ -11,7 +12,7 @@ from certbot import errors
 from certbot_apache.tests import util
 
 
-class BasicParserTest(util.ParserTest):
+class BasicParserTest(util.ParserTest):  # pylint: disable=too-many-public-methods
     """Apache Parser Test."""
 
     def setUp(self):  # pylint: disable=arguments-differ
@@ -46,6 +47,22 @@ class BasicParserTest(util.ParserTest):
 
         self.assertTrue(matches)
 
+    def test_parse_files_single_load(self):
+        not_parsed = os.path.join(self.config_path, "not-parsed-by-default")
+        file_paths = [os.path.join(not_parsed, "certbot.conf"),
+                      os.path.join(not_parsed, "other.conf")]
+
+        with mock.patch.object(self.parser.aug, "load",
+                               wraps=self.parser.aug.load) as mock_load:
+            self.parser.parse_files(file_paths)
+            self.assertEqual(mock_load.call_count, 1)
+            for file_path in file_paths:
+                self.assertTrue(self.parser.parsed_in_current(file_path))
+
+            # Nothing new to parse
+            self.parser.parse_files(file_paths)
+            self.assertEqual(mock_load.call_count, 1)
+
     def test_find_dir(self):
         test = self.parser.find_dir("Listen", "80")
         # This will only look in enabled hosts
@@ -54,6 +71,53 @@ class BasicParserTest(util.ParserTest):
         self.assertEqual(len(test), 1)
         self.assertEqual(len(test2), 7)
 
+    def test_find_dir_arg_case_insensitive(self):
+        self.assertEqual(self.parser.find_dir("Listen", "80"),
+                         self.parser.find_dir("LISTEN", "80"))
+        aug_default = "/files" + self.parser.loc["default"]
+        self.parser.add_dir(aug_default, "AddDirective", "MixedCase")
+        for arg in ("MixedCase", "mixedcase", "MIXEDCASE"):
+            self.assertEqual(len(self.parser.find_dir("AddDirective", arg)), 1)
+        self.assertFalse(self.parser.find_dir("AddDirective", "Mixed.ase"))
+
+    def test_add_include_once(self):
+        inc_path = os.path.join(self.config_path, "certbot-include.conf")
+        self.parser.add_include(self.parser.loc["default"], inc_path)
+        self.parser.add_include(self.parser.loc["default"], inc_path)
+        self.assertEqual(len(self.parser.find_dir("Include", inc_path)), 1)
+
+    def test_find_dir_uses_index(self):
+        self.parser.find_dir("Listen")
+        expected = self.parser.find_dir("Listen")
+        with mock.patch.object(self.parser.aug, "match") as mock_match:
+            self.assertEqual(self.parser.find_dir("LISTEN"), expected)
+            self.assertFalse(mock_match.called)
+
+    def test_find_dir_index_reset(self):
+        aug_default = "/files" + self.parser.loc["default"]
+        self.assertFalse(self.parser.find_dir("AddDirective"))
+        self.parser.add_dir(aug_default, "AddDirective", "test")
+        self.assertEqual(len(self.parser.find_dir("AddDirective")), 1)
+
+        self.parser.aug.remove(
+            self.parser.find_dir("AddDirective")[0][:-len("/arg")])
+        self.assertEqual(len(self.parser.find_dir("AddDirective")), 1)
+        self.parser.reset_dir_index()
+        self.assertFalse(self.parser.find_dir("AddDirective"))
+
+    def test_find_dir_include_order(self):
+        paths = [os.path.join(self.config_path, name)
+                 for name in ("outer.conf", "inner.conf", "empty.conf")]
+        for path, target in zip(paths, paths[1:]):
+            with open(path, "w") as f:
+                f.write("Include %s\n" % target)
+        open(paths[2], "w").close()
+        self.parser.parse_file(paths[0])
+
+        matches = self.parser.find_dir("Include", start="/files" + paths[0])
+        self.assertEqual([self.parser.get_arg(match) for match in matches],
+                         [paths[2], paths[1]])
+
     def test_add_dir(self):
         aug_default = "/files" + self.parser.loc["default"]
         self.parser.add_dir(aug_default, "AddDirective", "test")
@@ -209,29 +273,74 @@ class BasicParserTest(util.ParserTest):
             ' status_module (shared)\n'
         )
 
-        def mock_get_vars(cmd):
-            """Mock command output"""
-            if cmd[-1] == "DUMP_RUN_CFG":
-                return define_val
-            elif cmd[-1] == "DUMP_INCLUDES":
-                return inc_val
-            elif cmd[-1] == "DUMP_MODULES":
-                return mod_val
-
-        mock_cfg.side_effect = mock_get_vars
+        mock_cfg.return_value = define_val + inc_val + mod_val
 
         expected_vars = {"TEST": "", "U_MICH": "", "TLS": "443",
                          "example_path": "Documents/path"}
 
         self.parser.modules = set()
         with mock.patch(
-            "certbot_apache.parser.ApacheParser.parse_file") as mock_parse:
+            "certbot_apache.parser.ApacheParser.parse_files") as mock_parse:
             self.parser.update_runtime_variables()
             self.assertEqual(self.parser.variables, expected_vars)
             self.assertEqual(len(self.parser.modules), 58)
             # None of the includes in inc_val should be in parsed paths.
-            # Make sure we tried to include them all.
-            self.assertEqual(mock_parse.call_count, 25)
+            # Make sure we tried to include them all in a single load.
+            self.assertEqual(mock_parse.call_count, 1)
+            self.assertEqual(len(mock_parse.call_args[0][0]), 25)
+        # Defines, includes and modules come from a single httpd invocation
+        self.assertEqual(mock_cfg.call_count, 1)
+        self.assertTrue("DUMP_MODULES" in mock_cfg.call_args[0][0])
+
+    @mock.patch("certbot_apache.parser.time.time")
+    @mock.patch("certbot_apache.parser.ApacheParser._get_runtime_cfg")
+    def test_update_runtime_variables_cached(self, mock_cfg, mock_time):
+        mock_cfg.return_value = (
+            'Define: DUMP_RUN_CFG\n'
+            'Define: DUMP_INCLUDES\n'
+            'Define: DUMP_MODULES\n'
+            'Define: TEST\n'
+            'Included configuration files:\n'
+            '  (*) {0}\n'
+            'Loaded Modules:\n'
+            ' ssl_module (shared)\n'
+        ).format(self.parser.loc["root"])
+        # Pretend the configuration files were written long ago
+        mock_time.return_value = time.time() + 60
+
+        self.parser.update_runtime_variables()
+        self.assertEqual(self.parser.variables, {"TEST": ""})
+        self.assertTrue("ssl_module" in self.parser.modules)
+        self.parser.update_runtime_variables()
+        self.assertEqual(mock_cfg.call_count, 1)
+        self.assertEqual(self.parser.tested_fingerprint,
+                         self.parser.config_fingerprint())
+
+        # Any change to the configuration requires a new dump
+        with open(self.parser.loc["root"], "a") as f:
+            f.write("\n")
+        self.parser.update_runtime_variables()
+        self.assertEqual(mock_cfg.call_count, 2)
+
+    def test_is_current_dump_no_side_effect(self):
+        # pylint: disable=protected-access
+        self.parser._runtime_files = [self.parser.loc["root"]]
+        self.assertFalse(self.parser._is_current_dump(
+            {"files": ["/nonexistent.conf"], "fingerprint": [["x", None]]}))
+        self.assertEqual(self.parser._runtime_files, [self.parser.loc["root"]])
+
+    @mock.patch("certbot_apache.parser.ApacheParser._get_runtime_cfg")
+    def test_update_runtime_variables_recently_modified(self, mock_cfg):
+        mock_cfg.return_value = (
+            'Included configuration files:\n'
+            '  (*) {0}\n'
+        ).format(self.parser.loc["root"])
+        # The configuration files were just written, so they might still
+        # change within the resolution of their modification times
+        self.parser.update_runtime_variables()
+        self.parser.update_runtime_variables()
+        self.assertEqual(mock_cfg.call_count, 2)
+        self.assertTrue(self.parser.config_fingerprint() is None)
 
     @mock.patch("certbot_apache.parser.ApacheParser.find_dir")
     @mock.patch("certbot_apache.parser.ApacheParser._get_runtime_cfg")
@@ -248,13 +357,14 @@ class BasicParserTest(util.ParserTest):
         self.parser.modules = set()
 
         with mock.patch(
-            "certbot_apache.parser.ApacheParser.parse_file") as mock_parse:
+            "certbot_apache.parser.ApacheParser.parse_files") as mock_parse:
             self.parser.update_runtime_variables()
             # No matching modules should have been found
             self.assertEqual(len(self.parser.modules), 0)
             # Only one of the three includes do not exist in already parsed
             # path derived from root configuration Include statements
-            self.assertEqual(mock_parse.call_count, 1)
+            mock_parse.assert_called_once_with(
+                ["/etc/apache2/mods-enabled/access_compat.load"])
 
     @mock.patch("certbot_apache.parser.ApacheParser._get_runtime_cfg")
     def test_update_runtime_vars_bad_output(self, mock_cfg):
@@ -122,6 +122,17 @@ class TlsSniPerformTest(util.ApacheTest):
             self.assertEqual(vhost.addrs, set([obj.Addr.fromstring("*:443")]))
             names = vhost.get_names()
             self.assertTrue(names in z_domains)
+        self.assertEqual(self.sni.probe_hosts, ["127.0.0.1", "127.0.0.1"])
+
+    def test_mod_config_bound_addrs(self):
+        self.sni.add_chall(self.achalls[0])
+        self.sni.add_chall(self.achalls[1])
+        self.sni._get_addrs = mock.Mock(  # pylint: disable=protected-access
+            side_effect=[set([obj.Addr.fromstring("192.0.2.1:443")]),
+                         set([obj.Addr.fromstring("[2001:db8::1]:443")])])
+
+        self.sni._mod_config()  # pylint: disable=protected-access
+        self.assertEqual(self.sni.probe_hosts, ["192.0.2.1", "2001:db8::1"])
 
     def test_get_addrs_default(self):
         self.sni.configurator.choose_vhost = mock.Mock(
@@ -7,6 +7,7 @@ import unittest
 import augeas
 import josepy as jose
 import mock
+import six
 import zope.component
 
 from certbot.display import util as display_util
@@ -105,6 +106,7 @@ def get_apache_configurator(  # pylint: disable=too-many-arguments, too-many-loc
         config_dir=config_dir,
         temp_checkpoint_dir=os.path.join(work_dir, "temp_checkpoints"),
         in_progress_dir=os.path.join(backups, "IN_PROGRESS"),
+        max_checkpoints=0,
         work_dir=work_dir)
 
     orig_os_constant = configurator.ApacheConfigurator(mock_le_config,
@@ -141,6 +143,44 @@ def get_apache_configurator(  # pylint: disable=too-many-arguments, too-many-loc
     return config
 
 
+def generate_vhosts(server_root, count):
+    """Adds synthetic VirtualHosts to a Debian style server root.
+
+    Every vhost is written to its own file in sites-available and enabled
+    with a symlink from sites-enabled, like a2ensite does. Every other
+    vhost is an SSL vhost. This is meant for tests and benchmarks that
+    need large configuration trees.
+
+    :param str server_root: Apache server root containing sites-available
+        and sites-enabled
+    :param int count: number of vhosts to generate
+
+    :returns: ServerNames of the generated vhosts
+    :rtype: list
+
+    """
+    names = []
+    for i in six.moves.range(count):
+        name = "synthetic{0}.example.org".format(i)
+        lines = ["<VirtualHost *:{0}>".format(443 if i % 2 else 80),
+                 "    ServerName {0}".format(name),
+                 "    ServerAlias www.{0}".format(name),
+                 "    DocumentRoot /var/www/{0}".format(name)]
+        if i % 2:
+            lines.extend(["    SSLEngine on",
+                          "    SSLCertificateFile /etc/ssl/{0}.pem".format(name),
+                          "    SSLCertificateKeyFile /etc/ssl/{0}.key".format(name)])
+        lines.append("</VirtualHost>")
+
+        basename = name + ".conf"
+        with open(os.path.join(server_root, "sites-available", basename), "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.symlink(os.path.join(os.path.pardir, "sites-available", basename),
+                   os.path.join(server_root, "sites-enabled", basename))
+        names.append(name)
+    return names
+
+
 def get_vh_truth(temp_dir, config_name):
     """Return the ground truth for the specified directory."""
     if config_name == "debian_apache_2_4/multiple_vhosts":
@@ -30,6 +30,9 @@ class ApacheTlsSni01(common.TLSSNI01):
 
     :param str challenge_conf: location of the challenge config file
 
+    :ivar list probe_hosts: address on which the challenge vhost of each
+        challenge can be probed, once the config has been modified
+
     """
 
     VHOST_TEMPLATE = """\
@@ -55,6 +58,7 @@ class ApacheTlsSni01(common.TLSSNI01):
         self.challenge_conf = os.path.join(
             self.configurator.conf("challenge-location"),
             "le_tls_sni_01_cert_challenge.conf")
+        self.probe_hosts = []
 
     def perform(self):
         """Perform a TLS-SNI-01 challenge."""
@@ -95,10 +99,12 @@ class ApacheTlsSni01(common.TLSSNI01):
         """
         addrs = set()
         config_text = "<IfModule mod_ssl.c>\n"
+        self.probe_hosts = []
 
         for achall in self.achalls:
             achall_addrs = self._get_addrs(achall)
             addrs.update(achall_addrs)
+            self.probe_hosts.append(_probe_host(achall_addrs))
 
             config_text += self._get_config_text(achall, achall_addrs)
 
@@ -170,3 +176,22 @@ class ApacheTlsSni01(common.TLSSNI01):
             cert_path=self.get_cert_path(achall),
             key_path=self.get_key_path(achall),
             document_root=document_root).replace("\n", os.linesep)
+
+
+def _probe_host(addrs):
+    """Address on which a challenge vhost bound to addrs can be probed.
+
+    Vhosts bound to specific addresses don't answer on the loopback
+    address, so they are probed on one of them instead.
+
+    :param set addrs: addresses of the challenge vhost
+    :type addrs: `set` of :class:`~certbot_apache.obj.Addr`
+
+    :rtype: str
+
+    """
+    hosts = sorted(addr.get_addr() for addr in addrs)
+    if not hosts or "*" in hosts:
+        return "127.0.0.1"
+    # IPv6 addresses are written in brackets in Apache's config
+    return hosts[0].strip("[]")
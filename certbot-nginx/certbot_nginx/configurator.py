@@ -5,7 +5,6 @@ import re
 import socket
 import subprocess
 import tempfile
-import time
 
 import OpenSSL
 import six
@@ -21,6 +20,7 @@ from certbot import interfaces
 from certbot import util
 
 from certbot.plugins import common
+from certbot.plugins import util as plugins_util
 
 from certbot_nginx import constants
 from certbot_nginx import nginxparser
@@ -110,7 +110,8 @@ class NginxConfigurator(common.Installer):
         self._enhance_func = {"redirect": self._enable_redirect,
                               "staple-ocsp": self._enable_ocsp_stapling}
 
-        self.reverter.recovery_routine()
+        # The parser isn't set up yet for NginxConfigurator.recovery_routine
+        super(NginxConfigurator, self).recovery_routine()
 
     @property
     def mod_ssl_conf(self):
@@ -147,13 +148,26 @@ class NginxConfigurator(common.Installer):
         if self.version is None:
             self.version = self.get_version()
 
+        self.lock_config()
+
+    def lock_config(self):
+        """Prevent other Certbot processes from changing the configuration.
+
+        The server root is locked as well as the checkpoints, see
+        :meth:`certbot.plugins.common.Installer.lock_config`.
+
+        :raises .errors.PluginError: when the configuration stays in use
+
+        """
         # Prevent two Nginx plugins from modifying a config at once
         try:
-            util.lock_dir_until_exit(self.conf('server-root'))
+            util.lock_dir_until_exit(self.conf('server-root'),
+                                     timeout=self._lock_timeout())
         except (OSError, errors.LockError):
             logger.debug('Encountered error:', exc_info=True)
             raise errors.PluginError(
                 'Unable to lock %s', self.conf('server-root'))
+        super(NginxConfigurator, self).lock_config()
 
     # Entry point in main.py for installing cert
     def deploy_cert(self, domain, cert_path, key_path,
@@ -441,6 +455,7 @@ class NginxConfigurator(common.Installer):
 
         """
         all_names = set()
+        ips = set()
 
         for vhost in self.parser.get_vhosts():
             all_names.update(vhost.names)
@@ -458,9 +473,12 @@ class NginxConfigurator(common.Installer):
                             socket.inet_pton(socket.AF_INET6, host)
                         else:
                             socket.inet_pton(socket.AF_INET, host)
-                        all_names.add(socket.gethostbyaddr(host)[0])
-                    except (socket.error, socket.herror, socket.timeout):
+                    except socket.error:
                         continue
+                    ips.add(host)
+
+        if ips and self.config.reverse_dns:
+            all_names.update(common.reverse_dns_lookups(ips).values())
 
         return util.get_filtered_names(all_names)
 
@@ -725,17 +743,10 @@ class NginxConfigurator(common.Installer):
             Unable to find Nginx version or version is unsupported
 
         """
-        try:
-            proc = subprocess.Popen(
-                [self.conf('ctl'), "-c", self.nginx_conf, "-V"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True)
-            text = proc.communicate()[1]  # nginx prints output to stderr
-        except (OSError, ValueError) as error:
-            logger.debug(error, exc_info=True)
-            raise errors.PluginError(
-                "Unable to run %s -V" % self.conf('ctl'))
+        command = [self.conf('ctl'), "-c", self.nginx_conf, "-V"]
+        text = plugins_util.cached_introspection(
+            self.config, command, lambda: _run_version_cmd(command),
+            files=[self.nginx_conf])
 
         version_regex = re.compile(r"nginx/([0-9\.]*)", re.IGNORECASE)
         version_matches = version_regex.findall(text)
@@ -865,6 +876,8 @@ class NginxConfigurator(common.Installer):
         # Must restart in order to activate the challenges.
         # Handled here because we may be able to load up other challenge types
         self.restart()
+        # Nginx can take a moment to recognize newly added TLS SNI servernames
+        chall_doer.wait_until_served(sni_response, chall_doer.probe_hosts)
 
         # Go through all of the challenges and assign them to the proper place
         # in the responses return value. All responses must be in the same order
@@ -882,7 +895,8 @@ class NginxConfigurator(common.Installer):
         # If all of the challenges have been finished, clean up everything
         if self._chall_out <= 0:
             self.revert_challenge_config()
-            self.restart()
+            if not common.defer_challenge_reload(self):
+                self.restart()
 
 
 def _test_block_from_block(block):
@@ -890,6 +904,24 @@ def _test_block_from_block(block):
     parser.comment_directive(test_block, 0)
     return test_block[:-1]
 
+def _run_version_cmd(command):
+    """Get the output of nginx -V.
+
+    :raises .PluginError: If nginx can't be run
+
+    """
+    try:
+        proc = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True)
+        return proc.communicate()[1]  # nginx prints output to stderr
+    except (OSError, ValueError) as error:
+        logger.debug(error, exc_info=True)
+        raise errors.PluginError("Unable to run %s -V" % command[0])
+
+
 def nginx_restart(nginx_ctl, nginx_conf):
     """Restarts the Nginx Server.
 
@@ -920,10 +952,6 @@ def nginx_restart(nginx_ctl, nginx_conf):
 
     except (OSError, ValueError):
         raise errors.MisconfigurationError("nginx restart failed")
-    # Nginx can take a moment to recognize a newly added TLS SNI servername, so sleep
-    # for a second. TODO: Check for expected servername and loop until it
-    # appears or return an error if looping too long.
-    time.sleep(1)
 
 
 def install_ssl_options_conf(options_ssl, options_ssl_digest):
@@ -13,6 +13,7 @@ from acme import messages
 from certbot import achallenges
 from certbot import crypto_util
 from certbot import errors
+from certbot.plugins import common
 from certbot.tests import util as certbot_test_util
 
 from certbot_nginx import constants
@@ -30,6 +31,7 @@ class NginxConfiguratorTest(util.NginxTest):
 
         self.config = util.get_nginx_configurator(
             self.config_path, self.config_dir, self.work_dir, self.logs_dir)
+        common._reverse_dns_cache.clear()  # pylint: disable=protected-access
 
     def tearDown(self):
         shutil.rmtree(self.temp_dir)
@@ -65,6 +67,7 @@ class NginxConfiguratorTest(util.NginxTest):
         self.config.prepare()
         self.assertEqual((1, 6, 2), self.config.version)
 
+    @mock.patch("certbot.plugins.common.INSTALLER_LOCK_TIMEOUT", 0)
     def test_prepare_locked(self):
         server_root = self.config.conf("server-root")
         self.config.config_test = mock.Mock()
@@ -91,6 +94,14 @@ class NginxConfiguratorTest(util.NginxTest):
              "migration.com", "summer.com", "geese.com", "sslon.com",
              "globalssl.com", "globalsslsetssl.com", "ipv6.com", "ipv6ssl.com"]))
 
+    @mock.patch("certbot_nginx.configurator.common.reverse_dns_lookups")
+    def test_get_all_names_no_reverse_dns(self, mock_lookups):
+        self.config.config.reverse_dns = False
+        names = self.config.get_all_names()
+        self.assertFalse(mock_lookups.called)
+        self.assertFalse("155.225.50.69.nephoscale.net" in names)
+        self.assertTrue("www.example.org" in names)
+
     def test_supported_enhancements(self):
         self.assertEqual(['redirect', 'staple-ocsp'],
                          self.config.supported_enhancements())
@@ -290,10 +301,12 @@ class NginxConfiguratorTest(util.NginxTest):
                            ]],
                          parsed_migration_conf[0])
 
+    @mock.patch("certbot_nginx.configurator.tls_sni_01.NginxTlsSni01.wait_until_served")
     @mock.patch("certbot_nginx.configurator.tls_sni_01.NginxTlsSni01.perform")
     @mock.patch("certbot_nginx.configurator.NginxConfigurator.restart")
     @mock.patch("certbot_nginx.configurator.NginxConfigurator.revert_challenge_config")
-    def test_perform_and_cleanup(self, mock_revert, mock_restart, mock_perform):
+    def test_perform_and_cleanup(self, mock_revert, mock_restart, mock_perform,
+                                 mock_wait):
         # Only tests functionality specific to configurator.perform
         # Note: As more challenges are offered this will have to be expanded
         achall1 = achallenges.KeyAuthorizationAnnotatedChallenge(
@@ -319,12 +332,22 @@ class NginxConfiguratorTest(util.NginxTest):
 
         self.assertEqual(mock_perform.call_count, 1)
         self.assertEqual(responses, expected)
+        mock_wait.assert_called_once_with(expected, [])
 
         self.config.cleanup([achall1, achall2])
         self.assertEqual(0, self.config._chall_out) # pylint: disable=protected-access
         self.assertEqual(mock_revert.call_count, 1)
         self.assertEqual(mock_restart.call_count, 2)
 
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.restart")
+    @mock.patch("certbot_nginx.configurator.NginxConfigurator.revert_challenge_config")
+    def test_cleanup_deferred(self, mock_revert, mock_restart):
+        with common.shared_challenge_configs():
+            self.config.cleanup([])
+            self.assertEqual(mock_revert.call_count, 1)
+            self.assertFalse(mock_restart.called)
+        self.assertEqual(mock_restart.call_count, 1)
+
     @mock.patch("certbot_nginx.configurator.subprocess.Popen")
     def test_get_version(self, mock_popen):
         mock_popen().communicate.return_value = (
@@ -120,6 +120,21 @@ class TlsSniPerformTest(util.NginxTest):
         self.assertEqual(len(sni_responses), 4)
         for i in six.moves.range(4):
             self.assertEqual(sni_responses[i], acme_responses[i])
+        self.assertEqual(self.sni.probe_hosts, ["127.0.0.1"] * 4)
+
+    @mock.patch("certbot_nginx.configurator"
+                ".NginxConfigurator.choose_vhost")
+    def test_perform_bound_addrs(self, mock_choose):
+        self.sni.add_chall(self.achalls[0])
+        self.sni.add_chall(self.achalls[1])
+        mock_choose.side_effect = [
+            mock.Mock(addrs=set([obj.Addr.fromstring("192.0.2.1:443 ssl")])),
+            mock.Mock(addrs=set([obj.Addr.fromstring("[2001:db8::1]:443 ssl"),
+                                 obj.Addr.fromstring("[::]:443 ssl")])),
+        ]
+
+        self.sni.perform()
+        self.assertEqual(self.sni.probe_hosts, ["192.0.2.1", "::1"])
 
     def test_mod_config(self):
         self.sni.add_chall(self.achalls[0])
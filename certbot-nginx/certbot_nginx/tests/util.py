@@ -64,6 +64,8 @@ def get_nginx_configurator(
                     in_progress_dir=os.path.join(backups, "IN_PROGRESS"),
                     server="https://acme-server.org:443/new",
                     tls_sni_01_port=5001,
+                    max_checkpoints=0,
+                    nginx_ctl="nginx",
                 ),
                 name="nginx",
                 version=version)
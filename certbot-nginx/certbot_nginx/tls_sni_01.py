@@ -35,8 +35,15 @@ class NginxTlsSni01(common.TLSSNI01):
 
     :param str challenge_conf: location of the challenge config file
 
+    :ivar list probe_hosts: address on which the challenge server block of
+        each challenge can be probed, once the config has been modified
+
     """
 
+    def __init__(self, *args, **kwargs):
+        super(NginxTlsSni01, self).__init__(*args, **kwargs)
+        self.probe_hosts = []
+
     def perform(self):
         """Perform a challenge on Nginx.
 
@@ -78,6 +85,8 @@ class NginxTlsSni01(common.TLSSNI01):
                     logger.info("Using default address %s for TLSSNI01 authentication.",
                                 default_addr)
 
+        self.probe_hosts = [_probe_host(addrs) for addrs in addresses]
+
         # Create challenge certs
         responses = [self._setup_challenge_cert(x) for x in self.achalls]
 
@@ -172,3 +181,24 @@ class NginxTlsSni01(common.TLSSNI01):
                       ['include', ' ', self.configurator.mod_ssl_conf],
                       [['location', ' ', '/'], [['root', ' ', document_root]]]])
         return [['server'], block]
+
+
+def _probe_host(addrs):
+    """Address on which a challenge server block listening on addrs can be probed.
+
+    Server blocks listening on specific addresses don't answer on the
+    loopback address, so they are probed on one of them instead.
+
+    :param list addrs: addresses of the challenge server block
+    :type addrs: `list` of :class:`~certbot_nginx.obj.Addr`
+
+    :rtype: str
+
+    """
+    if not addrs or any(addr.unspecified_address for addr in addrs):
+        return "127.0.0.1"
+    # IPv6 addresses are written in brackets in Nginx's config
+    hosts = sorted(addr.get_addr().strip("[]") for addr in addrs)
+    if "::" in hosts:
+        return "::1"
+    return hosts[0]
@@ -1,21 +1,38 @@
 """ACME AuthHandler."""
 import logging
+import socket
+import threading
 import time
 
 import six
 import zope.component
 
 from acme import challenges
+from acme import errors as acme_errors
 from acme import messages
 
 from certbot import achallenges
+from certbot import authz_cache
 from certbot import errors
 from certbot import error_handler
 from certbot import interfaces
+from certbot import timing
 
 
 logger = logging.getLogger(__name__)
 
+PREFLIGHT_TIMEOUT = 30
+"""Seconds to wait for the local verification of all challenges."""
+
+PREFLIGHT_REQUEST_TIMEOUT = 10
+"""Seconds to wait for the server in one local verification of a challenge."""
+
+PREFLIGHT_ATTEMPTS = 3
+"""Times a challenge is verified locally before it's considered failed."""
+
+PREFLIGHT_RETRY_DELAY = 2
+"""Seconds to wait between two local verifications of a challenge."""
+
 
 class AuthHandler(object):
     """ACME Authorization Handler for a client.
@@ -35,15 +52,18 @@ class AuthHandler(object):
         :class:`certbot.achallenges.AnnotatedChallenge`
     :ivar list pref_challs: sorted user specified preferred challenges
         type strings with the most preferred challenge listed first
+    :ivar cache: Valid authorizations of the account to reuse, if any
+    :type cache: :class:`certbot.authz_cache.AuthorizationCache`
 
     """
-    def __init__(self, auth, acme, account, pref_challs):
+    def __init__(self, auth, acme, account, pref_challs, cache=None):
         self.auth = auth
         self.acme = acme
 
         self.account = account
         self.authzr = dict()
         self.pref_challs = pref_challs
+        self.cache = cache
 
         # List must be used to keep responses straight.
         self.achalls = []
@@ -62,16 +82,25 @@ class AuthHandler(object):
             authorizations
 
         """
-        for domain in domains:
-            self.authzr[domain] = self.acme.request_domain_challenges(domain)
-
-        self._choose_challenges(domains)
+        with timing.span("authz-request"):
+            for domain in domains:
+                authzr = self._reuse_authorization(domain)
+                if authzr is None:
+                    authzr = self.acme.request_domain_challenges(domain)
+                self.authzr[domain] = authzr
+
+        # Names still authorized don't need challenges
+        self._choose_challenges(
+            [domain for domain in domains
+             if self.authzr[domain].body.status != messages.STATUS_VALID])
         config = zope.component.getUtility(interfaces.IConfig)
         notify = zope.component.getUtility(interfaces.IDisplay).notification
 
         # While there are still challenges remaining...
         while self.achalls:
             resp = self._solve_challenges()
+            if config.preflight_challenges:
+                resp = self._preflight_challenges(resp, best_effort)
             logger.info("Waiting for verification...")
             if config.debug_challenges:
                 notify('Challenges loaded. Press continue to submit to CA. '
@@ -91,8 +120,38 @@ class AuthHandler(object):
             raise errors.AuthorizationError(
                 "Challenges failed for all domains")
 
+        if self.cache is not None:
+            self.cache.add(retVal)
         return retVal
 
+    def _reuse_authorization(self, domain):
+        """Find a cached authorization for domain the server still honors.
+
+        :param str domain: domain name
+
+        :returns: the up to date authorization, or ``None``
+        :rtype: `acme.messages.AuthorizationResource`
+
+        """
+        if self.cache is None:
+            return None
+        authzr = self.cache.get(domain)
+        if authzr is None:
+            return None
+
+        try:
+            authzr, _ = self.acme.poll(authzr)
+        except acme_errors.Error as error:
+            logger.debug("Unable to check cached authorization for %s: %s",
+                         domain, error)
+            authzr = None
+        if authzr is None or not authz_cache.is_reusable(authzr):
+            self.cache.remove(domain)
+            return None
+        logger.info("Reusing the authorization of %s, valid until %s",
+                    domain, authzr.body.expires)
+        return authzr
+
     def _choose_challenges(self, domains):
         """Retrieve necessary challenges to satisfy server."""
         logger.info("Performing the following challenges:")
@@ -112,7 +171,8 @@ class AuthHandler(object):
         with error_handler.ErrorHandler(self._cleanup_challenges):
             try:
                 if self.achalls:
-                    resp = self.auth.perform(self.achalls)
+                    with timing.span("challenge-perform"):
+                        resp = self.auth.perform(self.achalls)
             except errors.AuthorizationError:
                 logger.critical("Failure in setting up challenges.")
                 logger.info("Attempting to clean up outstanding challenges...")
@@ -122,6 +182,56 @@ class AuthHandler(object):
 
         return resp
 
+    def _preflight_challenges(self, resps, best_effort):
+        """Check locally that the CA will be able to validate the challenges.
+
+        http-01 and tls-sni-01 challenges are verified concurrently
+        before being answered, so a wrong webroot, proxy or server
+        configuration doesn't cost a failed validation.
+
+        :param list resps: responses to the challenges in ``self.achalls``
+        :param bool best_effort: Whether to drop the domains which
+            failed verification rather than give up
+
+        :returns: responses to the challenges left in ``self.achalls``
+        :rtype: list
+
+        :raises .AuthorizationError: If a challenge failed verification
+            and best_effort is ``False``
+
+        """
+        checks = [(achall, resp) for achall, resp
+                  in six.moves.zip(self.achalls, resps)
+                  if isinstance(resp, (challenges.HTTP01Response,
+                                       challenges.TLSSNI01Response))]
+        logger.info("Verifying %d challenge(s) locally...", len(checks))
+        results = _self_verify_all(checks)
+        failed = []
+        for (achall, _), verified in six.moves.zip(checks, results):
+            if not verified and achall.domain not in failed:
+                failed.append(achall.domain)
+        if not failed:
+            return resps
+
+        for domain in failed:
+            logger.warning("Local verification of the challenge for %s "
+                           "failed", domain)
+        if not best_effort:
+            self._cleanup_challenges()
+            raise errors.AuthorizationError(
+                "The challenges for {0} couldn't be verified locally, so "
+                "they weren't submitted to the CA. Please check that these "
+                "domains point to this server.".format(", ".join(failed)))
+
+        # Dropped domains no longer need an authorization
+        for domain in failed:
+            del self.authzr[domain]
+        remaining = [resp for achall, resp in six.moves.zip(self.achalls, resps)
+                     if achall.domain not in failed]
+        self._cleanup_challenges(
+            [achall for achall in self.achalls if achall.domain in failed])
+        return remaining
+
     def _respond(self, resp, best_effort):
         """Send/Receive confirmation of all challenges.
 
@@ -130,12 +240,14 @@ class AuthHandler(object):
         """
         # TODO: chall_update is a dirty hack to get around acme-spec #105
         chall_update = dict()
-        active_achalls = self._send_responses(self.achalls,
-                                              resp, chall_update)
+        with timing.span("challenge-answer"):
+            active_achalls = self._send_responses(self.achalls,
+                                                  resp, chall_update)
 
         # Check for updated status...
         try:
-            self._poll_challenges(chall_update, best_effort)
+            with timing.span("ca-polling"):
+                self._poll_challenges(chall_update, best_effort)
         finally:
             # This removes challenges from self.achalls
             self._cleanup_challenges(active_achalls)
@@ -276,12 +388,13 @@ class AuthHandler(object):
         logger.info("Cleaning up challenges")
 
         if achall_list is None:
-            achalls = self.achalls
+            achalls = list(self.achalls)
         else:
             achalls = achall_list
 
         if achalls:
-            self.auth.cleanup(achalls)
+            with timing.span("challenge-cleanup"):
+                self.auth.cleanup(achalls)
             for achall in achalls:
                 self.achalls.remove(achall)
 
@@ -320,6 +433,62 @@ class AuthHandler(object):
         return achalls
 
 
+def _self_verify(achall, resp, deadline=None):
+    """Verify a challenge like the CA would, retrying on failure.
+
+    :param float deadline: time after which to give up, or ``None`` to
+        make every attempt
+
+    :returns: whether the challenge was verified
+    :rtype: bool
+
+    """
+    for attempt in six.moves.range(PREFLIGHT_ATTEMPTS):
+        if attempt:
+            time.sleep(PREFLIGHT_RETRY_DELAY)
+        timeout = PREFLIGHT_REQUEST_TIMEOUT
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.time())
+            if timeout <= 0:
+                break
+        try:
+            if resp.simple_verify(achall.chall, achall.domain,
+                                  achall.account_key.public_key(),
+                                  timeout=timeout):
+                return True
+        except (acme_errors.Error, socket.error) as error:
+            logger.debug("Local verification of %s failed: %s",
+                         achall.domain, error)
+    return False
+
+
+def _self_verify_all(checks, timeout=PREFLIGHT_TIMEOUT):
+    """Concurrently verify challenges.
+
+    :param list checks: (annotated challenge, response) pairs
+    :param int timeout: Seconds to wait for all verifications
+
+    :returns: whether each challenge was verified in time
+    :rtype: `list` of `bool`
+
+    """
+    results = {}
+    deadline = time.time() + timeout
+
+    def _verify(i, achall, resp):
+        results[i] = _self_verify(achall, resp, deadline)
+
+    threads = []
+    for i, (achall, resp) in enumerate(checks):
+        thread = threading.Thread(target=_verify, args=(i, achall, resp))
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join(max(0, deadline - time.time()))
+    return [results.get(i, False) for i in six.moves.range(len(checks))]
+
+
 def challb_to_achall(challb, account_key, domain):
     """Converts a ChallengeBody object to an AnnotatedChallenge.
 
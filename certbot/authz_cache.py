@@ -0,0 +1,173 @@
+"""Cache of the valid authorizations of an account."""
+import contextlib
+import datetime
+import json
+import logging
+import os
+import tempfile
+import threading
+
+import pytz
+
+from acme import messages
+
+from certbot import errors
+from certbot import lock
+
+logger = logging.getLogger(__name__)
+
+AUTHORIZATIONS_FILE = "authorizations.json"
+"""Name of the cache file, in the account's directory."""
+
+EXPIRY_MARGIN = datetime.timedelta(hours=1)
+"""Authorizations expiring sooner than this aren't reused, as they might
+expire before the certificate is issued."""
+
+LOCK_TIMEOUT = 10
+"""Seconds to wait for other Certbot processes updating the cache."""
+
+# File locks don't exclude threads of the same process
+_thread_lock = threading.Lock()
+
+
+class AuthorizationCache(object):
+    """Valid authorizations of an account, by domain name.
+
+    The cache is kept in the account's directory, so authorizations
+    obtained for one certificate can be reused by the next ones until
+    they expire. Cached authorizations must be confirmed with the
+    ACME server before being used.
+
+    :ivar str path: path to the cache file
+
+    """
+    def __init__(self, config, account):
+        self.path = os.path.join(
+            config.accounts_dir, account.id, AUTHORIZATIONS_FILE)
+
+    def get(self, domain):
+        """Find a cached authorization for domain.
+
+        :param str domain: domain name
+
+        :returns: the authorization, or ``None`` if none is cached or it
+            is about to expire
+        :rtype: `acme.messages.AuthorizationResource`
+
+        """
+        value = self._read().get(domain)
+        if value is None:
+            return None
+        try:
+            authzr = messages.AuthorizationResource.from_json(value)
+        except Exception:  # pylint: disable=broad-except
+            logger.debug("Unable to decode cached authorization for %s",
+                         domain, exc_info=True)
+            return None
+        return authzr if is_reusable(authzr) else None
+
+    def add(self, authzrs):
+        """Cache valid authorizations.
+
+        Authorizations that aren't valid, or don't say when they expire,
+        are ignored. Expired authorizations are dropped from the cache.
+
+        :param authzrs: authorizations to cache
+        :type authzrs: `list` of `acme.messages.AuthorizationResource`
+
+        """
+        with self._locked():
+            cache = self._read()
+            for authzr in authzrs:
+                if is_reusable(authzr):
+                    cache[authzr.body.identifier.value] = json.loads(
+                        authzr.json_dumps())
+            self._write(dict(
+                (domain, value) for domain, value in cache.items()
+                if _unexpired(value)))
+
+    def remove(self, domain):
+        """Forget the cached authorization for domain.
+
+        :param str domain: domain name
+
+        """
+        with self._locked():
+            cache = self._read()
+            if cache.pop(domain, None) is not None:
+                self._write(cache)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Exclude other updates of the cache during the block.
+
+        Renewals may run in several processes at once, see
+        `.constants.SHARED_LOCK_VERBS`, and each of them reads, modifies
+        and writes back the whole file. If the cache can't be locked,
+        the block runs anyway, as losing an update only costs new
+        authorizations later.
+
+        """
+        with _thread_lock:
+            try:
+                cache_lock = lock.LockFile(
+                    self.path + ".lock", timeout=LOCK_TIMEOUT)
+            except (errors.LockError, OSError):
+                logger.debug("Unable to lock %s", self.path, exc_info=True)
+                cache_lock = None
+            try:
+                yield
+            finally:
+                if cache_lock is not None:
+                    cache_lock.release()
+
+    def _read(self):
+        try:
+            with open(self.path) as cache_file:
+                cache = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return {}
+        return cache if isinstance(cache, dict) else {}
+
+    def _write(self, cache):
+        """Atomically replace the cache file."""
+        try:
+            fd, temp_path = tempfile.mkstemp(
+                prefix=".authorizations-", dir=os.path.dirname(self.path))
+        except (IOError, OSError):
+            logger.debug("Unable to save authorizations", exc_info=True)
+            return
+        try:
+            with os.fdopen(fd, "w") as cache_file:
+                json.dump(cache, cache_file, indent=4, sort_keys=True)
+            os.rename(temp_path, self.path)
+        except Exception:  # pylint: disable=broad-except
+            logger.debug("Unable to save authorizations", exc_info=True)
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
+def is_reusable(authzr):
+    """Can authzr be reused for a new certificate?
+
+    :param acme.messages.AuthorizationResource authzr: authorization
+
+    :rtype: bool
+
+    """
+    expires = authzr.body.expires
+    if authzr.body.status != messages.STATUS_VALID or expires is None:
+        return False
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=pytz.UTC)
+    return expires > datetime.datetime.now(pytz.UTC) + EXPIRY_MARGIN
+
+
+def _unexpired(value):
+    """Is a cached authorization still usable?"""
+    try:
+        return is_reusable(messages.AuthorizationResource.from_json(value))
+    except Exception:  # pylint: disable=broad-except
+        return False
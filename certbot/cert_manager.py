@@ -1,15 +1,18 @@
 """Tools for managing certificates."""
 import datetime
+import json
 import logging
 import os
 import pytz
 import re
+import sys
 import traceback
 import zope.component
 
 from certbot import crypto_util
 from certbot import errors
 from certbot import interfaces
+from certbot import lineage_index
 from certbot import ocsp
 from certbot import storage
 from certbot import util
@@ -18,6 +21,9 @@ from certbot.display import util as display_util
 
 logger = logging.getLogger(__name__)
 
+CERTIFICATES_WORKERS = 8
+"""Maximum number of lineages loaded and checked concurrently."""
+
 ###################
 # Commands
 ###################
@@ -67,21 +73,29 @@ def rename_lineage(config):
 def certificates(config):
     """Display information about certs configured with Certbot
 
+    Lineages are loaded and checked concurrently. With ``--format json``,
+    each lineage is printed as a JSON object on its own line as soon as
+    it and the lineages before it have been checked. The default text
+    output does not stream: it is shown as a single notification once
+    every lineage has been loaded and checked.
+
     :param config: Configuration.
     :type config: :class:`certbot.configuration.NamespaceConfig`
     """
+    renewal_files = storage.renewal_conf_files(config)
+    if config.output_format == "json":
+        _print_certs_json(config, renewal_files)
+        return
+
     parsed_certs = []
     parse_failures = []
-    for renewal_file in storage.renewal_conf_files(config):
-        try:
-            renewal_candidate = storage.RenewableCert(renewal_file, config)
-            crypto_util.verify_renewable_cert(renewal_candidate)
-            parsed_certs.append(renewal_candidate)
-        except Exception as e:  # pylint: disable=broad-except
-            logger.warning("Renewal configuration file %s produced an "
-                           "unexpected error: %s. Skipping.", renewal_file, e)
-            logger.debug("Traceback was:\n%s", traceback.format_exc())
+    loaded = util.parallel_map(lambda renewal_file: _load_cert(config, renewal_file),
+                               renewal_files, CERTIFICATES_WORKERS)
+    for renewal_file, (renewal_candidate, _) in zip(renewal_files, loaded):
+        if renewal_candidate is None:
             parse_failures.append(renewal_file)
+        else:
+            parsed_certs.append(renewal_candidate)
 
     # Describe all the certs
     _describe_certs(config, parsed_certs, parse_failures)
@@ -141,7 +155,13 @@ def find_duplicative_certs(config, domains):
                 subset_names_cert = candidate_lineage
         return (identical_names_cert, subset_names_cert)
 
-    return _search_lineages(config, update_certs_for_domain_matches, (None, None))
+    candidates = lineage_index.load(config).lineages_for_domains(domains)
+    result = _search_lineages(config, update_certs_for_domain_matches, (None, None),
+                              certnames=candidates)
+    if result == (None, None):
+        # The index is only a hint, and may be out of date
+        result = _search_lineages(config, update_certs_for_domain_matches, (None, None))
+    return result
 
 def _archive_files(candidate_lineage, filetype):
     """ In order to match things like:
@@ -187,11 +207,14 @@ def cert_path_to_lineage(cli_config):
     :raises `errors.OverlappingMatchFound`: If the matched lineage's archive is shared.
     """
     acceptable_matches = _acceptable_matches()
+    candidates = lineage_index.load(cli_config).lineages_for_path(cli_config.cert_path[0])
     match = match_and_check_overlaps(cli_config, acceptable_matches,
-            lambda x: cli_config.cert_path[0], lambda x: x.lineagename)
+            lambda x: cli_config.cert_path[0], lambda x: x.lineagename,
+            certnames=candidates)
     return match[0]
 
-def match_and_check_overlaps(cli_config, acceptable_matches, match_func, rv_func):
+def match_and_check_overlaps(cli_config, acceptable_matches, match_func, rv_func,
+                             certnames=None):
     """ Searches through all lineages for a match, and checks for duplicates.
     If a duplicate is found, an error is raised, as performing operations on lineages
     that have their properties incorrectly duplicated elsewhere is probably a bad idea.
@@ -200,6 +223,9 @@ def match_and_check_overlaps(cli_config, acceptable_matches, match_func, rv_func
     :param list acceptable_matches: a list of functions that specify acceptable matches
     :param function match_func: specifies what to match
     :param function rv_func: specifies what to return
+    :param list certnames: names of the lineages to search, or ``None``
+        to search all of them. All lineages are searched if none of these
+        match.
 
     """
     def find_matches(candidate_lineage, return_value, acceptable_matches):
@@ -216,7 +242,11 @@ def match_and_check_overlaps(cli_config, acceptable_matches, match_func, rv_func
             return_value.append(rv_func(candidate_lineage))
         return return_value
 
-    matched = _search_lineages(cli_config, find_matches, [], acceptable_matches)
+    matched = _search_lineages(cli_config, find_matches, [], acceptable_matches,
+                               certnames=certnames)
+    if not matched and certnames is not None:
+        # The lineage index is only a hint, and may be out of date
+        matched = _search_lineages(cli_config, find_matches, [], acceptable_matches)
     if not matched:
         raise errors.Error("No match found for cert-path {0}!".format(cli_config.cert_path[0]))
     elif len(matched) > 1:
@@ -224,29 +254,16 @@ def match_and_check_overlaps(cli_config, acceptable_matches, match_func, rv_func
     else:
         return matched
 
-def human_readable_cert_info(config, cert, skip_filter_checks=False):
+def human_readable_cert_info(config, cert, skip_filter_checks=False, checker=None):
     """ Returns a human readable description of info about a RenewableCert object"""
-    certinfo = []
-    checker = ocsp.RevocationChecker()
-
-    if config.certname and cert.lineagename != config.certname and not skip_filter_checks:
+    if not skip_filter_checks and not _matches_filters(config, cert):
         return ""
-    if config.domains and not set(config.domains).issubset(cert.names()):
-        return ""
-    now = pytz.UTC.fromutc(datetime.datetime.utcnow())
+    info = _cert_status(cert, checker or ocsp.RevocationChecker())
 
-    reasons = []
-    if cert.is_test_cert:
-        reasons.append('TEST_CERT')
-    if cert.target_expiry <= now:
-        reasons.append('EXPIRED')
-    if checker.ocsp_revoked(cert.cert, cert.chain):
-        reasons.append('REVOKED')
-
-    if reasons:
-        status = "INVALID: " + ", ".join(reasons)
+    if info["reasons"]:
+        status = "INVALID: " + ", ".join(info["reasons"])
     else:
-        diff = cert.target_expiry - now
+        diff = cert.target_expiry - info["now"]
         if diff.days == 1:
             status = "VALID: 1 day"
         elif diff.days < 1:
@@ -255,17 +272,16 @@ def human_readable_cert_info(config, cert, skip_filter_checks=False):
             status = "VALID: {0} days".format(diff.days)
 
     valid_string = "{0} ({1})".format(cert.target_expiry, status)
-    certinfo.append("  Certificate Name: {0}\n"
-                    "    Domains: {1}\n"
-                    "    Expiry Date: {2}\n"
-                    "    Certificate Path: {3}\n"
-                    "    Private Key Path: {4}".format(
-                         cert.lineagename,
-                         " ".join(cert.names()),
-                         valid_string,
-                         cert.fullchain,
-                         cert.privkey))
-    return "".join(certinfo)
+    return ("  Certificate Name: {0}\n"
+            "    Domains: {1}\n"
+            "    Expiry Date: {2}\n"
+            "    Certificate Path: {3}\n"
+            "    Private Key Path: {4}".format(
+                 cert.lineagename,
+                 " ".join(cert.names()),
+                 valid_string,
+                 cert.fullchain,
+                 cert.privkey))
 
 ###################
 # Private Helpers
@@ -306,10 +322,92 @@ def _report_lines(msgs):
 
 def _report_human_readable(config, parsed_certs):
     """Format a results report for a parsed cert"""
-    certinfo = []
-    for cert in parsed_certs:
-        certinfo.append(human_readable_cert_info(config, cert))
-    return "\n".join(certinfo)
+    checker = ocsp.RevocationChecker()
+    return "\n".join(util.parallel_map(
+        lambda cert: human_readable_cert_info(config, cert, checker=checker),
+        parsed_certs, CERTIFICATES_WORKERS))
+
+def _load_cert(config, renewal_file):
+    """Load and verify a lineage.
+
+    :returns: the lineage, or ``None`` if it is broken, and the error
+    :rtype: tuple
+
+    """
+    try:
+        renewal_candidate = storage.RenewableCert(renewal_file, config)
+        crypto_util.verify_renewable_cert(renewal_candidate)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning("Renewal configuration file %s produced an "
+                       "unexpected error: %s. Skipping.", renewal_file, e)
+        logger.debug("Traceback was:\n%s", traceback.format_exc())
+        return None, e
+    return renewal_candidate, None
+
+def _matches_filters(config, cert):
+    """Was cert selected with --cert-name and --domains?"""
+    if config.certname and cert.lineagename != config.certname:
+        return False
+    if config.domains and not set(config.domains).issubset(cert.names()):
+        return False
+    return True
+
+def _cert_status(cert, checker):
+    """Check whether cert is still valid.
+
+    :param `.storage.RenewableCert` cert: lineage to check
+    :param `.ocsp.RevocationChecker` checker: checker for revocation
+
+    :returns: the current time as "now" and the reasons the certificate
+        is invalid as "reasons"
+    :rtype: dict
+
+    """
+    now = pytz.UTC.fromutc(datetime.datetime.utcnow())
+
+    reasons = []
+    if cert.is_test_cert:
+        reasons.append('TEST_CERT')
+    if cert.target_expiry <= now:
+        reasons.append('EXPIRED')
+    if checker.ocsp_revoked(cert.cert, cert.chain):
+        reasons.append('REVOKED')
+    return {"now": now, "reasons": reasons}
+
+def _cert_json(config, renewal_file, checker):
+    """Describe the lineage of renewal_file as a JSON object.
+
+    :returns: JSON object, or ``None`` if the lineage isn't selected
+    :rtype: str
+
+    """
+    cert, error = _load_cert(config, renewal_file)
+    if cert is None:
+        return json.dumps({"renewal_config": renewal_file, "error": str(error)},
+                          sort_keys=True)
+    if not _matches_filters(config, cert):
+        return None
+    reasons = _cert_status(cert, checker)["reasons"]
+    return json.dumps({
+        "renewal_config": renewal_file,
+        "certificate_name": cert.lineagename,
+        "domains": cert.names(),
+        "expiry_date": cert.target_expiry.isoformat(),
+        "valid": not reasons,
+        "invalid_reasons": reasons,
+        "certificate_path": cert.fullchain,
+        "private_key_path": cert.privkey,
+    }, sort_keys=True)
+
+def _print_certs_json(config, renewal_files):
+    """Print a JSON object per lineage to stdout as it becomes available."""
+    checker = ocsp.RevocationChecker()
+    for line in util.parallel_map(
+            lambda renewal_file: _cert_json(config, renewal_file, checker),
+            renewal_files, CERTIFICATES_WORKERS):
+        if line is not None:
+            sys.stdout.write(line + "\n")
+            sys.stdout.flush()
 
 def _describe_certs(config, parsed_certs, parse_failures):
     """Print information about the certs we know about"""
@@ -332,7 +430,7 @@ def _describe_certs(config, parsed_certs, parse_failures):
     disp = zope.component.getUtility(interfaces.IDisplay)
     disp.notification("\n".join(out), pause=False, wrap=False)
 
-def _search_lineages(cli_config, func, initial_rv, *args):
+def _search_lineages(cli_config, func, initial_rv, *args, **kwargs):
     """Iterate func over unbroken lineages, allowing custom return conditions.
 
     Allows flexible customization of return values, including multiple
@@ -341,15 +439,23 @@ def _search_lineages(cli_config, func, initial_rv, *args):
     :param `configuration.NamespaceConfig` cli_config: parsed command line arguments
     :param function func: function used while searching over lineages
     :param initial_rv: initial return value of the function (any type)
+    :param list certnames: names of the lineages to search, or ``None``
+        to search all of them (keyword only)
 
     :returns: Whatever was specified by `func` if a match is found.
     """
+    certnames = kwargs.pop("certnames", None)
     configs_dir = cli_config.renewal_configs_dir
     # Verify the directory is there
     util.make_or_verify_dir(configs_dir, mode=0o755, uid=os.geteuid())
 
+    if certnames is None:
+        renewal_files = storage.renewal_conf_files(cli_config)
+    else:
+        renewal_files = [storage.renewal_filename_for_lineagename(cli_config, certname)
+                         for certname in certnames]
     rv = initial_rv
-    for renewal_file in storage.renewal_conf_files(cli_config):
+    for renewal_file in renewal_files:
         try:
             candidate_lineage = storage.RenewableCert(renewal_file, cli_config)
         except (errors.CertStorageError, IOError):
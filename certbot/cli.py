@@ -915,6 +915,13 @@ def prepare_and_parse_args(plugins, args, detect_defaults=False):  # pylint: dis
              "When creating a new certificate, specifies the new certificate's name. "
              "(default: the first provided domain or the name of an existing "
              "certificate on your system for the same domains)")
+    helpful.add(
+        "certificates", "--format", dest="output_format",
+        choices=["text", "json"], default=flag_default("output_format"),
+        help="Output format. With json, each certificate is printed as a "
+             "JSON object on its own line as soon as it has been checked. "
+             "The text output is only printed once all certificates have "
+             "been checked.")
     helpful.add(
         [None, "testing", "renew", "certonly"],
         "--dry-run", action="store_true", dest="dry_run",
@@ -996,6 +1003,30 @@ def prepare_and_parse_args(plugins, args, detect_defaults=False):  # pylint: dis
              "the requested domains. This may be useful for allowing renewals for "
              "multiple domains to succeed even if some domains no longer point "
              "at this system. This option cannot be used with --csr.")
+    helpful.add(
+        "automation", "--preflight-challenges", action="store_true",
+        default=flag_default("preflight_challenges"),
+        help="Before submitting http-01 and tls-sni-01 challenges to the CA,"
+             " check that they can be validated by fetching them from each"
+             " domain. Domains that fail this check are reported without"
+             " counting against the CA's failed validation limits, or left"
+             " out of the certificate with --allow-subset-of-names."
+             " (default: False)")
+    helpful.add(
+        "automation", "--no-reverse-dns", action="store_false",
+        default=flag_default("reverse_dns"), dest="reverse_dns",
+        help="Don't look up reverse DNS names for the IP addresses in your "
+             "web server configuration when offering a list of domains. "
+             "Useful with --non-interactive on hosts listening on many "
+             "public addresses.")
+    helpful.add(
+        "automation", "--no-reuse-authorizations", action="store_false",
+        default=flag_default("reuse_authorizations"), dest="reuse_authorizations",
+        help="Don't reuse the authorizations your account recently obtained "
+             "for a domain name, and always solve new challenges instead. "
+             "By default, the authorizations are remembered in the accounts "
+             "directory and reused until they expire, if the CA confirms "
+             "they are still valid. They are never reused with --dry-run.")
     helpful.add(
         "automation", "--agree-tos", dest="tos", action="store_true",
         default=flag_default("tos"),
@@ -1073,6 +1104,17 @@ def prepare_and_parse_args(plugins, args, detect_defaults=False):  # pylint: dis
     helpful.add(
         "security", "--rsa-key-size", type=int, metavar="N",
         default=flag_default("rsa_key_size"), help=config_help("rsa_key_size"))
+    helpful.add(
+        "security", "--key-type", choices=["rsa", "ecdsa"],
+        default=flag_default("key_type"), help=config_help("key_type"))
+    helpful.add(
+        "security", "--elliptic-curve",
+        choices=sorted(crypto_util.ELLIPTIC_CURVES),
+        default=flag_default("elliptic_curve"),
+        help=config_help("elliptic_curve"))
+    helpful.add(
+        ["automation", "renew"], "--key-pool-size", type=int, metavar="N",
+        default=flag_default("key_pool_size"), help=config_help("key_pool_size"))
     helpful.add(
         "security", "--must-staple", action="store_true",
         dest="must_staple", default=flag_default("must_staple"),
@@ -1144,6 +1186,15 @@ def prepare_and_parse_args(plugins, args, detect_defaults=False):  # pylint: dis
         " run if an attempt was made to obtain/renew a certificate. If"
         " multiple renewed certificates have identical post-hooks, only"
         " one will be run.")
+    helpful.add(
+        "renew", "--batch-deploy-hook",
+        help="Command to be run in a shell once after renewing"
+        " certificates, rather than once for each of them. It is given a"
+        " JSON manifest listing the live subdirectory and domains of each"
+        " renewed certificate on its standard input, and in the file named"
+        " by the shell variable $RENEWED_MANIFEST. When renewing several"
+        " certificates with the same batch deploy hook, it is run once for"
+        " all of them.")
     helpful.add("renew", "--renew-hook",
                 action=_RenewHookAction, help=argparse.SUPPRESS)
     helpful.add(
@@ -1156,6 +1207,33 @@ def prepare_and_parse_args(plugins, args, detect_defaults=False):  # pylint: dis
         ' $RENEWED_DOMAINS will contain a space-delimited list of'
         ' renewed certificate domains (for example, "example.com'
         ' www.example.com"')
+    helpful.add(
+        "renew", "--deploy-hook-workers", type=int, metavar="N",
+        default=flag_default("deploy_hook_workers"),
+        help="Maximum number of executables from the deploy hook directory"
+        " to run at the same time. A hook containing a line like"
+        ' "# certbot-after: other-hook" is only run once the named hooks'
+        " in the same directory have finished. (default: 1)")
+    helpful.add(
+        "renew", "--deploy-hook-timeout", type=int, metavar="SECONDS",
+        default=flag_default("deploy_hook_timeout"),
+        help="Kill deploy hooks still running after this many seconds,"
+        " or 0 to wait for them however long they take. (default: 0)")
+    helpful.add(
+        "renew", "--reload-after-each-renewal", action="store_true",
+        default=flag_default("reload_after_each_renewal"),
+        help="Reload the installer's server after each renewed certificate,"
+        " rather than once for every distinct server after all certificates"
+        " have been renewed. (default: False)")
+    helpful.add(
+        "renew", "--shared-challenge-config", action="store_true",
+        default=flag_default("shared_challenge_config"),
+        help="When the authenticator is also an installer, such as nginx or"
+        " apache, revert its challenge configuration after each certificate"
+        " without reloading the server, and reload it once after all"
+        " certificates have been renewed. The server is still reloaded to"
+        " add the challenge configuration of each certificate."
+        " (default: False)")
     helpful.add(
         "renew", "--disable-hook-validation",
         action="store_false", dest="validate_hooks",
@@ -1224,6 +1302,10 @@ def _create_subparsers(helpful):
                 "--checkpoints", type=int, metavar="N",
                 default=flag_default("rollback_checkpoints"),
                 help="Revert configuration N number of checkpoints.")
+    helpful.add(["rollback", "install"],
+                "--max-checkpoints", type=int, metavar="N",
+                default=flag_default("max_checkpoints"),
+                help=config_help("max_checkpoints"))
     helpful.add("plugins",
                 "--init", action="store_true", default=flag_default("init"),
                 help="Initialize plugins.")
@@ -1291,6 +1373,18 @@ def _paths_parser(helpful):
         help="Logs directory.")
     add("paths", "--server", default=flag_default("server"),
         help=config_help("server"))
+    add("paths", "--timing-report", default=flag_default("timing_report"),
+        help="Where to write a JSON report of the time spent in each phase "
+             "of the run, in total and for each certificate. Only runs of {0} "
+             "are reported. (default: {1} in the logs directory)".format(
+                 ", ".join(constants.TIMED_VERBS),
+                 constants.TIMING_REPORT.format("PID")))
+    add("paths", "--prometheus-textfile",
+        default=flag_default("prometheus_textfile"),
+        help="Also write the report of the time spent in each phase to this "
+             "file, in the format of the Prometheus node exporter's textfile "
+             "collector, which reads files ending in .prom. Only runs of {0} "
+             "are reported.".format(", ".join(constants.TIMED_VERBS)))
 
 
 def _plugins_parsing(helpful, plugins):
@@ -1,4 +1,5 @@
 """Certbot client API."""
+import contextlib
 import logging
 import os
 import platform
@@ -18,6 +19,7 @@ import certbot
 
 from certbot import account
 from certbot import auth_handler
+from certbot import authz_cache
 from certbot import cli
 from certbot import constants
 from certbot import crypto_util
@@ -27,6 +29,7 @@ from certbot import errors
 from certbot import interfaces
 from certbot import reverter
 from certbot import storage
+from certbot import timing
 from certbot import util
 
 from certbot.display import ops as display_ops
@@ -37,12 +40,62 @@ from certbot.plugins import selection as plugin_selection
 logger = logging.getLogger(__name__)
 
 
+# Accounts and ACME clients shared within a `shared_acme_clients` block
+_shared_objects = None
+
+
+@contextlib.contextmanager
+def shared_acme_clients():
+    """Share accounts and ACME clients for the duration of the block.
+
+    Certificates obtained within the block with the same server and account
+    reuse a single ACME client, and with it its connection pool, directory
+    and nonces.
+
+    """
+    global _shared_objects  # pylint: disable=global-statement
+    previous = _shared_objects
+    _shared_objects = {}
+    try:
+        yield
+    finally:
+        _shared_objects = previous
+
+
+def get_shared(key, factory):
+    """Get an object shared within a `shared_acme_clients` block.
+
+    :param tuple key: Key identifying the object
+    :param callable factory: Creates the object if it isn't shared yet
+
+    :returns: the shared object, or a new one outside of a
+        `shared_acme_clients` block
+
+    """
+    if _shared_objects is None:
+        return factory()
+    try:
+        return _shared_objects[key]
+    except KeyError:
+        obj = _shared_objects[key] = factory()
+        return obj
+
+
 def acme_from_config_key(config, key):
     "Wrangle ACME client construction"
-    # TODO: Allow for other alg types besides RS256
-    net = acme_client.ClientNetwork(key, verify_ssl=(not config.no_verify_ssl),
-                                    user_agent=determine_user_agent(config))
-    return acme_client.Client(config.server, key=key, net=net)
+    user_agent = determine_user_agent(config)
+
+    def _acme():
+        # TODO: Allow for other alg types besides RS256
+        net = acme_client.ClientNetwork(key, verify_ssl=(not config.no_verify_ssl),
+                                        user_agent=user_agent)
+        chain_cache = acme_client.ChainCache(
+            os.path.join(config.work_dir, constants.CHAIN_CACHE_DIR))
+        return acme_client.Client(config.server, key=key, net=net,
+                                  chain_cache=chain_cache)
+
+    return get_shared(("acme", config.server, key.thumbprint(),
+                       config.no_verify_ssl, user_agent), _acme)
 
 
 def determine_user_agent(config):
@@ -236,8 +289,13 @@ class Client(object):
         self.acme = acme
 
         if auth is not None:
+            cache = None
+            # A dry run must solve challenges to test the authenticator
+            if (self.account is not None and config.reuse_authorizations and
+                    not config.dry_run):
+                cache = authz_cache.AuthorizationCache(config, self.account)
             self.auth_handler = auth_handler.AuthHandler(
-                auth, self.acme, self.account, self.config.pref_challs)
+                auth, self.acme, self.account, self.config.pref_challs, cache)
         else:
             self.auth_handler = None
 
@@ -272,9 +330,10 @@ class Client(object):
         if authzr is None:
             authzr = self.auth_handler.get_authorizations(domains)
 
-        certr = self.acme.request_issuance(
-            jose.ComparableX509(
-                OpenSSL.crypto.load_certificate_request(OpenSSL.crypto.FILETYPE_PEM, csr.data)),
+        with timing.span("issuance"):
+            certr = self.acme.request_issuance(
+                jose.ComparableX509(OpenSSL.crypto.load_certificate_request(
+                    OpenSSL.crypto.FILETYPE_PEM, csr.data)),
                 authzr)
 
         notify = zope.component.getUtility(interfaces.IDisplay).notification
@@ -286,7 +345,8 @@ class Client(object):
                 notify('Failed to fetch chain, please check your network '
                        'and continue', pause=True)
             try:
-                chain = self.acme.fetch_chain(certr)
+                with timing.span("chain-fetch"):
+                    chain = self.acme.fetch_chain(certr)
                 break
             except acme_errors.Error:
                 logger.debug('Failed to fetch chain', exc_info=True)
@@ -321,16 +381,21 @@ class Client(object):
         domains = [d for d in domains if d in auth_domains]
 
         # Create CSR from names
-        if self.config.dry_run:
-            key = util.Key(file=None,
-                           pem=crypto_util.make_key(self.config.rsa_key_size))
-            csr = util.CSR(file=None, form="pem",
-                           data=acme_crypto_util.make_csr(
-                               key.pem, domains, self.config.must_staple))
-        else:
-            key = crypto_util.init_save_key(
-                self.config.rsa_key_size, self.config.key_dir)
-            csr = crypto_util.init_save_csr(key, domains, self.config.csr_dir)
+        with timing.span("key-generation"):
+            if self.config.dry_run:
+                key = util.Key(file=None,
+                               pem=crypto_util.make_key(self.config.rsa_key_size,
+                                                        self.config.key_type,
+                                                        self.config.elliptic_curve))
+                csr = util.CSR(file=None, form="pem",
+                               data=acme_crypto_util.make_csr(
+                                   key.pem, domains, self.config.must_staple))
+            else:
+                key = crypto_util.init_save_key(
+                    self.config.rsa_key_size, self.config.key_dir,
+                    key_type=self.config.key_type,
+                    elliptic_curve=self.config.elliptic_curve)
+                csr = crypto_util.init_save_csr(key, domains, self.config.csr_dir)
 
         certr, chain = self.obtain_certificate_from_csr(
             domains, csr, authzr=authzr)
@@ -368,11 +433,12 @@ class Client(object):
                         new_name)
             return None
         else:
-            return storage.RenewableCert.new_lineage(
-                new_name, OpenSSL.crypto.dump_certificate(
-                    OpenSSL.crypto.FILETYPE_PEM, certr.body.wrapped),
-                key.pem, crypto_util.dump_pyopenssl_chain(chain),
-                self.config)
+            with timing.span("archive-write"):
+                return storage.RenewableCert.new_lineage(
+                    new_name, OpenSSL.crypto.dump_certificate(
+                        OpenSSL.crypto.FILETYPE_PEM, certr.body.wrapped),
+                    key.pem, crypto_util.dump_pyopenssl_chain(chain),
+                    self.config)
 
     def save_certificate(self, certr, chain_cert,
                          cert_path, chain_path, fullchain_path):
@@ -132,6 +132,12 @@ class NamespaceConfig(object):
         return os.path.join(self.renewal_hooks_dir,
                             constants.RENEWAL_POST_HOOKS_DIR)
 
+    @property
+    def renewal_batch_deploy_hooks_dir(self):
+        """Path to the batch deploy-hook directory for the renew subcommand."""
+        return os.path.join(self.renewal_hooks_dir,
+                            constants.RENEWAL_BATCH_DEPLOY_HOOKS_DIR)
+
 
 def check_config_sanity(config):
     """Validate command line options and display error message if
@@ -55,6 +55,10 @@ CLI_DEFAULTS = dict(
     http01_address="",
     break_my_certs=False,
     rsa_key_size=2048,
+    key_type="rsa",
+    elliptic_curve="secp256r1",
+    key_pool_size=0,
+    max_checkpoints=0,
     must_staple=False,
     redirect=None,
     hsts=None,
@@ -64,6 +68,15 @@ CLI_DEFAULTS = dict(
     pref_challs=[],
     validate_hooks=True,
     directory_hooks=True,
+    deploy_hook_workers=1,
+    deploy_hook_timeout=0,
+    reverse_dns=True,
+    reuse_authorizations=True,
+    reload_after_each_renewal=False,
+    preflight_challenges=False,
+    shared_challenge_config=False,
+    timing_report=None,
+    prometheus_textfile=None,
 
     # Subparsers
     num=None,
@@ -73,6 +86,7 @@ CLI_DEFAULTS = dict(
     reason=0,
     rollback_checkpoints=1,
     init=False,
+    output_format="text",
     prepare=False,
     ifaces=None,
 
@@ -168,15 +182,58 @@ IN_PROGRESS_DIR = "IN_PROGRESS"
 KEY_DIR = "keys"
 """Directory (relative to `IConfig.config_dir`) where keys are saved."""
 
+KEY_POOL_DIR = "pool"
+"""Directory (relative to `IConfig.key_dir`) where pre-generated keys are
+spooled."""
+
 LIVE_DIR = "live"
 """Live directory, relative to `IConfig.config_dir`."""
 
+LINEAGE_INDEX = "lineage-index.json"
+"""Index of the domains and files of all lineages (relative to
+`IConfig.config_dir`)."""
+
+LINEAGE_LOCKS_DIR = "renewal-locks"
+"""Directory of the lock files of lineages being renewed (relative to
+`IConfig.config_dir`)."""
+
 TEMP_CHECKPOINT_DIR = "temp_checkpoint"
 """Temporary checkpoint directory (relative to `IConfig.work_dir`)."""
 
+CHECKPOINTS_LOCK = ".certbot-checkpoints.lock"
+"""Lock file guarding the checkpoints (relative to `IConfig.work_dir`)."""
+
+CHECKPOINT_INDEX = "checkpoints.json"
+"""Index of the finalized checkpoints (relative to `IConfig.work_dir`)."""
+
+CHAIN_CACHE_DIR = "chain_cache"
+"""Cache of the intermediate certificates fetched from the CA (relative
+to `IConfig.work_dir`)."""
+
+INTROSPECTION_CACHE = "installer-introspection.json"
+"""Cached results of installer introspection commands (relative to
+`IConfig.work_dir`)."""
+
+TIMING_REPORT = "timing-report-{0}.json"
+"""Default location of the report of the durations of the phases of a
+run, formatted with its process ID, as runs of `SHARED_LOCK_VERBS` may
+overlap (relative to `IConfig.logs_dir`)."""
+
+TIMED_VERBS = ["certonly", "renew", "run"]
+"""Verbs whose runs are reported by `certbot.timing.recording`."""
+
+CHECKPOINT_OBJECTS_DIR = "checkpoint_objects"
+"""Content-addressed store of the files saved in checkpoints (relative to
+`IConfig.work_dir`)."""
+
 RENEWAL_CONFIGS_DIR = "renewal"
 """Renewal configs directory, relative to `IConfig.config_dir`."""
 
+SHARED_LOCK_VERBS = ["renew"]
+"""Verbs that only take a shared lock on `IConfig.config_dir`,
+`IConfig.work_dir` and `IConfig.logs_dir`, locking each lineage they
+work on instead."""
+
 RENEWAL_HOOKS_DIR = "renewal-hooks"
 """Basename of directory containing hooks to run with the renew command."""
 
@@ -189,6 +246,10 @@ RENEWAL_DEPLOY_HOOKS_DIR = "deploy"
 RENEWAL_POST_HOOKS_DIR = "post"
 """Basename of directory containing post-hooks to run with the renew command."""
 
+RENEWAL_BATCH_DEPLOY_HOOKS_DIR = "batch-deploy"
+"""Basename of directory containing hooks to run once for all the
+certificates renewed by the renew command."""
+
 FORCE_INTERACTIVE_FLAG = "--force-interactive"
 """Flag to disable TTY checking in IDisplay."""
 
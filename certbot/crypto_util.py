@@ -13,6 +13,8 @@ import pyrfc3339
 import six
 import zope.component
 from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography import x509
 import josepy as jose
 
@@ -25,12 +27,20 @@ from certbot import util
 
 logger = logging.getLogger(__name__)
 
+ELLIPTIC_CURVES = {
+    "secp256r1": ec.SECP256R1,
+    "secp384r1": ec.SECP384R1,
+}
+"""Elliptic curves supported for ECDSA keys, by name."""
+
 
 # High level functions
-def init_save_key(key_size, key_dir, keyname="key-certbot.pem"):
+def init_save_key(key_size, key_dir, keyname="key-certbot.pem",
+                  key_type="rsa", elliptic_curve="secp256r1"):
     """Initializes and saves a privkey.
 
-    Inits key and saves it in PEM format on the filesystem.
+    Inits key and saves it in PEM format on the filesystem. A key
+    pre-generated by the `.key_pool` is used if there is one.
 
     .. note:: keyname is the attempted filename, it may be different if a file
         already exists at the path.
@@ -38,6 +48,8 @@ def init_save_key(key_size, key_dir, keyname="key-certbot.pem"):
     :param int key_size: RSA key size in bits
     :param str key_dir: Key save directory.
     :param str keyname: Filename of key
+    :param str key_type: "rsa" or "ecdsa"
+    :param str elliptic_curve: Name of the curve of ECDSA keys
 
     :returns: Key
     :rtype: :class:`certbot.util.Key`
@@ -45,11 +57,14 @@ def init_save_key(key_size, key_dir, keyname="key-certbot.pem"):
     :raises ValueError: If unable to generate the key given key_size.
 
     """
-    try:
-        key_pem = make_key(key_size)
-    except ValueError as err:
-        logger.exception(err)
-        raise err
+    from certbot import key_pool
+    key_pem = key_pool.take_key(key_size, key_type, elliptic_curve)
+    if key_pem is None:
+        try:
+            key_pem = make_key(key_size, key_type, elliptic_curve)
+        except ValueError as err:
+            logger.exception(err)
+            raise err
 
     config = zope.component.getUtility(interfaces.IConfig)
     # Save file
@@ -59,7 +74,10 @@ def init_save_key(key_size, key_dir, keyname="key-certbot.pem"):
         os.path.join(key_dir, keyname), 0o600, "wb")
     with key_f:
         key_f.write(key_pem)
-    logger.debug("Generating key (%d bits): %s", key_size, key_path)
+    if key_type == "ecdsa":
+        logger.debug("Generating key (%s): %s", elliptic_curve, key_path)
+    else:
+        logger.debug("Generating key (%d bits): %s", key_size, key_path)
 
     return util.Key(key_path, key_pem)
 
@@ -169,15 +187,34 @@ def import_csr_file(csrfile, data):
     return PEM, util.CSR(file=csrfile, data=data_pem, form="pem"), domains
 
 
-def make_key(bits):
-    """Generate PEM encoded RSA key.
+def make_key(bits, key_type="rsa", elliptic_curve="secp256r1"):
+    """Generate PEM encoded RSA or ECDSA key.
 
-    :param int bits: Number of bits, at least 1024.
+    :param int bits: Number of bits of RSA keys, at least 1024.
+    :param str key_type: "rsa" or "ecdsa"
+    :param str elliptic_curve: Name of the curve of ECDSA keys, one of
+        `ELLIPTIC_CURVES`
 
-    :returns: new RSA key in PEM form with specified number of bits
+    :returns: new key in PEM form
     :rtype: str
 
+    :raises ValueError: If the key type or curve is not supported.
+
     """
+    if key_type == "ecdsa":
+        try:
+            curve = ELLIPTIC_CURVES[elliptic_curve]
+        except KeyError:
+            raise ValueError(
+                "Unsupported elliptic curve: {0}".format(elliptic_curve))
+        key = ec.generate_private_key(curve(), default_backend())
+        return key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.TraditionalOpenSSL,
+            encryption_algorithm=serialization.NoEncryption())
+    elif key_type != "rsa":
+        raise ValueError("Unsupported key type: {0}".format(key_type))
+
     assert bits >= 1024  # XXX
     key = OpenSSL.crypto.PKey()
     key.generate_key(OpenSSL.crypto.TYPE_RSA, bits)
@@ -185,7 +222,7 @@ def make_key(bits):
 
 
 def valid_privkey(privkey):
-    """Is valid RSA private key?
+    """Is valid RSA or ECDSA private key?
 
     :param str privkey: Private key file contents in PEM
 
@@ -194,9 +231,15 @@ def valid_privkey(privkey):
 
     """
     try:
-        return OpenSSL.crypto.load_privatekey(
-            OpenSSL.crypto.FILETYPE_PEM, privkey).check()
-    except (TypeError, OpenSSL.crypto.Error):
+        key = OpenSSL.crypto.load_privatekey(
+            OpenSSL.crypto.FILETYPE_PEM, privkey)
+        if key.type() == OpenSSL.crypto.TYPE_RSA:
+            return key.check()
+        # pyOpenSSL can only check the consistency of RSA keys
+        return isinstance(serialization.load_pem_private_key(
+            privkey, password=None, backend=default_backend()),
+                          ec.EllipticCurvePrivateKey)
+    except (TypeError, ValueError, OpenSSL.crypto.Error):
         return False
 
 
@@ -1,24 +1,34 @@
 """Facilities for implementing hooks that call shell commands."""
 from __future__ import print_function
 
+import json
 import logging
 import os
+import re
+import signal
+import tempfile
+import threading
 
 from subprocess import Popen, PIPE
 
 from certbot import errors
+from certbot import timing
 from certbot import util
 
 from certbot.plugins import util as plug_util
 
 logger = logging.getLogger(__name__)
 
+_AFTER_RE = re.compile(br"^#\s*certbot-after:(.*)$", re.IGNORECASE | re.MULTILINE)
+"""Matches the header lines declaring the hooks a deploy hook runs after."""
+
 
 def validate_hooks(config):
     """Check hook commands are executable."""
     validate_hook(config.pre_hook, "pre")
     validate_hook(config.post_hook, "post")
     validate_hook(config.deploy_hook, "deploy")
+    validate_hook(config.batch_deploy_hook, "batch-deploy")
     validate_hook(config.renew_hook, "renew")
 
 
@@ -161,7 +171,8 @@ def deploy_hook(config, domains, lineage_path):
     """
     if config.deploy_hook:
         _run_deploy_hook(config.deploy_hook, domains,
-                         lineage_path, config.dry_run)
+                         lineage_path, config.dry_run,
+                         config.deploy_hook_timeout)
 
 
 def renew_hook(config, domains, lineage_path):
@@ -170,7 +181,9 @@ def renew_hook(config, domains, lineage_path):
     This function runs any hooks found in
     config.renewal_deploy_hooks_dir followed by any renew-hook in the
     config. If the renew-hook in the config is a path to a script in
-    config.renewal_deploy_hooks_dir, it is not run twice.
+    config.renewal_deploy_hooks_dir, it is not run twice. Up to
+    config.deploy_hook_workers hooks from the directory are run at once
+    (see :func:`_run_deploy_hooks`).
 
     If Certbot is doing a dry run, no hooks are run and messages are
     logged saying that they were skipped.
@@ -183,9 +196,9 @@ def renew_hook(config, domains, lineage_path):
     """
     executed_dir_hooks = set()
     if config.directory_hooks:
-        for hook in list_hooks(config.renewal_deploy_hooks_dir):
-            _run_deploy_hook(hook, domains, lineage_path, config.dry_run)
-            executed_dir_hooks.add(hook)
+        dir_hooks = list_hooks(config.renewal_deploy_hooks_dir)
+        _run_deploy_hooks(config, dir_hooks, domains, lineage_path)
+        executed_dir_hooks.update(dir_hooks)
 
     if config.renew_hook:
         if config.renew_hook in executed_dir_hooks:
@@ -193,21 +206,129 @@ def renew_hook(config, domains, lineage_path):
                         config.renew_hook)
         else:
             _run_deploy_hook(config.renew_hook, domains,
-                             lineage_path, config.dry_run)
+                             lineage_path, config.dry_run,
+                             config.deploy_hook_timeout)
+
+
+def _run_deploy_hooks(config, hooks, domains, lineage_path):
+    """Run deploy hooks from the hook directory, several at once.
+
+    Up to config.deploy_hook_workers hooks are run at the same time,
+    taken in alphabetical order. A hook declaring that it runs after
+    other hooks (see :func:`_hook_dependencies`) is only started once
+    they have finished.
+
+    :param configuration.NamespaceConfig config: Certbot settings
+    :param list hooks: paths of the hooks
+    :param domains: domains in the obtained certificate
+    :type domains: `list` of `str`
+    :param str lineage_path: live directory path for the new cert
+
+    """
+    ordered, after = _order_hooks(hooks)
+    finished = dict((hook, threading.Event()) for hook in ordered)
+    # Hooks run on other threads are timed as part of this lineage as well
+    lineagename = timing.current_lineage()
+
+    def _run(hook):
+        # Hooks are started in order, so these are running or finished
+        for dependency in after[hook]:
+            while not finished[dependency].is_set():
+                finished[dependency].wait(1)
+        try:
+            with timing.lineage(lineagename):
+                _run_deploy_hook(hook, domains, lineage_path, config.dry_run,
+                                 config.deploy_hook_timeout)
+        finally:
+            finished[hook].set()
+
+    for _ in util.parallel_map(_run, ordered,
+                               max(1, config.deploy_hook_workers)):
+        pass
+
 
+def _order_hooks(hooks):
+    """Order hooks so each comes after the hooks it depends on.
 
-def _run_deploy_hook(command, domains, lineage_path, dry_run):
+    Hooks are otherwise kept in alphabetical order. Dependencies on
+    hooks that don't exist are ignored, and so are dependencies
+    forming a cycle, after logging a warning.
+
+    :param list hooks: sorted paths of the hooks
+
+    :returns: the ordered paths, and the paths of the hooks each one
+        must wait for
+    :rtype: `tuple` of `list` and `dict`
+
+    """
+    by_name = dict((os.path.basename(hook), hook) for hook in hooks)
+    after = {}
+    for hook in hooks:
+        after[hook] = []
+        for name in _hook_dependencies(hook):
+            if name not in by_name:
+                logger.debug("Deploy hook %s runs after unknown hook %s",
+                             hook, name)
+            elif by_name[name] != hook:
+                after[hook].append(by_name[name])
+
+    ordered = []
+    pending = list(hooks)
+    while pending:
+        ready = [hook for hook in pending
+                 if all(dependency in ordered for dependency in after[hook])]
+        if ready:
+            hook = ready[0]
+        else:
+            hook = pending[0]
+            logger.warning("Deploy hooks depend on each other in a cycle; "
+                           "running %s first", hook)
+            after[hook] = [dependency for dependency in after[hook]
+                           if dependency in ordered]
+        pending.remove(hook)
+        ordered.append(hook)
+    return ordered, after
+
+
+def _hook_dependencies(path):
+    """Find the names of the hooks a deploy hook must run after.
+
+    They are listed in lines like ``# certbot-after: 10-dns 20-cdn``
+    near the top of the hook.
+
+    :param str path: path to the hook
+
+    :returns: names of hooks in the same directory
+    :rtype: `list` of `str`
+
+    """
+    try:
+        with open(path, "rb") as hook_file:
+            head = hook_file.read(4096)
+    except IOError:
+        logger.debug("Unable to read deploy hook %s", path, exc_info=True)
+        return []
+    names = []
+    for match in _AFTER_RE.finditer(head):
+        names.extend(name.decode("utf-8", "replace")
+                     for name in match.group(1).replace(b",", b" ").split())
+    return names
+
+
+def _run_deploy_hook(command, domains, lineage_path, dry_run, timeout=0):
     """Run the specified deploy-hook (if not doing a dry run).
 
     If dry_run is True, command is not run and a message is logged
     saying that it was skipped. If dry_run is False, the hook is run
-    after setting the appropriate environment variables.
+    with the appropriate environment variables set.
 
     :param str command: command to run as a deploy-hook
     :param domains: domains in the obtained certificate
     :type domains: `list` of `str`
     :param str lineage_path: live directory path for the new cert
     :param bool dry_run: True iff Certbot is doing a dry run
+    :param int timeout: seconds after which the hook is killed, or 0 to
+        let it run until it exits
 
     """
     if dry_run:
@@ -215,10 +336,79 @@ def _run_deploy_hook(command, domains, lineage_path, dry_run):
                        command)
         return
 
-    os.environ["RENEWED_DOMAINS"] = " ".join(domains)
-    os.environ["RENEWED_LINEAGE"] = lineage_path
+    env = dict(os.environ)
+    env["RENEWED_DOMAINS"] = " ".join(domains)
+    env["RENEWED_LINEAGE"] = lineage_path
     logger.info("Running deploy-hook command: %s", command)
-    _run_hook(command)
+    execute(command, env=env, timeout=timeout)
+
+
+def batch_deploy_hook(config, domains, lineage_path):
+    """Register batch deploy hooks to be run for a renewed certificate.
+
+    Executables found in config.renewal_batch_deploy_hooks_dir and any
+    batch-deploy-hook in the config are run once at the end of the renew
+    subcommand, by :func:`run_saved_batch_deploy_hooks`, for all the
+    certificates they were registered for. For certonly and run, which
+    renew at most one certificate, they are run right away.
+
+    :param configuration.NamespaceConfig config: Certbot settings
+    :param domains: domains in the obtained certificate
+    :type domains: `list` of `str`
+    :param str lineage_path: live directory path for the new cert
+
+    """
+    commands = []
+    if config.directory_hooks:
+        commands.extend(list_hooks(config.renewal_batch_deploy_hooks_dir))
+    if config.batch_deploy_hook and config.batch_deploy_hook not in commands:
+        commands.append(config.batch_deploy_hook)
+
+    renewed = {"lineage": lineage_path, "domains": list(domains)}
+    for command in commands:
+        batch_deploy_hook.eventually.setdefault(command, []).append(renewed)
+    # certonly / run
+    if config.verb != "renew":
+        run_saved_batch_deploy_hooks(config)
+
+batch_deploy_hook.eventually = util.OrderedDict()  # type: ignore
+
+
+def run_saved_batch_deploy_hooks(config):
+    """Run the batch deploy hooks registered by :func:`batch_deploy_hook`.
+
+    Each hook is run once, in the order it was first registered, with a
+    JSON manifest of the certificates it was registered for. The
+    manifest is written to the hook's standard input, and to a file
+    whose path is in the RENEWED_MANIFEST environment variable.
+
+    If Certbot is doing a dry run, no hooks are run and messages are
+    logged saying that they were skipped.
+
+    :param configuration.NamespaceConfig config: Certbot settings
+
+    """
+    while batch_deploy_hook.eventually:
+        command, renewed = batch_deploy_hook.eventually.popitem(last=False)
+        if config.dry_run:
+            logger.warning("Dry run: skipping batch deploy hook command: %s",
+                           command)
+            continue
+
+        manifest = json.dumps({"certificates": renewed}, indent=4)
+        fd, manifest_path = tempfile.mkstemp(
+            prefix="certbot-manifest-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as manifest_file:
+                manifest_file.write(manifest)
+            env = dict(os.environ)
+            env["RENEWED_MANIFEST"] = manifest_path
+            logger.info("Running batch-deploy-hook command for %d "
+                        "certificate(s): %s", len(renewed), command)
+            execute(command, env=env, timeout=config.deploy_hook_timeout,
+                    stdin=manifest)
+        finally:
+            os.remove(manifest_path)
 
 
 def _run_hook(shell_cmd):
@@ -230,20 +420,43 @@ def _run_hook(shell_cmd):
     return err
 
 
-def execute(shell_cmd):
+def execute(shell_cmd, env=None, timeout=0, stdin=None):
     """Run a command.
 
+    :param str shell_cmd: command to run in a shell
+    :param dict env: environment of the command, instead of Certbot's
+    :param int timeout: seconds after which the command and any
+        processes it started are killed, or 0 to wait until it exits
+    :param str stdin: text written to the standard input of the command
+
     :returns: `tuple` (`str` stderr, `str` stdout)"""
 
     # universal_newlines causes Popen.communicate()
     # to return str objects instead of bytes in Python 3
-    cmd = Popen(shell_cmd, shell=True, stdout=PIPE,
-                stderr=PIPE, universal_newlines=True)
-    out, err = cmd.communicate()
+    # A new session lets the command be killed with its children
+    with timing.span("hooks"):
+        cmd = Popen(shell_cmd, shell=True, stdout=PIPE,
+                    stderr=PIPE, universal_newlines=True, env=env,
+                    stdin=PIPE if stdin is not None else None,
+                    preexec_fn=os.setsid if timeout else None)
+        timed_out = threading.Event()
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, _kill, (cmd, timed_out))
+            timer.daemon = True
+            timer.start()
+        try:
+            out, err = cmd.communicate(stdin)
+        finally:
+            if timer is not None:
+                timer.cancel()
     base_cmd = os.path.basename(shell_cmd.split(None, 1)[0])
     if out:
         logger.info('Output from %s:\n%s', base_cmd, out)
-    if cmd.returncode != 0:
+    if timed_out.is_set():
+        logger.error('Hook command "%s" was killed after running for %s '
+                     'seconds', shell_cmd, timeout)
+    elif cmd.returncode != 0:
         logger.error('Hook command "%s" returned error code %d',
                      shell_cmd, cmd.returncode)
     if err:
@@ -251,6 +464,16 @@ def execute(shell_cmd):
     return (err, out)
 
 
+def _kill(cmd, timed_out):
+    """Kill the session of a command that ran for too long."""
+    timed_out.set()
+    try:
+        os.killpg(cmd.pid, signal.SIGKILL)
+    except OSError:
+        # It exited in the meantime
+        logger.debug("Unable to kill %s", cmd.pid, exc_info=True)
+
+
 def list_hooks(dir_path):
     """List paths to all hooks found in dir_path in sorted order.
 
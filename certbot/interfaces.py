@@ -203,6 +203,19 @@ class IConfig(zope.interface.Interface):
     email = zope.interface.Attribute(
         "Email used for registration and recovery contact. (default: Ask)")
     rsa_key_size = zope.interface.Attribute("Size of the RSA key.")
+    key_type = zope.interface.Attribute(
+        "Type of generated private keys, rsa or ecdsa.")
+    elliptic_curve = zope.interface.Attribute(
+        "Elliptic curve of generated ECDSA private keys.")
+    key_pool_size = zope.interface.Attribute(
+        "Number of private keys to pre-generate in the background while "
+        "renewing, for use by the following renewals. Pre-generated keys "
+        "are kept for future runs. (default: 0)")
+    max_checkpoints = zope.interface.Attribute(
+        "Maximum number of configuration checkpoints to keep. Older "
+        "checkpoints are merged together, so rolling back all of them "
+        "still restores the original configuration. 0 keeps every "
+        "checkpoint. (default: 0)")
     must_staple = zope.interface.Attribute(
         "Adds the OCSP Must Staple extension to the certificate. "
         "Autoconfigures OCSP Stapling for supported setups "
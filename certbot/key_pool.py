@@ -0,0 +1,224 @@
+"""Pre-generation of private keys in a spool directory."""
+import binascii
+import contextlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from certbot import constants
+from certbot import crypto_util
+from certbot import util
+
+logger = logging.getLogger(__name__)
+
+# Pool handing out keys within a `pregenerate_keys` block
+_active_pool = None
+
+
+def _key_spec(key_size, key_type, elliptic_curve):
+    """Name of the spool directory for keys of the given type."""
+    if key_type == "ecdsa":
+        return "ecdsa-{0}".format(elliptic_curve)
+    return "rsa-{0}".format(key_size)
+
+
+class KeyPool(object):
+    """Pre-generates private keys in the background.
+
+    Keys are spooled in `.constants.KEY_POOL_DIR` below `.IConfig.key_dir`,
+    so keys generated but not used in one run are used in the next one.
+    Several processes can safely take keys from the same spool.
+
+    Keys of the type set in the configuration are generated, as well as
+    keys of the types added with `add_spec`.
+
+    :ivar str spool_root: Directory containing a spool for each key type
+
+    """
+    # Seconds between checks whether the spool needs refilling
+    POLL_INTERVAL = 1.0
+    # Seconds after which temporary files are considered abandoned
+    STALE_AGE = 3600
+
+    def __init__(self, config):
+        self.config = config
+        self.spool_root = os.path.join(config.key_dir, constants.KEY_POOL_DIR)
+        self._specs = [(config.rsa_key_size, config.key_type,
+                        config.elliptic_curve)]
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add_spec(self, key_size, key_type, elliptic_curve):
+        """Also generate keys of the given type.
+
+        :param int key_size: RSA key size in bits
+        :param str key_type: "rsa" or "ecdsa"
+        :param str elliptic_curve: Name of the curve of ECDSA keys
+
+        """
+        spec = (key_size, key_type, elliptic_curve)
+        # pylint: disable=star-args
+        if all(self._spool_dir(*spec) != self._spool_dir(*known)
+               for known in list(self._specs)):
+            self._specs.append(spec)
+
+    def start(self):
+        """Start filling the spool with keys of the configured type."""
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop generating keys.
+
+        A key that is being generated is still added to the spool.
+
+        """
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.fill()
+            except Exception:  # pylint: disable=broad-except
+                logger.debug("Failed to pre-generate keys", exc_info=True)
+                return
+            self._stop.wait(self.POLL_INTERVAL)
+
+    def fill(self):
+        """Generate keys until each spool holds `.IConfig.key_pool_size`.
+
+        Spools are filled in turn, one key at a time, so that keys of
+        every type are soon available.
+
+        """
+        # pylint: disable=star-args
+        specs = list(self._specs)
+        for spec in specs:
+            spool = self._spool_dir(*spec)
+            util.make_or_verify_dir(spool, 0o700, os.geteuid(),
+                                    self.config.strict_permissions)
+            self._remove_stale(spool)
+        while specs and not self._stop.is_set():
+            spec = specs.pop(0)
+            spool = self._spool_dir(*spec)
+            spooled = [name for name in os.listdir(spool)
+                       if name.endswith(".pem")]
+            if len(spooled) >= self.config.key_pool_size:
+                continue
+            key_pem = crypto_util.make_key(*spec)
+            # Only complete keys may appear under a .pem name
+            fd, tmp_path = tempfile.mkstemp(prefix=".new-", dir=spool)
+            with os.fdopen(fd, "wb") as key_f:
+                key_f.write(key_pem)
+            os.rename(tmp_path, os.path.join(spool, "{0}.pem".format(
+                binascii.hexlify(os.urandom(8)).decode("ascii"))))
+            specs.append(spec)
+
+    def _remove_stale(self, spool):
+        """Remove temporary files left behind by interrupted processes."""
+        for name in os.listdir(spool):
+            path = os.path.join(spool, name)
+            try:
+                if (name.startswith(".") and
+                        time.time() - os.path.getmtime(path) > self.STALE_AGE):
+                    os.remove(path)
+            except OSError:
+                logger.debug("Failed to remove %s", path, exc_info=True)
+
+    def take(self, key_size, key_type, elliptic_curve):
+        """Take a key out of the spool.
+
+        :param int key_size: RSA key size in bits
+        :param str key_type: "rsa" or "ecdsa"
+        :param str elliptic_curve: Name of the curve of ECDSA keys
+
+        :returns: key in PEM form, or None if no key of the type is spooled
+        :rtype: str
+
+        """
+        spool = self._spool_dir(key_size, key_type, elliptic_curve)
+        try:
+            names = sorted(os.listdir(spool))
+        except OSError:
+            return None
+        for name in names:
+            if not name.endswith(".pem"):
+                continue
+            claimed = os.path.join(
+                spool, ".claimed-{0}-{1}".format(os.getpid(), name))
+            try:
+                os.rename(os.path.join(spool, name), claimed)
+            except OSError:
+                # Taken by another process in the meantime
+                continue
+            try:
+                with open(claimed, "rb") as key_f:
+                    key_pem = key_f.read()
+            finally:
+                os.remove(claimed)
+            if crypto_util.valid_privkey(key_pem):
+                logger.debug("Using pre-generated key %s", name)
+                return key_pem
+        return None
+
+    def _spool_dir(self, key_size, key_type, elliptic_curve):
+        return os.path.join(
+            self.spool_root, _key_spec(key_size, key_type, elliptic_curve))
+
+
+@contextlib.contextmanager
+def pregenerate_keys(config):
+    """Pre-generate keys in the background for the duration of the block.
+
+    Keys are only pre-generated if `.IConfig.key_pool_size` is set.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+
+    """
+    global _active_pool  # pylint: disable=global-statement
+    if not config.key_pool_size:
+        yield
+        return
+    previous = _active_pool
+    _active_pool = KeyPool(config)
+    _active_pool.start()
+    try:
+        yield
+    finally:
+        _active_pool.stop()
+        _active_pool = previous
+
+
+def expect_keys(key_size, key_type, elliptic_curve):
+    """Pre-generate keys of the given type too, within the current block.
+
+    Does nothing outside of a `pregenerate_keys` block.
+
+    :param int key_size: RSA key size in bits
+    :param str key_type: "rsa" or "ecdsa"
+    :param str elliptic_curve: Name of the curve of ECDSA keys
+
+    """
+    if _active_pool is not None:
+        _active_pool.add_spec(key_size, key_type, elliptic_curve)
+
+
+def take_key(key_size, key_type, elliptic_curve):
+    """Take a pre-generated key, if there is one.
+
+    :param int key_size: RSA key size in bits
+    :param str key_type: "rsa" or "ecdsa"
+    :param str elliptic_curve: Name of the curve of ECDSA keys
+
+    :returns: key in PEM form, or None outside of a `pregenerate_keys`
+        block or if no key of the type is spooled
+    :rtype: str
+
+    """
+    if _active_pool is None:
+        return None
+    return _active_pool.take(key_size, key_type, elliptic_curve)
@@ -0,0 +1,315 @@
+"""Persistent index from domain names and file paths to lineages."""
+import contextlib
+import errno
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+
+from certbot import constants
+from certbot import errors
+from certbot import lock
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+"""Version of the index file format."""
+
+LOCK_TIMEOUT = 10
+"""Seconds to wait for other processes to finish updating the index."""
+
+
+class LineageIndex(object):
+    """Index of the domain names and files of every lineage.
+
+    The index is a hint: callers should load the lineages it returns
+    and check that they really match.
+
+    :ivar dict lineages: maps each lineage name to a dict with its
+        domain names as "names" and the paths of its certificate files
+        as "paths"
+    :ivar str generation: digest of the stat data of the renewal
+        configuration directory and files the index was built for
+
+    """
+    def __init__(self, lineages=None, generation=None):
+        self.lineages = lineages if lineages is not None else {}
+        self.generation = generation
+        # Inverted from lineages, so lookups don't scan every entry
+        self._by_domain = {}
+        self._by_path = {}
+        for lineagename, entry in self.lineages.items():
+            self._index_entry(lineagename, entry)
+
+    def _index_entry(self, lineagename, entry):
+        for name in entry["names"]:
+            self._by_domain.setdefault(name, set()).add(lineagename)
+        for path in entry["paths"]:
+            self._by_path.setdefault(path, set()).add(lineagename)
+
+    def _unindex_entry(self, lineagename, entry):
+        for inverted, keys in ((self._by_domain, entry["names"]),
+                               (self._by_path, entry["paths"])):
+            for key in keys:
+                lineagenames = inverted.get(key, set())
+                lineagenames.discard(lineagename)
+                if not lineagenames:
+                    inverted.pop(key, None)
+
+    def set(self, lineage):
+        """Add lineage to the index, or update its entry.
+
+        :param `.storage.RenewableCert` lineage: lineage to add
+
+        """
+        try:
+            names = lineage.names()
+        except Exception:  # pylint: disable=broad-except
+            # The lineage can still be found by its paths
+            logger.debug("Unable to read the names of %s", lineage.lineagename,
+                         exc_info=True)
+            names = []
+        archive_dir = lineage.archive_dir
+        try:
+            archive_files = [
+                os.path.join(archive_dir, f) for f in os.listdir(archive_dir)
+                if re.match("(cert|fullchain)[0-9]*.pem", f)]
+        except OSError:
+            archive_files = []
+        self.remove(lineage.lineagename)
+        entry = self.lineages[lineage.lineagename] = {
+            "names": names,
+            "paths": sorted(set([lineage.fullchain_path, lineage.cert_path] +
+                                archive_files)),
+        }
+        self._index_entry(lineage.lineagename, entry)
+
+    def remove(self, lineagename):
+        """Remove a lineage from the index.
+
+        :param str lineagename: name of the lineage
+
+        """
+        entry = self.lineages.pop(lineagename, None)
+        if entry is not None:
+            self._unindex_entry(lineagename, entry)
+
+    def rename(self, lineagename, new_lineagename):
+        """Record that a lineage was renamed.
+
+        :param str lineagename: old name of the lineage
+        :param str new_lineagename: new name of the lineage
+
+        """
+        entry = self.lineages.get(lineagename)
+        if entry is not None:
+            self.remove(lineagename)
+            self.remove(new_lineagename)
+            self.lineages[new_lineagename] = entry
+            self._index_entry(new_lineagename, entry)
+
+    def lineages_for_domains(self, domains):
+        """Find the lineages with at least one of the domain names.
+
+        :param domains: domain names
+        :type domains: `list` of `str`
+
+        :returns: names of the lineages, sorted
+        :rtype: `list` of `str`
+
+        """
+        lineagenames = set()
+        for domain in domains:
+            lineagenames.update(self._by_domain.get(domain, ()))
+        return sorted(lineagenames)
+
+    def lineages_for_path(self, path):
+        """Find the lineages with a certificate file at path.
+
+        :param str path: path to a certificate or full chain
+
+        :returns: names of the lineages, sorted
+        :rtype: `list` of `str`
+
+        """
+        return sorted(self._by_path.get(path, ()))
+
+
+def _index_path(config):
+    return os.path.join(config.config_dir, constants.LINEAGE_INDEX)
+
+
+def _generation(config):
+    """Identify the current contents of the renewal configuration directory.
+
+    Lineages are created, renamed, deleted and saved by replacing their
+    renewal configuration files, which changes the modification time of
+    the directory. The stat data of each file is included as well, so
+    that files edited in place, or replaced within the same tick of a
+    coarse directory modification time, are noticed.
+
+    """
+    configs_dir = config.renewal_configs_dir
+    try:
+        stats = [repr(os.stat(configs_dir).st_mtime)]
+        for name in sorted(os.listdir(configs_dir)):
+            if name.endswith(".conf"):
+                stat = os.stat(os.path.join(configs_dir, name))
+                stats.append("{0}:{1!r}:{2}:{3}".format(
+                    name, stat.st_mtime, stat.st_size, stat.st_ino))
+    except OSError:
+        return None
+    return hashlib.sha256("\n".join(stats).encode("utf-8")).hexdigest()
+
+
+def _read(config):
+    """Read the index file.
+
+    :returns: the index, or ``None`` if it is missing or unreadable
+    :rtype: LineageIndex
+
+    """
+    try:
+        with open(_index_path(config)) as index_file:
+            data = json.load(index_file)
+        if data.get("version") != INDEX_VERSION:
+            return None
+        return LineageIndex(data["lineages"], data["generation"])
+    except (IOError, OSError, ValueError, KeyError, AttributeError):
+        logger.debug("Unable to read lineage index", exc_info=True)
+        return None
+
+
+def _write(config, index):
+    """Atomically replace the index file."""
+    index_path = _index_path(config)
+    try:
+        fd, temp_path = tempfile.mkstemp(
+            prefix=".lineage-index-", dir=os.path.dirname(index_path))
+    except (IOError, OSError):
+        logger.debug("Unable to write lineage index", exc_info=True)
+        return
+    try:
+        with os.fdopen(fd, "w") as index_file:
+            json.dump({"version": INDEX_VERSION,
+                       "generation": index.generation,
+                       "lineages": index.lineages}, index_file, sort_keys=True)
+        os.rename(temp_path, index_path)
+    except Exception:  # pylint: disable=broad-except
+        logger.debug("Unable to write lineage index", exc_info=True)
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def _invalidate(config):
+    """Make sure the index is rebuilt before it is used again."""
+    try:
+        os.remove(_index_path(config))
+    except OSError as error:
+        if error.errno != errno.ENOENT:
+            logger.debug("Unable to remove lineage index", exc_info=True)
+
+
+def _lock(config, timeout):
+    """Lock the index file.
+
+    :returns: the lock, or ``None`` if it couldn't be acquired in time
+    :rtype: `.lock.LockFile`
+
+    """
+    try:
+        return lock.LockFile(_index_path(config) + ".lock", timeout=timeout)
+    except errors.LockError:
+        return None
+    except (IOError, OSError):
+        logger.debug("Unable to lock lineage index", exc_info=True)
+        return None
+
+
+def rebuild(config):
+    """Build the index from all lineages and save it.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+
+    :returns: the new index
+    :rtype: LineageIndex
+
+    """
+    from certbot import storage  # pylint: disable=cyclic-import
+    # Taken first, so changes made during the scan invalidate the index
+    index = LineageIndex(generation=_generation(config))
+    for renewal_file in storage.renewal_conf_files(config):
+        try:
+            index.set(storage.RenewableCert(renewal_file, config))
+        except (errors.CertStorageError, IOError):
+            logger.debug("Renewal conf file %s is broken. Skipping.", renewal_file)
+
+    index_lock = _lock(config, 0)
+    if index_lock is not None:
+        try:
+            _write(config, index)
+        finally:
+            index_lock.release()
+    return index
+
+
+def load(config):
+    """Load the index, rebuilding it if it is out of date.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+
+    :returns: the index
+    :rtype: LineageIndex
+
+    """
+    index = _read(config)
+    if index is None or index.generation != _generation(config):
+        logger.debug("Rebuilding lineage index")
+        index = rebuild(config)
+    return index
+
+
+@contextlib.contextmanager
+def updating(config):
+    """Keep the index up to date with the lineages changed in the block.
+
+    The block receives a `LineageIndex` and must record every lineage
+    it creates, changes or removes with `LineageIndex.set` and
+    `LineageIndex.remove`. Changes made in the meantime by other
+    processes are detected, and cause the index to be rebuilt before
+    its next use.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+
+    """
+    index_lock = _lock(config, LOCK_TIMEOUT)
+    if index_lock is None:
+        logger.debug("Lineage index is locked; invalidating it")
+        try:
+            yield LineageIndex()
+        finally:
+            _invalidate(config)
+        return
+
+    succeeded = False
+    try:
+        index = _read(config)
+        if index is not None and index.generation != _generation(config):
+            # Already out of date, so it must be rebuilt anyway
+            index = None
+        yield index if index is not None else LineageIndex()
+        succeeded = True
+        if index is not None:
+            index.generation = _generation(config)
+            _write(config, index)
+    finally:
+        if not succeeded:
+            _invalidate(config)
+        index_lock.release()
@@ -0,0 +1,102 @@
+"""Atomic writes of the files and symlinks of a lineage."""
+import binascii
+import os
+
+from certbot import error_handler
+from certbot import util
+
+
+class LineageTransaction(object):
+    """Writes files and symlinks of a lineage all at once.
+
+    Writes are staged under temporary names next to their destination
+    and flushed to disk. When the transaction is committed, they are
+    renamed into place in the order they were staged, and each affected
+    directory is synced once. Replacing a path with rename means that
+    readers see either its old or its new content, never a partially
+    written file or a missing symlink.
+
+    Usage::
+
+        with LineageTransaction() as txn:
+            txn.write(path, data)
+            txn.symlink(target, link)
+
+    If the block raises an exception, the staged writes are discarded.
+
+    """
+    def __init__(self):
+        # (temporary path, destination path) pairs in staging order
+        self._staged = []
+        self._dirs = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+        return False
+
+    def _temp_path(self, path):
+        self._dirs.add(os.path.dirname(os.path.abspath(path)))
+        return "{0}.{1}.tmp".format(
+            path, binascii.hexlify(os.urandom(6)).decode("ascii"))
+
+    def write(self, path, data, chmod=None):
+        """Stage writing data to path.
+
+        :param str path: destination path
+        :param bytes data: file contents
+        :param int chmod: exact mode of the file, or ``None`` to create
+            it like `open` does
+
+        """
+        temp_path = self._temp_path(path)
+        with util.safe_open(temp_path, mode="wb",
+                            chmod=0o666 if chmod is None else chmod) as f:
+            self._staged.append((temp_path, path))
+            if chmod is not None:
+                # Not subject to the umask, unlike the mode given to os.open
+                os.fchmod(f.fileno(), chmod)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def symlink(self, target, link):
+        """Stage pointing link at target.
+
+        :param str target: the symlink's target
+        :param str link: path of the symlink
+
+        """
+        temp_path = self._temp_path(link)
+        os.symlink(target, temp_path)
+        self._staged.append((temp_path, link))
+
+    def commit(self):
+        """Move all staged files and symlinks into place."""
+        with error_handler.ErrorHandler(self.abort):
+            while self._staged:
+                temp_path, path = self._staged[0]
+                os.rename(temp_path, path)
+                self._staged.pop(0)
+        self._sync_dirs()
+
+    def abort(self):
+        """Discard all staged writes."""
+        while self._staged:
+            temp_path, _ = self._staged.pop()
+            if os.path.lexists(temp_path):
+                os.unlink(temp_path)
+
+    def _sync_dirs(self):
+        """Make the renames durable."""
+        for directory in sorted(self._dirs):
+            fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
@@ -3,19 +3,27 @@ import errno
 import fcntl
 import logging
 import os
+import time
 
 from certbot import errors
 
 logger = logging.getLogger(__name__)
 
+RETRY_INTERVAL = 0.1
+"""Seconds between attempts to acquire a lock held by another process."""
 
-def lock_dir(dir_path):
+
+def lock_dir(dir_path, shared=False, timeout=0):
     """Place a lock file on the directory at dir_path.
 
     The lock file is placed in the root of dir_path with the name
     .certbot.lock.
 
     :param str dir_path: path to directory
+    :param bool shared: whether other processes may hold a shared lock
+        on the directory at the same time
+    :param float timeout: seconds to wait for another process to
+        release the lock
 
     :returns: the locked LockFile object
     :rtype: LockFile
@@ -23,7 +31,7 @@ def lock_dir(dir_path):
     :raises errors.LockError: if unable to acquire the lock
 
     """
-    return LockFile(os.path.join(dir_path, '.certbot.lock'))
+    return LockFile(os.path.join(dir_path, '.certbot.lock'), shared, timeout)
 
 
 class LockFile(object):
@@ -33,55 +41,111 @@ class LockFile(object):
     process exits. It cannot be used to provide synchronization between
     threads. It is based on the lock_file package by Martin Horcicka.
 
+    A shared lock can be held by several processes at once, but not
+    while another process holds an exclusive lock on the same file. A
+    process holding an exclusive lock writes its PID to the file, so
+    that processes waiting for it can say who they are waiting for.
+
     """
-    def __init__(self, path):
+    def __init__(self, path, shared=False, timeout=0):
         """Initialize and acquire the lock file.
 
         :param str path: path to the file to lock
+        :param bool shared: whether to acquire a shared lock rather than
+            an exclusive one
+        :param float timeout: seconds to wait for another process to
+            release the lock
 
         :raises errors.LockError: if unable to acquire the lock
 
         """
         super(LockFile, self).__init__()
         self._path = path
+        self._shared = shared
+        self._timeout = timeout
         self._fd = None
+        self._waiting = False
 
         self.acquire()
 
     def acquire(self):
         """Acquire the lock file.
 
-        :raises errors.LockError: if lock is already held
+        :raises errors.LockError: if lock is still held by another
+            process after the timeout
         :raises OSError: if unable to open or stat the lock file
 
         """
+        deadline = time.time() + self._timeout
         while self._fd is None:
             # Open the file
-            fd = os.open(self._path, os.O_CREAT | os.O_WRONLY, 0o600)
+            # Shared locks require the file to be opened for reading
+            fd = os.open(self._path, os.O_CREAT | os.O_RDWR, 0o600)
             try:
-                self._try_lock(fd)
+                self._try_lock(fd, deadline)
                 if self._lock_success(fd):
                     self._fd = fd
+                    if not self._shared:
+                        self._write_pid(fd)
             finally:
                 # Close the file if it is not the required one
                 if self._fd is None:
                     os.close(fd)
 
-    def _try_lock(self, fd):
-        """Try to acquire the lock file without blocking.
+    def _try_lock(self, fd, deadline):
+        """Try to acquire the lock file until the deadline.
 
         :param int fd: file descriptor of the opened file to lock
+        :param float deadline: time after which to stop trying
+
+        """
+        mode = fcntl.LOCK_SH if self._shared else fcntl.LOCK_EX
+        while True:
+            try:
+                fcntl.lockf(fd, mode | fcntl.LOCK_NB)
+                return
+            except IOError as err:
+                if err.errno not in (errno.EACCES, errno.EAGAIN):
+                    raise
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    logger.debug(
+                        "A lock on %s is held by another process.", self._path)
+                    raise errors.LockError(
+                        "Another instance of Certbot is already running.")
+                if not self._waiting:
+                    self._waiting = True
+                    logger.info(
+                        "Waiting up to %d seconds for another instance of "
+                        "Certbot (%s) to release its lock on %s",
+                        remaining, self._holder(fd), self._path)
+            time.sleep(RETRY_INTERVAL)
+
+    @staticmethod
+    def _write_pid(fd):
+        """Record the PID of this process in the locked file.
+
+        :param int fd: file descriptor of the locked file
+
+        """
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+
+    @staticmethod
+    def _holder(fd):
+        """Describe the process holding a lock on the file.
+
+        :param int fd: file descriptor of the opened file
+
+        :returns: PID of the process holding an exclusive lock, if known
+        :rtype: str
 
         """
         try:
-            fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
-        except IOError as err:
-            if err.errno in (errno.EACCES, errno.EAGAIN):
-                logger.debug(
-                    "A lock on %s is held by another process.", self._path)
-                raise errors.LockError(
-                    "Another instance of Certbot is already running.")
-            raise
+            pid = os.read(fd, 32).decode("ascii", "replace").strip()
+        except OSError:
+            pid = ""
+        return "PID " + pid if pid.isdigit() else "PID unknown"
 
     def _lock_success(self, fd):
         """Did we successfully grab the lock?
@@ -130,8 +194,13 @@ class LockFile(object):
         #
         # Calling os.remove on a file that's in use doesn't work on
         # Windows, but neither does locking with fcntl.
+        #
+        # A shared lock leaves the file in place, as other processes may
+        # still hold a shared lock on it. It is removed by the next
+        # process to release an exclusive lock.
         try:
-            os.remove(self._path)
+            if not self._shared:
+                os.remove(self._path)
         finally:
             try:
                 os.close(self._fd)
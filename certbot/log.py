@@ -26,6 +26,7 @@ from acme import messages
 
 from certbot import constants
 from certbot import errors
+from certbot import lock
 from certbot import util
 
 # Logging format
@@ -133,19 +134,36 @@ def setup_log_file_handler(config, logfile, fmt):
     """
     # TODO: logs might contain sensitive data such as contents of the
     # private key! #525
-    util.set_up_core_dir(
-        config.logs_dir, 0o700, os.geteuid(), config.strict_permissions)
+    shared = config.verb in constants.SHARED_LOCK_VERBS
+    if shared:
+        # Processes sharing the logs directory append to the same log, see
+        # constants.SHARED_LOCK_VERBS. It is only rotated by a process
+        # that finds no other one using the directory.
+        exclusive_lock = _try_lock_logs_dir(config)
+    else:
+        util.set_up_core_dir(
+            config.logs_dir, 0o700, os.geteuid(), config.strict_permissions)
+        exclusive_lock = None
     log_file_path = os.path.join(config.logs_dir, logfile)
     try:
-        handler = logging.handlers.RotatingFileHandler(
-            log_file_path, maxBytes=2 ** 20,
-            backupCount=config.max_log_backups)
-    except IOError as error:
-        raise errors.Error(util.PERM_ERR_FMT.format(error))
-    # rotate on each invocation, rollover only possible when maxBytes
-    # is nonzero and backupCount is nonzero, so we set maxBytes as big
-    # as possible not to overrun in single CLI invocation (1MB).
-    handler.doRollover()  # TODO: creates empty letsencrypt.log.1 file
+        try:
+            handler = logging.handlers.RotatingFileHandler(
+                log_file_path, maxBytes=0 if shared else 2 ** 20,
+                backupCount=config.max_log_backups)
+        except IOError as error:
+            raise errors.Error(util.PERM_ERR_FMT.format(error))
+        # rotate on each invocation, rollover only possible when maxBytes
+        # is nonzero and backupCount is nonzero, so we set maxBytes as big
+        # as possible not to overrun in single CLI invocation (1MB).
+        if not shared or exclusive_lock is not None:
+            handler.doRollover()  # TODO: creates empty letsencrypt.log.1 file
+    finally:
+        if exclusive_lock is not None:
+            exclusive_lock.release()
+    if shared:
+        util.set_up_core_dir(
+            config.logs_dir, 0o700, os.geteuid(), config.strict_permissions,
+            shared_lock=True)
     handler.setLevel(logging.DEBUG)
     handler_formatter = logging.Formatter(fmt=fmt)
     handler_formatter.converter = time.gmtime  # don't use localtime
@@ -153,6 +171,28 @@ def setup_log_file_handler(config, logfile, fmt):
     return handler, log_file_path
 
 
+def _try_lock_logs_dir(config):
+    """Lock the logs directory exclusively, if no other process uses it.
+
+    :param certbot.interface.IConfig config: Configuration object
+
+    :returns: the lock, or ``None`` if the directory is in use
+    :rtype: certbot.lock.LockFile
+
+    :raises .errors.Error: if the directory cannot be made or verified
+
+    """
+    try:
+        util.make_or_verify_dir(
+            config.logs_dir, 0o700, os.geteuid(), config.strict_permissions)
+        return lock.lock_dir(config.logs_dir)
+    except errors.LockError:
+        return None
+    except OSError as error:
+        logger.debug("Exception was:", exc_info=True)
+        raise errors.Error(util.PERM_ERR_FMT.format(error))
+
+
 class ColoredStreamHandler(logging.StreamHandler):
     """Sends colored logging output to a stream.
 
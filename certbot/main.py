@@ -28,6 +28,7 @@ from certbot import log
 from certbot import renewal
 from certbot import reporter
 from certbot import storage
+from certbot import timing
 from certbot import util
 
 from certbot.display import util as display_util, ops as display_ops
@@ -483,7 +484,9 @@ def _determine_account(config):
     acme = None
 
     if config.account is not None:
-        acc = account_storage.load(config.account)
+        acc = client.get_shared(
+            ("account", config.accounts_dir, config.account),
+            lambda: account_storage.load(config.account))
     else:
         accounts = account_storage.find_all()
         if len(accounts) > 1:
@@ -1032,7 +1035,7 @@ def _csr_get_and_save_cert(config, le_client):
             certr, chain, config.cert_path, config.chain_path, config.fullchain_path)
     return cert_path, fullchain_path
 
-def renew_cert(config, plugins, lineage):
+def renew_cert(config, plugins, lineage, restart=True):
     """Renew & save an existing cert. Do not install it.
 
     :param config: Configuration object
@@ -1044,8 +1047,11 @@ def renew_cert(config, plugins, lineage):
     :param lineage: Certificate lineage object
     :type lineage: storage.RenewableCert
 
-    :returns: `None`
-    :rtype: None
+    :param bool restart: Whether to reload the installer right away, rather
+        than leaving that to the caller
+
+    :returns: the installer used for the lineage, if any
+    :rtype: `interfaces.IInstaller` or `None`
 
     :raises errors.PluginSelectionError: MissingCommandlineFlag if supplied parameters do not pass
 
@@ -1065,13 +1071,17 @@ def renew_cert(config, plugins, lineage):
     if installer is None:
         notify("new certificate deployed without reload, fullchain is {0}".format(
                lineage.fullchain), pause=False)
-    else:
+    elif restart:
         # In case of a renewal, reload server to pick up new certificate.
-        # In principle we could have a configuration option to inhibit this
-        # from happening.
-        installer.restart()
+        with timing.span("reload"):
+            installer.restart()
         notify("new certificate deployed with reload of {0} server; fullchain is {1}".format(
                config.installer, lineage.fullchain), pause=False)
+    else:
+        notify("new certificate deployed, {0} server will be reloaded once all "
+               "renewals are done; fullchain is {1}".format(
+                   config.installer, lineage.fullchain), pause=False)
+    return installer
 
 def certonly(config, plugins):
     """Authenticate & obtain cert, but do not install it.
@@ -1136,7 +1146,8 @@ def renew(config, unused_plugins):
 
     """
     try:
-        renewal.handle_renewal_request(config)
+        with renewal.sharing_scope(config):
+            renewal.handle_renewal_request(config)
     finally:
         hooks.run_saved_post_hooks()
 
@@ -1151,14 +1162,16 @@ def make_or_verify_needed_dirs(config):
     :rtype: None
 
     """
+    shared_lock = config.verb in constants.SHARED_LOCK_VERBS
     util.set_up_core_dir(config.config_dir, constants.CONFIG_DIRS_MODE,
-                         os.geteuid(), config.strict_permissions)
+                         os.geteuid(), config.strict_permissions, shared_lock)
     util.set_up_core_dir(config.work_dir, constants.CONFIG_DIRS_MODE,
-                         os.geteuid(), config.strict_permissions)
+                         os.geteuid(), config.strict_permissions, shared_lock)
 
     hook_dirs = (config.renewal_pre_hooks_dir,
                  config.renewal_deploy_hooks_dir,
-                 config.renewal_post_hooks_dir,)
+                 config.renewal_post_hooks_dir,
+                 config.renewal_batch_deploy_hooks_dir,)
     for hook_dir in hook_dirs:
         util.make_or_verify_dir(hook_dir,
                                 uid=os.geteuid(),
@@ -1226,7 +1239,8 @@ def main(cli_args=sys.argv[1:]):
     zope.component.provideUtility(report)
     util.atexit_register(report.print_messages)
 
-    return config.func(config, plugins)
+    with timing.recording(config):
+        return config.func(config, plugins)
 
 
 if __name__ == "__main__":
@@ -1,9 +1,14 @@
 """Plugin common functions."""
+import collections
+import contextlib
 import logging
 import os
 import re
 import shutil
+import socket
 import tempfile
+import threading
+import time
 
 import OpenSSL
 import pkg_resources
@@ -11,6 +16,9 @@ import zope.interface
 
 from josepy import util as jose_util
 
+from acme import crypto_util as acme_crypto_util
+from acme import errors as acme_errors
+
 from certbot import constants
 from certbot import crypto_util
 from certbot import errors
@@ -36,6 +44,156 @@ private_ips_regex = re.compile(
 hostname_regex = re.compile(
     r"^(([a-z0-9]|[a-z0-9][a-z0-9\-]*[a-z0-9])\.)*[a-z]+$", re.IGNORECASE)
 
+INSTALLER_LOCK_TIMEOUT = 300
+"""Seconds an installer waits for other Certbot processes to release the
+configuration when renewing, see `Installer.lock_config`."""
+
+REVERSE_DNS_TIMEOUT = 5
+"""Seconds to wait for all the reverse DNS lookups of a call."""
+
+REVERSE_DNS_WORKERS = 16
+"""Maximum number of reverse DNS lookups performed concurrently."""
+
+_reverse_dns_cache = {}
+_reverse_dns_lock = threading.Lock()
+
+
+def reverse_dns_lookups(addrs, timeout=REVERSE_DNS_TIMEOUT,
+                        max_workers=REVERSE_DNS_WORKERS):
+    """Concurrently find the reverse DNS names of IP addresses.
+
+    Lookups are performed by a pool of up to ``max_workers`` daemon
+    threads, and all of them are given at most ``timeout`` seconds in
+    total. Lookups that don't finish in time are abandoned rather than
+    waited for.
+    Results, including failed lookups, are cached for the lifetime of
+    the process so repeated calls don't hit the resolver again.
+
+    :param addrs: IP addresses to look up
+    :type addrs: `collections.Iterable` of `str`
+    :param float timeout: seconds to wait for all the lookups
+    :param int max_workers: maximum number of concurrent lookups
+
+    :returns: mapping of each address that could be resolved to its name
+    :rtype: dict
+
+    """
+    names = {}
+    pending = []
+    with _reverse_dns_lock:
+        for addr in set(addrs):
+            if addr not in _reverse_dns_cache:
+                pending.append(addr)
+            elif _reverse_dns_cache[addr]:
+                names[addr] = _reverse_dns_cache[addr]
+
+    results = {}
+    queue = collections.deque(pending)
+    deadline = time.time() + timeout
+    def _worker():
+        # pylint: disable=missing-docstring
+        while time.time() < deadline:
+            try:
+                addr = queue.popleft()
+            except IndexError:
+                return
+            try:
+                name = socket.gethostbyaddr(addr)[0]
+            except (socket.error, socket.herror, socket.timeout):
+                name = None
+            with _reverse_dns_lock:
+                _reverse_dns_cache[addr] = name
+                results[addr] = name
+
+    threads = []
+    for _ in range(min(max_workers, len(pending))):
+        thread = threading.Thread(target=_worker)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join(max(0, deadline - time.time()))
+
+    with _reverse_dns_lock:
+        unfinished = [addr for addr in pending if addr not in results]
+        names.update((addr, name) for addr, name in results.items() if name)
+    if unfinished:
+        logger.debug("Reverse DNS lookup timed out for %s", ", ".join(unfinished))
+    return names
+
+
+# Servers whose reload was deferred within a `shared_challenge_configs` block
+_deferred_reloads = None
+
+
+@contextlib.contextmanager
+def shared_challenge_configs(enabled=True):
+    """Defer the reloads removing challenge configurations from servers.
+
+    Within the block, installers solving challenges for several
+    certificates still revert their challenge configuration after each
+    certificate, but don't reload their server to remove it from the
+    running configuration. The server is then reloaded once for all
+    certificates, see `pop_deferred_challenge_reloads`. Reloads still
+    pending at the end of the block are done then.
+
+    :param bool enabled: Whether to defer reloads at all
+
+    """
+    global _deferred_reloads  # pylint: disable=global-statement
+    if not enabled:
+        yield
+        return
+    previous = _deferred_reloads
+    _deferred_reloads = []
+    try:
+        yield
+    finally:
+        try:
+            for installer in pop_deferred_challenge_reloads():
+                try:
+                    installer.restart()
+                except errors.Error as error:
+                    logger.error("Reloading the %s server to remove the "
+                                 "challenge configuration failed: %s",
+                                 installer.name, error)
+                    logger.debug("Traceback was:", exc_info=True)
+        finally:
+            _deferred_reloads = previous
+
+
+def defer_challenge_reload(installer):
+    """Reload a server at the end of the current block.
+
+    :param installer: Installer whose challenge configuration was just
+        reverted
+    :type installer: interfaces.IInstaller
+
+    :returns: whether the reload was deferred; if not, the caller must
+        reload the server right away
+    :rtype: bool
+
+    """
+    if _deferred_reloads is None:
+        return False
+    if installer not in _deferred_reloads:
+        _deferred_reloads.append(installer)
+    return True
+
+
+def pop_deferred_challenge_reloads():
+    """Take over the reloads deferred so far in the current block.
+
+    :returns: installers whose server must be reloaded
+    :rtype: list
+
+    """
+    if not _deferred_reloads:
+        return []
+    installers = list(_deferred_reloads)
+    del _deferred_reloads[:]
+    return installers
+
 
 @zope.interface.implementer(interfaces.IPlugin)
 class Plugin(object):
@@ -112,6 +270,49 @@ class Installer(Plugin):
         super(Installer, self).__init__(*args, **kwargs)
         self.reverter = reverter.Reverter(self.config)
 
+    def lock_config(self):
+        """Prevent other Certbot processes from changing the configuration.
+
+        Renewals may run in several processes sharing the work directory
+        (see `.constants.SHARED_LOCK_VERBS`), but only one process at a time
+        may create and revert checkpoints. Renewals wait up to
+        `INSTALLER_LOCK_TIMEOUT` seconds for the checkpoints to be released,
+        other verbs fail at once. The lock is held until exit, or until the
+        end of the enclosing `.util.lock_scope` block, which renew opens for
+        each lineage.
+
+        Installers changing the files of a server also lock them by
+        overriding this method.
+
+        :raises .errors.PluginError: when the configuration stays in use
+
+        """
+        self._lock_checkpoints()
+
+    def _lock_timeout(self):
+        """Seconds to wait for other processes to release a lock.
+
+        Only renewals, which other renewals may be running alongside,
+        wait for the configuration. Interactive verbs fail right away.
+
+        :rtype: int
+
+        """
+        if self.config.verb in constants.SHARED_LOCK_VERBS:
+            return INSTALLER_LOCK_TIMEOUT
+        return 0
+
+    def _lock_checkpoints(self):
+        # The lock can't be placed in backup_dir, where every entry is
+        # taken to be a checkpoint
+        lock_path = os.path.join(self.config.work_dir,
+                                 constants.CHECKPOINTS_LOCK)
+        try:
+            util.lock_file_until_exit(lock_path, timeout=self._lock_timeout())
+        except (OSError, errors.LockError):
+            logger.debug("Encountered error:", exc_info=True)
+            raise errors.PluginError("Unable to lock {0}".format(lock_path))
+
     def add_to_checkpoint(self, save_files, save_notes, temporary=False):
         """Add files to a checkpoint.
 
@@ -155,10 +356,15 @@ class Installer(Plugin):
         :raises .errors.PluginError: If unable to recover the configuration
 
         """
-        try:
-            self.reverter.recovery_routine()
-        except errors.ReverterError as err:
-            raise errors.PluginError(str(err))
+        # Installers are created before they lock the configuration, and
+        # the temporary checkpoint may belong to another renewal in progress
+        with util.lock_scope():
+            if os.path.isdir(self.config.work_dir):
+                self._lock_checkpoints()
+            try:
+                self.reverter.recovery_routine()
+            except errors.ReverterError as err:
+                raise errors.PluginError(str(err))
 
     def revert_temporary_config(self):
         """Rollback temporary checkpoint.
@@ -318,6 +524,12 @@ class Addr(object):
 class TLSSNI01(object):
     """Abstract base for TLS-SNI-01 challenge performers"""
 
+    SERVED_TIMEOUT = 10
+    """Seconds to wait for the server to present the challenge certificates."""
+
+    PROBE_INTERVAL = 0.1
+    """Seconds between probes of the server."""
+
     def __init__(self, configurator):
         self.configurator = configurator
         self.achalls = []
@@ -385,6 +597,56 @@ class TLSSNI01(object):
 
         return response
 
+    def wait_until_served(self, responses, hosts=None):
+        """Wait until the server presents the challenge certificates.
+
+        The server is asked for the z_domain of each response with
+        `acme.crypto_util.probe_sni` until it presents the matching
+        certificate, or :attr:`SERVED_TIMEOUT` seconds have passed.
+
+        :param list responses: :class:`acme.challenges.TLSSNI01Response`
+            of the challenges
+        :param list hosts: address of the server to probe for each
+            response, 127.0.0.1 for all of them by default
+
+        :returns: whether every certificate was presented in time
+        :rtype: bool
+
+        """
+        port = self.configurator.config.tls_sni_01_port
+        deadline = time.time() + self.SERVED_TIMEOUT
+        if hosts is None:
+            hosts = ["127.0.0.1"] * len(responses)
+        pending = list(zip(responses, hosts))
+        while True:
+            pending = [(response, host) for response, host in pending
+                       if not _is_served(response, host, port, deadline)]
+            if not pending:
+                return True
+            if time.time() >= deadline:
+                logger.warning(
+                    "The server didn't present the certificates of %d "
+                    "tls-sni-01 challenge(s) on port %d within %d seconds; "
+                    "continuing anyway", len(pending), port,
+                    self.SERVED_TIMEOUT)
+                return False
+            time.sleep(self.PROBE_INTERVAL)
+
+
+def _is_served(response, host, port, deadline):
+    """Does the server present the challenge certificate of response?"""
+    timeout = deadline - time.time()
+    if timeout <= 0:
+        return False
+    try:
+        cert = acme_crypto_util.probe_sni(
+            response.z_domain, host, port, timeout=timeout)
+    except acme_errors.Error as error:
+        logger.debug("Probing %s on %s:%d failed: %s",
+                     response.z_domain, host, port, error)
+        return False
+    return response.verify_cert(cert)
+
 
 def install_version_controlled_file(dest_path, digest_path, src_path, all_hashes):
     """Copy a file into an active location (likely the system's config dir) if required.
@@ -2,7 +2,9 @@
 import functools
 import os
 import shutil
+import socket
 import tempfile
+import time
 import unittest
 
 import josepy as jose
@@ -14,6 +16,7 @@ from acme import challenges
 from certbot import achallenges
 from certbot import crypto_util
 from certbot import errors
+from certbot import util
 
 from certbot.tests import acme_util
 from certbot.tests import util as test_util
@@ -35,6 +38,67 @@ class NamespaceFunctionsTest(unittest.TestCase):
         self.assertEqual("foo_bar_", dest_namespace("foo-bar"))
 
 
+class ReverseDNSLookupsTest(unittest.TestCase):
+    """Tests for certbot.plugins.common.reverse_dns_lookups."""
+
+    def setUp(self):
+        from certbot.plugins import common
+        common._reverse_dns_cache.clear()  # pylint: disable=protected-access
+
+    tearDown = setUp
+
+    @classmethod
+    def _call(cls, *args, **kwargs):
+        from certbot.plugins.common import reverse_dns_lookups
+        return reverse_dns_lookups(*args, **kwargs)
+
+    @mock.patch("certbot.plugins.common.socket.gethostbyaddr")
+    def test_lookups(self, mock_gethostbyaddr):
+        def _gethostbyaddr(addr):  # pylint: disable=missing-docstring
+            if addr == "8.8.8.8":
+                return ("google.com", [], [])
+            raise socket.herror
+        mock_gethostbyaddr.side_effect = _gethostbyaddr
+        self.assertEqual(self._call(["8.8.8.8", "1.2.3.4"], max_workers=1),
+                         {"8.8.8.8": "google.com"})
+
+    @mock.patch("certbot.plugins.common.socket.gethostbyaddr")
+    def test_cache(self, mock_gethostbyaddr):
+        mock_gethostbyaddr.side_effect = socket.herror
+        self.assertEqual(self._call(["1.2.3.4"]), {})
+        mock_gethostbyaddr.side_effect = None
+        mock_gethostbyaddr.return_value = ("example.org", [], [])
+        self.assertEqual(self._call(["1.2.3.4", "5.6.7.8"]),
+                         {"5.6.7.8": "example.org"})
+        self.assertEqual(self._call(["5.6.7.8"]), {"5.6.7.8": "example.org"})
+        self.assertEqual(mock_gethostbyaddr.call_count, 2)
+
+    @mock.patch("certbot.plugins.common.socket.gethostbyaddr")
+    def test_timeout(self, mock_gethostbyaddr):
+        import threading
+        event = threading.Event()
+        def _gethostbyaddr(unused_addr):  # pylint: disable=missing-docstring
+            event.wait()
+            return ("slow.example.org", [], [])
+        mock_gethostbyaddr.side_effect = _gethostbyaddr
+        self.assertEqual(self._call(["1.2.3.4"], timeout=0.01), {})
+        event.set()
+
+    @mock.patch("certbot.plugins.common.socket.gethostbyaddr")
+    def test_overall_timeout(self, mock_gethostbyaddr):
+        import threading
+        event = threading.Event()
+        def _gethostbyaddr(unused_addr):  # pylint: disable=missing-docstring
+            event.wait()
+            return ("slow.example.org", [], [])
+        mock_gethostbyaddr.side_effect = _gethostbyaddr
+        addrs = ["10.0.0.{0}".format(i) for i in range(10)]
+        start = time.time()
+        self.assertEqual(self._call(addrs, timeout=0.1, max_workers=2), {})
+        self.assertTrue(time.time() - start < 0.5)
+        event.set()
+
+
 class PluginTest(unittest.TestCase):
     """Test for certbot.plugins.common.Plugin."""
 
@@ -92,6 +156,32 @@ class InstallerTest(test_util.ConfigTestCase):
                                        name="Installer")
         self.reverter = self.installer.reverter
 
+    def test_lock_config(self):
+        os.mkdir(self.config.work_dir)
+        lock_path = os.path.join(
+            self.config.work_dir, ".certbot-checkpoints.lock")
+        with util.lock_scope():
+            self.installer.lock_config()
+            self.assertTrue(os.path.exists(lock_path))
+        self.assertFalse(os.path.exists(lock_path))
+
+    @mock.patch("certbot.plugins.common.util.lock_file_until_exit")
+    def test_lock_config_timeout(self, mock_lock):
+        from certbot.plugins.common import INSTALLER_LOCK_TIMEOUT
+        self.config.verb = "renew"
+        self.installer.lock_config()
+        self.assertEqual(mock_lock.call_args[1]["timeout"],
+                         INSTALLER_LOCK_TIMEOUT)
+        for verb in ("certonly", "run", "install", "rollback"):
+            self.config.verb = verb
+            self.installer.lock_config()
+            self.assertEqual(mock_lock.call_args[1]["timeout"], 0)
+
+    @mock.patch("certbot.plugins.common.util.lock_file_until_exit")
+    def test_lock_config_locked(self, mock_lock):
+        mock_lock.side_effect = errors.LockError
+        self.assertRaises(errors.PluginError, self.installer.lock_config)
+
     def test_add_to_real_checkpoint(self):
         files = set(("foo.bar", "baz.qux",))
         save_notes = "foo bar baz qux"
@@ -329,6 +419,110 @@ class TLSSNI01Test(unittest.TestCase):
         self.assertEqual(self.sni.get_z_domain(achall),
             achall.response(achall.account_key).z_domain.decode("utf-8"))
 
+    @mock.patch("certbot.plugins.common.time")
+    @mock.patch("certbot.plugins.common.acme_crypto_util.probe_sni")
+    def test_wait_until_served(self, mock_probe, mock_time):
+        from acme import errors as acme_errors
+        response = mock.Mock(z_domain=b"z.acme.invalid")
+        response.verify_cert.side_effect = [False, True]
+        mock_probe.side_effect = [acme_errors.Error, "cert", "cert"]
+        mock_time.time.side_effect = [0, 1, 2, 3, 4, 5, 6]
+        self.sni.configurator.config.tls_sni_01_port = 5001
+
+        self.assertTrue(self.sni.wait_until_served([response]))
+        self.assertEqual(mock_time.sleep.call_count, 2)
+        mock_probe.assert_called_with(b"z.acme.invalid", "127.0.0.1", 5001,
+                                      timeout=self.sni.SERVED_TIMEOUT - 5)
+        response.verify_cert.assert_called_with("cert")
+
+    @mock.patch("certbot.plugins.common.acme_crypto_util.probe_sni")
+    def test_wait_until_served_hosts(self, mock_probe):
+        response = mock.Mock(z_domain=b"z.acme.invalid")
+        response.verify_cert.return_value = True
+        self.sni.configurator.config.tls_sni_01_port = 5001
+
+        self.assertTrue(self.sni.wait_until_served([response], ["192.0.2.1"]))
+        self.assertEqual(mock_probe.call_args[0][:3],
+                         (b"z.acme.invalid", "192.0.2.1", 5001))
+        self.assertTrue(0 < mock_probe.call_args[1]["timeout"] <=
+                        self.sni.SERVED_TIMEOUT)
+
+    @mock.patch("certbot.plugins.common.logger")
+    @mock.patch("certbot.plugins.common.time")
+    @mock.patch("certbot.plugins.common.acme_crypto_util.probe_sni")
+    def test_wait_until_served_timeout(self, mock_probe, mock_time, mock_logger):
+        from acme import errors as acme_errors
+        mock_probe.side_effect = acme_errors.Error
+        mock_time.time.side_effect = [0, 5, 6, self.sni.SERVED_TIMEOUT,
+                                      self.sni.SERVED_TIMEOUT]
+        self.sni.configurator.config.tls_sni_01_port = 5001
+
+        self.assertFalse(self.sni.wait_until_served([mock.Mock()]))
+        self.assertEqual(mock_time.sleep.call_count, 1)
+        # Not probed once the deadline passed
+        self.assertEqual(mock_probe.call_count, 1)
+        self.assertTrue(mock_logger.warning.called)
+
+    def test_wait_until_served_nothing(self):
+        self.assertTrue(self.sni.wait_until_served([]))
+
+    def test_wait_until_served_silent_server(self):
+        # Connections are accepted by the kernel, but never answered
+        listener = socket.socket()
+        try:
+            listener.bind(("127.0.0.1", 0))
+            listener.listen(1)
+            self.sni.configurator.config.tls_sni_01_port = (
+                listener.getsockname()[1])
+            self.sni.SERVED_TIMEOUT = 1
+
+            start = time.time()
+            self.assertFalse(self.sni.wait_until_served(
+                [mock.Mock(z_domain=b"z.acme.invalid")]))
+            self.assertTrue(time.time() - start < self.sni.SERVED_TIMEOUT + 1)
+        finally:
+            listener.close()
+
+
+class SharedChallengeConfigsTest(unittest.TestCase):
+    """Tests for certbot.plugins.common.shared_challenge_configs."""
+
+    def setUp(self):
+        from certbot.plugins.common import defer_challenge_reload
+        self.defer = defer_challenge_reload
+        self.installers = [mock.Mock(), mock.Mock()]
+
+    def test_not_shared(self):
+        from certbot.plugins.common import shared_challenge_configs
+        self.assertFalse(self.defer(self.installers[0]))
+        with shared_challenge_configs(enabled=False):
+            self.assertFalse(self.defer(self.installers[0]))
+
+    def test_deferred(self):
+        from certbot.plugins.common import pop_deferred_challenge_reloads
+        from certbot.plugins.common import shared_challenge_configs
+        self.assertEqual(pop_deferred_challenge_reloads(), [])
+        with shared_challenge_configs():
+            self.assertTrue(self.defer(self.installers[0]))
+            self.assertTrue(self.defer(self.installers[0]))
+            self.assertEqual(pop_deferred_challenge_reloads(), [self.installers[0]])
+            self.assertEqual(pop_deferred_challenge_reloads(), [])
+            self.assertTrue(self.defer(self.installers[1]))
+            self.assertFalse(self.installers[1].restart.called)
+        self.assertFalse(self.installers[0].restart.called)
+        self.installers[1].restart.assert_called_once_with()
+        self.assertFalse(self.defer(self.installers[0]))
+
+    @mock.patch("certbot.plugins.common.logger")
+    def test_reload_failure(self, mock_logger):
+        from certbot.plugins.common import shared_challenge_configs
+        self.installers[0].restart.side_effect = errors.MisconfigurationError
+        with shared_challenge_configs():
+            self.defer(self.installers[0])
+            self.defer(self.installers[1])
+        self.assertTrue(mock_logger.error.called)
+        self.installers[1].restart.assert_called_once_with()
+
 
 class InstallVersionControlledFileTest(test_util.TempDirTestCase):
     """Tests for certbot.plugins.common.install_version_controlled_file."""
@@ -12,6 +12,7 @@ from acme import challenges
 
 from certbot import errors
 from certbot import interfaces
+from certbot import timing
 from certbot.display import ops
 from certbot.display import util as display_util
 from certbot.plugins import common
@@ -62,7 +63,8 @@ class DNSAuthenticator(common.Plugin):
         # the ACME server). So: we sleep for a short amount of time we believe to be long enough.
         logger.info("Waiting %d seconds for DNS changes to propagate",
                     self.conf('propagation-seconds'))
-        sleep(self.conf('propagation-seconds'))
+        with timing.span("dns-propagation"):
+            sleep(self.conf('propagation-seconds'))
 
         return responses
 
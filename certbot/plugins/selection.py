@@ -9,6 +9,7 @@ import zope.component
 
 from certbot import errors
 from certbot import interfaces
+from certbot import timing
 
 from certbot.display import util as display_util
 
@@ -183,15 +184,16 @@ def choose_configurator_plugins(config, plugins, verb):
 
     # Try to meet the user's request and/or ask them to pick plugins
     authenticator = installer = None
-    if verb == "run" and req_auth == req_inst:
-        # Unless the user has explicitly asked for different auth/install,
-        # only consider offering a single choice
-        authenticator = installer = pick_configurator(config, req_inst, plugins)
-    else:
-        if need_inst or req_inst:
-            installer = pick_installer(config, req_inst, plugins)
-        if need_auth:
-            authenticator = pick_authenticator(config, req_auth, plugins)
+    with timing.span("plugin-prepare"):
+        if verb == "run" and req_auth == req_inst:
+            # Unless the user has explicitly asked for different auth/install,
+            # only consider offering a single choice
+            authenticator = installer = pick_configurator(config, req_inst, plugins)
+        else:
+            if need_inst or req_inst:
+                installer = pick_installer(config, req_inst, plugins)
+            if need_auth:
+                authenticator = pick_authenticator(config, req_auth, plugins)
     logger.debug("Selected authenticator %s and installer %s", authenticator, installer)
 
     # Report on any failures
@@ -1,11 +1,18 @@
 """Plugin utilities."""
+import json
 import logging
 import os
+import tempfile
+import time
 
+from certbot import constants
 from certbot import util
 
 logger = logging.getLogger(__name__)
 
+# Introspection results cached by this process, by command
+_introspection_cache = {}
+
 
 def path_surgery(cmd):
     """Attempt to perform PATH surgery to find cmd
@@ -36,3 +43,124 @@ def path_surgery(cmd):
         logger.warning("Failed to find executable %s in%s PATH: %s", cmd,
                        expanded, path)
         return False
+
+
+def cached_introspection(config, command, compute, files=(), validate=None):
+    """Get the result of an installer introspection command.
+
+    Installers query their server for its version, modules and runtime
+    configuration every time they are prepared. Results are cached in
+    memory and in `IConfig.work_dir`, and reused for as long as the
+    server's binary, the first item of command, and files are unchanged.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+
+    :param list command: Introspection command, identifying the result
+    :param callable compute: Runs the command and returns its result,
+        which must be JSON serializable
+    :param list files: Other files the result depends on, such as the
+        server's main configuration file
+    :param callable validate: Called with a cached result, returns
+        whether it can be reused
+
+    :returns: the result of compute, or a cached copy of it
+
+    """
+    key = " ".join(command)
+    started = time.time()
+    binary = find_executable(command[0])
+    fingerprint = None
+    if binary is not None:
+        fingerprint = _files_fingerprint([binary] + list(files), started)
+
+    entry = _introspection_cache.get(key)
+    if entry is None:
+        entry = _read_introspection_cache(config).get(key)
+    if (fingerprint is not None and isinstance(entry, dict) and
+            entry.get("fingerprint") == fingerprint and
+            (validate is None or validate(entry.get("result")))):
+        logger.debug("Reusing the result of %s", key)
+        _introspection_cache[key] = entry
+        return entry["result"]
+
+    result = compute()
+    if fingerprint is not None:
+        entry = {"fingerprint": fingerprint, "result": result}
+        _introspection_cache[key] = entry
+        _save_introspection_cache(config, key, entry)
+    return result
+
+
+def find_executable(exe):
+    """Find the path of an executable, like `certbot.util.exe_exists`.
+
+    :param str exe: Name or path of the executable
+
+    :returns: Path of the executable, or ``None`` if it isn't found
+    :rtype: str
+
+    """
+    if os.path.dirname(exe):
+        return exe if util.is_exe(exe) else None
+    for path in os.environ["PATH"].split(os.pathsep):
+        if util.is_exe(os.path.join(path, exe)):
+            return os.path.join(path, exe)
+    return None
+
+
+def _files_fingerprint(paths, since):
+    """Get the on-disk state of files, as JSON compatible lists.
+
+    :returns: the state of the files, or ``None`` if one of them can't
+        be accessed or was modified too recently for a change made in
+        the same second to be noticed later on
+    :rtype: list
+
+    """
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_mtime >= since - 1:
+            return None
+        fingerprint.append([path, stat.st_ino, stat.st_size, stat.st_mtime])
+    return fingerprint
+
+
+def _introspection_cache_path(config):
+    return os.path.join(config.work_dir, constants.INTROSPECTION_CACHE)
+
+
+def _read_introspection_cache(config):
+    try:
+        with open(_introspection_cache_path(config)) as cache_file:
+            cache = json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _save_introspection_cache(config, key, entry):
+    """Atomically update an entry of the cache file."""
+    cache = _read_introspection_cache(config)
+    cache[key] = entry
+    cache_path = _introspection_cache_path(config)
+    try:
+        fd, temp_path = tempfile.mkstemp(
+            prefix=".introspection-", dir=os.path.dirname(cache_path))
+    except (IOError, OSError):
+        logger.debug("Unable to save introspection results", exc_info=True)
+        return
+    try:
+        with os.fdopen(fd, "w") as cache_file:
+            json.dump(cache, cache_file)
+        os.rename(temp_path, cache_path)
+    except (IOError, OSError, TypeError, ValueError):
+        logger.debug("Unable to save introspection results", exc_info=True)
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
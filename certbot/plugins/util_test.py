@@ -4,6 +4,8 @@ import unittest
 
 import mock
 
+from certbot.tests import util as test_util
+
 
 class PathSurgeryTest(unittest.TestCase):
     """Tests for certbot.plugins.path_surgery."""
@@ -30,5 +32,82 @@ class PathSurgeryTest(unittest.TestCase):
             self.assertTrue("/tmp" in os.environ["PATH"])
 
 
+class CachedIntrospectionTest(test_util.TempDirTestCase):
+    """Tests for certbot.plugins.util.cached_introspection."""
+
+    def setUp(self):
+        super(CachedIntrospectionTest, self).setUp()
+        self.config = mock.Mock(work_dir=self.tempdir)
+        self.binary = os.path.join(self.tempdir, "server")
+        self.conf = os.path.join(self.tempdir, "server.conf")
+        for path in (self.binary, self.conf):
+            with open(path, "w") as f:
+                f.write(path)
+            os.chmod(path, 0o755)
+            os.utime(path, (0, 0))
+        self.compute = mock.Mock(return_value="server/1.0")
+        self.patcher = mock.patch.dict("certbot.plugins.util._introspection_cache")
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        super(CachedIntrospectionTest, self).tearDown()
+
+    def _call(self, command=None, **kwargs):
+        from certbot.plugins.util import cached_introspection
+        return cached_introspection(
+            self.config, command or [self.binary, "-v"], self.compute,
+            files=[self.conf], **kwargs)
+
+    def test_cached(self):
+        self.assertEqual(self._call(), "server/1.0")
+        self.assertEqual(self._call(), "server/1.0")
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_persisted(self):
+        from certbot.plugins import util
+        self._call()
+        util._introspection_cache.clear()  # pylint: disable=protected-access
+        self.assertEqual(self._call(), "server/1.0")
+        self.assertEqual(self.compute.call_count, 1)
+
+    def test_changed(self):
+        self._call()
+        os.utime(self.conf, (1, 1))
+        self._call()
+        os.utime(self.binary, (1, 1))
+        self._call()
+        self.assertEqual(self.compute.call_count, 3)
+
+    def test_recently_modified(self):
+        os.utime(self.conf, None)
+        self._call()
+        self._call()
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_not_found(self):
+        with mock.patch.dict("os.environ", {"PATH": self.tempdir}):
+            self._call(["missing", "-v"])
+            self._call(["missing", "-v"])
+            self._call(["server", "-v"])
+            self._call(["server", "-v"])
+        self.assertEqual(self.compute.call_count, 3)
+
+    def test_invalid(self):
+        validate = mock.Mock(return_value=False)
+        self._call(validate=validate)
+        self._call(validate=validate)
+        validate.assert_called_once_with("server/1.0")
+        self.assertEqual(self.compute.call_count, 2)
+
+    def test_unwritable(self):
+        self.config.work_dir = os.path.join(self.tempdir, "missing")
+        self._call()
+        self.compute.return_value = object()
+        self.config.work_dir = self.tempdir
+        self._call(command=[self.binary, "-M"])
+        self.assertEqual(sorted(os.listdir(self.tempdir)), ["server", "server.conf"])
+
+
 if __name__ == "__main__":
     unittest.main()  # pragma: no cover
@@ -1,5 +1,6 @@
 """Functionality for autorenewal and associated juggling of configurations"""
 from __future__ import print_function
+import contextlib
 import copy
 import itertools
 import logging
@@ -12,13 +13,19 @@ import zope.component
 import OpenSSL
 
 from certbot import cli
+from certbot import client
+from certbot import constants
 
 from certbot import crypto_util
 from certbot import errors
 from certbot import interfaces
+from certbot import key_pool
+from certbot import lock
 from certbot import util
 from certbot import hooks
 from certbot import storage
+from certbot import timing
+from certbot.plugins import common as plugins_common
 from certbot.plugins import disco as plugins_disco
 
 logger = logging.getLogger(__name__)
@@ -30,10 +37,11 @@ logger = logging.getLogger(__name__)
 STR_CONFIG_ITEMS = ["config_dir", "logs_dir", "work_dir", "user_agent",
                     "server", "account", "authenticator", "installer",
                     "standalone_supported_challenges", "renew_hook",
-                    "pre_hook", "post_hook", "tls_sni_01_address",
-                    "http01_address"]
+                    "pre_hook", "post_hook", "batch_deploy_hook",
+                    "tls_sni_01_address",
+                    "http01_address", "key_type", "elliptic_curve"]
 INT_CONFIG_ITEMS = ["rsa_key_size", "tls_sni_01_port", "http01_port"]
-BOOL_CONFIG_ITEMS = ["must_staple", "allow_subset_of_names"]
+BOOL_CONFIG_ITEMS = ["must_staple", "allow_subset_of_names", "preflight_challenges"]
 
 CONFIG_ITEMS = set(itertools.chain(
     BOOL_CONFIG_ITEMS, INT_CONFIG_ITEMS, STR_CONFIG_ITEMS, ('pref_challs',)))
@@ -304,10 +312,12 @@ def renew_cert(config, domains, le_client, lineage):
             OpenSSL.crypto.FILETYPE_PEM, new_certr.body.wrapped)
         new_chain = crypto_util.dump_pyopenssl_chain(new_chain)
         # TODO: Check return value of save_successor
-        lineage.save_successor(prior_version, new_cert, new_key.pem, new_chain, config)
-        lineage.update_all_links_to(lineage.latest_common_version())
+        with timing.span("archive-write"):
+            lineage.save_successor(prior_version, new_cert, new_key.pem, new_chain, config)
+            lineage.update_all_links_to(lineage.latest_common_version())
 
     hooks.renew_hook(config, domains, lineage.live_dir)
+    hooks.batch_deploy_hook(config, domains, lineage.live_dir)
 
 
 def report(msgs, category):
@@ -336,8 +346,9 @@ def _renew_describe_results(config, renew_successes, renew_failures,
         notify(report(renew_skipped, "skipped"))
     if not renew_successes and not renew_failures:
         notify("No renewals were attempted.")
-        if (config.pre_hook is not None or
-                config.renew_hook is not None or config.post_hook is not None):
+        if (config.pre_hook is not None or config.renew_hook is not None or
+                config.post_hook is not None or
+                config.batch_deploy_hook is not None):
             notify("No hooks were run.")
     elif renew_successes and not renew_failures:
         notify("Congratulations, all renewals succeeded. The following certs "
@@ -365,6 +376,209 @@ def _renew_describe_results(config, renew_successes, renew_failures,
     disp.notification("\n".join(out), wrap=False)
 
 
+def _installer_key(config, name=None):
+    """Identify the server reloaded by the installer of a lineage.
+
+    Lineages using the same installer plugin with the same plugin options
+    are deployed to the same server.
+
+    :param config: Configuration of the lineage
+    :type config: interfaces.IConfig
+    :param str name: name of the plugin, if not the lineage's installer
+
+    :returns: hashable key for the installer
+    :rtype: tuple
+
+    """
+    name = config.installer if name is None else name
+    prefix = plugins_common.dest_namespace(name)
+    options = sorted((dest, repr(value)) for dest, value
+                     in six.iteritems(vars(config.namespace))
+                     if dest.startswith(prefix))
+    return name, tuple(options)
+
+
+def _lock_lineage(config, lineagename):
+    """Lock a lineage against other Certbot processes renewing it.
+
+    The lock files are kept out of the renewal configuration directory,
+    as its modification time tells whether the lineage index is current.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+
+    :param str lineagename: name of the lineage
+
+    :returns: the lock
+    :rtype: `.lock.LockFile`
+
+    :raises errors.LockError: if another process holds the lock
+
+    """
+    locks_dir = os.path.join(config.config_dir, constants.LINEAGE_LOCKS_DIR)
+    util.make_or_verify_dir(locks_dir, constants.CONFIG_DIRS_MODE,
+                            os.geteuid(), config.strict_permissions)
+    return lock.LockFile(os.path.join(locks_dir, lineagename + ".lock"))
+
+
+def _reload_installers(installers, renew_successes, renew_failures):
+    """Reload each installer used by the renewed lineages once.
+
+    Lineages whose server could not be reloaded are moved from the renewal
+    successes to the failures, as their new certificates are not in use.
+
+    :param installers: (installer, fullchain paths) values for each
+        distinct installer; servers only used to solve challenges have
+        no fullchain paths
+    :type installers: `collections.OrderedDict`
+
+    :param list renew_successes: fullchain paths of renewed lineages
+    :param list renew_failures: fullchain paths of failed lineages
+
+    """
+    disp = zope.component.getUtility(interfaces.IDisplay)
+    for (name, _), (installer, fullchains) in six.iteritems(installers):
+        try:
+            # Installers only hold their locks while processing a lineage
+            with util.lock_scope():
+                if isinstance(installer, plugins_common.Installer):
+                    installer.lock_config()
+                with timing.span("reload"):
+                    installer.restart()
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Reloading the %s server after renewing %d "
+                         "certificate(s) failed: %s", name, len(fullchains), e)
+            logger.debug("Traceback was:\n%s", traceback.format_exc())
+            for fullchain in fullchains:
+                renew_successes.remove(fullchain)
+                renew_failures.append(fullchain)
+        else:
+            if not fullchains:
+                logger.debug("Reloaded %s server to remove the challenge "
+                             "configuration", name)
+                continue
+            disp.notification(
+                "Reloaded {0} server to deploy {1} renewed certificate(s)".format(
+                    name, len(fullchains)), pause=False)
+
+
+def _process_lineage(config, renewal_file, installers):
+    """Renew the lineage of a renewal configuration file if it is due.
+
+    :param config: Configuration of the renew run
+    :type config: interfaces.IConfig
+    :param str renewal_file: path to the renewal configuration file
+    :param installers: (installer, fullchain paths) values for each
+        distinct installer, see `_reload_installers`; the servers to
+        reload for this lineage are added to it
+    :type installers: `collections.OrderedDict`
+
+    :returns: "success", "failure" or "skipped" and the fullchain path
+        of the lineage, or "parse-failure" and renewal_file, or ``None``
+        if the lineage is being processed by another process
+    :rtype: tuple
+
+    """
+    disp = zope.component.getUtility(interfaces.IDisplay)
+    disp.notification("Processing " + renewal_file, pause=False)
+    lineage_config = copy.deepcopy(config)
+    lineagename = storage.lineagename_for_filename(renewal_file)
+
+    # Note that this modifies config (to add back the configuration
+    # elements from within the renewal configuration file).
+    try:
+        with timing.lineage(lineagename):
+            with timing.span("config-parse"):
+                renewal_candidate = _reconstitute(lineage_config, renewal_file)
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning("Renewal configuration file %s (cert: %s) "
+                       "produced an unexpected error: %s. Skipping.",
+                       renewal_file, lineagename, e)
+        logger.debug("Traceback was:\n%s", traceback.format_exc())
+        return "parse-failure", renewal_file
+    if renewal_candidate is None:
+        return "parse-failure", renewal_file
+
+    lineage_lock = None
+    try:
+        # Other Certbot processes may be renewing in parallel, see
+        # constants.SHARED_LOCK_VERBS. The lineage's files are only
+        # touched while holding its lock.
+        try:
+            lineage_lock = _lock_lineage(config, lineagename)
+        except errors.LockError:
+            logger.warning("Skipping %s, it is being processed by "
+                           "another instance of Certbot.", lineagename)
+            return None
+        # XXX: ensure that each call here replaces the previous one
+        zope.component.provideUtility(lineage_config)
+        renewal_candidate.ensure_deployed()
+        if not should_renew(lineage_config, renewal_candidate):
+            return "skipped", renewal_candidate.fullchain
+        # Keys of this type are then ready for the next lineages
+        key_pool.expect_keys(lineage_config.rsa_key_size,
+                             lineage_config.key_type,
+                             lineage_config.elliptic_curve)
+        plugins = plugins_disco.PluginsRegistry.find_all()
+        from certbot import main
+        # domains have been restored into lineage_config by reconstitute
+        # but they're unnecessary anyway because renew_cert here
+        # will just grab them from the certificate
+        # we already know it's time to renew based on should_renew
+        # and we have a lineage in renewal_candidate
+        # Installer locks are released with the lineage's, so
+        # that other processes can renew lineages of the same
+        # server in the meantime
+        with util.lock_scope():
+            with timing.lineage(lineagename):
+                with timing.span("renewal"):
+                    installer = main.renew_cert(
+                        lineage_config, plugins, renewal_candidate,
+                        restart=config.reload_after_each_renewal)
+        if installer is not None and not config.reload_after_each_renewal:
+            installers.setdefault(
+                _installer_key(lineage_config), (installer, []))[1].append(
+                    renewal_candidate.fullchain)
+        return "success", renewal_candidate.fullchain
+    except Exception as e:  # pylint: disable=broad-except
+        # obtain_cert (presumably) encountered an unanticipated problem.
+        logger.warning("Attempting to renew cert (%s) from %s produced an "
+                       "unexpected error: %s. Skipping.", lineagename,
+                       renewal_file, e)
+        logger.debug("Traceback was:\n%s", traceback.format_exc())
+        return "failure", renewal_candidate.fullchain
+    finally:
+        # With --shared-challenge-config, the challenge configuration
+        # of the lineage was reverted, but is only removed from its
+        # server by the reload in handle_renewal_request
+        for challenge_installer in plugins_common.pop_deferred_challenge_reloads():
+            installers.setdefault(
+                _installer_key(lineage_config, challenge_installer.name),
+                (challenge_installer, []))
+        if lineage_lock is not None:
+            lineage_lock.release()
+
+
+@contextlib.contextmanager
+def sharing_scope(config):
+    """Share state between the lineages renewed within the block.
+
+    Lineages renewed with the same server and account share an ACME
+    client, challenge configurations are shared if
+    --shared-challenge-config is set, and keys are generated ahead
+    of the lineages that need them.
+
+    :param config: Configuration of the renew run
+    :type config: interfaces.IConfig
+
+    """
+    with client.shared_acme_clients():
+        with plugins_common.shared_challenge_configs(
+                config.shared_challenge_config):
+            with key_pool.pregenerate_keys(config):
+                yield
+
+
 def handle_renewal_request(config):
     """Examine each lineage; renew if due and report results"""
 
@@ -389,50 +603,18 @@ def handle_renewal_request(config):
     renew_failures = []
     renew_skipped = []
     parse_failures = []
+    outcomes = {"success": renew_successes, "failure": renew_failures,
+                "skipped": renew_skipped, "parse-failure": parse_failures}
+    # Installers are reloaded once all lineages have been renewed, rather
+    # than once per lineage
+    installers = util.OrderedDict()
     for renewal_file in conf_files:
-        disp = zope.component.getUtility(interfaces.IDisplay)
-        disp.notification("Processing " + renewal_file, pause=False)
-        lineage_config = copy.deepcopy(config)
-        lineagename = storage.lineagename_for_filename(renewal_file)
+        outcome = _process_lineage(config, renewal_file, installers)
+        if outcome is not None:
+            outcomes[outcome[0]].append(outcome[1])
 
-        # Note that this modifies config (to add back the configuration
-        # elements from within the renewal configuration file).
-        try:
-            renewal_candidate = _reconstitute(lineage_config, renewal_file)
-        except Exception as e:  # pylint: disable=broad-except
-            logger.warning("Renewal configuration file %s (cert: %s) "
-                           "produced an unexpected error: %s. Skipping.",
-                           renewal_file, lineagename, e)
-            logger.debug("Traceback was:\n%s", traceback.format_exc())
-            parse_failures.append(renewal_file)
-            continue
-
-        try:
-            if renewal_candidate is None:
-                parse_failures.append(renewal_file)
-            else:
-                # XXX: ensure that each call here replaces the previous one
-                zope.component.provideUtility(lineage_config)
-                renewal_candidate.ensure_deployed()
-                if should_renew(lineage_config, renewal_candidate):
-                    plugins = plugins_disco.PluginsRegistry.find_all()
-                    from certbot import main
-                    # domains have been restored into lineage_config by reconstitute
-                    # but they're unnecessary anyway because renew_cert here
-                    # will just grab them from the certificate
-                    # we already know it's time to renew based on should_renew
-                    # and we have a lineage in renewal_candidate
-                    main.renew_cert(lineage_config, plugins, renewal_candidate)
-                    renew_successes.append(renewal_candidate.fullchain)
-                else:
-                    renew_skipped.append(renewal_candidate.fullchain)
-        except Exception as e:  # pylint: disable=broad-except
-            # obtain_cert (presumably) encountered an unanticipated problem.
-            logger.warning("Attempting to renew cert (%s) from %s produced an "
-                           "unexpected error: %s. Skipping.", lineagename,
-                               renewal_file, e)
-            logger.debug("Traceback was:\n%s", traceback.format_exc())
-            renew_failures.append(renewal_candidate.fullchain)
+    _reload_installers(installers, renew_successes, renew_failures)
+    hooks.run_saved_batch_deploy_hooks(config)
 
     # Describe all the results
     _renew_describe_results(config, renew_successes, renew_failures,
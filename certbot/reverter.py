@@ -1,9 +1,13 @@
 """Reverter class saves configuration checkpoints and allows for recovery."""
 import csv
-import glob
+import errno
+import hashlib
+import json
 import logging
 import os
 import shutil
+import stat
+import tempfile
 import time
 import traceback
 
@@ -233,11 +237,11 @@ class Reverter(object):
                 # have the same filename
                 logger.debug("Creating backup of %s", filename)
                 try:
-                    shutil.copy2(filename, os.path.join(
+                    self._save_file(filename, os.path.join(
                         cp_dir, os.path.basename(filename) + "_" + str(idx)))
                     op_fd.write(filename + os.linesep)
                 # http://stackoverflow.com/questions/4726260/effective-use-of-python-shutil-copy2
-                except IOError:
+                except (IOError, OSError):
                     op_fd.close()
                     logger.error(
                         "Unable to add file %s to checkpoint %s",
@@ -251,6 +255,59 @@ class Reverter(object):
         with open(os.path.join(cp_dir, "CHANGES_SINCE"), "a") as notes_fd:
             notes_fd.write(save_notes)
 
+    def _save_file(self, filename, backup_path):
+        """Save a copy of filename at backup_path.
+
+        Copies are kept in a content-addressed store, named after the
+        hash and mode of their contents, and hard linked into the
+        checkpoints, so a file saved unchanged in many checkpoints only
+        takes space once. Checkpoints get their own copy where hard
+        links aren't supported.
+
+        :param str filename: file to save
+        :param str backup_path: path of the copy in the checkpoint
+
+        :raises IOError: if unable to save the file
+
+        """
+        objects_dir = os.path.join(
+            self.config.work_dir, constants.CHECKPOINT_OBJECTS_DIR)
+        util.make_or_verify_dir(
+            objects_dir, constants.CONFIG_DIRS_MODE, os.geteuid(),
+            self.config.strict_permissions)
+
+        object_path = os.path.join(objects_dir, _object_name(filename))
+        if not os.path.isfile(object_path):
+            # Named after what was actually copied, in case filename
+            # changed in the meantime
+            fd, temp_path = tempfile.mkstemp(dir=objects_dir, prefix=".tmp-")
+            os.close(fd)
+            try:
+                shutil.copy2(filename, temp_path)
+                object_path = os.path.join(objects_dir, _object_name(temp_path))
+                os.rename(temp_path, object_path)
+            except (IOError, OSError):
+                os.remove(temp_path)
+                raise
+        _link_or_copy(object_path, backup_path)
+
+    def _collect_garbage(self):
+        """Remove the stored files no longer used by any checkpoint."""
+        objects_dir = os.path.join(
+            self.config.work_dir, constants.CHECKPOINT_OBJECTS_DIR)
+        try:
+            names = os.listdir(objects_dir)
+        except OSError:
+            return
+        for name in names:
+            object_path = os.path.join(objects_dir, name)
+            try:
+                # The store's own link is the only one left
+                if os.stat(object_path).st_nlink == 1:
+                    os.remove(object_path)
+            except OSError:
+                logger.debug("Unable to remove %s", object_path, exc_info=True)
+
     def _read_and_append(self, filepath):  # pylint: disable=no-self-use
         """Reads the file lines and returns a file obj.
 
@@ -305,6 +362,7 @@ class Reverter(object):
             logger.error("Unable to remove directory: %s", cp_dir)
             raise errors.ReverterError(
                 "Unable to remove directory: %s" % cp_dir)
+        self._collect_garbage()
 
     def _run_undo_commands(self, filepath):  # pylint: disable=no-self-use
         """Run all commands in a file."""
@@ -542,12 +600,105 @@ class Reverter(object):
 
         # rename the directory as a timestamp
         self._timestamp_progress_dir()
+        self._compact_checkpoints()
+
+    def _compact_checkpoints(self):
+        """Merge the oldest checkpoints to keep at most IConfig.max_checkpoints.
+
+        Rolling back the merged checkpoint has the same effect as rolling
+        back each of the checkpoints it replaces, so the configuration can
+        still be restored to its state before the oldest checkpoint.
+
+        """
+        max_checkpoints = self.config.max_checkpoints
+        checkpoints = self._checkpoints()
+        if max_checkpoints <= 0 or len(checkpoints) <= max_checkpoints:
+            return
+
+        logger.debug("Merging the %d oldest checkpoints",
+                     len(checkpoints) - max_checkpoints + 1)
+        try:
+            while len(checkpoints) > max_checkpoints:
+                self._merge_checkpoints(checkpoints[0], checkpoints[1])
+                del checkpoints[1]
+            self._write_checkpoint_index(checkpoints)
+        except (IOError, OSError):
+            # Leaves the checkpoints usable, if not compact
+            logger.warning("Unable to merge old checkpoints")
+            logger.debug("Exception was:\n%s", traceback.format_exc())
+        self._collect_garbage()
+
+    def _merge_checkpoints(self, older, newer):
+        """Merge a checkpoint into the one before it.
 
-    def _checkpoint_timestamp(self):
-        "Determine the timestamp of the checkpoint, enforcing monotonicity."
+        :param str older: name of the older checkpoint, which is kept
+        :param str newer: name of the newer checkpoint, which is removed
+
+        :raises IOError: if unable to merge the checkpoints
+
+        """
+        old_dir = os.path.join(self.config.backup_dir, older)
+        new_dir = os.path.join(self.config.backup_dir, newer)
+
+        _merge_file_backups(old_dir, new_dir)
+
+        # Undo commands are run last to first, so the newer ones go last
+        for name in ("COMMANDS", "CHANGES_SINCE"):
+            if os.path.isfile(os.path.join(new_dir, name)):
+                with open(os.path.join(new_dir, name)) as src_fd:
+                    with open(os.path.join(old_dir, name), "a") as dst_fd:
+                        dst_fd.write(src_fd.read())
+
+        shutil.rmtree(new_dir)
+
+    def _checkpoints(self):
+        """List the finalized checkpoints, oldest first.
+
+        The list is kept in an index in the work directory, which is
+        rebuilt whenever the backup directory changed since it was written.
+
+        :returns: names of the checkpoint directories
+        :rtype: `list` of `str`
+
+        """
+        index_path = os.path.join(self.config.work_dir, constants.CHECKPOINT_INDEX)
+        generation = repr(os.stat(self.config.backup_dir).st_mtime)
+        try:
+            with open(index_path) as index_fd:
+                index = json.load(index_fd)
+            if index["generation"] == generation:
+                return index["checkpoints"]
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            logger.debug("Unable to read checkpoint index", exc_info=True)
+
+        checkpoints = sorted(
+            (name for name in os.listdir(self.config.backup_dir)
+             if _is_checkpoint(name)), key=float)
+        self._write_checkpoint_index(checkpoints)
+        return checkpoints
+
+    def _write_checkpoint_index(self, checkpoints):
+        """Save the list of checkpoints for the current backup directory."""
+        index_path = os.path.join(self.config.work_dir, constants.CHECKPOINT_INDEX)
+        try:
+            fd, temp_path = tempfile.mkstemp(
+                dir=self.config.work_dir, prefix=".checkpoints-")
+            with os.fdopen(fd, "w") as index_fd:
+                json.dump({
+                    "generation": repr(os.stat(self.config.backup_dir).st_mtime),
+                    "checkpoints": checkpoints}, index_fd)
+            os.rename(temp_path, index_path)
+        except (IOError, OSError):
+            logger.debug("Unable to write checkpoint index", exc_info=True)
+
+    def _checkpoint_timestamp(self, others):
+        """Determine the timestamp of the checkpoint, enforcing monotonicity.
+
+        :param list others: names of the existing checkpoints
+
+        """
         timestamp = str(time.time())
-        others = glob.glob(os.path.join(self.config.backup_dir, "[0-9]*"))
-        others = [os.path.basename(d) for d in others]
+        others = list(others)
         others.append(timestamp)
         others.sort()
         if others[-1] != timestamp:
@@ -569,11 +720,13 @@ class Reverter(object):
         # It is possible save checkpoints faster than 1 per second resulting in
         # collisions in the naming convention.
 
+        checkpoints = self._checkpoints()
         for _ in six.moves.range(2):
-            timestamp = self._checkpoint_timestamp()
+            timestamp = self._checkpoint_timestamp(checkpoints)
             final_dir = os.path.join(self.config.backup_dir, timestamp)
             try:
                 os.rename(self.config.in_progress_dir, final_dir)
+                self._write_checkpoint_index(checkpoints + [timestamp])
                 return
             except OSError:
                 logger.warning("Extreme, unexpected race condition, retrying (%s)", timestamp)
@@ -584,3 +737,70 @@ class Reverter(object):
             self.config.in_progress_dir, final_dir)
         raise errors.ReverterError(
             "Unable to finalize checkpoint renaming")
+
+
+def _object_name(path):
+    """Name a stored copy of path after its contents and mode."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file_fd:
+        for block in iter(lambda: file_fd.read(65536), b""):
+            digest.update(block)
+    return "{0}-{1:o}".format(
+        digest.hexdigest(), stat.S_IMODE(os.stat(path).st_mode))
+
+
+def _merge_file_backups(old_dir, new_dir):
+    """Merge the FILEPATHS and NEW_FILES of new_dir into old_dir.
+
+    The older checkpoint's copies predate the newer's changes, and
+    files it created are removed after all copies are restored, so
+    only paths old_dir doesn't already restore are merged.
+
+    """
+    old_paths = _read_lines(os.path.join(old_dir, "FILEPATHS"))
+    restored = set(old_paths).union(
+        _read_lines(os.path.join(old_dir, "NEW_FILES")))
+
+    with open(os.path.join(old_dir, "FILEPATHS"), "a") as paths_fd:
+        idx = len(old_paths)
+        for new_idx, path in enumerate(
+                _read_lines(os.path.join(new_dir, "FILEPATHS"))):
+            if path in restored:
+                continue
+            _link_or_copy(
+                os.path.join(new_dir, os.path.basename(path) + "_" + str(new_idx)),
+                os.path.join(old_dir, os.path.basename(path) + "_" + str(idx)))
+            paths_fd.write(path + os.linesep)
+            idx += 1
+
+    with open(os.path.join(old_dir, "NEW_FILES"), "a") as new_fd:
+        for path in _read_lines(os.path.join(new_dir, "NEW_FILES")):
+            if path not in restored:
+                new_fd.write(path + os.linesep)
+
+
+def _link_or_copy(src, dst):
+    """Hard link src to dst, or copy it where links aren't supported."""
+    try:
+        os.link(src, dst)
+    except OSError as error:
+        if error.errno == errno.EEXIST:
+            raise
+        shutil.copy2(src, dst)
+
+
+def _is_checkpoint(name):
+    """Is name the name of a finalized checkpoint directory?"""
+    try:
+        float(name)
+    except ValueError:
+        return False
+    return True
+
+
+def _read_lines(path):
+    """Read the lines of path, or none if it doesn't exist."""
+    if not os.path.isfile(path):
+        return []
+    with open(path) as file_fd:
+        return file_fd.read().splitlines()
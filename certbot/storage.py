@@ -18,6 +18,8 @@ from certbot import constants
 from certbot import crypto_util
 from certbot import errors
 from certbot import error_handler
+from certbot import lineage_index
+from certbot import lineage_transaction
 from certbot import util
 
 from certbot.plugins import common as plugins_common
@@ -39,7 +41,7 @@ def renewal_conf_files(config):
     :rtype: `list` of `str`
 
     """
-    return glob.glob(os.path.join(config.renewal_configs_dir, "*.conf"))
+    return sorted(glob.glob(os.path.join(config.renewal_configs_dir, "*.conf")))
 
 def renewal_file_for_certname(config, certname):
     """Return /path/to/certname.conf in the renewal conf directory"""
@@ -95,7 +97,8 @@ def add_time_interval(base_time, interval, textparser=parsedatetime.Calendar()):
     return textparser.parseDT(interval, base_time, tzinfo=tzinfo)[0]
 
 
-def write_renewal_config(o_filename, n_filename, archive_dir, target, relevant_data):
+def write_renewal_config(o_filename, n_filename, archive_dir, target, relevant_data,
+                         transaction=None):
     """Writes a renewal config file with the specified name and values.
 
     :param str o_filename: Absolute path to the previous version of config file
@@ -103,6 +106,8 @@ def write_renewal_config(o_filename, n_filename, archive_dir, target, relevant_d
     :param str archive_dir: Absolute path to the archive directory
     :param dict target: Maps ALL_FOUR to their symlink paths
     :param dict relevant_data: Renewal configuration options to save
+    :param .LineageTransaction transaction: Transaction to stage the write
+        in, or ``None`` to write the file immediately
 
     :returns: Configuration object for the new config file
     :rtype: configobj.ConfigObj
@@ -134,16 +139,19 @@ def write_renewal_config(o_filename, n_filename, archive_dir, target, relevant_d
     #       parameters
     logger.debug("Writing new config %s.", n_filename)
 
-    # Ensure that the file exists
-    open(n_filename, 'a').close()
-
     # Copy permissions from the old version of the file, if it exists.
+    current_permissions = None
     if os.path.exists(o_filename):
         current_permissions = stat.S_IMODE(os.lstat(o_filename).st_mode)
-        os.chmod(n_filename, current_permissions)
 
-    with open(n_filename, "wb") as f:
-        config.write(outfile=f)
+    output = six.BytesIO()
+    config.write(outfile=output)
+    if transaction is None:
+        with lineage_transaction.LineageTransaction() as txn:
+            txn.write(n_filename, output.getvalue(), current_permissions)
+    else:
+        transaction.write(n_filename, output.getvalue(), current_permissions)
+    config.filename = n_filename
     return config
 
 
@@ -158,14 +166,17 @@ def rename_renewal_config(prev_name, new_name, cli_config):
     if os.path.exists(new_filename):
         raise errors.ConfigurationError("The new certificate name "
             "is already in use.")
-    try:
-        os.rename(prev_filename, new_filename)
-    except OSError:
-        raise errors.ConfigurationError("Please specify a valid filename "
-            "for the new certificate name.")
+    with lineage_index.updating(cli_config) as index:
+        try:
+            os.rename(prev_filename, new_filename)
+        except OSError:
+            raise errors.ConfigurationError("Please specify a valid filename "
+                "for the new certificate name.")
+        index.rename(prev_name, new_name)
 
 
-def update_configuration(lineagename, archive_dir, target, cli_config):
+def update_configuration(lineagename, archive_dir, target, cli_config,
+                         transaction=None):
     """Modifies lineagename's config to contain the specified values.
 
     :param str lineagename: Name of the lineage being modified
@@ -173,23 +184,27 @@ def update_configuration(lineagename, archive_dir, target, cli_config):
     :param dict target: Maps ALL_FOUR to their symlink paths
     :param .NamespaceConfig cli_config: parsed command line
         arguments
+    :param .LineageTransaction transaction: Transaction to stage the write
+        in, or ``None`` to write the file immediately
 
-    :returns: Configuration object for the updated config file
+    :returns: Configuration object for the updated config file, or
+        ``None`` if the write was staged in transaction
     :rtype: configobj.ConfigObj
 
     """
     config_filename = renewal_filename_for_lineagename(cli_config, lineagename)
+    # Remove a tempfile left behind by Certbot versions that didn't
+    # replace the file atomically
     temp_filename = config_filename + ".new"
-
-    # If an existing tempfile exists, delete it
     if os.path.exists(temp_filename):
         os.unlink(temp_filename)
 
     # Save only the config items that are relevant to renewal
     values = relevant_values(vars(cli_config.namespace))
-    write_renewal_config(config_filename, temp_filename, archive_dir, target, values)
-    os.rename(temp_filename, config_filename)
-
+    write_renewal_config(config_filename, config_filename, archive_dir, target,
+                         values, transaction)
+    if transaction is not None:
+        return None
     return configobj.ConfigObj(config_filename)
 
 
@@ -215,16 +230,17 @@ def get_link_target(link):
     return os.path.abspath(target)
 
 
-def _relevant(option):
+def _relevant(namespaces, option):
     """
     Is this option one that could be restored for future renewal purposes?
+
+    :param namespaces: plugin namespaces for configuration options
+    :type namespaces: `list` of `str`
     :param str option: the name of the option
 
     :rtype: bool
     """
     from certbot import renewal
-    plugins = plugins_disco.PluginsRegistry.find_all()
-    namespaces = [plugins_common.dest_namespace(plugin) for plugin in plugins]
 
     return (option in renewal.CONFIG_ITEMS or
             any(option.startswith(namespace) for namespace in namespaces))
@@ -239,10 +255,14 @@ def relevant_values(all_values):
     :rtype dict:
 
     """
+    # Discovering plugins is slow, so it is done once rather than per option
+    plugins = plugins_disco.PluginsRegistry.find_all()
+    namespaces = [plugins_common.dest_namespace(plugin) for plugin in plugins]
+
     return dict(
         (option, value)
         for option, value in six.iteritems(all_values)
-        if _relevant(option) and cli.option_was_set(option, value))
+        if _relevant(namespaces, option) and cli.option_was_set(option, value))
 
 def lineagename_for_filename(config_filename):
     """Returns the lineagename for a configuration filename.
@@ -284,6 +304,13 @@ def delete_files(config, certname):
 
     If some files are not found, ignore them and continue.
     """
+    with lineage_index.updating(config) as index:
+        index.remove(certname)
+        _delete_files(config, certname)
+
+
+def _delete_files(config, certname):
+    """Delete all files related to the certificate."""
     renewal_filename = renewal_file_for_certname(config, certname)
     # file exists
     full_default_archive_dir = full_archive_path(None, config, certname)
@@ -617,11 +644,9 @@ class RenewableCert(object):
         """
         previous_symlinks = self._previous_symlinks()
         if all(os.path.exists(link[1]) for link in previous_symlinks):
-            for kind, previous_link in previous_symlinks:
-                current_link = getattr(self, kind)
-                if os.path.lexists(current_link):
-                    os.unlink(current_link)
-                os.symlink(os.readlink(previous_link), current_link)
+            with lineage_transaction.LineageTransaction() as txn:
+                for kind, previous_link in previous_symlinks:
+                    txn.symlink(os.readlink(previous_link), getattr(self, kind))
 
         for _, link in previous_symlinks:
             if os.path.exists(link):
@@ -787,7 +812,7 @@ class RenewableCert(object):
         smallest_current = min(self.current_version(x) for x in ALL_FOUR)
         return smallest_current < self.latest_common_version()
 
-    def _update_link_to(self, kind, version):
+    def _update_link_to(self, kind, version, transaction=None):
         """Make the specified item point at the specified version.
 
         (Note that this method doesn't verify that the specified version
@@ -796,6 +821,8 @@ class RenewableCert(object):
         :param str kind: the lineage member item ("cert", "privkey",
             "chain", or "fullchain")
         :param int version: the desired version
+        :param .LineageTransaction transaction: Transaction to stage the
+            change in, or ``None`` to change the link immediately
 
         """
         if kind not in ALL_FOUR:
@@ -804,14 +831,13 @@ class RenewableCert(object):
         filename = "{0}{1}.pem".format(kind, version)
         # Relative rather than absolute target directory
         target_directory = os.path.dirname(os.readlink(link))
-        # TODO: it could be safer to make the link first under a temporary
-        #       filename, then unlink the old link, then rename the new link
-        #       to the old link; this ensures that this process is able to
-        #       create symlinks.
         # TODO: we might also want to check consistency of related links
         #       for the other corresponding items
-        os.unlink(link)
-        os.symlink(os.path.join(target_directory, filename), link)
+        if transaction is None:
+            with lineage_transaction.LineageTransaction() as txn:
+                txn.symlink(os.path.join(target_directory, filename), link)
+        else:
+            transaction.symlink(os.path.join(target_directory, filename), link)
 
     def update_all_links_to(self, version):
         """Change all member objects to point to the specified version.
@@ -819,13 +845,23 @@ class RenewableCert(object):
         :param int version: the desired version
 
         """
+        with lineage_index.updating(self.cli_config) as index:
+            self._update_all_links_to(version)
+            index.set(self)
+
+    def _update_all_links_to(self, version):
+        """Change all member objects to point to the specified version."""
         with error_handler.ErrorHandler(self._fix_symlinks):
+            # The previous links allow _fix_symlinks to restore all four
+            # links together if the process dies while swapping them
             previous_links = self._previous_symlinks()
-            for kind, link in previous_links:
-                os.symlink(self.current_target(kind), link)
+            with lineage_transaction.LineageTransaction() as txn:
+                for kind, link in previous_links:
+                    txn.symlink(self.current_target(kind), link)
 
-            for kind in ALL_FOUR:
-                self._update_link_to(kind, version)
+            with lineage_transaction.LineageTransaction() as txn:
+                for kind in ALL_FOUR:
+                    self._update_link_to(kind, version, txn)
 
             for _, link in previous_links:
                 os.unlink(link)
@@ -966,7 +1002,6 @@ class RenewableCert(object):
 
     @classmethod
     def new_lineage(cls, lineagename, cert, privkey, chain, cli_config):
-        # pylint: disable=too-many-locals
         """Create a new certificate lineage.
 
         Attempts to create a certificate lineage -- enrolled for
@@ -993,7 +1028,15 @@ class RenewableCert(object):
         :rtype: :class:`storage.renewableCert`
 
         """
+        with lineage_index.updating(cli_config) as index:
+            lineage = cls._new_lineage(lineagename, cert, privkey, chain, cli_config)
+            index.set(lineage)
+        return lineage
 
+    @classmethod
+    def _new_lineage(cls, lineagename, cert, privkey, chain, cli_config):
+        # pylint: disable=too-many-locals
+        """Create a new certificate lineage."""
         # Examine the configuration and find the new lineage's name
         for i in (cli_config.renewal_configs_dir, cli_config.default_archive_dir,
                   cli_config.live_dir):
@@ -1023,48 +1066,48 @@ class RenewableCert(object):
         # Put the data into the appropriate files on disk
         target = dict([(kind, os.path.join(live_dir, kind + ".pem"))
                        for kind in ALL_FOUR])
-        for kind in ALL_FOUR:
-            os.symlink(os.path.join(_relpath_from_file(archive, target[kind]), kind + "1.pem"),
-                       target[kind])
-        with open(target["cert"], "wb") as f:
-            logger.debug("Writing certificate to %s.", target["cert"])
-            f.write(cert)
-        with open(target["privkey"], "wb") as f:
-            logger.debug("Writing private key to %s.", target["privkey"])
-            f.write(privkey)
+        archive_target = dict([(kind, os.path.join(archive, kind + "1.pem"))
+                               for kind in ALL_FOUR])
+        with lineage_transaction.LineageTransaction() as txn:
+            logger.debug("Writing certificate to %s.", archive_target["cert"])
+            txn.write(archive_target["cert"], cert)
+            logger.debug("Writing private key to %s.", archive_target["privkey"])
             # XXX: Let's make sure to get the file permissions right here
-        with open(target["chain"], "wb") as f:
-            logger.debug("Writing chain to %s.", target["chain"])
-            f.write(chain)
-        with open(target["fullchain"], "wb") as f:
+            txn.write(archive_target["privkey"], privkey)
+            logger.debug("Writing chain to %s.", archive_target["chain"])
+            txn.write(archive_target["chain"], chain)
             # assumes that OpenSSL.crypto.dump_certificate includes
             # ending newline character
-            logger.debug("Writing full chain to %s.", target["fullchain"])
-            f.write(cert + chain)
+            logger.debug("Writing full chain to %s.", archive_target["fullchain"])
+            txn.write(archive_target["fullchain"], cert + chain)
+
+            for kind in ALL_FOUR:
+                txn.symlink(os.path.join(_relpath_from_file(archive, target[kind]),
+                                         kind + "1.pem"), target[kind])
 
-        # Write a README file to the live directory
-        readme_path = os.path.join(live_dir, README)
-        with open(readme_path, "w") as f:
+            # Write a README file to the live directory
+            readme_path = os.path.join(live_dir, README)
             logger.debug("Writing README to %s.", readme_path)
-            f.write("This directory contains your keys and certificates.\n\n"
-                    "`privkey.pem`  : the private key for your certificate.\n"
-                    "`fullchain.pem`: the certificate file used in most server software.\n"
-                    "`chain.pem`    : used for OCSP stapling in Nginx >=1.3.7.\n"
-                    "`cert.pem`     : will break many server configurations, and "
-                                        "should not be used\n"
-                    "                 without reading further documentation (see link below).\n\n"
-                    "We recommend not moving these files. For more information, see the Certbot\n"
-                    "User Guide at https://certbot.eff.org/docs/using.html#where-are-my-"
-                                        "certificates.\n")
-
-        # Document what we've done in a new renewal config file
-        config_file.close()
-
-        # Save only the config items that are relevant to renewal
-        values = relevant_values(vars(cli_config.namespace))
-
-        new_config = write_renewal_config(config_filename, config_filename, archive,
-            target, values)
+            txn.write(readme_path, (
+                "This directory contains your keys and certificates.\n\n"
+                "`privkey.pem`  : the private key for your certificate.\n"
+                "`fullchain.pem`: the certificate file used in most server software.\n"
+                "`chain.pem`    : used for OCSP stapling in Nginx >=1.3.7.\n"
+                "`cert.pem`     : will break many server configurations, and "
+                                    "should not be used\n"
+                "                 without reading further documentation (see link below).\n\n"
+                "We recommend not moving these files. For more information, see the Certbot\n"
+                "User Guide at https://certbot.eff.org/docs/using.html#where-are-my-"
+                                    "certificates.\n").encode("ascii"))
+
+            # Document what we've done in a new renewal config file
+            config_file.close()
+
+            # Save only the config items that are relevant to renewal
+            values = relevant_values(vars(cli_config.namespace))
+
+            new_config = write_renewal_config(config_filename, config_filename, archive,
+                target, values, txn)
         return cls(new_config.filename, cli_config)
 
     def save_successor(self, prior_version, new_cert,
@@ -1104,40 +1147,41 @@ class RenewableCert(object):
               os.path.join(self.archive_dir, "{0}{1}.pem".format(kind, target_version)))
              for kind in ALL_FOUR])
 
-        # Distinguish the cases where the privkey has changed and where it
-        # has not changed (in the latter case, making an appropriate symlink
-        # to an earlier privkey version)
-        if new_privkey is None:
-            # The behavior below keeps the prior key by creating a new
-            # symlink to the old key or the target of the old key symlink.
-            old_privkey = os.path.join(
-                self.archive_dir, "privkey{0}.pem".format(prior_version))
-            if os.path.islink(old_privkey):
-                old_privkey = os.readlink(old_privkey)
-            else:
-                old_privkey = "privkey{0}.pem".format(prior_version)
-            logger.debug("Writing symlink to old private key, %s.", old_privkey)
-            os.symlink(old_privkey, target["privkey"])
-        else:
-            with open(target["privkey"], "wb") as f:
-                logger.debug("Writing new private key to %s.", target["privkey"])
-                f.write(new_privkey)
-
-        # Save everything else
-        with open(target["cert"], "wb") as f:
-            logger.debug("Writing certificate to %s.", target["cert"])
-            f.write(new_cert)
-        with open(target["chain"], "wb") as f:
-            logger.debug("Writing chain to %s.", target["chain"])
-            f.write(new_chain)
-        with open(target["fullchain"], "wb") as f:
-            logger.debug("Writing full chain to %s.", target["fullchain"])
-            f.write(new_cert + new_chain)
-
-        symlinks = dict((kind, self.configuration[kind]) for kind in ALL_FOUR)
-        # Update renewal config file
-        self.configfile = update_configuration(
-            self.lineagename, self.archive_dir, symlinks, cli_config)
-        self.configuration = config_with_defaults(self.configfile)
+        with lineage_index.updating(cli_config) as index:
+            with lineage_transaction.LineageTransaction() as txn:
+                # Distinguish the cases where the privkey has changed and where it
+                # has not changed (in the latter case, making an appropriate symlink
+                # to an earlier privkey version)
+                if new_privkey is None:
+                    # The behavior below keeps the prior key by creating a new
+                    # symlink to the old key or the target of the old key symlink.
+                    old_privkey = os.path.join(
+                        self.archive_dir, "privkey{0}.pem".format(prior_version))
+                    if os.path.islink(old_privkey):
+                        old_privkey = os.readlink(old_privkey)
+                    else:
+                        old_privkey = "privkey{0}.pem".format(prior_version)
+                    logger.debug("Writing symlink to old private key, %s.", old_privkey)
+                    txn.symlink(old_privkey, target["privkey"])
+                else:
+                    logger.debug("Writing new private key to %s.", target["privkey"])
+                    txn.write(target["privkey"], new_privkey)
+
+                # Save everything else
+                logger.debug("Writing certificate to %s.", target["cert"])
+                txn.write(target["cert"], new_cert)
+                logger.debug("Writing chain to %s.", target["chain"])
+                txn.write(target["chain"], new_chain)
+                logger.debug("Writing full chain to %s.", target["fullchain"])
+                txn.write(target["fullchain"], new_cert + new_chain)
+
+                symlinks = dict((kind, self.configuration[kind]) for kind in ALL_FOUR)
+                # Update renewal config file
+                update_configuration(self.lineagename, self.archive_dir, symlinks,
+                                     cli_config, txn)
+            self.configfile = configobj.ConfigObj(
+                renewal_filename_for_lineagename(cli_config, self.lineagename))
+            self.configuration = config_with_defaults(self.configfile)
+            index.set(self)
 
         return target_version
@@ -1,6 +1,7 @@
 """Tests for certbot.auth_handler."""
 import functools
 import logging
+import threading
 import unittest
 
 import mock
@@ -9,6 +10,7 @@ import zope.component
 
 from acme import challenges
 from acme import client as acme_client
+from acme import errors as acme_errors
 from acme import messages
 
 from certbot import achallenges
@@ -214,6 +216,77 @@ class GetAuthorizationsTest(unittest.TestCase):
         self.assertRaises(
             errors.AuthorizationError, self.handler.get_authorizations, ["0"])
 
+    def _cached_handler(self, cached):
+        from certbot.auth_handler import AuthHandler
+        cache = mock.MagicMock()
+        cache.get.side_effect = cached.get
+        self.handler = AuthHandler(
+            self.mock_auth, self.mock_net, self.mock_account, [], cache)
+        return cache
+
+    def test_reuse_cached_authorization(self):
+        authzr = acme_util.gen_authzr(
+            messages.STATUS_VALID, "0", [acme_util.TLSSNI01],
+            [messages.STATUS_VALID], False)
+        cache = self._cached_handler({"0": authzr})
+        self.mock_net.poll.return_value = (authzr, mock.Mock())
+
+        self.assertEqual(self.handler.get_authorizations(["0"]), [authzr])
+        self.mock_net.poll.assert_called_once_with(authzr)
+        self.assertFalse(self.mock_net.request_domain_challenges.called)
+        self.assertFalse(self.mock_auth.perform.called)
+        cache.add.assert_called_once_with([authzr])
+
+    @mock.patch("certbot.auth_handler.AuthHandler._poll_challenges")
+    def test_cached_authorization_invalidated(self, mock_poll):
+        authzr = acme_util.gen_authzr(
+            messages.STATUS_VALID, "0", [acme_util.TLSSNI01],
+            [messages.STATUS_VALID], False)
+        deactivated = acme_util.gen_authzr(
+            messages.STATUS_INVALID, "0", [acme_util.TLSSNI01],
+            [messages.STATUS_VALID], False)
+        cache = self._cached_handler({"0": authzr, "1": authzr})
+        self.mock_net.poll.side_effect = [
+            (deactivated, mock.Mock()), acme_errors.Error("not found")]
+        self.mock_net.request_domain_challenges.side_effect = functools.partial(
+            gen_dom_authzr, challs=acme_util.CHALLENGES)
+        mock_poll.side_effect = self._validate_all
+
+        self.assertEqual(len(self.handler.get_authorizations(["0", "1"])), 2)
+        self.assertEqual(cache.remove.call_args_list,
+                         [mock.call("0"), mock.call("1")])
+        self.assertEqual(self.mock_net.request_domain_challenges.call_count, 2)
+        self.assertEqual(sorted(mock_poll.call_args[0][0]), ["0", "1"])
+
+    def _preflight(self, best_effort):
+        zope.component.provideUtility(
+            mock.Mock(debug_challenges=False, preflight_challenges=True),
+            interfaces.IConfig)
+        self.mock_net.request_domain_challenges.side_effect = functools.partial(
+            gen_dom_authzr, challs=acme_util.CHALLENGES)
+        self.mock_auth.perform.side_effect = lambda achalls: [
+            mock.Mock(spec=challenges.TLSSNI01Response) for _ in achalls]
+        with mock.patch("certbot.auth_handler._self_verify") as mock_verify:
+            mock_verify.side_effect = lambda achall, resp, deadline: (
+                achall.domain != "1")
+            with mock.patch("certbot.auth_handler.AuthHandler._poll_challenges",
+                            side_effect=self._validate_all):
+                return self.handler.get_authorizations(["0", "1"], best_effort)
+
+    def test_preflight_failure(self):
+        self.assertRaises(errors.AuthorizationError, self._preflight, False)
+        self.assertFalse(self.mock_net.answer_challenge.called)
+        self.assertEqual(self.mock_auth.cleanup.call_count, 1)
+        self.assertEqual(self.handler.achalls, [])
+
+    def test_preflight_failure_best_effort(self):
+        authzr = self._preflight(True)
+        self.assertEqual([a.body.identifier.value for a in authzr], ["0"])
+        self.assertEqual(self.mock_net.answer_challenge.call_count, 1)
+        self.assertEqual(
+            [achall.domain for achall in self.mock_auth.cleanup.call_args_list[0][0][0]],
+            ["1"])
+
     def _validate_all(self, unused_1, unused_2):
         for dom in six.iterkeys(self.handler.authzr):
             azr = self.handler.authzr[dom]
@@ -225,6 +298,63 @@ class GetAuthorizationsTest(unittest.TestCase):
                 azr.body.combinations)
 
 
+class SelfVerifyTest(unittest.TestCase):
+    """Tests for certbot.auth_handler._self_verify and _self_verify_all."""
+
+    def setUp(self):
+        self.achall = mock.Mock(domain="example.com")
+        self.resp = mock.Mock()
+
+    @mock.patch("certbot.auth_handler.time.sleep")
+    def test_retry(self, mock_sleep):
+        from certbot.auth_handler import _self_verify
+        self.resp.simple_verify.side_effect = [acme_errors.Error, False, True]
+        self.assertTrue(_self_verify(self.achall, self.resp))
+        self.assertEqual(mock_sleep.call_count, 2)
+
+    @mock.patch("certbot.auth_handler.time.sleep")
+    def test_failure(self, unused_mock_sleep):
+        from certbot.auth_handler import _self_verify
+        self.resp.simple_verify.return_value = False
+        self.assertFalse(_self_verify(self.achall, self.resp))
+        self.assertEqual(self.resp.simple_verify.call_count, 3)
+
+    @mock.patch("certbot.auth_handler.time.time")
+    def test_request_timeout(self, mock_time):
+        from certbot.auth_handler import _self_verify
+        from certbot.auth_handler import PREFLIGHT_REQUEST_TIMEOUT
+        mock_time.return_value = 100
+        self.resp.simple_verify.return_value = True
+        self.assertTrue(_self_verify(self.achall, self.resp))
+        self.assertEqual(self.resp.simple_verify.call_args[1]["timeout"],
+                         PREFLIGHT_REQUEST_TIMEOUT)
+
+        self.assertTrue(_self_verify(self.achall, self.resp, deadline=102))
+        self.assertEqual(self.resp.simple_verify.call_args[1]["timeout"], 2)
+
+    @mock.patch("certbot.auth_handler.time.sleep")
+    @mock.patch("certbot.auth_handler.time.time")
+    def test_deadline_passed(self, mock_time, unused_mock_sleep):
+        from certbot.auth_handler import _self_verify
+        mock_time.side_effect = [100, 101]
+        self.resp.simple_verify.return_value = False
+        self.assertFalse(_self_verify(self.achall, self.resp, deadline=101))
+        self.assertEqual(self.resp.simple_verify.call_count, 1)
+
+    def test_timeout(self):
+        from certbot.auth_handler import _self_verify_all
+        release = threading.Event()
+        slow = mock.Mock()
+        slow.simple_verify.side_effect = lambda *args, **kwargs: release.wait()
+        self.resp.simple_verify.return_value = True
+        try:
+            self.assertEqual(_self_verify_all(
+                [(self.achall, self.resp), (self.achall, slow)], timeout=0.1),
+                [True, False])
+        finally:
+            release.set()
+
+
 class PollChallengesTest(unittest.TestCase):
     # pylint: disable=protected-access
     """Test poll challenges."""
@@ -0,0 +1,99 @@
+"""Tests for certbot.authz_cache."""
+import datetime
+import os
+import unittest
+
+import mock
+import pytz
+
+from acme import messages
+
+from certbot.tests import acme_util
+from certbot.tests import util as test_util
+
+
+def _authzr(domain, status=messages.STATUS_VALID, expires_in=None):
+    authzr = acme_util.gen_authzr(
+        status, domain, [acme_util.HTTP01], [messages.STATUS_PENDING], False)
+    expires = datetime.datetime.now(pytz.UTC).replace(microsecond=0) + (
+        expires_in if expires_in is not None else datetime.timedelta(days=30))
+    return authzr.update(body=authzr.body.update(expires=expires))
+
+
+class AuthorizationCacheTest(test_util.ConfigTestCase):
+    """Tests for certbot.authz_cache.AuthorizationCache."""
+
+    def setUp(self):
+        super(AuthorizationCacheTest, self).setUp()
+        from certbot.authz_cache import AuthorizationCache
+        account = mock.Mock(id="account")
+        os.makedirs(os.path.join(self.config.accounts_dir, account.id))
+        self.cache = AuthorizationCache(self.config, account)
+
+    def test_add_and_get(self):
+        authzr = _authzr("example.com")
+        self.cache.add([authzr, _authzr("example.org", messages.STATUS_INVALID)])
+        self.assertEqual(self.cache.get("example.com"), authzr)
+        self.assertEqual(self.cache.get("example.org"), None)
+        self.assertEqual(self.cache.get("example.net"), None)
+
+    def test_remove(self):
+        self.cache.add([_authzr("example.com"), _authzr("example.org")])
+        self.cache.remove("example.com")
+        self.cache.remove("example.net")
+        self.assertEqual(self.cache.get("example.com"), None)
+        self.assertNotEqual(self.cache.get("example.org"), None)
+
+    def test_expiring(self):
+        self.cache.add([_authzr("example.com", expires_in=datetime.timedelta(days=1))])
+        with mock.patch("certbot.authz_cache.EXPIRY_MARGIN",
+                        datetime.timedelta(days=2)):
+            self.assertEqual(self.cache.get("example.com"), None)
+            # Expired authorizations are dropped when the cache is updated
+            self.cache.add([_authzr("example.org", expires_in=datetime.timedelta(days=3))])
+        self.assertEqual(self.cache.get("example.com"), None)
+        self.assertNotEqual(self.cache.get("example.org"), None)
+
+    def test_broken_cache(self):
+        with open(self.cache.path, "w") as cache_file:
+            cache_file.write("{\"example.com\": 1}")
+        self.assertEqual(self.cache.get("example.com"), None)
+        self.cache.add([_authzr("example.org")])
+        self.assertNotEqual(self.cache.get("example.org"), None)
+
+        with open(self.cache.path, "w") as cache_file:
+            cache_file.write("[")
+        self.assertEqual(self.cache.get("example.org"), None)
+
+    def test_write_failure(self):
+        os.rmdir(os.path.dirname(self.cache.path))
+        self.cache.add([_authzr("example.com")])
+        self.assertEqual(self.cache.get("example.com"), None)
+
+    def test_rename_failure(self):
+        with mock.patch("certbot.authz_cache.os.rename") as mock_rename:
+            mock_rename.side_effect = OSError
+            self.cache.add([_authzr("example.com")])
+        self.assertEqual(os.listdir(os.path.dirname(self.cache.path)), [])
+
+    def test_locked(self):
+        lock_path = self.cache.path + ".lock"
+        def _read():  # pylint: disable=missing-docstring
+            self.assertTrue(os.path.exists(lock_path))
+            return {}
+        with mock.patch.object(self.cache, "_read", side_effect=_read) as mock_read:
+            self.cache.add([_authzr("example.com")])
+            self.cache.remove("example.com")
+        self.assertEqual(mock_read.call_count, 2)
+        self.assertFalse(os.path.exists(lock_path))
+
+    @mock.patch("certbot.authz_cache.LOCK_TIMEOUT", 0)
+    def test_lock_contention(self):
+        def _add():  # pylint: disable=missing-docstring
+            self.cache.add([_authzr("example.com")])
+        test_util.lock_and_call(_add, self.cache.path + ".lock")
+        self.assertNotEqual(self.cache.get("example.com"), None)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -1,6 +1,7 @@
 
 """Tests for certbot.cert_manager."""
 # pylint: disable=protected-access
+import json
 import os
 import re
 import shutil
@@ -9,6 +10,7 @@ import unittest
 
 import configobj
 import mock
+import six
 
 from certbot import configuration
 from certbot import errors
@@ -203,6 +205,58 @@ class CertificatesTest(BaseCertManagerTest):
         self.assertTrue(mock_utility.called)
         shutil.rmtree(empty_tempdir)
 
+    def _certificates_json(self):
+        self.config.output_format = "json"
+        with mock.patch('certbot.cert_manager.sys.stdout',
+                        new_callable=six.StringIO) as mock_stdout:
+            self._certificates(self.config)
+        return [json.loads(line) for line in mock_stdout.getvalue().splitlines()]
+
+    @mock.patch('certbot.cert_manager.logger')
+    def test_certificates_json_parse_fail(self, mock_logger):
+        entries = self._certificates_json()
+        self.assertTrue(mock_logger.warning.called) #pylint: disable=no-member
+        self.assertEqual(
+            sorted(entry["renewal_config"] for entry in entries),
+            sorted(self.config_files[domain].filename for domain in self.domains))
+        self.assertTrue(all(entry["error"] for entry in entries))
+
+    @mock.patch('certbot.cert_manager.ocsp.RevocationChecker.ocsp_revoked')
+    @mock.patch('certbot.crypto_util.verify_renewable_cert')
+    @mock.patch("certbot.storage.RenewableCert")
+    def test_certificates_json(self, mock_renewable_cert, unused_verifier,
+                               mock_revoked):
+        import datetime, pytz
+        expiry = pytz.UTC.fromutc(datetime.datetime(2017, 1, 1))
+        def _load(renewal_file, unused_config):
+            name = os.path.basename(renewal_file)[:-len(".conf")]
+            cert = mock.MagicMock(lineagename=name, target_expiry=expiry,
+                                  is_test_cert=False, fullchain="fullchain",
+                                  privkey="privkey")
+            cert.names.return_value = [name]
+            return cert
+        mock_renewable_cert.side_effect = _load
+        mock_revoked.return_value = False
+
+        entries = self._certificates_json()
+        self.assertEqual([entry["certificate_name"] for entry in entries],
+                         ["example.org", "other.com"])
+        self.assertEqual(entries[0], {
+            "renewal_config": self.config_files["example.org"].filename,
+            "certificate_name": "example.org",
+            "domains": ["example.org"],
+            "expiry_date": "2017-01-01T00:00:00+00:00",
+            "valid": False,
+            "invalid_reasons": ["EXPIRED"],
+            "certificate_path": "fullchain",
+            "private_key_path": "privkey",
+        })
+
+        self.config.certname = "other.com"
+        entries = self._certificates_json()
+        self.assertEqual([entry["certificate_name"] for entry in entries],
+                         ["other.com"])
+
     @mock.patch('certbot.cert_manager.ocsp.RevocationChecker.ocsp_revoked')
     def test_report_human_readable(self, mock_revoked):
         mock_revoked.return_value = None
@@ -477,6 +531,20 @@ class DuplicativeCertsTest(storage_test.BaseRenewableCertTest):
             self.config, ['example.com', 'something.new'])
         self.assertEqual(result, (None, None))
 
+    @mock.patch('certbot.util.make_or_verify_dir')
+    @mock.patch('certbot.cert_manager.lineage_index.load')
+    def test_find_duplicative_names_stale_index(self, mock_load, unused_makedir):
+        from certbot.cert_manager import find_duplicative_certs
+        from certbot.lineage_index import LineageIndex
+        mock_load.return_value = LineageIndex()
+        test_cert = test_util.load_vector('cert-san_512.pem')
+        with open(self.test_rc.cert, 'wb') as f:
+            f.write(test_cert)
+
+        result = find_duplicative_certs(
+            self.config, ['example.com', 'www.example.com'])
+        self.assertTrue(result[0].configfile.filename.endswith('example.org.conf'))
+
 
 class CertPathToLineageTest(storage_test.BaseRenewableCertTest):
     """Tests for certbot.cert_manager.cert_path_to_lineage"""
@@ -500,6 +568,12 @@ class CertPathToLineageTest(storage_test.BaseRenewableCertTest):
     def test_basic_match(self):
         self.assertEqual('example.org', self._call(self.config))
 
+    @mock.patch('certbot.cert_manager.lineage_index.load')
+    def test_stale_index(self, mock_load):
+        from certbot.lineage_index import LineageIndex
+        mock_load.return_value = LineageIndex()
+        self.assertEqual('example.org', self._call(self.config))
+
     def test_no_match_exists(self):
         bad_test_config = self.config
         bad_test_config.cert_path = os.path.join(self.config.config_dir, 'live',
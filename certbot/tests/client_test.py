@@ -111,6 +111,44 @@ class RegisterTest(test_util.ConfigTestCase):
         self.assertFalse(mock_handle.called)
 
 
+class AcmeFromConfigKeyTest(test_util.ConfigTestCase):
+    """Tests for certbot.client.acme_from_config_key."""
+    def setUp(self):
+        super(AcmeFromConfigKeyTest, self).setUp()
+        self.config.no_verify_ssl = False
+        self.key = jose.JWKRSA.load(KEY)
+
+    @classmethod
+    def _call(cls, *args, **kwargs):
+        from certbot.client import acme_from_config_key
+        return acme_from_config_key(*args, **kwargs)
+
+    @mock.patch("certbot.client.acme_client.Client")
+    def test_not_shared(self, mock_acme):
+        mock_acme.side_effect = lambda *args, **kwargs: mock.MagicMock()
+        self.assertNotEqual(self._call(self.config, self.key),
+                            self._call(self.config, self.key))
+
+    @mock.patch("certbot.client.acme_client.Client")
+    def test_chain_cache(self, mock_acme):
+        self._call(self.config, self.key)
+        chain_cache = mock_acme.call_args[1]["chain_cache"]
+        self.assertEqual(chain_cache.directory,
+                         os.path.join(self.config.work_dir, "chain_cache"))
+
+    @mock.patch("certbot.client.acme_client.Client")
+    def test_shared(self, mock_acme):
+        from certbot.client import shared_acme_clients
+        mock_acme.side_effect = lambda *args, **kwargs: mock.MagicMock()
+        with shared_acme_clients():
+            acme = self._call(self.config, self.key)
+            self.assertEqual(acme, self._call(self.config, self.key))
+            self.config.server = "https://acme.example.org/directory"
+            self.assertNotEqual(acme, self._call(self.config, self.key))
+        self.assertEqual(mock_acme.call_count, 2)
+        self.assertNotEqual(acme, self._call(self.config, self.key))
+
+
 class ClientTestCommon(test_util.ConfigTestCase):
     """Common base class for certbot.client.Client tests."""
     def setUp(self):
@@ -143,6 +181,27 @@ class ClientTest(ClientTestCommon):
         net = self.acme_client.call_args[1]["net"]
         self.assertTrue(net.verify_ssl)
 
+    def test_init_authz_cache(self):
+        from certbot.client import Client
+        self.account.id = "account"
+        client = Client(self.config, self.account, mock.MagicMock(), None,
+                        acme=self.acme)
+        self.assertEqual(client.auth_handler.cache.path, os.path.join(
+            self.config.accounts_dir, "account", "authorizations.json"))
+
+        self.config.reuse_authorizations = False
+        client = Client(self.config, self.account, mock.MagicMock(), None,
+                        acme=self.acme)
+        self.assertEqual(client.auth_handler.cache, None)
+
+    def test_init_authz_cache_dry_run(self):
+        from certbot.client import Client
+        self.account.id = "account"
+        self.config.dry_run = True
+        client = Client(self.config, self.account, mock.MagicMock(), None,
+                        acme=self.acme)
+        self.assertEqual(client.auth_handler.cache, None)
+
     def _mock_obtain_certificate(self):
         self.client.auth_handler = mock.MagicMock()
         self.client.auth_handler.get_authorizations.return_value = [None]
@@ -242,7 +301,9 @@ class ClientTest(ClientTestCommon):
         self._test_obtain_certificate_common(mock.sentinel.key, csr)
 
         mock_crypto_util.init_save_key.assert_called_once_with(
-            self.config.rsa_key_size, self.config.key_dir)
+            self.config.rsa_key_size, self.config.key_dir,
+            key_type=self.config.key_type,
+            elliptic_curve=self.config.elliptic_curve)
         mock_crypto_util.init_save_csr.assert_called_once_with(
             mock.sentinel.key, self.eg_domains, self.config.csr_dir)
 
@@ -257,7 +318,9 @@ class ClientTest(ClientTestCommon):
         self.client.config.dry_run = True
         self._test_obtain_certificate_common(key, csr)
 
-        mock_crypto.make_key.assert_called_once_with(self.config.rsa_key_size)
+        mock_crypto.make_key.assert_called_once_with(
+            self.config.rsa_key_size, self.config.key_type,
+            self.config.elliptic_curve)
         mock_acme_crypto.make_csr.assert_called_once_with(
             mock.sentinel.key_pem, self.eg_domains, self.config.must_staple)
         mock_crypto.init_save_key.assert_not_called()
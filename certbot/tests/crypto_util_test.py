@@ -54,6 +54,15 @@ class InitSaveKeyTest(test_util.TempDirTestCase):
         mock_make.side_effect = ValueError
         self.assertRaises(ValueError, self._call, 431, self.tempdir)
 
+    @mock.patch('certbot.crypto_util.make_key')
+    @mock.patch('certbot.key_pool.take_key')
+    def test_pooled_key(self, mock_take, mock_make):
+        mock_take.return_value = b'pooled_key_pem'
+        key = self._call(1024, self.tempdir)
+        self.assertEqual(key.pem, b'pooled_key_pem')
+        mock_take.assert_called_once_with(1024, 'rsa', 'secp256r1')
+        self.assertFalse(mock_make.called)
+
 
 class InitSaveCSRTest(test_util.TempDirTestCase):
     """Tests for certbot.crypto_util.init_save_csr."""
@@ -167,6 +176,20 @@ class MakeKeyTest(unittest.TestCase):  # pylint: disable=too-few-public-methods
         OpenSSL.crypto.load_privatekey(
             OpenSSL.crypto.FILETYPE_PEM, make_key(1024))
 
+    def test_ecdsa(self):
+        from certbot.crypto_util import make_key
+        for curve, bits in (('secp256r1', 256), ('secp384r1', 384)):
+            key = OpenSSL.crypto.load_privatekey(
+                OpenSSL.crypto.FILETYPE_PEM,
+                make_key(None, key_type='ecdsa', elliptic_curve=curve))
+            self.assertEqual(key.bits(), bits)
+
+    def test_unsupported(self):
+        from certbot.crypto_util import make_key
+        self.assertRaises(ValueError, make_key, 2048, key_type='dsa')
+        self.assertRaises(ValueError, make_key, None, key_type='ecdsa',
+                          elliptic_curve='secp192r1')
+
 
 class VerifyCertSetup(unittest.TestCase):
     """Refactoring for verification tests."""
@@ -276,6 +299,10 @@ class ValidPrivkeyTest(unittest.TestCase):
     def test_valid_true(self):
         self.assertTrue(self._call(RSA512_KEY))
 
+    def test_valid_ecdsa_true(self):
+        from certbot.crypto_util import make_key
+        self.assertTrue(self._call(make_key(None, key_type='ecdsa')))
+
     def test_empty_false(self):
         self.assertFalse(self._call(''))
 
@@ -1,6 +1,9 @@
 """Tests for certbot.hooks."""
+import json
 import os
 import stat
+import threading
+import time
 import unittest
 
 import mock
@@ -23,7 +26,8 @@ class ValidateHooksTest(unittest.TestCase):
         self._call(config)
 
         types = [call[0][1] for call in mock_validate_hook.call_args_list]
-        self.assertEqual(set(("pre", "post", "deploy",)), set(types[:-1]))
+        self.assertEqual(set(("pre", "post", "deploy", "batch-deploy",)),
+                         set(types[:-1]))
         # This ensures error messages are about deploy hooks when appropriate
         self.assertEqual("renew", types[-1])
 
@@ -299,15 +303,16 @@ class RenewalHookTest(HookTest):
         domains = kwargs["domains"] if "domains" in kwargs else args[1]
         lineage = kwargs["lineage"] if "lineage" in kwargs else args[2]
 
-        def execute_side_effect(*unused_args, **unused_kwargs):
+        def execute_side_effect(*unused_args, **kwargs):
             """Assert environment variables are properly set.
 
             :returns: two strings imitating no output from the hook
             :rtype: `tuple` of `str`
 
             """
-            self.assertEqual(os.environ["RENEWED_DOMAINS"], " ".join(domains))
-            self.assertEqual(os.environ["RENEWED_LINEAGE"], lineage)
+            self.assertEqual(kwargs["env"]["RENEWED_DOMAINS"], " ".join(domains))
+            self.assertEqual(kwargs["env"]["RENEWED_LINEAGE"], lineage)
+            self.assertFalse("RENEWED_LINEAGE" in os.environ)
             return ("", "")
 
         with mock.patch("certbot.hooks.execute") as mock_execute:
@@ -358,7 +363,8 @@ class DeployHookTest(RenewalHookTest):
         self.config.deploy_hook = "foo"
         mock_execute = self._call_with_mock_execute(
             self.config, domains, lineage)
-        mock_execute.assert_called_once_with(self.config.deploy_hook)
+        mock_execute.assert_called_once_with(
+            self.config.deploy_hook, env=mock.ANY, timeout=0)
 
 
 class RenewHookTest(RenewalHookTest):
@@ -382,7 +388,8 @@ class RenewHookTest(RenewalHookTest):
         self.config.directory_hooks = False
         mock_execute = self._call_with_mock_execute(
             self.config, ["example.org"], "/foo/bar")
-        mock_execute.assert_called_once_with(self.config.renew_hook)
+        mock_execute.assert_called_once_with(
+            self.config.renew_hook, env=mock.ANY, timeout=0)
 
     @mock.patch("certbot.hooks.logger")
     def test_dry_run(self, mock_logger):
@@ -406,13 +413,202 @@ class RenewHookTest(RenewalHookTest):
         self.config.renew_hook = self.dir_hook
         mock_execute = self._call_with_mock_execute(
             self.config, ["example.net", "example.org"], "/foo/bar")
-        mock_execute.assert_called_once_with(self.dir_hook)
+        mock_execute.assert_called_once_with(
+            self.dir_hook, env=mock.ANY, timeout=0)
 
     def test_no_overlap(self):
         mock_execute = self._call_with_mock_execute(
             self.config, ["example.org"], "/foo/bar")
-        mock_execute.assert_any_call(self.dir_hook)
-        mock_execute.assert_called_with(self.config.renew_hook)
+        mock_execute.assert_any_call(self.dir_hook, env=mock.ANY, timeout=0)
+        mock_execute.assert_called_with(
+            self.config.renew_hook, env=mock.ANY, timeout=0)
+
+    def _create_dir_hook(self, name, after=None):
+        path = os.path.join(self.config.renewal_deploy_hooks_dir, name)
+        create_hook(path)
+        if after is not None:
+            with open(path, "w") as hook_file:
+                hook_file.write("#!/bin/sh\n# certbot-after: {0}\n".format(after))
+        return path
+
+    def _executed_hooks(self):
+        self.config.renew_hook = None
+        mock_execute = self._call_with_mock_execute(
+            self.config, ["example.org"], "/foo/bar")
+        return [call[0][0] for call in mock_execute.call_args_list]
+
+    def test_dependencies(self):
+        first = self._create_dir_hook("a", after="bar, c")
+        third = self._create_dir_hook("c", after="unknown")
+        self.assertEqual(self._executed_hooks(), [self.dir_hook, third, first])
+
+    @mock.patch("certbot.hooks.logger")
+    def test_dependency_cycle(self, mock_logger):
+        first = self._create_dir_hook("a", after="c")
+        third = self._create_dir_hook("c", after="a")
+        self.assertEqual(self._executed_hooks(), [self.dir_hook, first, third])
+        self.assertTrue(mock_logger.warning.called)
+
+    def test_concurrent(self):
+        self.config.deploy_hook_workers = 2
+        self.config.renew_hook = None
+        other = self._create_dir_hook("foo")
+        # Each hook waits for the other to start
+        started = dict((hook, threading.Event()) for hook in (self.dir_hook, other))
+
+        def _execute(command, **unused_kwargs):
+            started[command].set()
+            for event in started.values():
+                # Event.wait only returns whether it was set since Python 2.7
+                event.wait(5)
+                self.assertTrue(event.is_set())
+            return ("", "")
+
+        with mock.patch("certbot.hooks.execute") as mock_execute:
+            mock_execute.side_effect = _execute
+            self._call(self.config, ["example.org"], "/foo/bar")
+        self.assertEqual(mock_execute.call_count, 2)
+
+    def test_concurrent_lineage(self):
+        from certbot import timing
+        self.config.deploy_hook_workers = 2
+        self.config.renew_hook = None
+        self._create_dir_hook("foo")
+        lineages = []
+
+        def _execute(unused_command, **unused_kwargs):
+            lineages.append(timing.current_lineage())
+            return ("", "")
+
+        with mock.patch("certbot.hooks.execute") as mock_execute:
+            mock_execute.side_effect = _execute
+            with timing.lineage("example.org"):
+                self._call(self.config, ["example.org"], "/foo/bar")
+        self.assertEqual(lineages, ["example.org", "example.org"])
+
+    def test_concurrent_dependencies(self):
+        self.config.deploy_hook_workers = 3
+        first = self._create_dir_hook("a", after="bar")
+        finished = []
+
+        def _execute(command, **unused_kwargs):
+            if command == self.dir_hook:
+                time.sleep(0.1)
+            finished.append(command)
+            return ("", "")
+
+        with mock.patch("certbot.hooks.execute") as mock_execute:
+            mock_execute.side_effect = _execute
+            self._call(self.config, ["example.org"], "/foo/bar")
+        self.assertEqual(finished, [self.dir_hook, first, self.config.renew_hook])
+
+
+class BatchDeployHookTest(HookTest):
+    """Tests for certbot.hooks.batch_deploy_hook and run_saved_batch_deploy_hooks."""
+
+    @classmethod
+    def _call(cls, *args, **kwargs):
+        from certbot.hooks import batch_deploy_hook
+        return batch_deploy_hook(*args, **kwargs)
+
+    @classmethod
+    def _call_run_saved(cls, *args, **kwargs):
+        from certbot.hooks import run_saved_batch_deploy_hooks
+        return run_saved_batch_deploy_hooks(*args, **kwargs)
+
+    def setUp(self):
+        super(BatchDeployHookTest, self).setUp()
+        self.config.batch_deploy_hook = "foo"
+        self.config.verb = "renew"
+
+        os.makedirs(self.config.renewal_batch_deploy_hooks_dir)
+        self.dir_hook = os.path.join(
+            self.config.renewal_batch_deploy_hooks_dir, "bar")
+        create_hook(self.dir_hook)
+
+        # Reset this value as it may have been modified by past tests
+        self._reset_eventually()
+
+    def tearDown(self):
+        # Reset this value so it's unmodified for future tests
+        self._reset_eventually()
+        super(BatchDeployHookTest, self).tearDown()
+
+    def _reset_eventually(self):
+        from certbot.hooks import batch_deploy_hook
+        batch_deploy_hook.eventually.clear()
+
+    def _run_saved(self):
+        """Run the saved hooks, returning their commands and manifests."""
+        runs = []
+
+        def _execute(command, env=None, stdin=None, **unused_kwargs):
+            with open(env["RENEWED_MANIFEST"]) as manifest_file:
+                self.assertEqual(json.load(manifest_file), json.loads(stdin))
+            runs.append((command, json.loads(stdin)["certificates"]))
+            return ("", "")
+
+        with mock.patch("certbot.hooks.execute") as mock_execute:
+            mock_execute.side_effect = _execute
+            self._call_run_saved(self.config)
+        return runs
+
+    def test_once_for_all(self):
+        self._call(self.config, ["example.org"], "/live/example.org")
+        self._call(self.config, ["example.net", "www.example.net"],
+                   "/live/example.net")
+        renewed = [
+            {"lineage": "/live/example.org", "domains": ["example.org"]},
+            {"lineage": "/live/example.net",
+             "domains": ["example.net", "www.example.net"]},
+        ]
+        self.assertEqual(self._run_saved(),
+                         [(self.dir_hook, renewed), ("foo", renewed)])
+        # Each hook is only run once
+        self.assertEqual(self._run_saved(), [])
+
+    def test_per_command(self):
+        self.config.directory_hooks = False
+        self._call(self.config, ["example.org"], "/live/example.org")
+        self.config.batch_deploy_hook = self.dir_hook
+        self._call(self.config, ["example.net"], "/live/example.net")
+        self.assertEqual(self._run_saved(), [
+            ("foo", [{"lineage": "/live/example.org", "domains": ["example.org"]}]),
+            (self.dir_hook,
+             [{"lineage": "/live/example.net", "domains": ["example.net"]}]),
+        ])
+
+    def test_overlap(self):
+        self.config.batch_deploy_hook = self.dir_hook
+        self._call(self.config, ["example.org"], "/live/example.org")
+        self.assertEqual([command for command, _ in self._run_saved()],
+                         [self.dir_hook])
+
+    def test_certonly_run(self):
+        renewed = [{"lineage": "/live/example.org", "domains": ["example.org"]}]
+        for verb in ("certonly", "run",):
+            self.config.verb = verb
+            mock_execute = self._call_with_mock_execute(
+                self.config, ["example.org"], "/live/example.org")
+            self.assertEqual(
+                [(call[0][0], json.loads(call[1]["stdin"])["certificates"])
+                 for call in mock_execute.call_args_list],
+                [(self.dir_hook, renewed), ("foo", renewed)])
+            self.assertEqual(self._run_saved(), [])
+
+    @mock.patch("certbot.hooks.logger")
+    def test_dry_run(self, mock_logger):
+        self.config.dry_run = True
+        self._call(self.config, ["example.org"], "/live/example.org")
+        self.assertEqual(self._run_saved(), [])
+        self.assertEqual(mock_logger.warning.call_count, 2)
+
+    def test_manifest_removed(self):
+        self._call(self.config, ["example.org"], "/live/example.org")
+        with mock.patch("certbot.hooks.execute") as mock_execute:
+            self._call_run_saved(self.config)
+        for call in mock_execute.call_args_list:
+            self.assertFalse(os.path.exists(call[1]["env"]["RENEWED_MANIFEST"]))
 
 
 class ExecuteTest(unittest.TestCase):
@@ -446,6 +642,25 @@ class ExecuteTest(unittest.TestCase):
         if stderr or returncode:
             self.assertTrue(mock_logger.error.called)
 
+    def test_stdin(self):
+        self.assertEqual(self._call("cat", stdin="foo"), ("", "foo"))
+
+    def test_env(self):
+        err, out = self._call("echo $FOO", env={"FOO": "bar"})
+        self.assertEqual((err, out), ("", "bar\n"))
+
+    @mock.patch("certbot.hooks.logger")
+    def test_timeout(self, mock_logger):
+        start = time.time()
+        self._call("sleep 10 & wait", timeout=0.2)
+        self.assertTrue(time.time() - start < 5)
+        self.assertTrue("killed" in mock_logger.error.call_args[0][0])
+
+    @mock.patch("certbot.hooks.logger")
+    def test_timeout_not_reached(self, mock_logger):
+        self.assertEqual(self._call("echo foo", timeout=5), ("", "foo\n"))
+        self.assertFalse(mock_logger.error.called)
+
 
 class ListHooksTest(util.TempDirTestCase):
     """Tests for certbot.hooks.list_hooks."""
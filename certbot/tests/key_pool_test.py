@@ -0,0 +1,133 @@
+"""Tests for certbot.key_pool."""
+import os
+import unittest
+
+import mock
+
+from certbot.tests import util as test_util
+
+
+class KeyPoolTest(test_util.ConfigTestCase):
+    """Tests for certbot.key_pool.KeyPool."""
+
+    def setUp(self):
+        super(KeyPoolTest, self).setUp()
+        self.config.key_type = "ecdsa"
+        self.config.elliptic_curve = "secp256r1"
+        self.config.key_pool_size = 2
+        self.config.strict_permissions = False
+
+        from certbot.key_pool import KeyPool
+        self.pool = KeyPool(self.config)
+        self.spool = os.path.join(self.config.key_dir, "pool", "ecdsa-secp256r1")
+
+    def _spooled(self):
+        return [name for name in os.listdir(self.spool) if name.endswith(".pem")]
+
+    def test_fill_and_take(self):
+        self.pool.fill()
+        self.assertEqual(len(self._spooled()), 2)
+        self.assertEqual(os.stat(self.spool).st_mode & 0o777, 0o700)
+
+        from certbot.crypto_util import valid_privkey
+        first = self.pool.take(None, "ecdsa", "secp256r1")
+        second = self.pool.take(None, "ecdsa", "secp256r1")
+        self.assertTrue(valid_privkey(first))
+        self.assertTrue(valid_privkey(second))
+        self.assertNotEqual(first, second)
+        self.assertTrue(self.pool.take(None, "ecdsa", "secp256r1") is None)
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_take_other_type(self):
+        self.pool.fill()
+        self.assertTrue(self.pool.take(2048, "rsa", None) is None)
+        self.assertEqual(len(self._spooled()), 2)
+
+    def test_take_invalid_key(self):
+        os.makedirs(self.spool)
+        with open(os.path.join(self.spool, "bad.pem"), "w") as f:
+            f.write("not a key")
+        self.assertTrue(self.pool.take(None, "ecdsa", "secp256r1") is None)
+        self.assertEqual(os.listdir(self.spool), [])
+
+    def test_fill_added_specs(self):
+        self.pool.add_spec(None, "ecdsa", "secp384r1")
+        self.pool.add_spec(1024, "rsa", None)
+        self.pool.add_spec(None, "ecdsa", "secp256r1")
+        with mock.patch("certbot.key_pool.crypto_util.make_key") as mock_make_key:
+            mock_make_key.return_value = b"key"
+            self.pool.fill()
+        self.assertEqual(mock_make_key.call_count, 6)
+        # Spools are filled in turn
+        self.assertEqual([call[0][1:] for call in mock_make_key.call_args_list[:3]],
+                         [("ecdsa", "secp256r1"), ("ecdsa", "secp384r1"),
+                          ("rsa", None)])
+        for spec in ("ecdsa-secp256r1", "ecdsa-secp384r1", "rsa-1024"):
+            spool = os.path.join(self.config.key_dir, "pool", spec)
+            self.assertEqual(len(os.listdir(spool)), 2)
+
+    def test_fill_removes_stale_files(self):
+        os.makedirs(self.spool)
+        stale = os.path.join(self.spool, ".new-stale")
+        recent = os.path.join(self.spool, ".new-recent")
+        for path in (stale, recent):
+            open(path, "w").close()
+        os.utime(stale, (0, 0))
+        self.pool.fill()
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(recent))
+
+    def test_stop(self):
+        self.pool.stop()
+        self.pool.fill()
+        self.assertEqual(self._spooled(), [])
+
+    @mock.patch("certbot.key_pool.KeyPool.fill")
+    def test_background(self, mock_fill):
+        mock_fill.side_effect = [None, ValueError]
+        self.pool.POLL_INTERVAL = 0
+        self.pool.start()
+        self.pool._thread.join()  # pylint: disable=protected-access
+        self.assertEqual(mock_fill.call_count, 2)
+
+
+class PregenerateKeysTest(test_util.ConfigTestCase):
+    """Tests for certbot.key_pool.pregenerate_keys."""
+
+    @classmethod
+    def _take_key(cls):
+        from certbot.key_pool import take_key
+        return take_key(2048, "rsa", None)
+
+    def test_disabled(self):
+        from certbot.key_pool import pregenerate_keys
+        self.config.key_pool_size = 0
+        with mock.patch("certbot.key_pool.KeyPool") as mock_pool:
+            with pregenerate_keys(self.config):
+                self.assertTrue(self._take_key() is None)
+        self.assertFalse(mock_pool.called)
+
+    def test_enabled(self):
+        from certbot.key_pool import pregenerate_keys
+        self.config.key_pool_size = 1
+        with mock.patch("certbot.key_pool.KeyPool") as mock_pool:
+            mock_pool().take.return_value = "key"
+            with pregenerate_keys(self.config):
+                self.assertEqual(self._take_key(), "key")
+            self.assertTrue(mock_pool().start.called)
+            self.assertTrue(mock_pool().stop.called)
+        self.assertTrue(self._take_key() is None)
+
+    def test_expect_keys(self):
+        from certbot.key_pool import expect_keys
+        from certbot.key_pool import pregenerate_keys
+        expect_keys(4096, "rsa", None)
+        self.config.key_pool_size = 1
+        with mock.patch("certbot.key_pool.KeyPool") as mock_pool:
+            with pregenerate_keys(self.config):
+                expect_keys(4096, "rsa", None)
+            mock_pool().add_spec.assert_called_once_with(4096, "rsa", None)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,153 @@
+"""Tests for certbot.lineage_index."""
+import json
+import os
+import unittest
+
+import mock
+
+from certbot import errors
+from certbot import lineage_index
+from certbot.tests import util as test_util
+
+
+class LineageIndexTest(test_util.ConfigTestCase):
+    """Tests for certbot.lineage_index."""
+
+    def setUp(self):
+        super(LineageIndexTest, self).setUp()
+        self.patcher = mock.patch("certbot.storage.relevant_values")
+        self.patcher.start().side_effect = lambda values: values
+        self.index_path = os.path.join(self.config.config_dir, "lineage-index.json")
+        os.makedirs(self.config.renewal_configs_dir)
+        lineage_index.load(self.config)
+
+    def tearDown(self):
+        self.patcher.stop()
+        super(LineageIndexTest, self).tearDown()
+
+    def _new_lineage(self, name="example.com"):
+        from certbot import storage
+        return storage.RenewableCert.new_lineage(
+            name, test_util.load_vector("cert-san_512.pem"), b"privkey",
+            b"chain", self.config)
+
+    def _stored(self):
+        with open(self.index_path) as index_file:
+            return json.load(index_file)["lineages"]
+
+    def test_new_lineage(self):
+        lineage = self._new_lineage()
+        self.assertEqual(self._stored()["example.com"]["names"],
+                         ["example.com", "www.example.com"])
+
+        with mock.patch("certbot.lineage_index.rebuild") as mock_rebuild:
+            index = lineage_index.load(self.config)
+        self.assertFalse(mock_rebuild.called)
+        self.assertEqual(index.lineages_for_domains(["www.example.com", "other"]),
+                         ["example.com"])
+        self.assertEqual(index.lineages_for_domains(["other"]), [])
+        self.assertEqual(index.lineages_for_path(lineage.fullchain),
+                         ["example.com"])
+        self.assertEqual(index.lineages_for_path(lineage.version("cert", 1)),
+                         ["example.com"])
+
+    def test_save_successor(self):
+        lineage = self._new_lineage()
+        lineage.save_successor(1, test_util.load_vector("cert_512.pem"), None,
+                               b"chain", self.config)
+        self.assertTrue(lineage.version("fullchain", 2) in
+                        self._stored()["example.com"]["paths"])
+        lineage.update_all_links_to(2)
+        self.assertEqual(self._stored()["example.com"]["names"], ["example.com"])
+
+    def test_rename_and_delete(self):
+        from certbot import storage
+        self._new_lineage()
+        storage.rename_renewal_config("example.com", "renamed", self.config)
+        self.assertEqual(list(self._stored()), ["renamed"])
+        storage.delete_files(self.config, "renamed")
+        self.assertEqual(self._stored(), {})
+
+    def test_rebuild_when_changed(self):
+        self._new_lineage()
+        # Created without updating the index
+        with mock.patch("certbot.storage.lineage_index.updating"):
+            self._new_lineage("other.com")
+        os.utime(self.config.renewal_configs_dir, (0, 0))
+        index = lineage_index.load(self.config)
+        self.assertEqual(sorted(index.lineages), ["example.com", "other.com"])
+        self.assertEqual(sorted(self._stored()), ["example.com", "other.com"])
+
+    def test_rebuild_when_edited_in_place(self):
+        self._new_lineage()
+        dir_stat = os.stat(self.config.renewal_configs_dir)
+        conf_path = os.path.join(self.config.renewal_configs_dir,
+                                 "example.com.conf")
+        with open(conf_path, "a") as conf_file:
+            conf_file.write("\n")
+        os.utime(self.config.renewal_configs_dir,
+                 (dir_stat.st_atime, dir_stat.st_mtime))
+        with mock.patch("certbot.lineage_index.rebuild") as mock_rebuild:
+            lineage_index.load(self.config)
+        self.assertTrue(mock_rebuild.called)
+
+    def test_stale_index_not_updated(self):
+        self._new_lineage()
+        os.utime(self.config.renewal_configs_dir, (0, 0))
+        with lineage_index.updating(self.config) as index:
+            index.remove("example.com")
+        self.assertEqual(list(self._stored()), ["example.com"])
+
+    def test_failed_update(self):
+        self._new_lineage()
+        def _fail():
+            with lineage_index.updating(self.config):
+                raise ValueError
+        self.assertRaises(ValueError, _fail)
+        self.assertFalse(os.path.exists(self.index_path))
+
+    def test_locked(self):
+        self._new_lineage()
+        with mock.patch("certbot.lineage_index.lock.LockFile") as mock_lock:
+            mock_lock.side_effect = errors.LockError
+            with lineage_index.updating(self.config) as index:
+                index.remove("example.com")
+        mock_lock.assert_called_once_with(self.index_path + ".lock",
+                                          timeout=lineage_index.LOCK_TIMEOUT)
+        self.assertFalse(os.path.exists(self.index_path))
+
+    def test_lookups_follow_changes(self):
+        index = lineage_index.LineageIndex({
+            "a": {"names": ["a.example.com", "example.com"], "paths": ["/a"]},
+            "b": {"names": ["example.com"], "paths": ["/b"]},
+        })
+        self.assertEqual(index.lineages_for_domains(["example.com"]), ["a", "b"])
+        index.rename("a", "c")
+        self.assertEqual(index.lineages_for_domains(["a.example.com"]), ["c"])
+        self.assertEqual(index.lineages_for_path("/a"), ["c"])
+        index.remove("c")
+        self.assertEqual(index.lineages_for_domains(
+            ["a.example.com", "example.com"]), ["b"])
+        self.assertEqual(index.lineages_for_path("/a"), [])
+        index.rename("missing", "b")
+        self.assertEqual(index.lineages_for_path("/b"), ["b"])
+
+        lineage = mock.MagicMock(lineagename="b", archive_dir=self.tempdir,
+                                 fullchain_path="/new", cert_path="/new")
+        lineage.names.return_value = ["b.example.com"]
+        index.set(lineage)
+        self.assertEqual(index.lineages_for_domains(["example.com"]), [])
+        self.assertEqual(index.lineages_for_domains(["b.example.com"]), ["b"])
+        self.assertEqual(index.lineages_for_path("/b"), [])
+        self.assertEqual(index.lineages_for_path("/new"), ["b"])
+
+    def test_broken_index(self):
+        self._new_lineage()
+        with open(self.index_path, "w") as index_file:
+            index_file.write("{")
+        index = lineage_index.load(self.config)
+        self.assertEqual(list(index.lineages), ["example.com"])
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,70 @@
+"""Tests for certbot.lineage_transaction."""
+import os
+import stat
+import unittest
+
+import mock
+
+import certbot.tests.util as test_util
+
+
+class LineageTransactionTest(test_util.TempDirTestCase):
+    """Tests for certbot.lineage_transaction.LineageTransaction."""
+    def setUp(self):
+        super(LineageTransactionTest, self).setUp()
+        self.path = os.path.join(self.tempdir, "cert1.pem")
+        self.link = os.path.join(self.tempdir, "cert.pem")
+
+    def _txn(self):
+        from certbot.lineage_transaction import LineageTransaction
+        return LineageTransaction()
+
+    def test_commit(self):
+        with mock.patch("certbot.lineage_transaction.os.fsync") as mock_fsync:
+            with self._txn() as txn:
+                txn.write(self.path, b"cert", 0o640)
+                txn.symlink("cert1.pem", self.link)
+                self.assertFalse(os.path.exists(self.path))
+                self.assertFalse(os.path.lexists(self.link))
+        # the file and, once, its directory
+        self.assertEqual(mock_fsync.call_count, 2)
+        with open(self.link, "rb") as f:
+            self.assertEqual(f.read(), b"cert")
+        self.assertEqual(stat.S_IMODE(os.stat(self.path).st_mode), 0o640)
+        self.assertEqual(sorted(os.listdir(self.tempdir)),
+                         ["cert.pem", "cert1.pem"])
+
+    def test_replace(self):
+        os.symlink("missing.pem", self.link)
+        with self._txn() as txn:
+            txn.write(self.path, b"cert")
+            txn.symlink("cert1.pem", self.link)
+        self.assertEqual(os.readlink(self.link), "cert1.pem")
+
+    def test_abort(self):
+        def _stage():
+            with self._txn() as txn:
+                txn.write(self.path, b"cert")
+                txn.symlink("cert1.pem", self.link)
+                raise ValueError
+        self.assertRaises(ValueError, _stage)
+        self.assertEqual(os.listdir(self.tempdir), [])
+
+    def test_commit_failure(self):
+        txn = self._txn()
+        txn.write(self.path, b"cert")
+        txn.symlink("cert1.pem", self.link)
+        def rename_or_raise(src, dst, real_rename=os.rename):
+            # pylint: disable=missing-docstring
+            if dst == self.link:
+                raise OSError
+            real_rename(src, dst)
+
+        with mock.patch("certbot.lineage_transaction.os.rename") as mock_rename:
+            mock_rename.side_effect = rename_or_raise
+            self.assertRaises(OSError, txn.commit)
+        self.assertEqual(os.listdir(self.tempdir), ["cert1.pem"])
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -52,6 +52,61 @@ class LockFileTest(test_util.TempDirTestCase):
             self.assertRaises, errors.LockError, self._call, self.lock_path)
         test_util.lock_and_call(assert_raises, self.lock_path)
 
+    def test_timeout(self):
+        assert_raises = functools.partial(
+            self.assertRaises, errors.LockError, self._call, self.lock_path,
+            timeout=0.2)
+        test_util.lock_and_call(assert_raises, self.lock_path)
+
+    @mock.patch('certbot.lock.time.sleep')
+    @mock.patch('certbot.lock.fcntl.lockf')
+    def test_wait(self, mock_lockf, mock_sleep):
+        import errno
+        mock_lockf.side_effect = [IOError(errno.EAGAIN, 'locked'), None]
+        self._call(self.lock_path, timeout=10).release()
+        self.assertEqual(mock_lockf.call_count, 2)
+        self.assertEqual(mock_sleep.call_count, 1)
+
+    @mock.patch('certbot.lock.logger')
+    @mock.patch('certbot.lock.time.sleep')
+    @mock.patch('certbot.lock.fcntl.lockf')
+    def test_wait_logged_once(self, mock_lockf, mock_sleep, mock_logger):
+        import errno
+        with open(self.lock_path, 'w') as lock_f:
+            lock_f.write('1234')
+        mock_lockf.side_effect = [IOError(errno.EAGAIN, 'locked')] * 3 + [None]
+        self._call(self.lock_path, timeout=10).release()
+        self.assertEqual(mock_sleep.call_count, 3)
+        self.assertEqual(mock_logger.info.call_count, 1)
+        self.assertTrue('PID 1234' in mock_logger.info.call_args[0])
+
+    def test_pid_written(self):
+        lock_file = self._call(self.lock_path)
+        with open(self.lock_path) as lock_f:
+            self.assertEqual(lock_f.read(), str(os.getpid()))
+        lock_file.release()
+
+    def test_shared_pid_not_written(self):
+        lock_file = self._call(self.lock_path, shared=True)
+        self.assertEqual(os.path.getsize(self.lock_path), 0)
+        lock_file.release()
+
+    def test_shared(self):
+        def assert_shared():
+            """Take a shared and fail to take an exclusive lock."""
+            lock_file = self._call(self.lock_path, shared=True)
+            self.assertRaises(errors.LockError, self._call, self.lock_path)
+            lock_file.release()
+            # The other process still holds its shared lock on the file
+            self.assertTrue(os.path.exists(self.lock_path))
+        test_util.lock_and_call(assert_shared, self.lock_path, shared=True)
+
+    def test_shared_contention(self):
+        assert_raises = functools.partial(
+            self.assertRaises, errors.LockError, self._call, self.lock_path,
+            shared=True)
+        test_util.lock_and_call(assert_raises, self.lock_path)
+
     def test_locked_repr(self):
         lock_file = self._call(self.lock_path)
         locked_repr = repr(lock_file)
@@ -1,4 +1,5 @@
 """Tests for certbot.log."""
+import functools
 import logging
 import logging.handlers
 import os
@@ -164,6 +165,26 @@ class SetupLogFileHandlerTest(test_util.ConfigTestCase):
         backup_path = os.path.join(self.config.logs_dir, log_file + '.1')
         self.assertEqual(os.path.exists(backup_path), should_rollover)
 
+    def test_shared_with_rollover(self):
+        self.config.namespace.verb = 'renew'
+        self._test_success_common(should_rollover=True)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.config.logs_dir, '.certbot.lock')))
+
+    def test_shared_without_rollover(self):
+        self.config.namespace.verb = 'renew'
+        os.makedirs(self.config.logs_dir)
+        test_util.lock_and_call(
+            functools.partial(self._test_success_common, should_rollover=False),
+            self.config.logs_dir, shared=True)
+
+    @mock.patch('certbot.log.util.make_or_verify_dir')
+    def test_shared_failure(self, mock_make_or_verify):
+        self.config.namespace.verb = 'renew'
+        mock_make_or_verify.side_effect = OSError
+        self.assertRaises(errors.Error, self._call,
+                          self.config, 'test.log', '%(message)s')
+
     @mock.patch('certbot.log.logging.handlers.RotatingFileHandler')
     def test_max_log_backups_used(self, mock_handler):
         self._call(self.config, 'test.log', '%(message)s')
@@ -2,7 +2,9 @@
 # pylint: disable=too-many-lines
 from __future__ import print_function
 
+import functools
 import itertools
+import json
 import mock
 import os
 import shutil
@@ -509,6 +511,17 @@ class DetermineAccountTest(test_util.ConfigTestCase):
         self.assertEqual(self.accs[1].id, self.config.account)
         self.assertTrue(self.config.email is None)
 
+    def test_args_account_shared(self):
+        from certbot.client import shared_acme_clients
+        self.account_storage.save(self.accs[1], self.mock_client)
+        self.config.account = self.accs[1].id
+        with shared_acme_clients():
+            with mock.patch.object(self.account_storage, 'load',
+                                   wraps=self.account_storage.load) as mock_load:
+                self.assertEqual((self.accs[1], None), self._call())
+                self.assertEqual((self.accs[1], None), self._call())
+                self.assertEqual(mock_load.call_count, 1)
+
     def test_single_account(self):
         self.account_storage.save(self.accs[0], self.mock_client)
         self.assertEqual((self.accs[0], None), self._call())
@@ -750,9 +763,9 @@ class MainTest(test_util.ConfigTestCase):  # pylint: disable=too-many-public-met
         ifaces = []
         plugins = mock_disco.PluginsRegistry.find_all()
 
-        def throw_error(directory, mode, uid, strict):
+        def throw_error(directory, mode, uid, strict, shared_lock=False):
             """Raises error.Error."""
-            _, _, _, _ = directory, mode, uid, strict
+            _, _, _, _, _ = directory, mode, uid, strict, shared_lock
             raise errors.Error()
 
         stdout = six.StringIO()
@@ -930,7 +943,8 @@ class MainTest(test_util.ConfigTestCase):  # pylint: disable=too-many-public-met
         cert_path = test_util.vector_path('cert_512.pem')
         chain_path = '/etc/letsencrypt/live/foo.bar/fullchain.pem'
         mock_lineage = mock.MagicMock(cert=cert_path, fullchain=chain_path,
-                                      cert_path=cert_path, fullchain_path=chain_path)
+                                      cert_path=cert_path, fullchain_path=chain_path,
+                                      live_dir='/etc/letsencrypt/live/foo.bar')
         mock_lineage.should_autorenew.return_value = due_for_renewal
         mock_lineage.has_pending_deployment.return_value = False
         mock_lineage.names.return_value = ['isnot.org']
@@ -1062,6 +1076,26 @@ class MainTest(test_util.ConfigTestCase):  # pylint: disable=too-many-public-met
         args = ["renew", "--dry-run", "-tvv"]
         self._test_renewal_common(False, [], args=args, should_renew=False, error_expected=True)
 
+    def test_renew_batch_deploy_hook(self):
+        test_util.make_lineage(self.config.config_dir, 'sample-renewal.conf')
+        args = ["renew", "--dry-run", "--batch-deploy-hook=echo",
+                "--disable-hook-validation"]
+        with mock.patch("certbot.hooks.logger") as mock_logger:
+            self._test_renewal_common(True, [], args=args, should_renew=True)
+        skipped = [call for call in mock_logger.warning.call_args_list
+                   if "batch deploy hook" in call[0][0]]
+        self.assertEqual(len(skipped), 1)
+
+    @mock.patch('certbot.crypto_util.notAfter')
+    def test_certonly_renewal_batch_deploy_hook(self, unused_notafter):
+        with mock.patch('certbot.hooks.execute') as mock_execute:
+            self._test_renewal_common(
+                True, ['--batch-deploy-hook=echo', '--disable-hook-validation'])
+        self.assertEqual(mock_execute.call_count, 1)
+        self.assertEqual(mock_execute.call_args[0][0], 'echo')
+        manifest = json.loads(mock_execute.call_args[1]['stdin'])
+        self.assertEqual(manifest['certificates'][0]['domains'], ['isnot.org'])
+
     def test_renew_with_certname(self):
         test_util.make_lineage(self.config.config_dir, 'sample-renewal.conf')
         self._test_renewal_common(True, [], should_renew=True,
@@ -1074,7 +1108,8 @@ class MainTest(test_util.ConfigTestCase):  # pylint: disable=too-many-public-met
 
     def _make_dummy_renewal_config(self):
         renewer_configs_dir = os.path.join(self.config.config_dir, 'renewal')
-        os.makedirs(renewer_configs_dir)
+        if not os.path.exists(renewer_configs_dir):
+            os.makedirs(renewer_configs_dir)
         with open(os.path.join(renewer_configs_dir, 'test.conf'), 'w') as f:
             f.write("My contents don't matter")
 
@@ -1090,6 +1125,8 @@ class MainTest(test_util.ConfigTestCase):  # pylint: disable=too-many-public-met
                 mock_lineage.names.return_value = names
             mock_rc.return_value = mock_lineage
             with mock.patch('certbot.main.renew_cert') as mock_renew_cert:
+                # The lineages are renewed without an installer
+                mock_renew_cert.return_value = None
                 kwargs.setdefault('args', ['renew'])
                 self._test_renewal_common(True, None, should_renew=False, **kwargs)
 
@@ -1143,6 +1180,26 @@ class MainTest(test_util.ConfigTestCase):  # pylint: disable=too-many-public-met
             renewalparams=renewalparams, assert_oc_called=True,
             args=['renew', '--webroot-map', '{"example.com": "/tmp"}'])
 
+    def test_renew_lineage_locked(self):
+        locks_dir = os.path.join(self.config.config_dir, 'renewal-locks')
+        os.makedirs(locks_dir)
+        renew_common = functools.partial(
+            self._test_renew_common,
+            renewalparams={'authenticator': 'webroot'},
+            assert_oc_called=False, log_out="being processed by another")
+        test_util.lock_and_call(
+            renew_common, os.path.join(locks_dir, 'test.lock'))
+
+    def test_renew_releases_lineage_lock(self):
+        renewalparams = {'authenticator': 'webroot'}
+        self._test_renew_common(renewalparams=renewalparams,
+                                assert_oc_called=True)
+        self.assertEqual(os.listdir(
+            os.path.join(self.config.config_dir, 'renewal-locks')), [])
+        # Lock files would change the generation of the lineage index
+        self.assertEqual(os.listdir(
+            os.path.join(self.config.config_dir, 'renewal')), ['test.conf'])
+
     def test_renew_reconstitute_error(self):
         # pylint: disable=protected-access
         with mock.patch('certbot.main.renewal._reconstitute') as mock_reconstitute:
@@ -1162,6 +1219,90 @@ class MainTest(test_util.ConfigTestCase):  # pylint: disable=too-many-public-met
                 self._test_renewal_common(True, None, error_expected=True,
                                           args=['renew'], should_renew=False)
 
+    def _test_renew_reload_common(self, extra_args=None, restart_error=None,
+                                  installer=None, renew_cert=None):
+        renewer_configs_dir = os.path.join(self.config.config_dir, 'renewal')
+        os.makedirs(renewer_configs_dir)
+        lineages = []
+        for name in ('a', 'b'):
+            with open(os.path.join(renewer_configs_dir, name + '.conf'), 'w') as f:
+                f.write("My contents don't matter")
+            lineage = mock.MagicMock(fullchain=name + '/fullchain.pem')
+            lineage.configuration = {'renewalparams': {
+                'authenticator': 'webroot', 'installer': 'nginx'}}
+            lineages.append(lineage)
+        if installer is None:
+            installer = mock.MagicMock()
+        installer.restart.side_effect = restart_error
+        with mock.patch('certbot.storage.RenewableCert') as mock_rc:
+            mock_rc.side_effect = lineages
+            with mock.patch('certbot.main.renew_cert') as mock_renew_cert:
+                mock_renew_cert.return_value = installer
+                mock_renew_cert.side_effect = renew_cert
+                self._test_renewal_common(
+                    True, None, should_renew=False,
+                    args=['renew'] + (extra_args or []),
+                    error_expected=restart_error is not None)
+        self.assertEqual(mock_renew_cert.call_count, 2)
+        return mock_renew_cert, installer
+
+    def test_renew_reloads_installer_once(self):
+        mock_renew_cert, installer = self._test_renew_reload_common()
+        self.assertEqual(installer.restart.call_count, 1)
+        for call in mock_renew_cert.call_args_list:
+            self.assertFalse(call[1]['restart'])
+
+    @mock.patch('certbot.renewal.key_pool.expect_keys')
+    def test_renew_expects_keys(self, mock_expect_keys):
+        self._test_renew_reload_common()
+        self.assertEqual(mock_expect_keys.call_count, 2)
+        mock_expect_keys.assert_called_with(
+            self.config.rsa_key_size, self.config.key_type,
+            self.config.elliptic_curve)
+
+    def test_renew_reload_locks_config(self):
+        from certbot.plugins import common as plugins_common
+        installer = mock.MagicMock(spec=plugins_common.Installer)
+        installer.restart = mock.MagicMock()
+        installer.lock_config.side_effect = lambda: self.assertFalse(
+            installer.restart.called)
+        self._test_renew_reload_common(installer=installer)
+        self.assertEqual(installer.lock_config.call_count, 1)
+        self.assertEqual(installer.restart.call_count, 1)
+
+    def test_renew_reload_failure(self):
+        _, installer = self._test_renew_reload_common(
+            restart_error=errors.MisconfigurationError)
+        self.assertEqual(installer.restart.call_count, 1)
+
+    def _test_renew_shared_challenge_config(self, authenticator_name):
+        from certbot.plugins import common as plugins_common
+        authenticator = mock.MagicMock()
+        authenticator.name = authenticator_name
+        def _renew_cert(*unused_args, **unused_kwargs):
+            self.assertTrue(plugins_common.defer_challenge_reload(authenticator))
+            return mock.DEFAULT
+        _, installer = self._test_renew_reload_common(
+            extra_args=['--shared-challenge-config'], renew_cert=_renew_cert)
+        self.assertEqual(installer.restart.call_count, 1)
+        return authenticator
+
+    def test_renew_shared_challenge_config(self):
+        authenticator = self._test_renew_shared_challenge_config('nginx')
+        # Reloaded once as the installer of the lineages
+        self.assertFalse(authenticator.restart.called)
+
+    def test_renew_shared_challenge_config_authenticator_only(self):
+        authenticator = self._test_renew_shared_challenge_config('apache')
+        self.assertEqual(authenticator.restart.call_count, 1)
+
+    def test_renew_reload_after_each_renewal(self):
+        mock_renew_cert, installer = self._test_renew_reload_common(
+            extra_args=['--reload-after-each-renewal'])
+        self.assertFalse(installer.restart.called)
+        for call in mock_renew_cert.call_args_list:
+            self.assertTrue(call[1]['restart'])
+
     def test_renew_with_bad_cli_args(self):
         self._test_renewal_common(True, None, args='renew -d example.com'.split(),
                                   should_renew=False, error_expected=True)
@@ -1238,7 +1379,8 @@ class MainTest(test_util.ConfigTestCase):  # pylint: disable=too-many-public-met
                                  '--server', server, 'revoke'])
         with open(RSA2048_KEY_PATH, 'rb') as f:
             mock_acme_client.Client.assert_called_once_with(
-                server, key=jose.JWK.load(f.read()), net=mock.ANY)
+                server, key=jose.JWK.load(f.read()), net=mock.ANY,
+                chain_cache=mock.ANY)
         with open(SS_CERT_PATH, 'rb') as f:
             cert = crypto_util.pyopenssl_load_certificate(f.read())[0]
             mock_revoke = mock_acme_client.Client().revoke
@@ -1412,18 +1554,29 @@ class MakeOrVerifyNeededDirs(test_util.ConfigTestCase):
         for core_dir in (self.config.config_dir, self.config.work_dir,):
             mock_util.set_up_core_dir.assert_any_call(
                 core_dir, constants.CONFIG_DIRS_MODE,
-                os.geteuid(), self.config.strict_permissions
+                os.geteuid(), self.config.strict_permissions, False
             )
 
         hook_dirs = (self.config.renewal_pre_hooks_dir,
                      self.config.renewal_deploy_hooks_dir,
-                     self.config.renewal_post_hooks_dir,)
+                     self.config.renewal_post_hooks_dir,
+                     self.config.renewal_batch_deploy_hooks_dir,)
         for hook_dir in hook_dirs:
             # default mode of 755 is used
             mock_util.make_or_verify_dir.assert_any_call(
                 hook_dir, uid=os.geteuid(),
                 strict=self.config.strict_permissions)
 
+    @mock.patch("certbot.main.util")
+    def test_renew_shared_lock(self, mock_util):
+        self.config.namespace.verb = "renew"
+        main.make_or_verify_needed_dirs(self.config)
+        for core_dir in (self.config.config_dir, self.config.work_dir,):
+            mock_util.set_up_core_dir.assert_any_call(
+                core_dir, constants.CONFIG_DIRS_MODE,
+                os.geteuid(), self.config.strict_permissions, True
+            )
+
 
 if __name__ == '__main__':
     unittest.main()  # pragma: no cover
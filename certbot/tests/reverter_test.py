@@ -348,14 +348,14 @@ class TestFullCheckpointsReverter(test_util.ConfigTestCase):
         self.assertRaises(
             errors.ReverterError, self.reverter.finalize_checkpoint, "Title")
 
-    @mock.patch("certbot.reverter.os.rename")
-    def test_finalize_checkpoint_no_rename_directory(self, mock_rename):
+    def test_finalize_checkpoint_no_rename_directory(self):
 
         self.reverter.add_to_checkpoint(self.sets[0], "perm save")
-        mock_rename.side_effect = OSError
+        with mock.patch("certbot.reverter.os.rename") as mock_rename:
+            mock_rename.side_effect = OSError
 
-        self.assertRaises(
-            errors.ReverterError, self.reverter.finalize_checkpoint, "Title")
+            self.assertRaises(
+                errors.ReverterError, self.reverter.finalize_checkpoint, "Title")
 
     @mock.patch("certbot.reverter.logger")
     def test_rollback_too_many(self, mock_logger):
@@ -410,6 +410,95 @@ class TestFullCheckpointsReverter(test_util.ConfigTestCase):
         self.assertTrue("Second Checkpoint" in config_changes)
         self.assertTrue("Third Checkpoint" in config_changes)
 
+    def test_saved_files_shared(self):
+        self.reverter.add_to_checkpoint(self.sets[0], "first save")
+        self.reverter.finalize_checkpoint("First Checkpoint")
+        self.reverter.add_to_checkpoint(self.sets[0], "second save")
+        self.reverter.finalize_checkpoint("Second Checkpoint")
+
+        first, second = sorted(os.listdir(self.config.backup_dir))
+        self.assertTrue(os.path.samefile(
+            os.path.join(self.config.backup_dir, first, "config.txt_0"),
+            os.path.join(self.config.backup_dir, second, "config.txt_0")))
+        objects_dir = os.path.join(self.config.work_dir, "checkpoint_objects")
+        self.assertEqual(len(os.listdir(objects_dir)), 1)
+
+        self.reverter.rollback_checkpoints(2)
+        self.assertEqual(read_in(self.config1), "directive-dir1")
+        self.assertEqual(os.listdir(objects_dir), [])
+
+    @mock.patch("certbot.reverter.os.link")
+    def test_saved_files_copied_without_links(self, mock_link):
+        mock_link.side_effect = OSError
+        self._setup_three_checkpoints()
+        self.reverter.rollback_checkpoints(3)
+
+        self.assertEqual(read_in(self.config1), "directive-dir1")
+        self.assertEqual(read_in(self.config2), "directive-dir2")
+
+    def test_checkpoint_index(self):
+        # pylint: disable=protected-access
+        self._setup_three_checkpoints()
+        checkpoints = sorted(os.listdir(self.config.backup_dir))
+        self.assertEqual(self.reverter._checkpoints(), checkpoints)
+
+        with mock.patch("certbot.reverter.os.listdir") as mock_listdir:
+            self.reverter.add_to_checkpoint(self.sets[0], "fourth save")
+            self.reverter.finalize_checkpoint("Fourth Checkpoint")
+        self.assertFalse(mock_listdir.called)
+        self.assertEqual(self.reverter._checkpoints(),
+                         sorted(os.listdir(self.config.backup_dir)))
+
+        # Changes made without updating the index are noticed
+        self.reverter.rollback_checkpoints(1)
+        os.utime(self.config.backup_dir, (0, 0))
+        self.assertEqual(self.reverter._checkpoints(), checkpoints)
+
+    def test_max_checkpoints(self):
+        self.config.max_checkpoints = 2
+        config3 = self._setup_three_checkpoints()
+        self.assertEqual(len(os.listdir(self.config.backup_dir)), 2)
+
+        self.reverter.rollback_checkpoints(1)
+        self.assertEqual(read_in(self.config1), "update config1")
+        self.assertEqual(read_in(self.config2), "update config2")
+        self.assertEqual(read_in(config3), "Final form config3")
+
+        # The first two checkpoints were merged
+        config_changes = self.reverter.view_config_changes(for_logging=True)
+        self.assertTrue("First Checkpoint" in config_changes)
+        self.assertTrue("Second Checkpoint" in config_changes)
+        self.reverter.rollback_checkpoints(1)
+        self.assertEqual(read_in(self.config1), "directive-dir1")
+        self.assertEqual(read_in(self.config2), "directive-dir2")
+        self.assertFalse(os.path.isfile(config3))
+
+    def test_max_checkpoints_merge_commands(self):
+        self.config.max_checkpoints = 1
+        self.reverter.register_undo_command(False, ["first"])
+        self.reverter.finalize_checkpoint("First Checkpoint")
+        self.reverter.register_undo_command(False, ["second"])
+        self.reverter.finalize_checkpoint("Second Checkpoint")
+
+        with mock.patch("certbot.reverter.util.run_script") as mock_run:
+            self.reverter.rollback_checkpoints(1)
+        self.assertEqual(mock_run.call_args_list,
+                         [mock.call(["second"]), mock.call(["first"])])
+
+    @mock.patch("certbot.reverter.logger")
+    def test_max_checkpoints_merge_failure(self, mock_logger):
+        self.config.max_checkpoints = 1
+        self.reverter.add_to_checkpoint(self.sets[0], "first save")
+        self.reverter.finalize_checkpoint("First Checkpoint")
+        self.reverter.add_to_checkpoint(self.sets[1], "second save")
+        with mock.patch("certbot.reverter.shutil.rmtree") as mock_rmtree:
+            mock_rmtree.side_effect = OSError
+            self.reverter.finalize_checkpoint("Second Checkpoint")
+
+        self.assertEqual(mock_logger.warning.call_count, 1)
+        # pylint: disable=protected-access
+        self.assertEqual(len(self.reverter._checkpoints()), 2)
+
     def _setup_three_checkpoints(self):
         """Generate some finalized checkpoints."""
         # Checkpoint1 - config1
@@ -329,20 +329,24 @@ class RenewableCertTests(BaseRenewableCertTest):
             self.assertEqual(self.test_rc.current_version(kind), 12)
 
     def test_update_all_links_to_full_failure(self):
-        def unlink_or_raise(path, real_unlink=os.unlink):
+        failed = []
+        def rename_or_raise(src, dst, real_rename=os.rename):
             # pylint: disable=missing-docstring
-            if "fullchain" in os.path.basename(path):
+            if os.path.basename(dst) == "fullchain.pem" and not failed:
+                failed.append(dst)
                 raise ValueError
             else:
-                real_unlink(path)
+                real_rename(src, dst)
 
         self._write_out_ex_kinds()
-        with mock.patch("certbot.storage.os.unlink") as mock_unlink:
-            mock_unlink.side_effect = unlink_or_raise
+        with mock.patch("certbot.storage.os.rename") as mock_rename:
+            mock_rename.side_effect = rename_or_raise
             self.assertRaises(ValueError, self.test_rc.update_all_links_to, 12)
 
         for kind in ALL_FOUR:
             self.assertEqual(self.test_rc.current_version(kind), 11)
+        self.assertFalse([name for name in os.listdir(self.test_rc.live_dir)
+                          if name.endswith(".tmp")])
 
     def test_has_pending_deployment(self):
         for ver in six.moves.range(1, 6):
@@ -583,6 +587,13 @@ class RenewableCertTests(BaseRenewableCertTest):
         self.assertEqual(
             self._test_relevant_values_common(values), values)
 
+    @mock.patch("certbot.plugins.disco.PluginsRegistry.find_all")
+    def test_relevant_values_finds_plugins_once(self, mock_find_all):
+        mock_find_all.return_value = []
+        self._test_relevant_values_common(
+            {"hello": "there", "rsa_key_size": 12, "authenticator": "apache"})
+        self.assertEqual(mock_find_all.call_count, 1)
+
     @mock.patch("certbot.storage.relevant_values")
     def test_new_lineage(self, mock_rv):
         """Test for new_lineage() class method."""
@@ -903,5 +914,6 @@ class CertPathForCertNameTest(BaseRenewableCertTest):
     def test_no_such_cert_name(self):
         self.assertRaises(errors.CertStorageError, self._call, self.config, 'fake-example.org')
 
+
 if __name__ == "__main__":
     unittest.main()  # pragma: no cover
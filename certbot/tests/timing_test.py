@@ -0,0 +1,135 @@
+"""Tests for certbot.timing."""
+import json
+import os
+import unittest
+
+import mock
+
+from certbot import constants
+from certbot import timing
+from certbot.tests import util as test_util
+
+
+class TimingTest(test_util.ConfigTestCase):
+    """Tests for certbot.timing."""
+
+    def setUp(self):
+        super(TimingTest, self).setUp()
+        os.makedirs(self.config.logs_dir)
+        self.config.namespace.verb = "renew"
+        self.config.namespace.timing_report = None
+        self.config.namespace.prometheus_textfile = None
+        self.config.namespace.max_log_backups = 1
+        self.report_path = os.path.join(
+            self.config.logs_dir, constants.TIMING_REPORT.format(os.getpid()))
+
+    def _report(self):
+        with open(self.report_path) as report_file:
+            return json.load(report_file)
+
+    def test_span_not_recording(self):
+        with timing.span("phase"):
+            pass
+        self.assertFalse(os.path.exists(self.report_path))
+
+    def test_recording(self):
+        with timing.recording(self.config):
+            with timing.span("key-generation"):
+                pass
+            for name in ("a.example.com", "b.example.com"):
+                with timing.lineage(name):
+                    with timing.span("renewal"):
+                        with timing.span("hooks"):
+                            pass
+        with timing.span("hooks"):
+            pass
+
+        report = self._report()
+        self.assertEqual(report["verb"], "renew")
+        self.assertEqual(report["phases"]["run"]["count"], 1)
+        self.assertEqual(report["phases"]["hooks"]["count"], 2)
+        self.assertEqual(report["phases"]["key-generation"]["count"], 1)
+        self.assertEqual(sorted(report["lineages"]), ["a.example.com", "b.example.com"])
+        self.assertEqual(sorted(report["lineages"]["a.example.com"]),
+                         ["hooks", "renewal"])
+
+    def test_recording_failure(self):
+        def _fail():
+            with timing.recording(self.config):
+                with timing.span("issuance"):
+                    raise ValueError
+        self.assertRaises(ValueError, _fail)
+        self.assertEqual(self._report()["phases"]["issuance"]["count"], 1)
+
+    def test_prometheus_textfile(self):
+        textfile = os.path.join(self.tempdir, "certbot.prom")
+        self.config.namespace.timing_report = os.path.join(self.tempdir, "report.json")
+        self.config.namespace.prometheus_textfile = textfile
+        with timing.recording(self.config):
+            with timing.lineage('we"ird\\name'):
+                with timing.span("renewal"):
+                    pass
+
+        self.assertTrue(os.path.exists(self.config.timing_report))
+        self.assertFalse(os.path.exists(self.report_path))
+        with open(textfile) as prom_file:
+            lines = prom_file.read().splitlines()
+        self.assertTrue("# TYPE certbot_phase_seconds gauge" in lines)
+        self.assertTrue('certbot_phase_count{phase="renewal"} 1' in lines)
+        self.assertTrue(any(line.startswith(
+            'certbot_lineage_phase_seconds{lineage="we\\"ird\\\\name",phase="renewal"} ')
+                            for line in lines))
+        self.assertTrue(any(line.startswith(
+            'certbot_last_run_timestamp_seconds{verb="renew"} ') for line in lines))
+
+    def test_untimed_verb(self):
+        self.config.namespace.verb = "certificates"
+        self.config.namespace.prometheus_textfile = os.path.join(
+            self.tempdir, "certbot.prom")
+        with timing.recording(self.config) as recorder:
+            with timing.span("phase"):
+                pass
+        self.assertTrue(recorder is None)
+        self.assertEqual(os.listdir(self.config.logs_dir), [])
+        self.assertFalse(os.path.exists(self.config.prometheus_textfile))
+
+    def test_prune_reports(self):
+        old_reports = [
+            os.path.join(self.config.logs_dir, constants.TIMING_REPORT.format(pid))
+            for pid in (1, 2)]
+        for i, path in enumerate(old_reports):
+            open(path, "w").close()
+            os.utime(path, (i, i))
+        other = os.path.join(self.config.logs_dir, "letsencrypt.log")
+        open(other, "w").close()
+        with timing.recording(self.config):
+            pass
+        self.assertEqual(sorted(os.listdir(self.config.logs_dir)), sorted([
+            "letsencrypt.log", os.path.basename(old_reports[1]),
+            os.path.basename(self.report_path)]))
+
+    def test_write_failure(self):
+        os.rmdir(self.config.logs_dir)
+        with timing.recording(self.config):
+            pass
+        self.assertFalse(os.path.exists(self.report_path))
+
+    def test_rename_failure(self):
+        with mock.patch("certbot.timing.os.rename") as mock_rename:
+            mock_rename.side_effect = OSError
+            with timing.recording(self.config):
+                pass
+        self.assertEqual(os.listdir(self.config.logs_dir), [])
+
+    def test_rename_and_remove_failure(self):
+        with mock.patch("certbot.timing.os.rename") as mock_rename:
+            mock_rename.side_effect = OSError
+            with mock.patch("certbot.timing.os.remove") as mock_remove:
+                mock_remove.side_effect = OSError
+                with timing.recording(self.config):
+                    pass
+        self.assertTrue(mock_remove.called)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -342,11 +342,12 @@ class ConfigTestCase(TempDirTestCase):
         self.config.chain_path = constants.CLI_DEFAULTS['auth_chain_path']
         self.config.server = "example.com"
 
-def lock_and_call(func, lock_path):
+def lock_and_call(func, lock_path, shared=False):
     """Grab a lock for lock_path and call func.
 
     :param callable func: object to call after acquiring the lock
     :param str lock_path: path to file or directory to lock
+    :param bool shared: whether to grab a shared lock
 
     """
     # Reload module to reset internal _LOCKS dictionary
@@ -355,7 +356,7 @@ def lock_and_call(func, lock_path):
     # start child and wait for it to grab the lock
     cv = multiprocessing.Condition()
     cv.acquire()
-    child_args = (cv, lock_path,)
+    child_args = (cv, lock_path, shared,)
     child = multiprocessing.Process(target=hold_lock, args=child_args)
     child.start()
     cv.wait()
@@ -368,18 +369,19 @@ def lock_and_call(func, lock_path):
     assert child.exitcode == 0
 
 
-def hold_lock(cv, lock_path):  # pragma: no cover
+def hold_lock(cv, lock_path, shared=False):  # pragma: no cover
     """Acquire a file lock at lock_path and wait to release it.
 
     :param multiprocessing.Condition cv: condition for synchronization
     :param str lock_path: path to the file lock
+    :param bool shared: whether to acquire a shared lock
 
     """
     from certbot import lock
     if os.path.isdir(lock_path):
-        my_lock = lock.lock_dir(lock_path)
+        my_lock = lock.lock_dir(lock_path, shared)
     else:
-        my_lock = lock.LockFile(lock_path)
+        my_lock = lock.LockFile(lock_path, shared)
     cv.acquire()
     cv.notify()
     cv.wait()
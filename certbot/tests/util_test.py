@@ -4,6 +4,8 @@ import errno
 import os
 import shutil
 import stat
+import threading
+import time
 import unittest
 
 import mock
@@ -106,6 +108,68 @@ class LockDirUntilExit(test_util.TempDirTestCase):
         self.assertEqual(mock_logger.debug.call_count, 1)
 
 
+class LockFileUntilExit(test_util.TempDirTestCase):
+    """Tests for certbot.util.lock_file_until_exit."""
+    @classmethod
+    def _call(cls, *args, **kwargs):
+        from certbot.util import lock_file_until_exit
+        return lock_file_until_exit(*args, **kwargs)
+
+    def setUp(self):
+        super(LockFileUntilExit, self).setUp()
+        # reset global state from other tests
+        import certbot.util
+        reload_module(certbot.util)
+
+    @mock.patch('certbot.util.atexit_register')
+    def test_it(self, mock_register):
+        lock_path = os.path.join(self.tempdir, 'test.lock')
+        self._call(lock_path)
+        self._call(lock_path)
+
+        self.assertEqual(mock_register.call_count, 1)
+        self.assertTrue(os.path.exists(lock_path))
+        registered_func = mock_register.call_args[0][0]
+        registered_func()
+        self.assertFalse(os.path.exists(lock_path))
+
+
+class LockScopeTest(test_util.TempDirTestCase):
+    """Tests for certbot.util.lock_scope."""
+
+    def setUp(self):
+        super(LockScopeTest, self).setUp()
+        # reset global state from other tests
+        import certbot.util
+        reload_module(certbot.util)
+
+    @mock.patch('certbot.util.atexit_register')
+    def test_it(self, mock_register):
+        from certbot import util
+        held_path = os.path.join(self.tempdir, 'held.lock')
+        scoped_path = os.path.join(self.tempdir, 'scoped.lock')
+        util.lock_file_until_exit(held_path)
+        with util.lock_scope():
+            util.lock_file_until_exit(held_path)
+            util.lock_file_until_exit(scoped_path)
+            util.lock_dir_until_exit(self.tempdir)
+            self.assertTrue(os.path.exists(scoped_path))
+        self.assertTrue(os.path.exists(held_path))
+        self.assertFalse(os.path.exists(scoped_path))
+        self.assertFalse(os.path.exists(
+            os.path.join(self.tempdir, '.certbot.lock')))
+        self.assertEqual(mock_register.call_count, 1)
+
+    @mock.patch('certbot.util.logger')
+    def test_release_failure(self, mock_logger):
+        from certbot import util
+        lock_path = os.path.join(self.tempdir, 'scoped.lock')
+        with util.lock_scope():
+            util.lock_file_until_exit(lock_path)
+            os.remove(lock_path)
+        self.assertTrue(mock_logger.debug.called)
+
+
 class SetUpCoreDirTest(test_util.TempDirTestCase):
     """Tests for certbot.util.make_or_verify_core_dir."""
 
@@ -306,6 +370,54 @@ class SafelyRemoveTest(test_util.TempDirTestCase):
         self.assertRaises(OSError, self._call)
 
 
+class ParallelMapTest(unittest.TestCase):
+    """Tests for certbot.util.parallel_map."""
+
+    @classmethod
+    def _call(cls, func, items, max_workers=4):
+        from certbot.util import parallel_map
+        return parallel_map(func, items, max_workers)
+
+    def test_order(self):
+        finished = []
+        def _slow_first(item):
+            if item == 0:
+                # wait for the others to show results aren't out of order
+                while len(finished) < 9:
+                    time.sleep(0.01)
+            finished.append(item)
+            return item * 2
+        self.assertEqual(list(self._call(_slow_first, range(10), 10)),
+                         [item * 2 for item in range(10)])
+
+    def test_empty(self):
+        self.assertEqual(list(self._call(str, [])), [])
+
+    def test_max_workers(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+        def _track(item):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return item
+        self.assertEqual(list(self._call(_track, range(8), 2)), list(range(8)))
+        self.assertTrue(peak[0] <= 2)
+
+    def test_error(self):
+        def _fail_on_one(item):
+            if item == 1:
+                raise ValueError(item)
+            return item
+        results = self._call(_fail_on_one, range(3))
+        self.assertEqual(next(results), 0)
+        self.assertRaises(ValueError, next, results)
+
+
 class SafeEmailTest(unittest.TestCase):
     """Test safe_email."""
     @classmethod
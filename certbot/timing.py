@@ -0,0 +1,246 @@
+"""Timing of the phases of a run, and reports of them."""
+import contextlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from certbot import constants
+
+logger = logging.getLogger(__name__)
+
+_recorder = None
+"""`Recorder` of the current run, or ``None`` if it isn't being timed."""
+
+_local = threading.local()
+"""Holds the name of the lineage being processed by each thread."""
+
+
+class Recorder(object):
+    """Durations of the phases of a run.
+
+    :ivar float started: time at which the run started
+    :ivar list spans: (phase, lineage name or ``None``, duration in
+        seconds) of each timed phase, in the order they ended
+
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, phase, lineagename, duration):
+        """Record that a phase ended.
+
+        :param str phase: name of the phase
+        :param str lineagename: name of the lineage being processed, or
+            ``None``
+        :param float duration: seconds spent in the phase
+
+        """
+        with self._lock:
+            self.spans.append((phase, lineagename, duration))
+
+    def summary(self):
+        """Total the durations of each phase.
+
+        Phases may be nested, e.g. "issuance" is part of "renewal", so
+        durations of different phases shouldn't be added up.
+
+        :returns: report of the run, with the number of times each phase
+            ran and the seconds spent in it, both in total under
+            "phases" and for each lineage under "lineages"
+        :rtype: dict
+
+        """
+        phases = {}
+        lineages = {}
+        with self._lock:
+            spans = list(self.spans)
+        for phase, lineagename, duration in spans:
+            _add_to(phases.setdefault(phase, _new_total()), duration)
+            if lineagename is not None:
+                _add_to(lineages.setdefault(lineagename, {}).setdefault(
+                    phase, _new_total()), duration)
+        return {"started": self.started, "phases": phases, "lineages": lineages}
+
+
+def _new_total():
+    return {"count": 0, "seconds": 0.0, "max_seconds": 0.0}
+
+
+def _add_to(total, duration):
+    total["count"] += 1
+    total["seconds"] += duration
+    total["max_seconds"] = max(total["max_seconds"], duration)
+
+
+@contextlib.contextmanager
+def span(phase):
+    """Time the block as a phase of the run.
+
+    Does nothing unless the run is timed, see `recording`.
+
+    :param str phase: name of the phase
+
+    """
+    recorder = _recorder
+    if recorder is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        recorder.add(phase, current_lineage(), time.time() - start)
+
+
+def current_lineage():
+    """Get the lineage the phases timed by this thread are attributed to.
+
+    Threads started to process a lineage should pass it to `lineage`.
+
+    :returns: name of the lineage, or ``None``
+    :rtype: str
+
+    """
+    return getattr(_local, "lineage", None)
+
+
+@contextlib.contextmanager
+def lineage(name):
+    """Attribute the phases timed in the block by this thread to a lineage.
+
+    :param str name: name of the lineage
+
+    """
+    previous = getattr(_local, "lineage", None)
+    _local.lineage = name
+    try:
+        yield
+    finally:
+        _local.lineage = previous
+
+
+@contextlib.contextmanager
+def recording(config):
+    """Time the phases of the run in the block, and report them.
+
+    Only runs of `constants.TIMED_VERBS` are timed, so that the reports
+    of the last renewal aren't replaced by those of, say, ``certbot
+    certificates``. The block is timed as the "run" phase. The report
+    is written as JSON to ``config.timing_report``, or to
+    `constants.TIMING_REPORT` in the logs directory, and in the
+    Prometheus text format to ``config.prometheus_textfile`` if it is
+    set.
+
+    :param config: Configuration object
+    :type config: interfaces.IConfig
+
+    """
+    global _recorder  # pylint: disable=global-statement
+    if config.verb not in constants.TIMED_VERBS:
+        yield None
+        return
+    recorder = _recorder = Recorder()
+    try:
+        with span("run"):
+            yield recorder
+    finally:
+        _recorder = None
+        summary = recorder.summary()
+        summary["verb"] = config.verb
+        if config.timing_report:
+            _write(config.timing_report,
+                   json.dumps(summary, indent=4, sort_keys=True))
+        else:
+            _write(os.path.join(config.logs_dir,
+                                constants.TIMING_REPORT.format(os.getpid())),
+                   json.dumps(summary, indent=4, sort_keys=True))
+            # Kept as long as the log files
+            _prune_reports(config.logs_dir, config.max_log_backups + 1)
+        if config.prometheus_textfile:
+            _write(config.prometheus_textfile, prometheus_text(summary))
+
+
+def prometheus_text(summary):
+    """Format a report in the Prometheus text exposition format.
+
+    The result is meant to be picked up by the textfile collector of
+    the Prometheus node exporter.
+
+    :param dict summary: report, as returned by `Recorder.summary`
+
+    :rtype: str
+
+    """
+    lines = []
+    def _metric(name, kind, help_text, samples):
+        lines.append("# HELP {0} {1}".format(name, help_text))
+        lines.append("# TYPE {0} {1}".format(name, kind))
+        for labels, value in samples:
+            lines.append("{0}{{{1}}} {2!r}".format(name, ",".join(
+                '{0}="{1}"'.format(label, _escape(label_value))
+                for label, label_value in labels), value))
+
+    _metric("certbot_last_run_timestamp_seconds", "gauge",
+            "Time at which the last run of Certbot started.",
+            [((("verb", summary.get("verb", "")),), summary["started"])])
+    phases = sorted(summary["phases"].items())
+    _metric("certbot_phase_seconds", "gauge",
+            "Seconds spent in each phase during the last run.",
+            [((("phase", phase),), total["seconds"]) for phase, total in phases])
+    _metric("certbot_phase_count", "gauge",
+            "Number of times each phase ran during the last run.",
+            [((("phase", phase),), total["count"]) for phase, total in phases])
+    lineage_phases = sorted(
+        ((name, phase), total)
+        for name, totals in summary["lineages"].items()
+        for phase, total in totals.items())
+    _metric("certbot_lineage_phase_seconds", "gauge",
+            "Seconds spent in each phase for each lineage during the last run.",
+            [((("lineage", name), ("phase", phase)), total["seconds"])
+             for (name, phase), total in lineage_phases])
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _prune_reports(logs_dir, keep):
+    """Remove all but the newest keep reports in the logs directory."""
+    prefix, suffix = constants.TIMING_REPORT.split("{0}")
+    try:
+        reports = [os.path.join(logs_dir, name) for name in os.listdir(logs_dir)
+                   if name.startswith(prefix) and name.endswith(suffix) and
+                   name[len(prefix):-len(suffix)].isdigit()]
+        reports.sort(key=os.path.getmtime, reverse=True)
+        for path in reports[keep:]:
+            os.remove(path)
+    except OSError:
+        logger.debug("Unable to remove old timing reports", exc_info=True)
+
+
+def _write(path, content):
+    """Atomically replace the file at path."""
+    try:
+        fd, temp_path = tempfile.mkstemp(
+            prefix=".timing-", dir=os.path.dirname(os.path.abspath(path)))
+    except (IOError, OSError):
+        logger.debug("Unable to write timing report %s", path, exc_info=True)
+        return
+    try:
+        with os.fdopen(fd, "w") as report_file:
+            report_file.write(content)
+        os.chmod(temp_path, 0o644)
+        os.rename(temp_path, path)
+    except Exception:  # pylint: disable=broad-except
+        # A failure to report must never fail the run
+        logger.debug("Unable to write timing report %s", path, exc_info=True)
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
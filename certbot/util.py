@@ -2,6 +2,7 @@
 import argparse
 import atexit
 import collections
+import contextlib
 # distutils.version under virtualenv confuses pylint
 # For more info, see: https://github.com/PyCQA/pylint/issues/73
 import distutils.version  # pylint: disable=import-error,no-name-in-module
@@ -15,6 +16,7 @@ import socket
 import stat
 import subprocess
 import sys
+import threading
 
 import configargparse
 
@@ -59,6 +61,8 @@ _INITIAL_PID = os.getpid()
 # program exits before the lock is cleaned up, it is automatically
 # released, but the file isn't deleted.
 _LOCKS = OrderedDict()
+# Locks taken within each enclosing lock_scope block, innermost last
+_LOCK_SCOPES = []
 
 
 def run_script(params, log=logger.error):
@@ -123,19 +127,74 @@ def exe_exists(exe):
     return False
 
 
-def lock_dir_until_exit(dir_path):
+def lock_dir_until_exit(dir_path, shared=False, timeout=0):
     """Lock the directory at dir_path until program exit.
 
+    Within a `lock_scope` block, the lock is only held until the end of
+    the block.
+
     :param str dir_path: path to directory
+    :param bool shared: whether other processes may hold a shared lock
+        on the directory at the same time
+    :param float timeout: seconds to wait for another process to
+        release the lock
+
+    :raises errors.LockError: if the lock is held by another process
+
+    """
+    _hold_lock(dir_path, lambda: lock.lock_dir(dir_path, shared, timeout))
+
+
+def lock_file_until_exit(path, shared=False, timeout=0):
+    """Lock the file at path until program exit.
+
+    Within a `lock_scope` block, the lock is only held until the end of
+    the block.
+
+    :param str path: path to the lock file
+    :param bool shared: whether other processes may hold a shared lock
+        on the file at the same time
+    :param float timeout: seconds to wait for another process to
+        release the lock
 
     :raises errors.LockError: if the lock is held by another process
 
     """
+    _hold_lock(path, lambda: lock.LockFile(path, shared, timeout))
+
+
+def _hold_lock(path, acquire):
+    if any(path in locks for locks in [_LOCKS] + _LOCK_SCOPES):
+        return
+    if _LOCK_SCOPES:
+        _LOCK_SCOPES[-1][path] = acquire()
+        return
     if not _LOCKS:  # this is the first lock to be released at exit
         atexit_register(_release_locks)
+    _LOCKS[path] = acquire()
+
+
+@contextlib.contextmanager
+def lock_scope():
+    """Release the locks taken in the block at its end.
 
-    if dir_path not in _LOCKS:
-        _LOCKS[dir_path] = lock.lock_dir(dir_path)
+    Locks taken with `lock_dir_until_exit` and `lock_file_until_exit`
+    within the block are released when it ends rather than at program
+    exit. Locks already held when the block is entered are kept.
+
+    """
+    locks = OrderedDict()
+    _LOCK_SCOPES.append(locks)
+    try:
+        yield
+    finally:
+        _LOCK_SCOPES.pop()
+        for held_lock in reversed(list(locks.values())):
+            try:
+                held_lock.release()
+            except:  # pylint: disable=bare-except
+                msg = 'Exception occurred releasing lock: {0!r}'.format(held_lock)
+                logger.debug(msg, exc_info=True)
 
 
 def _release_locks():
@@ -147,13 +206,15 @@ def _release_locks():
             logger.debug(msg, exc_info=True)
 
 
-def set_up_core_dir(directory, mode, uid, strict):
+def set_up_core_dir(directory, mode, uid, strict, shared_lock=False):
     """Ensure directory exists with proper permissions and is locked.
 
     :param str directory: Path to a directory.
     :param int mode: Directory mode.
     :param int uid: Directory owner.
     :param bool strict: require directory to be owned by current user
+    :param bool shared_lock: allow other processes to use the directory
+        at the same time
 
     :raises .errors.LockError: if the directory cannot be locked
     :raises .errors.Error: if the directory cannot be made or verified
@@ -161,7 +222,7 @@ def set_up_core_dir(directory, mode, uid, strict):
     """
     try:
         make_or_verify_dir(directory, mode, uid, strict)
-        lock_dir_until_exit(directory)
+        lock_dir_until_exit(directory, shared_lock)
     except OSError as error:
         logger.debug("Exception was:", exc_info=True)
         raise errors.Error(PERM_ERR_FMT.format(error))
@@ -294,6 +355,62 @@ def safely_remove(path):
             raise
 
 
+def parallel_map(func, iterable, max_workers):
+    """Apply func to every item on a pool of threads.
+
+    Like `map`, results are yielded in the order of iterable, but each
+    result is yielded as soon as it and the ones before it are done.
+    Exceptions raised by func are reraised when their result would have
+    been yielded. Calls that haven't started when the generator is
+    closed are skipped.
+
+    :param callable func: function to call with each item
+    :param iterable: items to process
+    :param int max_workers: maximum number of concurrent calls
+
+    :returns: results of func
+    :rtype: generator
+
+    """
+    items = list(iterable)
+    results = [None] * len(items)
+    done = [threading.Event() for _ in items]
+    pending = six.moves.queue.Queue()
+    for i in six.moves.range(len(items)):
+        pending.put(i)
+    stopped = threading.Event()
+
+    def _work():
+        while not stopped.is_set():
+            try:
+                i = pending.get_nowait()
+            except six.moves.queue.Empty:
+                return
+            try:
+                results[i] = (True, func(items[i]))
+            except Exception:  # pylint: disable=broad-except
+                results[i] = (False, sys.exc_info())
+            done[i].set()
+
+    for _ in six.moves.range(min(max_workers, len(items))):
+        thread = threading.Thread(target=_work)
+        thread.daemon = True
+        thread.start()
+
+    try:
+        for i in six.moves.range(len(items)):
+            # Waiting without a timeout can't be interrupted on Python 2
+            while not done[i].is_set():
+                done[i].wait(1)
+            succeeded, result = results[i]
+            results[i] = None
+            if not succeeded:
+                six.reraise(*result)  # pylint: disable=star-args
+            yield result
+    finally:
+        stopped.set()
+
+
 def get_filtered_names(all_names):
     """Removes names that aren't considered valid by Let's Encrypt.
 
@@ -0,0 +1,116 @@
+"""Measure the request throughput of acme.client.ClientNetwork.
+
+A stub HTTP server is started on localhost, answering every request
+instantly with a canned JSON object, DER certificate or signed POST
+response, so the time measured is spent in ClientNetwork itself.
+
+Usage: python tests/acme_network_benchmark.py [-n REQUESTS] [--debug]
+
+"""
+import argparse
+import logging
+import pkg_resources
+import threading
+import time
+
+from cryptography.hazmat.backends import default_backend
+from cryptography.hazmat.primitives import serialization
+import josepy as jose
+from six.moves import BaseHTTPServer  # pylint: disable=import-error
+
+from acme import client
+from acme import messages
+
+
+JSON_BODY = messages.Directory({
+    messages.NewRegistration: 'http://127.0.0.1/acme/new-reg',
+    messages.Revocation: 'http://127.0.0.1/acme/revoke-cert',
+}).json_dumps().encode()
+DER_BODY = pkg_resources.resource_string('acme', 'testdata/cert.der')
+NONCE = jose.b64encode(b'benchmark-nonce').decode()
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Answers every request without doing any work."""
+    protocol_version = 'HTTP/1.1'
+    # Send each response in one write, avoiding delayed ACK stalls
+    wbufsize = -1
+
+    def _respond(self, body, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Replay-Nonce', NONCE)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def do_HEAD(self):  # pylint: disable=invalid-name,missing-docstring
+        self._respond(b'', client.ClientNetwork.JSON_CONTENT_TYPE)
+
+    def do_GET(self):  # pylint: disable=invalid-name,missing-docstring
+        if self.path == '/der':
+            self._respond(DER_BODY, client.DER_CONTENT_TYPE)
+        else:
+            self._respond(JSON_BODY, client.ClientNetwork.JSON_CONTENT_TYPE)
+
+    def do_POST(self):  # pylint: disable=invalid-name,missing-docstring
+        self.rfile.read(int(self.headers['Content-Length']))
+        self._respond(JSON_BODY, client.ClientNetwork.JSON_CONTENT_TYPE)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+def _load_key():
+    return jose.JWKRSA(key=serialization.load_pem_private_key(
+        pkg_resources.resource_string('acme', 'testdata/rsa2048_key.pem'),
+        password=None, backend=default_backend()))
+
+
+def _measure(name, count, request):
+    request()  # warm up the connection
+    start = time.time()
+    for _ in range(count):
+        request()
+    elapsed = time.time() - start
+    print('{0:<10} {1:>10.1f} requests/s'.format(name, count / elapsed))
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-n', '--requests', type=int, default=1000,
+                        help='number of requests per measurement')
+    parser.add_argument('--debug', action='store_true',
+                        help='enable debug logging, discarding its output')
+    args = parser.parse_args()
+
+    if args.debug:
+        logging.getLogger().addHandler(logging.NullHandler())
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    url = 'http://127.0.0.1:{0}'.format(server.server_address[1])
+
+    net = client.ClientNetwork(_load_key())
+    regr = messages.NewRegistration(contact=('mailto:admin@example.com',))
+    try:
+        _measure('GET json', args.requests,
+                 lambda: net.get(url + '/json').json())
+        _measure('GET der', args.requests,
+                 lambda: net.get(url + '/der',
+                                 content_type=client.DER_CONTENT_TYPE))
+        _measure('POST jws', args.requests,
+                 lambda: net.post(url + '/post', regr).json())
+    finally:
+        # The server handles one connection at a time, until it's closed
+        net.session.close()
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
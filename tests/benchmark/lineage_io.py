@@ -0,0 +1,219 @@
+"""Benchmark the lineage writes of certbot on different filesystems.
+
+Lineages are created and renewed directly through certbot.storage, as
+certbot certonly and certbot renew do, so that the cost of their
+writes can be compared across filesystems:
+
+  new-lineage  create a lineage (RenewableCert.new_lineage)
+  renewal      save a new version of a lineage and point its live links
+               at it (RenewableCert.save_successor and
+               update_all_links_to)
+
+Each lineage's files are written through storage.LineageTransaction,
+which syncs every file and directory it touches. The cost of that is
+dominated by the latency of fsync, so by default the benchmark runs on
+a tmpfs (/dev/shm), on the disk holding the temporary directory, and on
+that same disk with a delay added to every fsync to model a slow disk
+(a spinning disk or a network filesystem). A real slow disk can be used
+instead with --slow-disk.
+
+Usage: python tests/benchmark/lineage_io.py [--lineages 200] [--json FILE]
+
+"""
+import argparse
+import collections
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import OpenSSL
+
+from certbot import cli
+from certbot import configuration
+from certbot import storage
+from certbot.plugins import disco as plugins_disco
+
+
+TMPFS = '/dev/shm'
+"""Mount point of a tmpfs on most Linux systems."""
+
+
+class CountingOS(object):
+    """Counts the calls to os.fsync and os.rename, and slows fsync down.
+
+    :ivar collections.Counter calls: number of calls, by function name
+
+    """
+    def __init__(self, fsync_delay=0):
+        self.fsync_delay = fsync_delay
+        self.calls = collections.Counter()
+        self._fsync = os.fsync
+        self._rename = os.rename
+
+    def fsync(self, fd):  # pylint: disable=missing-docstring
+        self.calls['fsync'] += 1
+        if self.fsync_delay:
+            time.sleep(self.fsync_delay)
+        return self._fsync(fd)
+
+    def rename(self, src, dst):  # pylint: disable=missing-docstring
+        self.calls['rename'] += 1
+        return self._rename(src, dst)
+
+    def __enter__(self):
+        os.fsync = self.fsync
+        os.rename = self.rename
+        return self
+
+    def __exit__(self, *unused_exc_info):
+        os.fsync = self._fsync
+        os.rename = self._rename
+        return False
+
+
+def _make_cert():
+    """Make a self-signed certificate and its key, in PEM form."""
+    key = OpenSSL.crypto.PKey()
+    key.generate_key(OpenSSL.crypto.TYPE_RSA, 2048)
+    cert = OpenSSL.crypto.X509()
+    cert.get_subject().CN = 'example.com'
+    cert.set_issuer(cert.get_subject())
+    cert.set_serial_number(1)
+    cert.gmtime_adj_notBefore(0)
+    cert.gmtime_adj_notAfter(90 * 24 * 3600)
+    cert.set_pubkey(key)
+    cert.sign(key, 'sha256')
+    return (OpenSSL.crypto.dump_certificate(OpenSSL.crypto.FILETYPE_PEM, cert),
+            OpenSSL.crypto.dump_privatekey(OpenSSL.crypto.FILETYPE_PEM, key))
+
+
+def _make_config(directory):
+    """Parse the configuration certbot would use in directory."""
+    args = cli.prepare_and_parse_args(
+        plugins_disco.PluginsRegistry.find_all(), [
+            'certonly', '--config-dir', os.path.join(directory, 'config'),
+            '--work-dir', os.path.join(directory, 'work'),
+            '--logs-dir', os.path.join(directory, 'logs')])
+    return configuration.NamespaceConfig(args)
+
+
+def _measure(phase, count, fsync_delay, func):
+    """Call func count times, and measure the calls."""
+    with CountingOS(fsync_delay) as counting_os:
+        start = time.time()
+        for i in range(count):
+            func(i)
+        wall = time.time() - start
+    return {
+        'phase': phase,
+        'count': count,
+        'wall_time': wall,
+        'ms_per_lineage': wall * 1000 / count,
+        'fsync_per_lineage': float(counting_os.calls['fsync']) / count,
+        'rename_per_lineage': float(counting_os.calls['rename']) / count,
+    }
+
+
+def benchmark(directory, lineages, fsync_delay):
+    """Create and renew lineages in directory.
+
+    :param str directory: directory in which to place certbot's
+        configuration directory
+    :param int lineages: number of lineages
+    :param float fsync_delay: seconds added to each fsync
+
+    :returns: measurements of each phase
+    :rtype: list
+
+    """
+    config = _make_config(directory)
+    os.makedirs(config.renewal_configs_dir)
+    cert_pem, key_pem = _make_cert()
+    created = []
+
+    def _new_lineage(i):
+        created.append(storage.RenewableCert.new_lineage(
+            'lineage{0}.example.com'.format(i), cert_pem, key_pem, cert_pem,
+            config))
+
+    def _renew(i):
+        lineage = created[i]
+        prior_version = lineage.latest_common_version()
+        lineage.save_successor(prior_version, cert_pem, key_pem, cert_pem,
+                               config)
+        lineage.update_all_links_to(lineage.latest_common_version())
+
+    return [_measure('new-lineage', lineages, fsync_delay, _new_lineage),
+            _measure('renewal', lineages, fsync_delay, _renew)]
+
+
+def _print_report(report):
+    print('{0:<10} {1:<12} {2:>9} {3:>11} {4:>8} {5:>8}'.format(
+        'target', 'phase', 'wall (s)', 'ms/lineage', 'fsyncs', 'renames'))
+    for entry in report:
+        for result in entry['phases']:
+            print('{0:<10} {1:<12} {2:>9.2f} {3:>11.2f} {4:>8.1f} {5:>8.1f}'.format(
+                entry['target'], result['phase'], result['wall_time'],
+                result['ms_per_lineage'], result['fsync_per_lineage'],
+                result['rename_per_lineage']))
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '--lineages', type=int, default=200,
+        help='number of lineages to create and renew on each target')
+    parser.add_argument(
+        '--tmpfs', default=TMPFS,
+        help='directory on a tmpfs (default: %(default)s)')
+    parser.add_argument(
+        '--disk', default=tempfile.gettempdir(),
+        help='directory on a disk (default: %(default)s)')
+    parser.add_argument(
+        '--slow-disk',
+        help='directory on a slow disk (default: --disk, with --fsync-delay '
+        'added to each fsync)')
+    parser.add_argument(
+        '--fsync-delay', type=float, default=0.01,
+        help='seconds added to each fsync to model a slow disk, unless '
+        '--slow-disk is given (default: %(default)s)')
+    parser.add_argument('--json', help='write the report to this file')
+    args = parser.parse_args()
+
+    targets = [('tmpfs', args.tmpfs, 0), ('disk', args.disk, 0)]
+    if args.slow_disk:
+        targets.append(('slow-disk', args.slow_disk, 0))
+    else:
+        targets.append(('slow-disk', args.disk, args.fsync_delay))
+
+    report = []
+    for label, path, fsync_delay in targets:
+        if not os.path.isdir(path):
+            sys.stderr.write('Skipping {0}, {1} is not a directory\n'.format(
+                label, path))
+            continue
+        directory = tempfile.mkdtemp(prefix='certbot-lineage-io-', dir=path)
+        try:
+            report.append({
+                'target': label,
+                'path': path,
+                'fsync_delay': fsync_delay,
+                'phases': benchmark(directory, args.lineages, fsync_delay),
+            })
+        finally:
+            shutil.rmtree(directory)
+
+    _print_report(report)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(report, json_file, indent=4, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
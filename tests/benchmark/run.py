@@ -0,0 +1,292 @@
+"""Benchmark certbot against an in-process mock ACME server.
+
+For each number of lineages, a configuration directory holding that
+many synthetic lineages is created, and certbot is run against
+server.MockACMEServer for each of these phases:
+
+  register    register an account
+  certonly    obtain one new certificate
+  renew       renew the lineages that are due (see --due)
+  renew-idle  renew again, with no lineage due
+
+Wall time, CPU time, peak RSS and HTTP requests to the server are
+reported for each phase, as well as syscalls if --strace is given. The
+JSON report also holds the durations certbot measured for its own
+phases, see certbot.timing.
+
+Usage: python tests/benchmark/run.py [--lineages 10,1000] [--json FILE]
+
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import OpenSSL
+
+import certbot
+
+from server import MockACMEServer, dump_pem  # pylint: disable=import-error
+
+
+DUE_LIFETIME = datetime.timedelta(days=10)
+"""Lifetime of the certificates of lineages due for renewal."""
+
+LIFETIME = datetime.timedelta(days=90)
+"""Lifetime of the other certificates."""
+
+RENEWAL_CONF = """\
+version = {version}
+archive_dir = {archive_dir}
+cert = {live_dir}/cert.pem
+privkey = {live_dir}/privkey.pem
+chain = {live_dir}/chain.pem
+fullchain = {live_dir}/fullchain.pem
+
+[renewalparams]
+authenticator = webroot
+account = {account}
+server = {server}
+webroot_path = {webroot},
+[[webroot_map]]
+{name} = {webroot}
+"""
+
+
+class Benchmark(object):
+    """Certbot runs against a mock ACME server in a directory.
+
+    :ivar str directory: directory holding the configuration, work,
+        logs and webroot directories of certbot
+    :ivar list command: command running certbot
+
+    """
+    def __init__(self, server, directory, command, strace=False):
+        self.server = server
+        self.directory = directory
+        self.command = command
+        self.strace = strace
+        self.config_dir = os.path.join(directory, 'config')
+        self.webroot = os.path.join(directory, 'webroot')
+        os.makedirs(self.webroot)
+
+    def certbot(self, phase, args):
+        """Run certbot, and measure it.
+
+        :param str phase: name of the phase
+        :param list args: arguments to certbot
+
+        :returns: measurements of the run
+        :rtype: dict
+
+        """
+        timing_path = os.path.join(self.directory, phase + '-timing.json')
+        command = self.command + args + [
+            '--config-dir', self.config_dir,
+            '--work-dir', os.path.join(self.directory, 'work'),
+            '--logs-dir', os.path.join(self.directory, 'logs'),
+            '--server', self.server.directory_url,
+            '--non-interactive', '--max-log-backups', '0',
+            '--timing-report', timing_path]
+        strace_path = os.path.join(self.directory, phase + '.strace')
+        if self.strace:
+            command = ['strace', '-f', '-c', '-o', strace_path] + command
+        requests_before = self.server.requests.copy()
+
+        output_path = os.path.join(self.directory, phase + '.out')
+        with open(output_path, 'w') as output:
+            start = time.time()
+            process = subprocess.Popen(command, stdout=output, stderr=output)
+            _, status, rusage = os.wait4(process.pid, 0)
+            wall = time.time() - start
+        process.returncode = status
+        if status != 0:
+            raise RuntimeError('{0} failed, see {1}'.format(
+                ' '.join(command), output_path))
+
+        requests = self.server.requests - requests_before
+        certbot_phases = None
+        # Runs of verbs such as register aren't timed by certbot
+        if os.path.exists(timing_path):
+            with open(timing_path) as timing_file:
+                certbot_phases = json.load(timing_file)['phases']
+        return {
+            'phase': phase,
+            'wall_time': wall,
+            'cpu_time': rusage.ru_utime + rusage.ru_stime,
+            'max_rss_kb': rusage.ru_maxrss,
+            'syscalls': _count_syscalls(strace_path) if self.strace else None,
+            'http_requests': dict(requests),
+            'http_requests_total': sum(requests.values()),
+            'certbot_phases': certbot_phases,
+        }
+
+    def account_id(self):
+        """Find the ID of the account registered by certbot."""
+        for dirpath, _, filenames in os.walk(
+                os.path.join(self.config_dir, 'accounts')):
+            if 'regr.json' in filenames:
+                return os.path.basename(dirpath)
+        raise RuntimeError('No account found in ' + self.config_dir)
+
+    def make_lineages(self, count, due):
+        """Create lineages, as certbot would have.
+
+        All lineages share a private key, to save time.
+
+        :param int count: number of lineages
+        :param int due: number of them which are due for renewal
+
+        """
+        key = OpenSSL.crypto.PKey()
+        key.generate_key(OpenSSL.crypto.TYPE_RSA, 2048)
+        key_pem = OpenSSL.crypto.dump_privatekey(OpenSSL.crypto.FILETYPE_PEM, key)
+        chain_pem = dump_pem(self.server.ca_cert)
+        account = self.account_id()
+        os.makedirs(os.path.join(self.config_dir, 'renewal'))
+
+        for i in range(count):
+            name = 'lineage{0}.example.com'.format(i)
+            cert_pem = dump_pem(self.server.issue(
+                key, [name], DUE_LIFETIME if i < due else LIFETIME))
+            archive_dir = os.path.join(self.config_dir, 'archive', name)
+            live_dir = os.path.join(self.config_dir, 'live', name)
+            os.makedirs(archive_dir)
+            os.makedirs(live_dir)
+            for kind, content in (('cert', cert_pem), ('privkey', key_pem),
+                                  ('chain', chain_pem),
+                                  ('fullchain', cert_pem + chain_pem)):
+                with open(os.path.join(archive_dir, kind + '1.pem'), 'wb') as f:
+                    f.write(content)
+                os.symlink(os.path.join('..', '..', 'archive', name, kind + '1.pem'),
+                           os.path.join(live_dir, kind + '.pem'))
+            os.chmod(os.path.join(archive_dir, 'privkey1.pem'), 0o600)
+            with open(os.path.join(
+                    self.config_dir, 'renewal', name + '.conf'), 'w') as f:
+                f.write(RENEWAL_CONF.format(
+                    version=certbot.__version__, archive_dir=archive_dir,
+                    live_dir=live_dir, account=account,
+                    server=self.server.directory_url, webroot=self.webroot,
+                    name=name))
+
+    def run(self, count, due):
+        """Run all phases over count lineages.
+
+        :returns: measurements of each phase
+        :rtype: list
+
+        """
+        results = [self.certbot('register', [
+            'register', '--agree-tos', '--register-unsafely-without-email'])]
+        self.make_lineages(count, due)
+        results.append(self.certbot('certonly', [
+            'certonly', '--webroot', '-w', self.webroot,
+            '-d', 'new.example.com']))
+        results.append(self.certbot('renew', ['renew']))
+        results.append(self.certbot('renew-idle', ['renew']))
+        return results
+
+
+def _count_syscalls(strace_path):
+    """Total the calls reported by strace -c."""
+    total = 0
+    with open(strace_path) as strace_file:
+        for line in strace_file:
+            fields = line.split()
+            # % time, seconds, usecs/call, calls, [errors,] syscall
+            if len(fields) in (5, 6) and fields[-1] != 'total':
+                try:
+                    total += int(fields[3])
+                except ValueError:
+                    pass
+    return total
+
+
+def _default_command():
+    certbot_path = os.path.join(os.path.dirname(sys.executable), 'certbot')
+    if os.path.exists(certbot_path):
+        return [certbot_path]
+    return [sys.executable, '-m', 'certbot.main']
+
+
+def _print_report(report):
+    print('{0:>9} {1:<11} {2:>9} {3:>9} {4:>10} {5:>9} {6:>9}'.format(
+        'lineages', 'phase', 'wall (s)', 'cpu (s)', 'rss (KiB)',
+        'syscalls', 'requests'))
+    for entry in report:
+        for result in entry['phases']:
+            print('{0:>9} {1:<11} {2:>9.2f} {3:>9.2f} {4:>10} {5:>9} {6:>9}'.format(
+                entry['lineages'], result['phase'], result['wall_time'],
+                result['cpu_time'], result['max_rss_kb'],
+                '-' if result['syscalls'] is None else result['syscalls'],
+                result['http_requests_total']))
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(
+        description=__doc__.split('\n\n')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        '--lineages', default='10,1000,10000',
+        help='comma separated numbers of lineages to benchmark')
+    parser.add_argument(
+        '--due', type=int, default=1,
+        help='number of lineages due for renewal')
+    parser.add_argument(
+        '--latency', type=float, default=0,
+        help='seconds the server waits before answering each request')
+    parser.add_argument(
+        '--pending-polls', type=int, default=0,
+        help='times the server reports an answered authorization as pending')
+    parser.add_argument(
+        '--retry-after', type=int,
+        help='Retry-After header sent with pending authorizations')
+    parser.add_argument(
+        '--certbot', help='certbot executable (default: the one installed '
+        'next to this Python, or certbot.main)')
+    parser.add_argument(
+        '--strace', action='store_true',
+        help='count syscalls with strace; this inflates the timings')
+    parser.add_argument('--json', help='write the report to this file')
+    parser.add_argument(
+        '--keep', action='store_true',
+        help="don't remove the directories of the runs")
+    args = parser.parse_args()
+
+    command = [args.certbot] if args.certbot else _default_command()
+    server = MockACMEServer(latency=args.latency,
+                            pending_polls=args.pending_polls,
+                            retry_after=args.retry_after)
+    server.start()
+    base_dir = tempfile.mkdtemp(prefix='certbot-benchmark-')
+    report = []
+    try:
+        for count in [int(count) for count in args.lineages.split(',')]:
+            benchmark = Benchmark(
+                server, os.path.join(base_dir, str(count)), command,
+                strace=args.strace)
+            report.append({
+                'lineages': count,
+                'phases': benchmark.run(count, min(args.due, count)),
+            })
+    finally:
+        server.stop()
+        if args.keep:
+            print('Runs kept in ' + base_dir)
+        else:
+            shutil.rmtree(base_dir)
+
+    _print_report(report)
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(report, json_file, indent=4, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
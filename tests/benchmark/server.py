@@ -0,0 +1,346 @@
+"""In-process mock ACME server for benchmarks.
+
+The server speaks the subset of the ACME protocol used by
+`acme.client.Client`, keeps all its state in memory, and considers
+every challenge valid as soon as it is answered, so certbot can be
+benchmarked without a real CA. Latency and Retry-After behavior can be
+configured to model a remote CA.
+
+"""
+import collections
+import datetime
+import json
+import os
+import re
+import threading
+import time
+
+import josepy as jose
+import OpenSSL
+import pytz
+import six
+from six.moves import BaseHTTPServer  # pylint: disable=import-error
+from six.moves import socketserver  # pylint: disable=import-error
+
+from acme import challenges
+from acme import jws
+from acme import messages
+
+
+DER_CONTENT_TYPE = 'application/pkix-cert'
+JSON_CONTENT_TYPE = 'application/json'
+
+CA_NAME = 'Benchmark Mock CA'
+
+
+class MockACMEServer(object):
+    """Mock ACME server, running on a thread of the current process.
+
+    :ivar float latency: seconds to wait before answering each request
+    :ivar int pending_polls: number of times an answered authorization
+        is reported as pending before becoming valid
+    :ivar int retry_after: value of the Retry-After header sent with
+        pending authorizations, or ``None`` to leave it out
+    :ivar collections.Counter requests: number of requests received,
+        by method and resource (e.g. ``"POST new-authz"``)
+
+    """
+    def __init__(self, latency=0, pending_polls=0, retry_after=None,
+                 host='127.0.0.1', port=0):
+        self.latency = latency
+        self.pending_polls = pending_polls
+        self.retry_after = retry_after
+        self.requests = collections.Counter()
+        self._lock = threading.Lock()
+        self._registrations = []
+        self._authorizations = []
+        self._certs = []
+        self._nonces = 0
+        self.ca_key = OpenSSL.crypto.PKey()
+        self.ca_key.generate_key(OpenSSL.crypto.TYPE_RSA, 2048)
+        self.ca_cert = self._make_cert(
+            self.ca_key, [CA_NAME], datetime.timedelta(days=3650), ca=True)
+
+        self._httpd = _HTTPServer((host, port), _Handler)
+        self._httpd.acme_server = self
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL of the server."""
+        return 'http://{0}:{1}'.format(*self._httpd.server_address[:2])
+
+    @property
+    def directory_url(self):
+        """URL of the ACME directory, to be passed to ``--server``."""
+        return self.url + '/directory'
+
+    def start(self):
+        """Start serving requests on a daemon thread."""
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving requests."""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def issue(self, public_key, names, lifetime):
+        """Issue a certificate signed by the mock CA.
+
+        :param OpenSSL.crypto.PKey public_key: key of the subject
+        :param list names: domain names of the certificate, the first
+            one being its common name
+        :param datetime.timedelta lifetime: validity period of the
+            certificate
+
+        :rtype: OpenSSL.crypto.X509
+
+        """
+        return self._make_cert(public_key, names, lifetime)
+
+    def _make_cert(self, public_key, names, lifetime, ca=False):
+        with self._lock:
+            self._certs.append(None)
+            serial = len(self._certs)
+        cert = OpenSSL.crypto.X509()
+        cert.set_version(2)
+        cert.set_serial_number(serial)
+        cert.get_subject().CN = names[0]
+        cert.set_issuer(cert.get_subject() if ca else
+                        self.ca_cert.get_subject())
+        cert.gmtime_adj_notBefore(-60)
+        cert.gmtime_adj_notAfter(int(lifetime.total_seconds()))
+        cert.set_pubkey(public_key)
+        if ca:
+            extensions = [OpenSSL.crypto.X509Extension(
+                b'basicConstraints', True, b'CA:TRUE')]
+        else:
+            extensions = [OpenSSL.crypto.X509Extension(
+                b'subjectAltName', False,
+                ', '.join('DNS:' + name for name in names).encode())]
+        cert.add_extensions(extensions)
+        cert.sign(self.ca_key if not ca else public_key, 'sha256')
+        return cert
+
+    def _nonce(self):
+        with self._lock:
+            self._nonces += 1
+            return jose.b64encode(
+                six.b('nonce-{0}'.format(self._nonces))).decode()
+
+    def _new_reg(self, jwk, payload):
+        with self._lock:
+            self._registrations.append(payload)
+            reg_id = len(self._registrations) - 1
+        body = dict(payload, key=jwk.to_json())
+        body.pop('resource', None)
+        return (201, body, {
+            'Location': self.url + '/acme/reg/{0}'.format(reg_id),
+            'Link': '<{0}/acme/new-authz>;rel="next"'.format(self.url)})
+
+    def _reg(self, reg_id, jwk, payload):
+        registration = self._registrations[int(reg_id)]
+        registration.update(payload)
+        body = dict(registration, key=jwk.to_json())
+        body.pop('resource', None)
+        return 202, body, {}
+
+    def _new_authz(self, payload):
+        identifier = messages.Identifier.from_json(payload['identifier'])
+        with self._lock:
+            authz_id = len(self._authorizations)
+            self._authorizations.append({
+                'identifier': identifier, 'token': os.urandom(32),
+                'answered': False, 'polls': 0})
+        return (201, self._authz_body(authz_id), {
+            'Location': self._authz_url(authz_id),
+            'Link': '<{0}/acme/new-cert>;rel="next"'.format(self.url)})
+
+    def _authz_url(self, authz_id):
+        return self.url + '/acme/authz/{0}'.format(authz_id)
+
+    def _authz_status(self, authz_id):
+        authz = self._authorizations[authz_id]
+        if authz['answered'] and authz['polls'] > self.pending_polls:
+            return messages.STATUS_VALID
+        return messages.STATUS_PENDING
+
+    def _challb(self, authz_id, index, chall):
+        status = self._authz_status(authz_id)
+        return messages.ChallengeBody(
+            chall=chall, status=status,
+            uri=self.url + '/acme/challenge/{0}/{1}'.format(authz_id, index))
+
+    def _authz_body(self, authz_id):
+        authz = self._authorizations[authz_id]
+        token = authz['token']
+        challbs = tuple(
+            self._challb(authz_id, index, chall) for index, chall in enumerate(
+                (challenges.HTTP01(token=token),
+                 challenges.TLSSNI01(token=token),
+                 challenges.DNS01(token=token))))
+        status = self._authz_status(authz_id)
+        expires = None
+        if status == messages.STATUS_VALID:
+            expires = (datetime.datetime.now(pytz.UTC).replace(microsecond=0) +
+                       datetime.timedelta(days=30))
+        return messages.Authorization(
+            identifier=authz['identifier'], challenges=challbs,
+            combinations=((0,), (1,), (2,)), status=status,
+            expires=expires).to_json()
+
+    def _authz(self, authz_id):
+        authz_id = int(authz_id)
+        authz = self._authorizations[authz_id]
+        headers = {}
+        with self._lock:
+            if authz['answered']:
+                authz['polls'] += 1
+        if (self._authz_status(authz_id) == messages.STATUS_PENDING and
+                self.retry_after is not None):
+            headers['Retry-After'] = str(self.retry_after)
+        return 200, self._authz_body(authz_id), headers
+
+    def _challenge(self, authz_id, index):
+        authz_id = int(authz_id)
+        self._authorizations[authz_id]['answered'] = True
+        body = self._authz_body(authz_id)['challenges'][int(index)]
+        return 202, body, {
+            'Link': '<{0}>;rel="up"'.format(self._authz_url(authz_id))}
+
+    def _new_cert(self, payload):
+        csr = OpenSSL.crypto.load_certificate_request(
+            OpenSSL.crypto.FILETYPE_ASN1, jose.b64decode(payload['csr']))
+        names = []
+        for extension in csr.get_extensions():
+            if extension.get_short_name() == b'subjectAltName':
+                names = re.findall(r'DNS:([^,\s]+)', str(extension))
+        cert = self.issue(csr.get_pubkey(), names, datetime.timedelta(days=90))
+        der = OpenSSL.crypto.dump_certificate(OpenSSL.crypto.FILETYPE_ASN1, cert)
+        with self._lock:
+            self._certs[cert.get_serial_number() - 1] = der
+        return 201, der, {
+            'Location': self.url + '/acme/cert/{0}'.format(
+                cert.get_serial_number()),
+            'Link': '<{0}/acme/issuer-cert>;rel="up"'.format(self.url)}
+
+    def _cert(self, serial):
+        return 200, self._certs[int(serial) - 1], {}
+
+    def _issuer_cert(self):
+        return 200, OpenSSL.crypto.dump_certificate(
+            OpenSSL.crypto.FILETYPE_ASN1, self.ca_cert), {}
+
+    def _directory(self):
+        return 200, {
+            'new-reg': self.url + '/acme/new-reg',
+            'new-authz': self.url + '/acme/new-authz',
+            'new-cert': self.url + '/acme/new-cert',
+            'revoke-cert': self.url + '/acme/revoke-cert',
+        }, {}
+
+    def handle(self, method, path, body):
+        """Answer a request.
+
+        :returns: status code, body (bytes, or a JSON object) and headers
+        :rtype: tuple
+
+        """
+        parts = path.strip('/').split('/')
+        resource = parts[1] if parts[0] == 'acme' and len(parts) > 1 else parts[0]
+        with self._lock:
+            self.requests['{0} {1}'.format(method, resource)] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if method == 'HEAD':
+            return 200, b'', {}
+        if method == 'GET':
+            if parts == ['directory']:
+                return self._directory()
+            elif resource == 'authz':
+                return self._authz(parts[2])
+            elif resource == 'cert':
+                return self._cert(parts[2])
+            elif resource == 'issuer-cert':
+                return self._issuer_cert()
+        elif method == 'POST':
+            signed = jws.JWS.json_loads(body)
+            jwk = signed.signature.combined.jwk
+            payload = json.loads(signed.payload.decode())
+            if resource == 'new-reg':
+                return self._new_reg(jwk, payload)
+            elif resource == 'reg':
+                return self._reg(parts[2], jwk, payload)
+            elif resource == 'new-authz':
+                return self._new_authz(payload)
+            elif resource == 'challenge':
+                return self._challenge(parts[2], parts[3])
+            elif resource == 'new-cert':
+                return self._new_cert(payload)
+            elif resource == 'revoke-cert':
+                return 200, b'', {}
+        return 404, {'type': 'urn:acme:error:malformed',
+                     'detail': 'Unknown resource'}, {}
+
+
+class _HTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Send each response in one write, avoiding delayed ACK stalls
+    wbufsize = -1
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        status, content, headers = self.server.acme_server.handle(
+            self.command, self.path, body)
+        if isinstance(content, bytes):
+            content_type = DER_CONTENT_TYPE
+        else:
+            content = json.dumps(content).encode()
+            content_type = (JSON_CONTENT_TYPE if status < 400 else
+                            'application/problem+json')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.send_header('Replay-Nonce', self.server.acme_server._nonce())  # pylint: disable=protected-access
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(content)
+
+    do_GET = do_HEAD = do_POST = _handle
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+def dump_pem(cert):
+    """Encode a certificate as PEM.
+
+    :param OpenSSL.crypto.X509 cert: certificate
+
+    :rtype: bytes
+
+    """
+    return OpenSSL.crypto.dump_certificate(OpenSSL.crypto.FILETYPE_PEM, cert)
+
+
+if __name__ == '__main__':
+    SERVER = MockACMEServer()
+    SERVER.start()
+    print('Serving ACME at ' + SERVER.directory_url)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        SERVER.stop()